@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Benchmark: creative association discovery over all memory pairs.
+
+Times the blocked matrix-multiply scoring in CreativeAssociationEngine on
+synthetic unit-norm embeddings. Every tile of the upper triangle is scored
+(no block budget), so the reported pair count is N*(N-1)/2.
+
+Usage:
+    python scripts/benchmarks/association_discovery.py [sizes...]
+    python scripts/benchmarks/association_discovery.py 5000 20000
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from mcp_memory_service.consolidation.associations import CreativeAssociationEngine
+from mcp_memory_service.consolidation.base import ConsolidationConfig
+from mcp_memory_service.models.memory import Memory
+
+
+def make_corpus(size, dimension=384, seed=42):
+    rng = np.random.default_rng(seed)
+    # A few topic centroids plus noise gives a spread of pair similarities
+    centroids = rng.normal(size=(32, dimension))
+    vectors = centroids[rng.integers(0, 32, size)] + rng.normal(scale=1.5, size=(size, dimension))
+    return [
+        Memory(content=f"memory {i}", content_hash=f"hash{i}", embedding=vectors[i].tolist())
+        for i in range(size)
+    ]
+
+
+def run_benchmark(sizes):
+    engine = CreativeAssociationEngine(ConsolidationConfig(association_max_blocks_per_run=0))
+    print(f"  {'memories':>9} {'pairs':>12} {'scoring (s)':>12} {'sampled':>8}")
+    for size in sizes:
+        memories = make_corpus(size)
+        vectors, with_vectors, _ = engine._normalized_embeddings(memories)
+
+        start = time.perf_counter()
+        candidates = engine._find_candidate_pairs(vectors, with_vectors, set())
+        seconds = time.perf_counter() - start
+
+        print(f"  {size:>9} {size * (size - 1) // 2:>12} {seconds:>12.2f} {len(candidates):>8}")
+
+
+if __name__ == "__main__":
+    run_benchmark([int(arg) for arg in sys.argv[1:]] or [5000, 20000])
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Benchmark: semantic clustering of large stores within a memory budget.
+
+Clusters synthetic embeddings with SemanticClusteringEngine set to 'dbscan',
+which switches to mini-batch k-means once the pairwise distances would
+exceed the memory budget (or to 'simple' below it when sklearn is missing). Reports wall time and the peak
+numpy allocation on top of the input matrix (via tracemalloc).
+
+Usage:
+    python scripts/benchmarks/clustering_scale.py [sizes...]
+    python scripts/benchmarks/clustering_scale.py 10000 100000
+"""
+
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from mcp_memory_service.consolidation.base import ConsolidationConfig
+from mcp_memory_service.consolidation.clustering import SemanticClusteringEngine
+
+
+def make_embeddings(size, dimension=384, seed=42):
+    rng = np.random.default_rng(seed)
+    centroids = rng.normal(size=(64, dimension))
+    vectors = centroids[rng.integers(0, 64, size)] + rng.normal(scale=0.8, size=(size, dimension))
+    return vectors.astype(np.float32)
+
+
+async def run_benchmark(sizes):
+    engine = SemanticClusteringEngine(ConsolidationConfig(clustering_algorithm='dbscan'))
+    print(f"  {'memories':>9} {'algorithm':>17} {'seconds':>8} {'clusters':>9} {'peak MB':>8}")
+    for size in sizes:
+        embeddings = make_embeddings(size)
+        algorithm = engine._select_algorithm(size)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        if algorithm == 'minibatch_kmeans':
+            labels = await engine._minibatch_kmeans_clustering(embeddings)
+        elif algorithm == 'dbscan':
+            labels = await engine._dbscan_clustering(embeddings)
+        else:
+            labels = await engine._simple_clustering(embeddings)
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(f"  {size:>9} {algorithm:>17} {seconds:>8.2f} {len(np.unique(labels)):>9} {peak / 1e6:>8.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(run_benchmark([int(arg) for arg in sys.argv[1:]] or [10000, 100000]))
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Benchmark: relevance scoring of large memory sets.
+
+Times ExponentialDecayCalculator.score_arrays() on prepared columns (the
+daily decay path) and process() on Memory objects, which also gathers the
+columns from each memory.
+
+Usage:
+    python scripts/benchmarks/decay_scoring.py [sizes...]
+    python scripts/benchmarks/decay_scoring.py 10000 100000
+"""
+
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from mcp_memory_service.consolidation.base import ConsolidationConfig
+from mcp_memory_service.consolidation.decay import ExponentialDecayCalculator
+from mcp_memory_service.models.memory import Memory
+
+
+def make_memories(size, seed=42):
+    rng = np.random.default_rng(seed)
+    now = time.time()
+    created = now - rng.uniform(0, 400 * 86400, size)
+    types = ['standard', 'critical', 'temporary', 'reference']
+    return [
+        Memory(
+            content=f"Memory {i}",
+            content_hash=f"hash{i}",
+            tags=['note'] if i % 3 else ['project'],
+            memory_type=types[i % len(types)],
+            created_at=float(created[i]),
+            updated_at=float(created[i] + rng.uniform(0, 30 * 86400))
+        )
+        for i in range(size)
+    ]
+
+
+async def run_benchmark(sizes):
+    calculator = ExponentialDecayCalculator(ConsolidationConfig())
+    print(f"  {'memories':>9} {'arrays ms':>10} {'process ms':>11}")
+    for size in sizes:
+        memories = make_memories(size)
+        created_at = np.array([m.created_at for m in memories])
+        updated_at = np.array([m.updated_at for m in memories])
+        retention = np.array([calculator.retention_periods.get(m.memory_type, 30) for m in memories])
+        hashes = [m.content_hash for m in memories]
+
+        start = time.perf_counter()
+        calculator.score_arrays(hashes, created_at, updated_at, retention, np.zeros(size, dtype=np.int64))
+        arrays_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        await calculator.process(memories, reference_time=datetime.now())
+        process_ms = (time.perf_counter() - start) * 1000
+
+        print(f"  {size:>9} {arrays_ms:>10.1f} {process_ms:>11.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(run_benchmark([int(arg) for arg in sys.argv[1:]] or [10000, 100000]))
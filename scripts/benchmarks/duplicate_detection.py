@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark: duplicate detection for controlled forgetting.
+
+Compares the one-pass MinHash/LSH detector with the previous per-memory
+pairwise scan (reproduced below) on synthetic corpora where ~10% of the
+memories are near copies. The pairwise scan is only timed on a sample and
+extrapolated, since at 100k memories it would run for hours.
+
+Usage:
+    python scripts/benchmarks/duplicate_detection.py [sizes...]
+    python scripts/benchmarks/duplicate_detection.py 10000 100000
+"""
+
+import os
+import random
+import sys
+import time
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from mcp_memory_service.consolidation.dedup import DuplicateDetector
+from mcp_memory_service.models.memory import Memory
+
+
+def make_corpus(size, seed=42):
+    rng = random.Random(seed)
+    vocabulary = [f"term{i}" for i in range(5000)]
+    memories = []
+    for i in range(size):
+        if memories and rng.random() < 0.1:
+            words = rng.choice(memories).content.split()
+            words[rng.randrange(len(words))] = rng.choice(vocabulary)
+            content = " ".join(words)
+        else:
+            content = " ".join(rng.choice(vocabulary) for _ in range(rng.randint(15, 60)))
+        memories.append(Memory(content=content, content_hash=f"hash{i}", created_at=float(i)))
+    return memories
+
+
+def pairwise_is_duplicate(memory, all_memories):
+    """The previous ControlledForgettingEngine._appears_to_be_duplicate."""
+    content = memory.content.strip().lower()
+    if len(content) < 20:
+        return False
+    for other_memory in all_memories:
+        if other_memory.content_hash == memory.content_hash:
+            continue
+        other_content = other_memory.content.strip().lower()
+        if content == other_content:
+            return True
+        if len(content) > 50 and len(other_content) > 50:
+            if content in other_content or other_content in content:
+                return True
+            words1 = set(content.split())
+            words2 = set(other_content.split())
+            if len(words1) > 5 and len(words2) > 5:
+                if len(words1 & words2) / len(words1 | words2) > 0.8:
+                    return True
+    return False
+
+
+def run_benchmark(sizes):
+    detector = DuplicateDetector()
+    print(f"  {'memories':>9} {'LSH (s)':>9} {'duplicates':>11} {'pairs':>9} {'pairwise est. (s)':>18}")
+    for size in sizes:
+        memories = make_corpus(size)
+
+        start = time.perf_counter()
+        report = detector.detect(memories)
+        lsh_seconds = time.perf_counter() - start
+
+        sample = memories[:20]
+        start = time.perf_counter()
+        for memory in sample:
+            pairwise_is_duplicate(memory, memories)
+        pairwise_estimate = (time.perf_counter() - start) / len(sample) * size
+
+        print(f"  {size:>9} {lsh_seconds:>9.2f} {len(report.duplicates):>11} "
+              f"{report.candidate_pairs:>9} {pairwise_estimate:>18.0f}")
+
+
+if __name__ == "__main__":
+    run_benchmark([int(arg) for arg in sys.argv[1:]] or [10000, 100000])
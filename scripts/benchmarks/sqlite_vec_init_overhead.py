@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: per-call initialization overhead of SqliteVecMemoryStorage.
+
+get_all_memories(), count_all_memories() and friends call initialize() on
+every invocation. This measures what that costs now that initialize() is
+idempotent, against a full re-initialization per call (the previous
+behaviour, reproduced by clearing the ready flag before each call).
+
+Usage:
+    python scripts/benchmarks/sqlite_vec_init_overhead.py [iterations]
+"""
+
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from mcp_memory_service.storage.sqlite_vec import SqliteVecMemoryStorage
+from mcp_memory_service.models.memory import Memory
+from mcp_memory_service.utils.hashing import generate_content_hash
+
+
+async def time_calls(label, call, iterations, reset=None):
+    """Run call() iterations times and print the mean latency."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        if reset:
+            reset()
+        await call()
+    elapsed_ms = (time.perf_counter() - start) * 1000 / iterations
+    print(f"  {label:<45} {elapsed_ms:8.3f} ms/call")
+    return elapsed_ms
+
+
+async def run_benchmark(iterations: int = 200):
+    temp_dir = tempfile.mkdtemp()
+    storage = SqliteVecMemoryStorage(os.path.join(temp_dir, "bench.db"))
+    try:
+        await storage.initialize()
+        for i in range(100):
+            content = f"Benchmark memory {i}"
+            await storage.store(Memory(
+                content=content,
+                content_hash=generate_content_hash(content),
+                tags=["benchmark"]
+            ))
+
+        def force_reinit():
+            storage._initialized = False
+
+        print(f"SQLite-vec initialization overhead ({iterations} iterations)")
+
+        print("\nBefore (full initialize() on every call):")
+        before_init = await time_calls("initialize()", storage.initialize, iterations // 10 or 1, force_reinit)
+        before_count = await time_calls(
+            "count_all_memories()", storage.count_all_memories, iterations // 10 or 1, force_reinit
+        )
+
+        print("\nAfter (idempotent initialize()):")
+        after_init = await time_calls("initialize()", storage.initialize, iterations)
+        after_count = await time_calls("count_all_memories()", storage.count_all_memories, iterations)
+        await time_calls("get_all_memories(limit=10)", lambda: storage.get_all_memories(limit=10), iterations)
+
+        # Concurrent first calls must initialize exactly once
+        fresh = SqliteVecMemoryStorage(os.path.join(temp_dir, "bench_concurrent.db"))
+        calls = 0
+        original = fresh._initialize
+
+        async def counting_initialize():
+            nonlocal calls
+            calls += 1
+            await original()
+
+        fresh._initialize = counting_initialize
+        await asyncio.gather(*[fresh.initialize() for _ in range(10)])
+        fresh.close()
+
+        print(f"\nSpeedup: initialize() {before_init / max(after_init, 1e-6):.0f}x, "
+              f"count_all_memories() {before_count / max(after_count, 1e-6):.0f}x")
+        print(f"Concurrent initialize() calls ran initialization {calls} time(s)")
+
+    finally:
+        storage.close()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
@@ -158,18 +158,17 @@ class DataMigrator:
             
             await storage.initialize()
             
-            # Import memories in batches
-            batch_size = 10  # Smaller batches for Cloudflare API limits
+            # Import memories in batches; each batch is a handful of API requests
+            batch_size = 100
             imported_count = 0
             failed_count = 0
             
             for i in range(0, len(memories), batch_size):
-                batch = memories[i:i + batch_size]
-                
-                for memory_data in batch:
+                batch = []
+                for memory_data in memories[i:i + batch_size]:
                     try:
                         # Convert to Memory object
-                        memory = Memory(
+                        batch.append(Memory(
                             content=memory_data['content'],
                             content_hash=memory_data['content_hash'],
                             tags=memory_data.get('tags', []),
@@ -179,28 +178,23 @@ class DataMigrator:
                             created_at_iso=memory_data.get('created_at_iso'),
                             updated_at=memory_data.get('updated_at'),
                             updated_at_iso=memory_data.get('updated_at_iso')
-                        )
-                        
-                        # Store in Cloudflare
-                        success, message = await storage.store(memory)
-                        
-                        if success:
-                            imported_count += 1
-                            logger.debug(f"Imported memory: {memory.content_hash[:16]}...")
-                        else:
-                            failed_count += 1
-                            logger.warning(f"Failed to import memory {memory.content_hash[:16]}: {message}")
-                        
+                        ))
                     except Exception as e:
                         failed_count += 1
                         logger.error(f"Error importing memory: {e}")
                 
+                # Store in Cloudflare
+                for memory, (success, message) in zip(batch, await storage.store_batch(batch)):
+                    if success:
+                        imported_count += 1
+                        logger.debug(f"Imported memory: {memory.content_hash[:16]}...")
+                    else:
+                        failed_count += 1
+                        logger.warning(f"Failed to import memory {memory.content_hash[:16]}: {message}")
+                
                 # Progress update
                 processed = min(i + batch_size, len(memories))
                 logger.info(f"Progress: {processed}/{len(memories)} processed, {imported_count} imported, {failed_count} failed")
-                
-                # Rate limiting - small delay between batches
-                await asyncio.sleep(0.5)
             
             # Final cleanup
             await storage.close()
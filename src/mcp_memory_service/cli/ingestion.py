@@ -67,6 +67,7 @@ def ingest_document(file_path: Path, tags: tuple, chunk_size: int, chunk_overlap
     
     async def run_ingestion():
         from .utils import get_storage
+        from ..config import INGESTION_BATCH_SIZE
         
         try:
             # Initialize storage
@@ -90,6 +91,21 @@ def ingest_document(file_path: Path, tags: tuple, chunk_size: int, chunk_overlap
             chunks_processed = 0
             chunks_stored = 0
             errors = []
+            pending = []  # (chunk_index, memory) pairs waiting for a batched store
+            
+            async def flush_pending():
+                nonlocal chunks_stored
+                if not pending:
+                    return
+                results = await storage.store_batch([memory for _, memory in pending])
+                for (chunk_index, _), (success, error) in zip(pending, results):
+                    if success:
+                        chunks_stored += 1
+                    else:
+                        errors.append(f"Chunk {chunk_index}: {error}")
+                        if verbose:
+                            click.echo(f"⚠️  Error storing chunk {chunk_index}: {error}")
+                pending.clear()
             
             # Extract and store chunks
             with click.progressbar(length=0, label='Processing chunks') as bar:
@@ -113,19 +129,17 @@ def ingest_document(file_path: Path, tags: tuple, chunk_size: int, chunk_overlap
                             metadata=chunk.metadata
                         )
                         
-                        # Store the memory
-                        success, error = await storage.store(memory)
-                        if success:
-                            chunks_stored += 1
-                        else:
-                            errors.append(f"Chunk {chunk.chunk_index}: {error}")
-                            if verbose:
-                                click.echo(f"⚠️  Error storing chunk {chunk.chunk_index}: {error}")
+                        # Queue the memory; stores happen in batches
+                        pending.append((chunk.chunk_index, memory))
+                        if len(pending) >= INGESTION_BATCH_SIZE:
+                            await flush_pending()
                                 
                     except Exception as e:
                         errors.append(f"Chunk {chunk.chunk_index}: {str(e)}")
                         if verbose:
                             click.echo(f"⚠️  Exception in chunk {chunk.chunk_index}: {str(e)}")
+                
+                await flush_pending()
             
             processing_time = time.time() - start_time
             success_rate = (chunks_stored / chunks_processed * 100) if chunks_processed > 0 else 0
@@ -168,12 +182,19 @@ def ingest_document(file_path: Path, tags: tuple, chunk_size: int, chunk_overlap
 @click.option('--extensions', '-e', multiple=True, help='File extensions to process (default: all supported)')
 @click.option('--chunk-size', '-c', default=1000, help='Target size for text chunks in characters')
 @click.option('--max-files', default=100, help='Maximum number of files to process')
+@click.option('--workers', '-w', type=int, default=None,
+              help='Processes parsing documents in parallel (default: MCP_INGESTION_WORKERS)')
+@click.option('--incremental/--full', default=True,
+              help='Skip files unchanged since the last run and replace only changed chunks (default: incremental)')
+@click.option('--purge-deleted', is_flag=True,
+              help='Delete memories of previously ingested files that no longer exist')
 @click.option('--storage-backend', '-s', default='sqlite_vec', 
               type=click.Choice(['sqlite_vec', 'chromadb']), help='Storage backend to use')
 @click.option('--verbose', '-v', is_flag=True, help='Enable verbose output')
 @click.option('--dry-run', is_flag=True, help='Show what would be processed without storing')
 def ingest_directory(directory_path: Path, tags: tuple, recursive: bool, extensions: tuple,
-                    chunk_size: int, max_files: int, storage_backend: str, verbose: bool, dry_run: bool):
+                    chunk_size: int, max_files: int, workers: Optional[int], incremental: bool,
+                    purge_deleted: bool, storage_backend: str, verbose: bool, dry_run: bool):
     """
     Batch ingest all supported documents from a directory.
     
@@ -184,6 +205,7 @@ def ingest_directory(directory_path: Path, tags: tuple, recursive: bool, extensi
         memory ingest-directory ./docs --tags knowledge-base --recursive
         memory ingest-directory ./manuals --extensions pdf,md --max-files 50
         memory ingest-directory ./content --dry-run --verbose
+        memory ingest-directory ./docs --purge-deleted   # nightly re-sync
     """
     if verbose:
         logging.basicConfig(level=logging.INFO)
@@ -191,6 +213,8 @@ def ingest_directory(directory_path: Path, tags: tuple, recursive: bool, extensi
     
     async def run_batch_ingestion():
         from .utils import get_storage
+        from ..config import INGESTION_BATCH_SIZE, INGESTION_WORKERS
+        from ..ingestion import IngestionPipeline
         
         try:
             # Initialize storage (unless dry run)
@@ -239,84 +263,57 @@ def ingest_directory(directory_path: Path, tags: tuple, recursive: bool, extensi
                     click.echo(f"   📄 {file_path}")
                 return True
             
-            start_time = time.time()
-            total_chunks_processed = 0
-            total_chunks_stored = 0
-            files_processed = 0
-            files_failed = 0
-            all_errors = []
+            def build_memory(file_path, chunk):
+                # Add directory-level tags and file-specific tags
+                all_tags = list(tags)
+                all_tags.append(f"source_dir:{directory_path.name}")
+                all_tags.append(f"file_type:{file_path.suffix.lstrip('.')}")
+                
+                if chunk.metadata.get('tags'):
+                    all_tags.extend(chunk.metadata['tags'])
+                
+                return Memory(
+                    content=chunk.content,
+                    content_hash=generate_content_hash(chunk.content, chunk.metadata),
+                    tags=list(set(all_tags)),  # Remove duplicates
+                    memory_type="document",
+                    metadata=chunk.metadata
+                )
             
-            # Process each file with progress bar
-            with click.progressbar(files_to_process, label='Processing files') as files_bar:
-                for file_path in files_bar:
-                    try:
-                        if verbose:
-                            click.echo(f"\n🔄 Processing: {file_path.name}")
-                        
-                        # Get appropriate document loader
-                        loader = get_loader_for_file(file_path)
-                        if loader is None:
-                            all_errors.append(f"{file_path.name}: Unsupported format")
-                            files_failed += 1
-                            continue
-                        
-                        # Configure loader
-                        loader.chunk_size = chunk_size
-                        
-                        file_chunks_processed = 0
-                        file_chunks_stored = 0
-                        
-                        # Extract and store chunks from this file
-                        async for chunk in loader.extract_chunks(file_path):
-                            file_chunks_processed += 1
-                            total_chunks_processed += 1
-                            
-                            try:
-                                # Add directory-level tags and file-specific tags
-                                all_tags = list(tags)
-                                all_tags.append(f"source_dir:{directory_path.name}")
-                                all_tags.append(f"file_type:{file_path.suffix.lstrip('.')}")
-                                
-                                if chunk.metadata.get('tags'):
-                                    all_tags.extend(chunk.metadata['tags'])
-                                
-                                # Create memory object
-                                memory = Memory(
-                                    content=chunk.content,
-                                    content_hash=generate_content_hash(chunk.content, chunk.metadata),
-                                    tags=list(set(all_tags)),  # Remove duplicates
-                                    memory_type="document",
-                                    metadata=chunk.metadata
-                                )
-                                
-                                # Store the memory
-                                success, error = await storage.store(memory)
-                                if success:
-                                    file_chunks_stored += 1
-                                    total_chunks_stored += 1
-                                else:
-                                    all_errors.append(f"{file_path.name} chunk {chunk.chunk_index}: {error}")
-                                    
-                            except Exception as e:
-                                all_errors.append(f"{file_path.name} chunk {chunk.chunk_index}: {str(e)}")
-                        
-                        if file_chunks_stored > 0:
-                            files_processed += 1
-                            if verbose:
-                                click.echo(f"   ✅ {file_chunks_stored}/{file_chunks_processed} chunks stored")
-                        else:
-                            files_failed += 1
-                            if verbose:
-                                click.echo(f"   ❌ No chunks stored")
-                                
-                    except Exception as e:
-                        files_failed += 1
-                        all_errors.append(f"{file_path.name}: {str(e)}")
-                        if verbose:
-                            click.echo(f"   ❌ Error: {str(e)}")
+            # Parse, embed and store in overlapping stages
+            with click.progressbar(length=len(files_to_process), label='Processing files') as files_bar:
+                async def report_progress(progress):
+                    files_bar.update(progress.files_parsed - files_bar.pos)
+                
+                pipeline = IngestionPipeline(
+                    storage,
+                    build_memory,
+                    workers=INGESTION_WORKERS if workers is None else workers,
+                    batch_size=INGESTION_BATCH_SIZE,
+                    progress_callback=report_progress,
+                    incremental=incremental,
+                    purge_deleted=purge_deleted
+                )
+                result = await pipeline.run(files_to_process, chunk_size=chunk_size, root=directory_path)
+                files_bar.update(len(files_to_process) - files_bar.pos)
             
-            processing_time = time.time() - start_time
-            success_rate = (total_chunks_stored / total_chunks_processed * 100) if total_chunks_processed > 0 else 0
+            if verbose:
+                for file_path, progress in result.files.items():
+                    if progress.unchanged:
+                        click.echo(f"   ⏭️  {file_path.name}: unchanged")
+                    elif progress.chunks_stored > 0 or progress.chunks_unchanged > 0:
+                        click.echo(f"   ✅ {file_path.name}: {progress.chunks_stored}/{progress.chunks_processed} chunks stored"
+                                   + (f", {progress.chunks_unchanged} unchanged" if progress.chunks_unchanged else ""))
+                    else:
+                        click.echo(f"   ❌ {file_path.name}: {progress.error or 'No chunks stored'}")
+            
+            files_processed = result.files_processed
+            files_failed = result.files_failed
+            total_chunks_processed = result.chunks_processed
+            total_chunks_stored = result.chunks_stored
+            all_errors = result.errors
+            processing_time = result.processing_time
+            success_rate = result.success_rate
             
             # Display results
             click.echo(f"\n✅ Directory ingestion completed: {directory_path.name}")
@@ -326,6 +323,11 @@ def ingest_directory(directory_path: Path, tags: tuple, recursive: bool, extensi
             click.echo(f"⚡ Success rate: {success_rate:.1f}%")
             click.echo(f"⏱️  Processing time: {processing_time:.2f} seconds")
             
+            if result.files_unchanged or result.chunks_unchanged:
+                click.echo(f"⏭️  Unchanged: {result.files_unchanged} files, {result.chunks_unchanged} chunks kept")
+            if result.chunks_removed or result.files_purged:
+                click.echo(f"🗑️  Removed: {result.chunks_removed} stale chunks, {result.files_purged} deleted files")
+            
             if files_failed > 0:
                 click.echo(f"❌ Files failed: {files_failed}")
             
@@ -338,7 +340,7 @@ def ingest_directory(directory_path: Path, tags: tuple, recursive: bool, extensi
                     if len(all_errors) > error_limit:
                         click.echo(f"   ... and {len(all_errors) - error_limit} more errors")
             
-            return total_chunks_stored > 0
+            return total_chunks_stored > 0 or result.files_processed > 0
             
         except Exception as e:
             click.echo(f"❌ Error in batch ingestion: {str(e)}", err=True)
@@ -229,6 +229,15 @@ if STORAGE_BACKEND == 'cloudflare':
     CLOUDFLARE_LARGE_CONTENT_THRESHOLD = int(os.getenv('CLOUDFLARE_LARGE_CONTENT_THRESHOLD', '1048576'))  # 1MB
     CLOUDFLARE_MAX_RETRIES = int(os.getenv('CLOUDFLARE_MAX_RETRIES', '3'))
     CLOUDFLARE_BASE_DELAY = float(os.getenv('CLOUDFLARE_BASE_DELAY', '1.0'))
+    CLOUDFLARE_ROW_CACHE_SIZE = int(os.getenv('CLOUDFLARE_ROW_CACHE_SIZE', '1000'))  # 0 disables the row cache
+    CLOUDFLARE_ROW_CACHE_TTL = float(os.getenv('CLOUDFLARE_ROW_CACHE_TTL', '300'))  # seconds
+    CLOUDFLARE_WRITE_BATCH_SIZE = int(os.getenv('CLOUDFLARE_WRITE_BATCH_SIZE', '100'))
+    CLOUDFLARE_WRITE_FLUSH_INTERVAL = float(os.getenv('CLOUDFLARE_WRITE_FLUSH_INTERVAL', '0.05'))  # seconds
+    CLOUDFLARE_EMBEDDING_BATCH_SIZE = int(os.getenv('CLOUDFLARE_EMBEDDING_BATCH_SIZE', '100'))
+    CLOUDFLARE_EMBEDDING_BATCH_WINDOW = float(os.getenv('CLOUDFLARE_EMBEDDING_BATCH_WINDOW', '0.005'))  # seconds
+    CLOUDFLARE_REQUESTS_PER_SECOND = float(os.getenv('CLOUDFLARE_REQUESTS_PER_SECOND', '10'))  # per API family
+    CLOUDFLARE_REPLICA_PATH = os.getenv('CLOUDFLARE_REPLICA_PATH')  # Local SQLite replica of D1 (disabled when unset)
+    CLOUDFLARE_REPLICA_MAX_STALENESS = float(os.getenv('CLOUDFLARE_REPLICA_MAX_STALENESS', '30'))  # seconds
     
     # Validate required settings
     missing_vars = []
@@ -252,6 +261,7 @@ if STORAGE_BACKEND == 'cloudflare':
     logger.info(f"  R2 Bucket: {CLOUDFLARE_R2_BUCKET or 'Not configured'}")
     logger.info(f"  Embedding Model: {CLOUDFLARE_EMBEDDING_MODEL}")
     logger.info(f"  Large Content Threshold: {CLOUDFLARE_LARGE_CONTENT_THRESHOLD} bytes")
+    logger.info(f"  D1 Replica: {CLOUDFLARE_REPLICA_PATH or 'Not configured'}")
 else:
     # Set Cloudflare variables to None when not using Cloudflare backend
     CLOUDFLARE_API_TOKEN = None
@@ -263,6 +273,15 @@ else:
     CLOUDFLARE_LARGE_CONTENT_THRESHOLD = None
     CLOUDFLARE_MAX_RETRIES = None
     CLOUDFLARE_BASE_DELAY = None
+    CLOUDFLARE_ROW_CACHE_SIZE = None
+    CLOUDFLARE_ROW_CACHE_TTL = None
+    CLOUDFLARE_WRITE_BATCH_SIZE = None
+    CLOUDFLARE_WRITE_FLUSH_INTERVAL = None
+    CLOUDFLARE_EMBEDDING_BATCH_SIZE = None
+    CLOUDFLARE_EMBEDDING_BATCH_WINDOW = None
+    CLOUDFLARE_REQUESTS_PER_SECOND = None
+    CLOUDFLARE_REPLICA_PATH = None
+    CLOUDFLARE_REPLICA_MAX_STALENESS = None
 
 # ChromaDB settings with performance optimizations
 CHROMA_SETTINGS = {
@@ -310,6 +329,12 @@ else:
 # Embedding model configuration
 EMBEDDING_MODEL_NAME = os.getenv('MCP_EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
 
+# Document ingestion configuration
+# Number of chunks handed to storage.store_batch() at once
+INGESTION_BATCH_SIZE = int(os.getenv('MCP_INGESTION_BATCH_SIZE', '100'))
+# Processes parsing documents in parallel during directory ingestion (0 parses in a thread)
+INGESTION_WORKERS = int(os.getenv('MCP_INGESTION_WORKERS', str(min(8, os.cpu_count() or 1))))
+
 # Dream-inspired consolidation configuration
 CONSOLIDATION_ENABLED = os.getenv('MCP_CONSOLIDATION_ENABLED', 'false').lower() == 'true'
 
@@ -345,17 +370,21 @@ CONSOLIDATION_CONFIG = {
         'standard': int(os.getenv('MCP_RETENTION_STANDARD', '30')),
         'temporary': int(os.getenv('MCP_RETENTION_TEMPORARY', '7'))
     },
+    'relevance_storage': os.getenv('MCP_DECAY_RELEVANCE_STORAGE', 'metadata'),  # 'metadata', 'table'
     
     # Association settings
     'associations_enabled': os.getenv('MCP_ASSOCIATIONS_ENABLED', 'true').lower() == 'true',
     'min_similarity': float(os.getenv('MCP_ASSOCIATION_MIN_SIMILARITY', '0.3')),
     'max_similarity': float(os.getenv('MCP_ASSOCIATION_MAX_SIMILARITY', '0.7')),
     'max_pairs_per_run': int(os.getenv('MCP_ASSOCIATION_MAX_PAIRS', '100')),
+    'association_block_size': int(os.getenv('MCP_ASSOCIATION_BLOCK_SIZE', '1024')),
+    'association_max_blocks_per_run': int(os.getenv('MCP_ASSOCIATION_MAX_BLOCKS', '512')),
     
     # Clustering settings
     'clustering_enabled': os.getenv('MCP_CLUSTERING_ENABLED', 'true').lower() == 'true',
     'min_cluster_size': int(os.getenv('MCP_CLUSTERING_MIN_SIZE', '5')),
-    'clustering_algorithm': os.getenv('MCP_CLUSTERING_ALGORITHM', 'dbscan'),  # 'dbscan', 'hierarchical', 'simple'
+    'clustering_algorithm': os.getenv('MCP_CLUSTERING_ALGORITHM', 'dbscan'),  # 'dbscan', 'hierarchical', 'minibatch_kmeans', 'simple'
+    'clustering_memory_budget_mb': int(os.getenv('MCP_CLUSTERING_MEMORY_BUDGET_MB', '512')),
     
     # Compression settings
     'compression_enabled': os.getenv('MCP_COMPRESSION_ENABLED', 'true').lower() == 'true',
@@ -366,7 +395,25 @@ CONSOLIDATION_CONFIG = {
     'forgetting_enabled': os.getenv('MCP_FORGETTING_ENABLED', 'true').lower() == 'true',
     'relevance_threshold': float(os.getenv('MCP_FORGETTING_RELEVANCE_THRESHOLD', '0.1')),
     'access_threshold_days': int(os.getenv('MCP_FORGETTING_ACCESS_THRESHOLD', '90')),
-    'archive_location': CONSOLIDATION_ARCHIVE_PATH
+    'archive_location': CONSOLIDATION_ARCHIVE_PATH,
+    'archive_format': os.getenv('MCP_FORGETTING_ARCHIVE_FORMAT', 'sqlite'),  # 'sqlite', 'json'
+    'duplicate_similarity_threshold': float(os.getenv('MCP_FORGETTING_DUPLICATE_THRESHOLD', '0.8')),
+    'duplicate_embedding_threshold': (
+        float(os.getenv('MCP_FORGETTING_DUPLICATE_EMBEDDING_THRESHOLD'))
+        if os.getenv('MCP_FORGETTING_DUPLICATE_EMBEDDING_THRESHOLD') else None
+    ),
+    
+    # Incremental settings
+    'incremental_enabled': os.getenv('MCP_CONSOLIDATION_INCREMENTAL', 'false').lower() == 'true',
+    'state_path': os.getenv('MCP_CONSOLIDATION_STATE_PATH'),
+    'relevance_refresh_days': float(os.getenv('MCP_CONSOLIDATION_RELEVANCE_REFRESH_DAYS', '7')),
+    
+    # Execution settings
+    'execution_mode': os.getenv('MCP_CONSOLIDATION_EXECUTION_MODE', 'inline'),  # 'inline', 'process'
+    'worker_cpu_seconds': int(os.getenv('MCP_CONSOLIDATION_WORKER_CPU_SECONDS', '0')),
+    'worker_memory_mb': int(os.getenv('MCP_CONSOLIDATION_WORKER_MEMORY_MB', '0')),
+    'worker_max_latency_ms': float(os.getenv('MCP_CONSOLIDATION_WORKER_MAX_LATENCY_MS', '0')),
+    'profile_trace_dir': os.getenv('MCP_CONSOLIDATION_PROFILE_DIR')
 }
 
 # Consolidation scheduling settings (for APScheduler integration)
@@ -0,0 +1,128 @@
+# Copyright 2024 Heinrich Krupp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Append-only archive database for forgotten memories."""
+
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional
+
+@dataclass
+class ArchiveEntry:
+    """One archived, compressed-away or deleted memory."""
+    memory_hash: str
+    action: str  # 'archived', 'compressed', 'deleted'
+    archived_at: str
+    payload: Dict[str, Any]
+    memory_type: Optional[str] = None
+    content_length: int = 0
+
+    def encode(self) -> bytes:
+        return zlib.compress(json.dumps(self.payload, ensure_ascii=False).encode('utf-8'))
+
+class ForgettingArchive:
+    """
+    Archived memories in a single SQLite file.
+
+    Entries are only ever appended, with their JSON payload zlib-compressed,
+    and a whole forgetting run is written in one transaction. The hash and
+    action indexes turn recovery into a lookup and let statistics be
+    computed without reading any payloads.
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.expanduser(path)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._create_tables()
+
+    def _create_tables(self) -> None:
+        with self._lock:
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS archive_entries (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    memory_hash TEXT NOT NULL,
+                    action TEXT NOT NULL,
+                    archived_at TEXT NOT NULL,
+                    memory_type TEXT,
+                    content_length INTEGER NOT NULL DEFAULT 0,
+                    payload BLOB NOT NULL
+                )
+            ''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_archive_hash ON archive_entries(memory_hash)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_archive_action ON archive_entries(action)')
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def append(self, entries: Iterable[ArchiveEntry]) -> int:
+        """Append entries in one transaction; returns how many were written."""
+        rows = [
+            (e.memory_hash, e.action, e.archived_at, e.memory_type, e.content_length, e.encode())
+            for e in entries
+        ]
+        if not rows:
+            return 0
+        with self._lock:
+            with self._conn:
+                self._conn.executemany('''
+                    INSERT INTO archive_entries (memory_hash, action, archived_at, memory_type, content_length, payload)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', rows)
+        return len(rows)
+
+    def latest(self, memory_hash: str) -> Optional[ArchiveEntry]:
+        """The most recent entry for a memory, or None."""
+        with self._lock:
+            row = self._conn.execute('''
+                SELECT memory_hash, action, archived_at, memory_type, content_length, payload
+                FROM archive_entries WHERE memory_hash = ? ORDER BY id DESC LIMIT 1
+            ''', (memory_hash,)).fetchone()
+        if row is None:
+            return None
+        memory_hash, action, archived_at, memory_type, content_length, payload = row
+        return ArchiveEntry(
+            memory_hash=memory_hash,
+            action=action,
+            archived_at=archived_at,
+            payload=json.loads(zlib.decompress(payload).decode('utf-8')),
+            memory_type=memory_type,
+            content_length=content_length
+        )
+
+    def statistics(self) -> Dict[str, Any]:
+        """Per-action counts, stored bytes and the archived_at range, from the index."""
+        with self._lock:
+            counts = dict(self._conn.execute(
+                'SELECT action, COUNT(*) FROM archive_entries GROUP BY action'
+            ).fetchall())
+            size, oldest, newest = self._conn.execute(
+                'SELECT COALESCE(SUM(LENGTH(payload)), 0), MIN(archived_at), MAX(archived_at) FROM archive_entries'
+            ).fetchone()
+        return {
+            'counts': counts,
+            'size_bytes': size,
+            'oldest': oldest,
+            'newest': newest
+        }
@@ -17,13 +17,12 @@
 import random
 import numpy as np
 from typing import List, Dict, Any, Optional, Tuple, Set
-from itertools import combinations
 from datetime import datetime
 from dataclasses import dataclass
 import re
 
-from .base import ConsolidationBase, ConsolidationConfig, MemoryAssociation
-from ..models.memory import Memory
+from .base import ConsolidationBase, ConsolidationConfig, MemoryAssociation, checkpoint
+from ..models.memory import Memory, MemoryEmbeddings
 
 @dataclass
 class AssociationAnalysis:
@@ -41,9 +40,10 @@ class CreativeAssociationEngine(ConsolidationBase):
     """
     Discovers creative connections between seemingly unrelated memories.
     
-    Similar to how dreams create unexpected associations, this engine randomly
-    pairs memories to discover non-obvious connections in the "sweet spot"
-    of moderate similarity (0.3-0.7 range).
+    Similar to how dreams create unexpected associations, this engine scores
+    memory pairs in blocked matrix multiplies over the normalised embeddings
+    and randomly samples those in the "sweet spot" of moderate similarity
+    (0.3-0.7 range) to discover non-obvious connections.
     """
     
     def __init__(self, config: ConsolidationConfig):
@@ -51,6 +51,8 @@ class CreativeAssociationEngine(ConsolidationBase):
         self.min_similarity = config.min_similarity
         self.max_similarity = config.max_similarity
         self.max_pairs_per_run = config.max_pairs_per_run
+        self.block_size = getattr(config, 'association_block_size', 1024)
+        self.max_blocks_per_run = getattr(config, 'association_max_blocks_per_run', 512)
         
         # Compile regex patterns for concept extraction
         self._concept_patterns = {
@@ -64,61 +66,267 @@ class CreativeAssociationEngine(ConsolidationBase):
         }
     
     async def process(self, memories: List[Memory], **kwargs) -> List[MemoryAssociation]:
-        """Discover creative associations between memories."""
+        """
+        Discover creative associations between memories.
+        
+        With ``changed`` (a subset of memories) only pairs involving at least
+        one changed memory are scored, against every memory in the set.
+        """
         if not self._validate_memories(memories) or len(memories) < 2:
             return []
         
         # Get existing associations to avoid duplicates
         existing_associations = kwargs.get('existing_associations', set())
-        
-        # Sample memory pairs for analysis
-        pairs = self._sample_memory_pairs(memories)
+        embedding_set = kwargs.get('embeddings')
+        changed = kwargs.get('changed')
+        
+        # Changed memories go first, so their rows form the leading blocks
+        anchor_rows = None
+        if changed is not None:
+            changed_hashes = {m.content_hash for m in changed}
+            memories = (
+                [m for m in memories if m.content_hash in changed_hashes] +
+                [m for m in memories if m.content_hash not in changed_hashes]
+            )
+        
+        # Split memories by whether they have a usable vector
+        vectors, with_vectors, without_vectors = self._normalized_embeddings(memories, embedding_set)
+        if changed is not None:
+            anchor_rows = sum(1 for m in with_vectors if m.content_hash in changed_hashes)
+        
+        # Score every pair inside the block budget and keep a uniform sample
+        # of the pairs that land in the sweet spot
+        candidates = self._find_candidate_pairs(vectors, with_vectors, existing_associations, anchor_rows)
+        pairs_considered = len(candidates)
+        
+        # Memories without vectors fall back to sampled text similarity
+        if changed is not None:
+            without_vectors = [m for m in without_vectors if m.content_hash in changed_hashes]
+        if without_vectors:
+            remaining = max(0, self.max_pairs_per_run - len(candidates))
+            fallback_pairs = self._sample_memory_pairs(memories, remaining, without_vectors)
+            pairs_considered += len(fallback_pairs)
+            for mem1, mem2 in fallback_pairs:
+                if self._pair_key(mem1, mem2) in existing_associations:
+                    continue
+                similarity = self._calculate_text_similarity(mem1.content, mem2.content)
+                if self.min_similarity <= similarity <= self.max_similarity:
+                    candidates.append((mem1, mem2, similarity))
         
         associations = []
-        for mem1, mem2 in pairs:
-            # Skip if association already exists
-            pair_key = tuple(sorted([mem1.content_hash, mem2.content_hash]))
-            if pair_key in existing_associations:
+        for mem1, mem2, similarity in candidates:
+            checkpoint()
+            analysis = await self._analyze_association(mem1, mem2, similarity)
+            
+            if analysis.confidence_score > 0.3:  # Minimum confidence threshold
+                association = await self._create_association_memory(analysis)
+                associations.append(association)
+        
+        self.logger.info(f"Discovered {len(associations)} creative associations from {pairs_considered} candidate pairs")
+        return associations
+    
+    @staticmethod
+    def _pair_key(mem1: Memory, mem2: Memory) -> Tuple[str, str]:
+        """Order-independent key used for existing association lookups."""
+        return tuple(sorted((mem1.content_hash, mem2.content_hash)))
+    
+    def _normalized_embeddings(
+        self,
+        memories: List[Memory],
+        embedding_set: Optional[MemoryEmbeddings] = None
+    ) -> Tuple[np.ndarray, List[Memory], List[Memory]]:
+        """
+        Build a unit-norm float32 matrix for memories that have a vector.
+        
+        Rows are taken from the preloaded embedding matrix when available,
+        otherwise from ``memory.embedding``. Memories without a vector, with a
+        zero vector or with a mismatched dimension are returned separately.
+        """
+        if embedding_set is None:
+            embedding_set = MemoryEmbeddings.from_memories(memories)
+        rows = embedding_set.rows(memories)
+        
+        if embedding_set.dimension == 0 or not (rows >= 0).any():
+            return np.empty((0, 0), dtype=np.float32), [], list(memories)
+        
+        vectors = np.asarray(embedding_set.embeddings[rows[rows >= 0]], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1)
+        usable = norms > 0
+        vectors = vectors[usable] / norms[usable, None]
+        
+        candidates = [m for m, row in zip(memories, rows) if row >= 0]
+        with_vectors = [m for m, ok in zip(candidates, usable) if ok]
+        seen = {m.content_hash for m in with_vectors}
+        without_vectors = [m for m in memories if m.content_hash not in seen]
+        return vectors, with_vectors, without_vectors
+    
+    def _block_pairs(self, n: int, anchor_rows: Optional[int] = None) -> List[Tuple[int, int]]:
+        """
+        Upper-triangular block pairs to score this run, in random order.
+        
+        With ``anchor_rows`` only block rows covering the first anchor_rows
+        rows are included.
+        """
+        block_size = max(1, self.block_size)
+        n_blocks = (n + block_size - 1) // block_size
+        n_row_blocks = n_blocks if anchor_rows is None else (anchor_rows + block_size - 1) // block_size
+        block_pairs = [(i, j) for i in range(n_row_blocks) for j in range(i, n_blocks)]
+        random.shuffle(block_pairs)
+        if self.max_blocks_per_run > 0:
+            block_pairs = block_pairs[:self.max_blocks_per_run]
+        return block_pairs
+    
+    def _find_candidate_pairs(
+        self,
+        vectors: np.ndarray,
+        memories: List[Memory],
+        existing_associations: Set[Tuple[str, str]],
+        anchor_rows: Optional[int] = None
+    ) -> List[Tuple[Memory, Memory, float]]:
+        """
+        Score pairs with blocked matrix multiplies over the normalised vectors.
+        
+        Each block pair yields a similarity tile; the sweet spot is selected by
+        masking and existing associations are masked out. A uniform sample of
+        at most ``max_pairs_per_run`` matches is kept across tiles by giving
+        each match a random priority and keeping the lowest. Work is bounded by
+        ``max_blocks_per_run`` tiles rather than by enumerating pairs.
+        
+        With ``anchor_rows`` only pairs whose first row is below it are kept,
+        i.e. the first anchor_rows memories against all memories.
+        """
+        n = len(memories)
+        if n < 2 or self.max_pairs_per_run <= 0 or anchor_rows == 0:
+            return []
+        
+        block_size = max(1, self.block_size)
+        
+        # Resolve existing associations to (row, row) pairs once, so they can
+        # be masked out of each tile instead of checked pair by pair
+        row_of = {m.content_hash: row for row, m in enumerate(memories)}
+        existing_rows = [
+            (row_of[a], row_of[b]) for a, b in existing_associations
+            if a in row_of and b in row_of and a != b
+        ]
+        existing_i = np.array([min(p) for p in existing_rows], dtype=np.int64)
+        existing_j = np.array([max(p) for p in existing_rows], dtype=np.int64)
+        
+        # Sweet-spot bounds expressed as raw cosine, so tiles need no rescaling
+        cosine_min = 2.0 * self.min_similarity - 1.0
+        cosine_max = 2.0 * self.max_similarity - 1.0
+        
+        # Reservoir of matches keyed by uniform random priorities; once full,
+        # only matches that would beat the current worst priority are drawn
+        rng = np.random.default_rng()
+        k = self.max_pairs_per_run
+        kept_i = np.empty(0, dtype=np.int64)
+        kept_j = np.empty(0, dtype=np.int64)
+        kept_cosine = np.empty(0, dtype=np.float32)
+        kept_priority = np.empty(0, dtype=np.float64)
+        threshold = 1.0
+        
+        for bi, bj in self._block_pairs(n, anchor_rows):
+            checkpoint()
+            i0, j0 = bi * block_size, bj * block_size
+            tile = vectors[i0:i0 + block_size] @ vectors[j0:j0 + block_size].T
+            
+            mask = (tile >= cosine_min) & (tile <= cosine_max)
+            if bi == bj:
+                mask = np.triu(mask, k=1)
+            if anchor_rows is not None and i0 + tile.shape[0] > anchor_rows:
+                mask[max(0, anchor_rows - i0):] = False
+            if existing_i.size:
+                in_tile = (
+                    (existing_i >= i0) & (existing_i < i0 + tile.shape[0]) &
+                    (existing_j >= j0) & (existing_j < j0 + tile.shape[1])
+                )
+                mask[existing_i[in_tile] - i0, existing_j[in_tile] - j0] = False
+            
+            matches = np.flatnonzero(mask)
+            drawn = rng.binomial(matches.size, threshold) if threshold < 1.0 else matches.size
+            if drawn == 0:
                 continue
+            if drawn < matches.size:
+                matches = matches[rng.choice(matches.size, drawn, replace=False)]
+            ii, jj = np.divmod(matches, tile.shape[1])
             
-            # Calculate semantic similarity
-            similarity = await self._calculate_semantic_similarity(mem1, mem2)
+            kept_i = np.concatenate([kept_i, ii + i0])
+            kept_j = np.concatenate([kept_j, jj + j0])
+            kept_cosine = np.concatenate([kept_cosine, tile[ii, jj]])
+            kept_priority = np.concatenate([kept_priority, rng.uniform(0.0, threshold, drawn)])
             
-            # Check if similarity is in the "sweet spot" for creative connections
-            if self.min_similarity <= similarity <= self.max_similarity:
-                analysis = await self._analyze_association(mem1, mem2, similarity)
-                
-                if analysis.confidence_score > 0.3:  # Minimum confidence threshold
-                    association = await self._create_association_memory(analysis)
-                    associations.append(association)
-        
-        self.logger.info(f"Discovered {len(associations)} creative associations from {len(pairs)} pairs")
-        return associations
+            if kept_priority.size >= k:
+                keep = np.argpartition(kept_priority, k - 1)[:k]
+                kept_i, kept_j = kept_i[keep], kept_j[keep]
+                kept_cosine, kept_priority = kept_cosine[keep], kept_priority[keep]
+                threshold = float(kept_priority.max())
+        
+        # Cosine in [-1, 1] mapped to [0, 1] as in _calculate_semantic_similarity
+        kept_similarity = (kept_cosine + 1.0) / 2.0
+        return [
+            (memories[i], memories[j], similarity)
+            for i, j, similarity in zip(kept_i.tolist(), kept_j.tolist(), kept_similarity.tolist())
+        ]
     
-    def _sample_memory_pairs(self, memories: List[Memory]) -> List[Tuple[Memory, Memory]]:
-        """Sample random pairs of memories for association discovery."""
-        # Calculate maximum possible pairs
-        total_possible = len(memories) * (len(memories) - 1) // 2
-        max_pairs = min(self.max_pairs_per_run, total_possible)
-        
-        if total_possible <= max_pairs:
-            # Return all possible pairs if total is manageable
-            return list(combinations(memories, 2))
-        else:
-            # Randomly sample pairs to prevent combinatorial explosion
-            all_pairs = list(combinations(memories, 2))
-            return random.sample(all_pairs, max_pairs)
+    def _sample_memory_pairs(
+        self,
+        memories: List[Memory],
+        max_pairs: Optional[int] = None,
+        required: Optional[List[Memory]] = None
+    ) -> List[Tuple[Memory, Memory]]:
+        """
+        Sample random pairs of memories without enumerating all combinations.
+        
+        When ``required`` is given, every sampled pair contains at least one of
+        those memories; this is how memories without vectors get paired.
+        """
+        if max_pairs is None:
+            max_pairs = self.max_pairs_per_run
+        n = len(memories)
+        if n < 2 or max_pairs <= 0:
+            return []
+        
+        anchors = list(required) if required is not None else memories
+        n_required = len(anchors)
+        n_other = n - n_required
+        # Pairs with at least one anchor: among anchors plus anchor x other
+        total_possible = (n_required * (n_required - 1) // 2) + n_required * n_other
+        max_pairs = min(max_pairs, total_possible)
+        
+        pairs: List[Tuple[Memory, Memory]] = []
+        seen: Set[Tuple[str, str]] = set()
+        attempts = 0
+        while len(pairs) < max_pairs and attempts < max_pairs * 20:
+            attempts += 1
+            mem1 = random.choice(anchors)
+            mem2 = random.choice(memories)
+            if mem1.content_hash == mem2.content_hash:
+                continue
+            key = self._pair_key(mem1, mem2)
+            if key in seen:
+                continue
+            seen.add(key)
+            pairs.append((mem1, mem2))
+        return pairs
     
-    async def _calculate_semantic_similarity(self, mem1: Memory, mem2: Memory) -> float:
+    async def _calculate_semantic_similarity(
+        self,
+        mem1: Memory,
+        mem2: Memory,
+        embedding_set: Optional[MemoryEmbeddings] = None
+    ) -> float:
         """Calculate semantic similarity between two memories using embeddings."""
-        if not mem1.embedding or not mem2.embedding:
+        embedding1 = embedding_set.get(mem1.content_hash) if embedding_set is not None else None
+        embedding2 = embedding_set.get(mem2.content_hash) if embedding_set is not None else None
+        if embedding1 is None and mem1.embedding:
+            embedding1 = np.array(mem1.embedding)
+        if embedding2 is None and mem2.embedding:
+            embedding2 = np.array(mem2.embedding)
+        
+        if embedding1 is None or embedding2 is None:
             # Fallback to text-based similarity if embeddings unavailable
             return self._calculate_text_similarity(mem1.content, mem2.content)
         
-        # Use cosine similarity for embeddings
-        embedding1 = np.array(mem1.embedding)
-        embedding2 = np.array(mem2.embedding)
-        
         # Normalize embeddings
         norm1 = np.linalg.norm(embedding1)
         norm2 = np.linalg.norm(embedding2)
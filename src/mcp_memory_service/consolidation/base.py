@@ -15,15 +15,27 @@
 """Base classes and interfaces for memory consolidation components."""
 
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional, Tuple
+from contextvars import ContextVar
+from typing import List, Dict, Any, Optional, Tuple, Callable
 from dataclasses import dataclass, field
 from datetime import datetime
 import logging
 
 from ..models.memory import Memory
+from .profiler import PipelineProfile
 
 logger = logging.getLogger(__name__)
 
+# Set by worker processes to a function that blocks while the job is paused
+# and raises ConsolidationCancelledError once it is cancelled
+current_checkpoint: ContextVar[Optional[Callable[[], None]]] = ContextVar('consolidation_checkpoint', default=None)
+
+def checkpoint() -> None:
+    """Let a worker pause or cancel the current job; called between units of work in long stages."""
+    callback = current_checkpoint.get()
+    if callback is not None:
+        callback()
+
 @dataclass
 class ConsolidationConfig:
     """Configuration for consolidation operations."""
@@ -36,17 +48,21 @@ class ConsolidationConfig:
         'standard': 30,
         'temporary': 7
     })
+    relevance_storage: str = 'metadata'  # 'metadata', or 'table' for a dedicated score table
     
     # Association settings
     associations_enabled: bool = True
     min_similarity: float = 0.3
     max_similarity: float = 0.7
-    max_pairs_per_run: int = 100
+    max_pairs_per_run: int = 100  # sweet-spot pairs analysed per run
+    association_block_size: int = 1024  # rows per similarity tile
+    association_max_blocks_per_run: int = 512  # tiles scored per run; 0 = all
     
     # Clustering settings
     clustering_enabled: bool = True
     min_cluster_size: int = 5
-    clustering_algorithm: str = 'dbscan'  # 'dbscan', 'hierarchical'
+    clustering_algorithm: str = 'dbscan'  # 'dbscan', 'hierarchical', 'minibatch_kmeans', 'simple'
+    clustering_memory_budget_mb: int = 512  # pairwise algorithms switch to minibatch_kmeans above this
     
     # Compression settings
     compression_enabled: bool = True
@@ -58,6 +74,21 @@ class ConsolidationConfig:
     relevance_threshold: float = 0.1
     access_threshold_days: int = 90
     archive_location: Optional[str] = None
+    archive_format: str = 'sqlite'  # 'sqlite' (indexed archive database) or 'json' (one file per memory)
+    duplicate_similarity_threshold: float = 0.8  # word-set Jaccard for near duplicates
+    duplicate_embedding_threshold: Optional[float] = None  # cosine; None disables embedding neighbours
+    
+    # Incremental settings
+    incremental_enabled: bool = False  # weekly+ runs only process memories changed since the last run
+    state_path: Optional[str] = None  # defaults to consolidation_state.db in the archive location
+    relevance_refresh_days: float = 7  # incremental runs re-score unchanged memories whose score is older
+    
+    # Execution settings
+    execution_mode: str = 'inline'  # 'inline', or 'process' to run scheduled jobs in a worker process
+    worker_cpu_seconds: int = 0  # CPU-time ceiling for the worker; 0 = unlimited
+    worker_memory_mb: int = 0  # address-space ceiling for the worker; 0 = unlimited
+    worker_max_latency_ms: float = 0  # pause the worker while event-loop lag exceeds this; 0 = never
+    profile_trace_dir: Optional[str] = None  # write a trace-event JSON per run here
 
 @dataclass
 class ConsolidationReport:
@@ -72,6 +103,7 @@ class ConsolidationReport:
     memories_archived: int = 0
     errors: List[str] = field(default_factory=list)
     performance_metrics: Dict[str, Any] = field(default_factory=dict)
+    profile: Optional[PipelineProfile] = None  # per-stage timings of the run
 
 @dataclass
 class MemoryAssociation:
@@ -151,4 +183,8 @@ class ConsolidationConfigError(ConsolidationError):
 
 class ConsolidationProcessingError(ConsolidationError):
     """Exception raised during processing operations."""
+    pass
+
+class ConsolidationCancelledError(ConsolidationError):
+    """Exception raised inside a worker when its job is cancelled."""
     pass
\ No newline at end of file
@@ -29,7 +29,7 @@ try:
 except ImportError:
     SKLEARN_AVAILABLE = False
 
-from .base import ConsolidationBase, ConsolidationConfig, MemoryCluster
+from .base import ConsolidationBase, ConsolidationConfig, MemoryCluster, checkpoint
 from ..models.memory import Memory
 
 class SemanticClusteringEngine(ConsolidationBase):
@@ -38,14 +38,22 @@ class SemanticClusteringEngine(ConsolidationBase):
     
     Uses embedding-based clustering algorithms (DBSCAN, Hierarchical) to group
     semantically similar memories, enabling efficient compression and retrieval.
+    Stores too large for a pairwise algorithm within the memory budget are
+    clustered with spherical mini-batch k-means, which works in chunks.
     """
     
+    # Algorithms that need sklearn
+    SKLEARN_ALGORITHMS = ('dbscan', 'hierarchical')
+    # Algorithms whose memory or time grows with the O(N^2) pairwise distances
+    PAIRWISE_ALGORITHMS = ('dbscan', 'hierarchical', 'simple')
+    
     def __init__(self, config: ConsolidationConfig):
         super().__init__(config)
         self.min_cluster_size = config.min_cluster_size
         self.algorithm = config.clustering_algorithm
+        self.memory_budget_bytes = getattr(config, 'clustering_memory_budget_mb', 512) * 1024 * 1024
         
-        if not SKLEARN_AVAILABLE:
+        if not SKLEARN_AVAILABLE and self.algorithm in self.SKLEARN_ALGORITHMS:
             self.logger.warning("sklearn not available, using simple clustering fallback")
             self.algorithm = 'simple'
     
@@ -54,26 +62,40 @@ class SemanticClusteringEngine(ConsolidationBase):
         if not self._validate_memories(memories) or len(memories) < self.min_cluster_size:
             return []
         
-        # Filter memories with embeddings
-        memories_with_embeddings = [m for m in memories if m.embedding]
+        # Filter memories with embeddings, taking rows from the preloaded
+        # embedding matrix when the caller provides one
+        embedding_set = kwargs.get('embeddings')
+        if embedding_set is not None:
+            rows = embedding_set.rows(memories)
+            memories_with_embeddings = [m for m, row in zip(memories, rows) if row >= 0]
+        else:
+            memories_with_embeddings = [m for m in memories if m.embedding]
         
         if len(memories_with_embeddings) < self.min_cluster_size:
             self.logger.warning(f"Only {len(memories_with_embeddings)} memories have embeddings, need at least {self.min_cluster_size}")
             return []
         
         # Extract embeddings matrix
-        embeddings = np.array([m.embedding for m in memories_with_embeddings])
+        if embedding_set is not None:
+            embeddings = embedding_set.embeddings[rows[rows >= 0]]
+        else:
+            embeddings = np.array([m.embedding for m in memories_with_embeddings])
         
         # Perform clustering
-        if self.algorithm == 'dbscan':
+        algorithm = self._select_algorithm(len(memories_with_embeddings))
+        if algorithm == 'dbscan':
             cluster_labels = await self._dbscan_clustering(embeddings)
-        elif self.algorithm == 'hierarchical':
+        elif algorithm == 'hierarchical':
             cluster_labels = await self._hierarchical_clustering(embeddings)
+        elif algorithm == 'minibatch_kmeans':
+            cluster_labels = await self._minibatch_kmeans_clustering(embeddings)
         else:
             cluster_labels = await self._simple_clustering(embeddings)
         
         # Create cluster objects
-        clusters = await self._create_clusters(memories_with_embeddings, cluster_labels, embeddings)
+        clusters = await self._create_clusters(
+            memories_with_embeddings, cluster_labels, embeddings, algorithm=algorithm
+        )
         
         # Filter by minimum cluster size
         valid_clusters = [c for c in clusters if len(c.memory_hashes) >= self.min_cluster_size]
@@ -81,6 +103,123 @@ class SemanticClusteringEngine(ConsolidationBase):
         self.logger.info(f"Created {len(valid_clusters)} valid clusters from {len(memories_with_embeddings)} memories")
         return valid_clusters
     
+    def _select_algorithm(self, n_samples: int) -> str:
+        """Pick the configured algorithm unless its pairwise distances exceed the memory budget."""
+        if self.algorithm in self.PAIRWISE_ALGORITHMS:
+            pairwise_bytes = n_samples * n_samples * 8  # float64 distances
+            if pairwise_bytes > self.memory_budget_bytes:
+                self.logger.info(
+                    f"{self.algorithm} on {n_samples} memories needs ~{pairwise_bytes // (1024 * 1024)}MB, "
+                    f"over the {self.memory_budget_bytes // (1024 * 1024)}MB budget; using minibatch_kmeans"
+                )
+                return 'minibatch_kmeans'
+        return self.algorithm
+    
+    def _chunk_rows(self, row_bytes: int) -> int:
+        """Rows per chunk so that a chunk of ``row_bytes``-wide rows fits the budget."""
+        return int(max(256, min(65536, self.memory_budget_bytes // max(1, row_bytes) // 4)))
+    
+    @staticmethod
+    def _normalize_rows(embeddings: np.ndarray) -> np.ndarray:
+        """Return a float32 copy of ``embeddings`` with unit-norm rows (zero rows stay zero)."""
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1.0)
+    
+    def _assign_to_centroids(self, vectors: np.ndarray, centroids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Nearest centroid (by cosine) and its similarity for every row, computed in chunks."""
+        n_samples = vectors.shape[0]
+        labels = np.empty(n_samples, dtype=np.int64)
+        similarities = np.empty(n_samples, dtype=np.float32)
+        chunk = self._chunk_rows(centroids.shape[0] * 4)
+        for start in range(0, n_samples, chunk):
+            checkpoint()
+            scores = vectors[start:start + chunk] @ centroids.T
+            labels[start:start + chunk] = np.argmax(scores, axis=1)
+            similarities[start:start + chunk] = scores[np.arange(scores.shape[0]), labels[start:start + chunk]]
+        return labels, similarities
+    
+    def assign_to_centroids(
+        self,
+        embeddings: np.ndarray,
+        centroids: np.ndarray,
+        threshold: float = 0.7
+    ) -> np.ndarray:
+        """
+        Index of the nearest existing centroid for each embedding, or -1.
+        
+        Used by incremental consolidation to place new memories into stored
+        clusters; embeddings whose cosine similarity to every centroid is
+        below ``threshold`` are left unassigned.
+        """
+        if len(embeddings) == 0 or len(centroids) == 0:
+            return np.full(len(embeddings), -1, dtype=np.int64)
+        labels, similarities = self._assign_to_centroids(
+            self._normalize_rows(embeddings), self._normalize_rows(centroids)
+        )
+        labels[similarities < threshold] = -1
+        return labels
+    
+    async def _minibatch_kmeans_clustering(
+        self,
+        embeddings: np.ndarray,
+        max_iterations: int = 100,
+        tolerance: float = 1e-4,
+        threshold: float = 0.7
+    ) -> np.ndarray:
+        """
+        Spherical mini-batch k-means on unit-normalised embeddings.
+        
+        Centroids are updated from random batches with per-centroid learning
+        rates (Sculley, 2010), then every embedding is assigned to its nearest
+        centroid in budget-sized chunks. Embeddings whose cosine similarity to
+        their centroid is below ``threshold`` are labelled noise (-1), as in
+        the density-based algorithms. Peak memory beyond the normalised input
+        is one batch-by-k similarity matrix.
+        """
+        vectors = self._normalize_rows(embeddings)
+        n_samples = vectors.shape[0]
+        n_clusters = max(2, min(n_samples // self.min_cluster_size, int(np.sqrt(n_samples) / 2)))
+        if n_samples <= n_clusters:
+            return np.arange(n_samples)
+        
+        rng = np.random.default_rng(0)
+        centroids = vectors[rng.choice(n_samples, n_clusters, replace=False)].copy()
+        counts = np.zeros(n_clusters, dtype=np.float64)
+        # A batch holds its vectors plus their similarities to every centroid
+        batch_size = min(n_samples, 4096, self._chunk_rows((n_clusters + vectors.shape[1]) * 4))
+        
+        for _ in range(max_iterations):
+            checkpoint()
+            batch = vectors[rng.choice(n_samples, batch_size, replace=False)]
+            assigned = np.argmax(batch @ centroids.T, axis=1)
+            
+            batch_counts = np.bincount(assigned, minlength=n_clusters).astype(np.float64)
+            batch_sums = np.zeros_like(centroids)
+            np.add.at(batch_sums, assigned, batch)
+            
+            touched = batch_counts > 0
+            counts[touched] += batch_counts[touched]
+            previous = centroids[touched].copy()
+            # Streaming mean: move each centroid toward its batch members by count / total count
+            centroids[touched] += (
+                (batch_sums[touched] - batch_counts[touched, None] * centroids[touched])
+                / counts[touched, None]
+            ).astype(np.float32)
+            centroids = self._normalize_rows(centroids)
+            
+            shift = float(np.max(1.0 - np.sum(previous * centroids[touched], axis=1)))
+            if shift < tolerance:
+                break
+        
+        labels, similarities = self._assign_to_centroids(vectors, centroids)
+        labels[similarities < threshold] = -1
+        self.logger.debug(
+            f"Mini-batch k-means: k={n_clusters}, batch_size={batch_size}, "
+            f"found {len(np.unique(labels[labels >= 0]))} clusters, {int(np.sum(labels < 0))} noise points"
+        )
+        return labels
+    
     async def _dbscan_clustering(self, embeddings: np.ndarray) -> np.ndarray:
         """Perform DBSCAN clustering on embeddings."""
         if not SKLEARN_AVAILABLE:
@@ -120,41 +259,30 @@ class SemanticClusteringEngine(ConsolidationBase):
     
     async def _simple_clustering(self, embeddings: np.ndarray) -> np.ndarray:
         """Simple fallback clustering using cosine similarity threshold."""
-        n_samples = embeddings.shape[0]
+        vectors = self._normalize_rows(embeddings)
+        n_samples = vectors.shape[0]
         labels = np.full(n_samples, -1)  # Start with all as noise
+        assigned = np.zeros(n_samples, dtype=bool)
         current_cluster = 0
         
         similarity_threshold = 0.7  # Threshold for grouping
         
         for i in range(n_samples):
-            if labels[i] != -1:  # Already assigned
+            if assigned[i]:
                 continue
+            checkpoint()
             
-            # Start new cluster
-            cluster_members = [i]
-            labels[i] = current_cluster
-            
-            # Find similar memories
-            for j in range(i + 1, n_samples):
-                if labels[j] != -1:  # Already assigned
-                    continue
-                
-                # Calculate cosine similarity
-                similarity = np.dot(embeddings[i], embeddings[j]) / (
-                    np.linalg.norm(embeddings[i]) * np.linalg.norm(embeddings[j])
-                )
-                
-                if similarity >= similarity_threshold:
-                    labels[j] = current_cluster
-                    cluster_members.append(j)
+            # Find similar unassigned memories after i in one pass
+            similarities = vectors[i + 1:] @ vectors[i]
+            members = np.flatnonzero((similarities >= similarity_threshold) & ~assigned[i + 1:]) + i + 1
+            members = np.concatenate(([i], members))
             
-            # Only keep cluster if it meets minimum size
-            if len(cluster_members) >= self.min_cluster_size:
+            # Only keep cluster if it meets minimum size; otherwise the members
+            # stay noise and remain available to later clusters
+            if len(members) >= self.min_cluster_size:
+                assigned[members] = True
+                labels[members] = current_cluster
                 current_cluster += 1
-            else:
-                # Mark as noise
-                for member in cluster_members:
-                    labels[member] = -1
         
         self.logger.debug(f"Simple clustering: threshold={similarity_threshold}, found {current_cluster} clusters")
         return labels
@@ -163,36 +291,34 @@ class SemanticClusteringEngine(ConsolidationBase):
         self,
         memories: List[Memory],
         labels: np.ndarray,
-        embeddings: np.ndarray
+        embeddings: np.ndarray,
+        algorithm: Optional[str] = None
     ) -> List[MemoryCluster]:
         """Create MemoryCluster objects from clustering results."""
         clusters = []
-        unique_labels = set(labels)
+        labels = np.asarray(labels)
+        norms = np.linalg.norm(embeddings, axis=1)
+        
+        # Group member indices by label with one sort instead of a scan per label
+        order = np.argsort(labels, kind='stable')
+        unique_labels, starts, sizes = np.unique(labels[order], return_index=True, return_counts=True)
         
-        for label in unique_labels:
-            if label == -1:  # Skip noise points
+        for label, start, size in zip(unique_labels, starts, sizes):
+            if label == -1 or size < self.min_cluster_size:  # Skip noise points and small clusters
                 continue
             
             # Get memories in this cluster
-            cluster_indices = np.where(labels == label)[0]
+            cluster_indices = order[start:start + size]
             cluster_memories = [memories[i] for i in cluster_indices]
             cluster_embeddings = embeddings[cluster_indices]
             
-            if len(cluster_memories) < self.min_cluster_size:
-                continue
-            
             # Calculate centroid embedding
             centroid = np.mean(cluster_embeddings, axis=0)
             
             # Calculate coherence score (average cosine similarity to centroid)
-            coherence_scores = []
-            for embedding in cluster_embeddings:
-                similarity = np.dot(embedding, centroid) / (
-                    np.linalg.norm(embedding) * np.linalg.norm(centroid)
-                )
-                coherence_scores.append(similarity)
-            
-            coherence_score = np.mean(coherence_scores)
+            denominators = norms[cluster_indices] * np.linalg.norm(centroid)
+            similarities = (cluster_embeddings @ centroid) / np.where(denominators > 0, denominators, 1.0)
+            coherence_score = np.mean(similarities)
             
             # Extract theme keywords
             theme_keywords = await self._extract_theme_keywords(cluster_memories)
@@ -206,7 +332,7 @@ class SemanticClusteringEngine(ConsolidationBase):
                 created_at=datetime.now(),
                 theme_keywords=theme_keywords,
                 metadata={
-                    'algorithm': self.algorithm,
+                    'algorithm': algorithm or self.algorithm,
                     'cluster_size': len(cluster_memories),
                     'average_memory_age': self._calculate_average_age(cluster_memories),
                     'tag_distribution': self._analyze_tag_distribution(cluster_memories)
@@ -297,33 +423,21 @@ class SemanticClusteringEngine(ConsolidationBase):
         if len(clusters) <= 1:
             return clusters
         
-        # Calculate pairwise similarities between cluster centroids
-        centroids = np.array([cluster.centroid_embedding for cluster in clusters])
+        # Normalised centroid matrix; each row's similarities are one matrix-vector product
+        centroids = self._normalize_rows(np.array([cluster.centroid_embedding for cluster in clusters]))
         
-        merged = [False] * len(clusters)
+        merged = np.zeros(len(clusters), dtype=bool)
         result_clusters = []
         
-        for i, cluster1 in enumerate(clusters):
+        for i in range(len(clusters)):
             if merged[i]:
                 continue
             
-            # Start with current cluster
-            merge_group = [i]
-            merged[i] = True
-            
-            # Find similar clusters to merge
-            for j in range(i + 1, len(clusters)):
-                if merged[j]:
-                    continue
-                
-                # Calculate cosine similarity between centroids
-                similarity = np.dot(centroids[i], centroids[j]) / (
-                    np.linalg.norm(centroids[i]) * np.linalg.norm(centroids[j])
-                )
-                
-                if similarity >= similarity_threshold:
-                    merge_group.append(j)
-                    merged[j] = True
+            # Start with current cluster and find similar unmerged clusters after it
+            similarities = centroids[i + 1:] @ centroids[i]
+            followers = np.flatnonzero((similarities >= similarity_threshold) & ~merged[i + 1:]) + i + 1
+            merge_group = [i] + followers.tolist()
+            merged[merge_group] = True
             
             # Create merged cluster
             if len(merge_group) == 1:
@@ -15,11 +15,14 @@
 """Main dream-inspired consolidation orchestrator."""
 
 import asyncio
-from typing import List, Dict, Any, Optional, Protocol
+import os
+from typing import List, Dict, Any, Optional, Protocol, Callable, Awaitable
 from datetime import datetime, timedelta
 import logging
 import time
 
+import numpy as np
+
 from .base import ConsolidationConfig, ConsolidationReport, ConsolidationError
 from .decay import ExponentialDecayCalculator
 from .associations import CreativeAssociationEngine
@@ -27,7 +30,9 @@ from .clustering import SemanticClusteringEngine
 from .compression import SemanticCompressionEngine
 from .forgetting import ControlledForgettingEngine
 from .health import ConsolidationHealthMonitor
-from ..models.memory import Memory
+from .profiler import PipelineProfile, PipelineProfiler, ProfiledStorage, current_profiler, profile_stage
+from .state import ClusterCentroid, ConsolidationState
+from ..models.memory import Memory, MemoryEmbeddings
 
 # Protocol for storage backend interface
 class StorageProtocol(Protocol):
@@ -51,7 +56,8 @@ class DreamInspiredConsolidator:
     """
     
     def __init__(self, storage: StorageProtocol, config: ConsolidationConfig):
-        self.storage = storage
+        # Wrapped so each run's profile can count storage calls per stage
+        self.storage = ProfiledStorage(storage)
         self.config = config
         self.logger = logging.getLogger(__name__)
         
@@ -65,8 +71,21 @@ class DreamInspiredConsolidator:
         # Initialize health monitoring
         self.health_monitor = ConsolidationHealthMonitor(config)
         
+        # Watermarks, centroids and association pairs for incremental runs
+        self.state: Optional[ConsolidationState] = None
+        if getattr(config, 'incremental_enabled', False):
+            state_path = getattr(config, 'state_path', None) or os.path.join(
+                config.archive_location or "~/.mcp_memory_archive", "consolidation_state.db"
+            )
+            self.state = ConsolidationState(state_path)
+        
+        # Awaited with (stage, details) as each pipeline stage starts; worker
+        # processes use it to report progress and to pause when asked to
+        self.progress_callback: Optional[Callable[[str, Dict[str, Any]], Awaitable[None]]] = None
+        
         # Performance tracking
         self.last_consolidation_times = {}
+        self.last_profiles: Dict[str, PipelineProfile] = {}
         self.consolidation_stats = {
             'total_runs': 0,
             'successful_runs': 0,
@@ -84,6 +103,7 @@ class DreamInspiredConsolidator:
         Args:
             time_horizon: 'daily', 'weekly', 'monthly', 'quarterly', 'yearly'
             **kwargs: Additional parameters for consolidation
+                (``full=True`` ignores the incremental watermark for this run)
         
         Returns:
             ConsolidationReport with results and performance metrics
@@ -96,75 +116,119 @@ class DreamInspiredConsolidator:
             memories_processed=0
         )
         
+        # Every stage runs in a profiler span; storage calls are counted
+        # against the span they happen in
+        profiler = PipelineProfiler(time_horizon)
+        profiler_token = current_profiler.set(profiler)
+        try:
+            return await self._run_pipeline(time_horizon, report, profiler, **kwargs)
+        finally:
+            current_profiler.reset(profiler_token)
+    
+    async def _run_pipeline(
+        self,
+        time_horizon: str,
+        report: ConsolidationReport,
+        profiler: PipelineProfiler,
+        **kwargs
+    ) -> ConsolidationReport:
         try:
             self.logger.info(f"Starting {time_horizon} consolidation")
+            await self._report_progress('loading', time_horizon=time_horizon)
             
-            # 1. Retrieve memories for processing
-            memories = await self._get_memories_for_horizon(time_horizon, **kwargs)
+            # 1. Retrieve memories (and their embedding matrix) for processing.
+            # Incremental runs load the whole horizon, but only re-score
+            # memories that changed since the watermark or whose score is due,
+            # and only cluster and associate the changed ones (against every
+            # loaded memory); the next watermark is taken before loading, so
+            # edits made while the run is in progress are picked up next time
+            with profiler.stage('load') as span:
+                watermark = self._get_watermark(time_horizon, **kwargs)
+                load_started = time.time()
+                loaded = await self._get_memories_for_horizon(time_horizon, **kwargs)
+                memories = loaded.memories
+                span.items = len(memories)
             report.memories_processed = len(memories)
             
             if not memories:
                 self.logger.info(f"No memories to process for {time_horizon} consolidation")
+                self._advance_watermark(time_horizon, load_started)
                 return self._finalize_report(report, [])
             
+            changed = scored = memories
+            if watermark is not None:
+                changed = [m for m in memories if (m.updated_at or m.created_at or 0) > watermark]
+                scored = await self._select_for_scoring(memories, changed)
+                self.logger.info(
+                    f"{len(changed)} of {len(memories)} memories changed since the last {time_horizon} run, "
+                    f"{len(scored)} to re-score"
+                )
+            
             self.logger.info(f"Processing {len(memories)} memories for {time_horizon} consolidation")
             
             # 2. Calculate/update relevance scores
-            performance_start = time.time()
-            relevance_scores = await self._update_relevance_scores(memories, time_horizon)
-            self.logger.debug(f"Relevance scoring took {time.time() - performance_start:.2f}s")
+            await self._report_progress('scoring', memories=len(scored))
+            relevance_scores = await self._update_relevance_scores(scored, time_horizon)
             
             # 3. Cluster by semantic similarity (if enabled and appropriate)
             clusters = []
             if self.config.clustering_enabled and time_horizon in ['weekly', 'monthly', 'quarterly']:
-                performance_start = time.time()
-                clusters = await self.clustering_engine.process(memories)
+                await self._report_progress('clustering', memories=len(changed))
+                with profiler.stage('clustering', items=len(changed)):
+                    clusters = await self._cluster_memories(time_horizon, changed, loaded, incremental=watermark is not None)
                 report.clusters_created = len(clusters)
-                self.logger.debug(f"Clustering took {time.time() - performance_start:.2f}s, created {len(clusters)} clusters")
             
             # 4. Run creative associations (if enabled and appropriate)
             associations = []
             if self.config.associations_enabled and time_horizon in ['weekly', 'monthly']:
-                performance_start = time.time()
-                existing_associations = await self._get_existing_associations()
-                associations = await self.association_engine.process(
-                    memories, existing_associations=existing_associations
-                )
+                await self._report_progress('associations', memories=len(changed))
+                with profiler.stage('associations', items=len(changed)):
+                    existing_associations = await self._get_existing_associations(changed)
+                    associations = await self.association_engine.process(
+                        memories, existing_associations=existing_associations, embeddings=loaded,
+                        changed=changed if watermark is not None else None
+                    )
                 report.associations_discovered = len(associations)
-                self.logger.debug(f"Association discovery took {time.time() - performance_start:.2f}s, found {len(associations)} associations")
                 
                 # Store new associations as memories
-                await self._store_associations_as_memories(associations)
+                with profiler.stage('writeback', items=len(associations)):
+                    await self._store_associations_as_memories(associations)
             
             # 5. Compress clusters (if enabled and clusters exist)
             compression_results = []
             if self.config.compression_enabled and clusters:
-                performance_start = time.time()
-                compression_results = await self.compression_engine.process(clusters, memories)
+                await self._report_progress('compression', clusters=len(clusters))
+                with profiler.stage('compression', items=len(clusters)):
+                    compression_results = await self.compression_engine.process(clusters, memories)
                 report.memories_compressed = len(compression_results)
-                self.logger.debug(f"Compression took {time.time() - performance_start:.2f}s, compressed {len(compression_results)} clusters")
                 
                 # Store compressed memories and update originals
-                await self._handle_compression_results(compression_results)
+                with profiler.stage('writeback', items=len(compression_results)):
+                    await self._handle_compression_results(compression_results)
             
-            # 6. Controlled forgetting (if enabled and appropriate)
+            # 6. Controlled forgetting (if enabled and appropriate). Only the
+            # memories scored this run can be candidates, but duplicates are
+            # looked for across the whole horizon
             forgetting_results = []
             if self.config.forgetting_enabled and time_horizon in ['monthly', 'quarterly', 'yearly']:
-                performance_start = time.time()
-                access_patterns = await self._get_access_patterns()
-                forgetting_results = await self.forgetting_engine.process(
-                    memories, relevance_scores, 
-                    access_patterns=access_patterns, 
-                    time_horizon=time_horizon
-                )
+                await self._report_progress('forgetting', memories=len(scored))
+                with profiler.stage('forgetting', items=len(scored)):
+                    access_patterns = await self._get_access_patterns()
+                    forgetting_results = await self.forgetting_engine.process(
+                        memories, relevance_scores, 
+                        access_patterns=access_patterns, 
+                        time_horizon=time_horizon,
+                        embeddings=loaded
+                    )
                 report.memories_archived = len([r for r in forgetting_results if r.action_taken in ['archived', 'deleted']])
-                self.logger.debug(f"Forgetting took {time.time() - performance_start:.2f}s, processed {len(forgetting_results)} candidates")
                 
                 # Apply forgetting results to storage
-                await self._apply_forgetting_results(forgetting_results)
+                with profiler.stage('writeback', items=len(forgetting_results)):
+                    await self._apply_forgetting_results(forgetting_results)
             
             # 7. Update consolidation statistics
             self._update_consolidation_stats(report)
+            self._advance_watermark(time_horizon, load_started)
             
             # 8. Finalize report
             return self._finalize_report(report, [])
@@ -180,8 +244,40 @@ class DreamInspiredConsolidator:
             report.errors.append(str(e))
             return self._finalize_report(report, [str(e)])
     
-    async def _get_memories_for_horizon(self, time_horizon: str, **kwargs) -> List[Memory]:
-        """Get memories appropriate for the given time horizon."""
+    def _get_watermark(self, time_horizon: str, **kwargs) -> Optional[float]:
+        """
+        The incremental watermark for this run, or None for a full run.
+        
+        Storages whose bulk metadata updates always refresh updated_at
+        (``honours_metadata_touch`` False) always get full runs: writing the
+        scores would mark every memory as changed.
+        """
+        if self.state is None or time_horizon == 'daily' or kwargs.get('full', False):
+            return None
+        if not getattr(self.storage, 'honours_metadata_touch', True):
+            self.logger.warning("Storage refreshes updated_at on every metadata update; running a full consolidation")
+            return None
+        return self.state.get_watermark(time_horizon)
+    
+    def _advance_watermark(self, time_horizon: str, loaded_at: float) -> None:
+        """
+        Record that memories changed before ``loaded_at`` have been processed.
+        
+        ``loaded_at`` is when the run started loading, not when it finished,
+        so a memory edited during the run is treated as changed next time.
+        Relevance scores are written without touching updated_at and so do
+        not count as changes.
+        """
+        if self.state is None or time_horizon == 'daily':
+            return
+        self.state.set_watermark(time_horizon, loaded_at, time.time())
+    
+    async def _get_memories_for_horizon(
+        self,
+        time_horizon: str,
+        **kwargs
+    ) -> MemoryEmbeddings:
+        """Get memories appropriate for the given time horizon, with their embeddings."""
         now = datetime.now()
         
         # Define time ranges for different horizons
@@ -201,45 +297,198 @@ class DreamInspiredConsolidator:
         if time_horizon == 'daily':
             start_time = (now - timedelta(days=2)).timestamp()
             end_time = now.timestamp()
-            memories = await self.storage.get_memories_by_time_range(start_time, end_time)
+            loaded = await self._load_memories(start_time, end_time)
         else:
             # For longer horizons, process all memories but focus on older ones
-            memories = await self.storage.get_all_memories()
+            loaded = await self._load_memories()
             
             # Filter by relevance to time horizon
             if time_horizon in ['quarterly', 'yearly']:
                 # For long horizons, focus on older memories that need consolidation
                 cutoff_date = now - time_ranges[time_horizon]
-                memories = [
-                    m for m in memories 
+                loaded.memories = [
+                    m for m in loaded.memories 
                     if m.created_at and datetime.utcfromtimestamp(m.created_at) < cutoff_date
                 ]
         
-        return memories
+        return loaded
     
-    async def _update_relevance_scores(self, memories: List[Memory], time_horizon: str) -> List:
-        """Calculate and update relevance scores for memories."""
-        # Get connection and access data
-        connections = await self._get_memory_connections()
-        access_patterns = await self._get_access_patterns()
-        
-        # Calculate relevance scores
-        relevance_scores = await self.decay_calculator.process(
-            memories,
-            connections=connections,
-            access_patterns=access_patterns,
-            reference_time=datetime.now()
+    async def _load_memories(
+        self,
+        start_time: Optional[float] = None,
+        end_time: Optional[float] = None
+    ) -> MemoryEmbeddings:
+        """
+        Load memories with their embedding matrix.
+        
+        Uses the storage's bulk ``get_memories_with_embeddings`` loader when it
+        has one; otherwise falls back to the plain getters and builds the matrix
+        from whatever embeddings the memories carry.
+        """
+        loader = getattr(self.storage, 'get_memories_with_embeddings', None)
+        if loader is not None:
+            loaded = await loader(start_time, end_time)
+            if isinstance(loaded, MemoryEmbeddings):
+                return loaded
+            self.logger.warning("Bulk embedding loader unavailable, falling back to plain memory loading")
+        
+        if start_time is not None and end_time is not None:
+            memories = await self.storage.get_memories_by_time_range(start_time, end_time)
+        else:
+            memories = await self.storage.get_all_memories()
+        return MemoryEmbeddings.from_memories(memories)
+    
+    async def _cluster_memories(
+        self,
+        time_horizon: str,
+        memories: List[Memory],
+        loaded: MemoryEmbeddings,
+        incremental: bool = False
+    ) -> List:
+        """
+        Cluster memories, reusing stored centroids on incremental runs.
+        
+        Incremental runs first assign changed memories to the nearest stored
+        centroid (updating it as a running mean) and only cluster the rest.
+        Full runs replace the stored centroids for the horizon. Returns the
+        newly created clusters.
+        """
+        if self.state is None:
+            return await self.clustering_engine.process(memories, embeddings=loaded)
+        
+        if not incremental:
+            clusters = await self.clustering_engine.process(memories, embeddings=loaded)
+            self.state.reset_centroids(time_horizon)
+            self._save_cluster_centroids(time_horizon, clusters)
+            return clusters
+        
+        stored = self.state.get_centroids(time_horizon)
+        rows = loaded.rows(memories)
+        has_vector = rows >= 0
+        
+        assigned_hashes = set()
+        if stored and has_vector.any():
+            vectors = loaded.embeddings[rows[has_vector]]
+            labels = self.clustering_engine.assign_to_centroids(
+                vectors, np.stack([c.centroid for c in stored])
+            )
+            for index in np.unique(labels[labels >= 0]):
+                members = vectors[labels == index]
+                centroid = stored[index]
+                total = centroid.size + len(members)
+                centroid.centroid = (centroid.centroid * centroid.size + members.sum(axis=0)) / total
+                centroid.size = total
+            self.state.save_centroids([stored[i] for i in np.unique(labels[labels >= 0])], time.time())
+            with_vectors = [m for m, ok in zip(memories, has_vector) if ok]
+            assigned_hashes = {m.content_hash for m, label in zip(with_vectors, labels) if label >= 0}
+            self.logger.info(f"Assigned {len(assigned_hashes)} changed memories to existing {time_horizon} clusters")
+        
+        remaining = [m for m in memories if m.content_hash not in assigned_hashes]
+        clusters = await self.clustering_engine.process(remaining, embeddings=loaded)
+        self._save_cluster_centroids(time_horizon, clusters)
+        return clusters
+    
+    def _save_cluster_centroids(self, time_horizon: str, clusters: List) -> None:
+        """Store the centroids of newly created clusters for later incremental runs."""
+        self.state.save_centroids(
+            [
+                ClusterCentroid(
+                    cluster_id=cluster.cluster_id,
+                    time_horizon=time_horizon,
+                    centroid=np.asarray(cluster.centroid_embedding, dtype=np.float32),
+                    size=len(cluster.memory_hashes)
+                )
+                for cluster in clusters
+            ],
+            time.time()
         )
+    
+    async def _select_for_scoring(self, memories: List[Memory], changed: List[Memory]) -> List[Memory]:
+        """
+        Memories an incremental run re-scores: the changed ones, plus those
+        whose stored score is missing or older than ``relevance_refresh_days``.
+        """
+        changed_hashes = {m.content_hash for m in changed}
+        cutoff = time.time() - getattr(self.config, 'relevance_refresh_days', 7) * 86400
+        calculated_at = await self._relevance_calculated_at([m for m in memories if m.content_hash not in changed_hashes])
+        return [
+            m for m in memories
+            if m.content_hash in changed_hashes or calculated_at.get(m.content_hash, 0.0) < cutoff
+        ]
+    
+    async def _relevance_calculated_at(self, memories: List[Memory]) -> Dict[str, float]:
+        """
+        When each memory's stored relevance score was calculated.
+        
+        Read from the storage's score table with ``relevance_storage='table'``,
+        otherwise from the memories' metadata.
+        """
+        if self._uses_relevance_table() and hasattr(self.storage, 'get_relevance_scores'):
+            scores = await self.storage.get_relevance_scores([m.content_hash for m in memories])
+            return {
+                content_hash: score['calculated_at']
+                for content_hash, score in scores.items() if score.get('calculated_at')
+            }
         
-        # Update memory metadata with relevance scores
+        calculated_at = {}
         for memory in memories:
-            score = next((s for s in relevance_scores if s.memory_hash == memory.content_hash), None)
-            if score:
-                updated_memory = await self.decay_calculator.update_memory_relevance_metadata(memory, score)
-                await self.storage.update_memory(updated_memory)
+            value = (memory.metadata or {}).get('relevance_calculated_at')
+            if not value:
+                continue
+            try:
+                calculated_at[memory.content_hash] = datetime.fromisoformat(value).timestamp()
+            except (TypeError, ValueError):
+                pass
+        return calculated_at
+    
+    async def _update_relevance_scores(self, memories: List[Memory], time_horizon: str) -> List:
+        """Calculate and update relevance scores for memories."""
+        with profile_stage('decay', items=len(memories)):
+            # Get connection and access data
+            connections = await self._get_memory_connections()
+            access_patterns = await self._get_access_patterns()
+            
+            # Calculate relevance scores
+            relevance_scores = await self.decay_calculator.process(
+                memories,
+                connections=connections,
+                access_patterns=access_patterns,
+                reference_time=datetime.now()
+            )
+            
+            patches = self.decay_calculator.relevance_metadata_patches(relevance_scores)
+            for memory in memories:
+                patch = patches.get(memory.content_hash)
+                if patch:
+                    memory.metadata.update(patch)
+        
+        # Persist the scores in bulk, indexed by hash
+        if patches:
+            with profile_stage('writeback', items=len(patches)):
+                await self._persist_relevance_scores(memories, patches)
         
         return relevance_scores
     
+    def _uses_relevance_table(self) -> bool:
+        return getattr(self.config, 'relevance_storage', 'metadata') == 'table'
+    
+    async def _persist_relevance_scores(self, memories: List[Memory], patches: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Write relevance scores with the cheapest API the storage offers.
+        
+        With ``relevance_storage='table'`` scores go to the backend's narrow
+        score table; otherwise they are merged into metadata in one batched
+        call. Storages with neither API get one update_memory() per memory.
+        """
+        if self._uses_relevance_table() and hasattr(self.storage, 'update_relevance_scores'):
+            await self.storage.update_relevance_scores(patches)
+        elif hasattr(self.storage, 'update_memories_metadata'):
+            await self.storage.update_memories_metadata(patches, touch=False)
+        else:
+            for memory in memories:
+                if memory.content_hash in patches:
+                    await self.storage.update_memory(memory)
+    
     async def _get_memory_connections(self) -> Dict[str, int]:
         """Get memory connection counts from storage."""
         try:
@@ -258,8 +507,23 @@ class DreamInspiredConsolidator:
             self.logger.warning("Storage backend doesn't support access pattern tracking")
             return {}
     
-    async def _get_existing_associations(self) -> set:
-        """Get existing memory associations to avoid duplicates."""
+    async def _get_existing_associations(self, memories: Optional[List[Memory]] = None) -> set:
+        """
+        Get existing memory associations to avoid duplicates.
+        
+        With incremental state the pairs come from its indexed table, limited
+        to pairs involving ``memories``; the table is seeded once from the
+        stored association memories.
+        """
+        if self.state is not None and memories is not None:
+            if self.state.get_flag('association_pairs_seeded') is None:
+                self.state.add_association_pairs(await self._scan_existing_associations())
+                self.state.set_flag('association_pairs_seeded', datetime.now().isoformat())
+            return self.state.get_association_pairs(m.content_hash for m in memories)
+        return await self._scan_existing_associations()
+    
+    async def _scan_existing_associations(self) -> set:
+        """Collect association pairs by scanning every stored association memory."""
         try:
             # Look for existing association memories
             all_memories = await self.storage.get_all_memories()
@@ -309,6 +573,11 @@ class DreamInspiredConsolidator:
             
             # Store the association memory
             await self.storage.store_memory(association_memory)
+        
+        if self.state is not None:
+            self.state.add_association_pairs(
+                tuple(association.source_memory_hashes[:2]) for association in associations
+            )
     
     async def _handle_compression_results(self, compression_results) -> None:
         """Handle storage of compressed memories and linking to originals."""
@@ -332,6 +601,11 @@ class DreamInspiredConsolidator:
                 await self.storage.store_memory(result.compressed_version)
             # 'archived' memories are handled by the forgetting engine
     
+    async def _report_progress(self, stage: str, **details) -> None:
+        """Tell the progress callback, if any, that a pipeline stage is starting."""
+        if self.progress_callback is not None:
+            await self.progress_callback(stage, details)
+    
     def _update_consolidation_stats(self, report: ConsolidationReport) -> None:
         """Update internal consolidation statistics."""
         self.consolidation_stats['total_runs'] += 1
@@ -361,14 +635,14 @@ class DreamInspiredConsolidator:
             'success': success
         }
         
+        # Attach the per-stage profile of this run
+        profiler = current_profiler.get()
+        if profiler is not None:
+            report.profile = profiler.finish()
+            self._record_profile(report)
+        
         # Record performance in health monitor
-        self.health_monitor.record_consolidation_performance(
-            time_horizon=report.time_horizon,
-            duration=duration,
-            memories_processed=report.memories_processed,
-            success=success,
-            errors=errors
-        )
+        self._record_performance(report, errors)
         
         # Log summary
         if errors:
@@ -383,6 +657,43 @@ class DreamInspiredConsolidator:
         
         return report
     
+    def _record_performance(self, report: ConsolidationReport, errors: List[str]) -> None:
+        """Record a finished run in the health monitor."""
+        metrics = report.performance_metrics or {}
+        self.health_monitor.record_consolidation_performance(
+            time_horizon=report.time_horizon,
+            duration=metrics.get('duration_seconds', 0),
+            memories_processed=report.memories_processed,
+            success=metrics.get('success', not errors),
+            errors=errors,
+            stages=report.profile.summary() if report.profile else None
+        )
+    
+    def _record_profile(self, report: ConsolidationReport) -> None:
+        """Keep the run's profile for status queries and export its trace if configured."""
+        if report.profile is None:
+            return
+        self.last_profiles[report.time_horizon] = report.profile
+        
+        trace_dir = getattr(self.config, 'profile_trace_dir', None)
+        if trace_dir:
+            filename = f"consolidation_{report.time_horizon}_{report.start_time.strftime('%Y%m%d_%H%M%S')}.trace.json"
+            try:
+                path = report.profile.export_trace(os.path.join(trace_dir, filename))
+                self.logger.info(f"Wrote consolidation trace to {path}")
+            except OSError as e:
+                self.logger.warning(f"Could not write consolidation trace: {e}")
+        
+        for stage in report.profile.summary():
+            self.logger.debug(
+                f"{report.time_horizon} {stage['stage']}: {stage['wall_seconds']:.2f}s wall, "
+                f"{stage['cpu_seconds']:.2f}s cpu, {stage['items']} items, {stage['storage_calls']} storage calls"
+            )
+    
+    def get_last_profiles(self) -> Dict[str, PipelineProfile]:
+        """The profile of the latest run of each horizon."""
+        return dict(self.last_profiles)
+    
     async def health_check(self) -> Dict[str, Any]:
         """Perform health check on the consolidation system."""
         return await self.health_monitor.check_overall_health()
@@ -14,11 +14,12 @@
 
 """Exponential decay scoring for memory relevance calculation."""
 
-import math
-from typing import List, Dict, Any, Optional
-from datetime import datetime
+from typing import List, Dict, Any, Optional, Iterator, Sequence, Union
+from datetime import datetime, timezone
 from dataclasses import dataclass
 
+import numpy as np
+
 from .base import ConsolidationBase, ConsolidationConfig
 from ..models.memory import Memory
 
@@ -33,6 +34,111 @@ class RelevanceScore:
     access_boost: float
     metadata: Dict[str, Any]
 
+# Importance derived from tags when a memory has no explicit importance_score
+TAG_IMPORTANCE = {
+    'critical': 2.0,
+    'important': 1.5,
+    'reference': 1.3,
+    'urgent': 1.4,
+    'project': 1.2,
+    'personal': 1.1,
+    'temporary': 0.7,
+    'draft': 0.8,
+    'note': 0.9
+}
+
+_EPOCH = datetime(1970, 1, 1)
+_SECONDS_PER_DAY = 86400.0
+
+def _naive_epoch_seconds(value: datetime) -> float:
+    """
+    Seconds since the epoch, reading naive datetimes as UTC.
+
+    Ages were always computed as ``reference_time - utcfromtimestamp(ts)``,
+    so a naive reference time sits on the UTC axis; keeping that reading
+    leaves every score unchanged by the columnar path.
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH).total_seconds()
+
+class RelevanceScores(Sequence):
+    """
+    Relevance scores for many memories held as NumPy columns.
+
+    Behaves like a read-only list of RelevanceScore, but the per-memory
+    objects are only built when an element is accessed, so scoring a large
+    set and picking out the low-relevance tail stays cheap.
+    """
+    
+    def __init__(
+        self,
+        memory_hashes: List[str],
+        total_score: np.ndarray,
+        base_importance: np.ndarray,
+        decay_factor: np.ndarray,
+        connection_boost: np.ndarray,
+        access_boost: np.ndarray,
+        age_days: np.ndarray,
+        retention_period: np.ndarray,
+        connection_count: np.ndarray,
+        is_protected: np.ndarray,
+        memory_types: Optional[List[str]] = None
+    ):
+        self.memory_hashes = memory_hashes
+        self.total_score = total_score
+        self.base_importance = base_importance
+        self.decay_factor = decay_factor
+        self.connection_boost = connection_boost
+        self.access_boost = access_boost
+        self.age_days = age_days
+        self.retention_period = retention_period
+        self.connection_count = connection_count
+        self.is_protected = is_protected
+        self.memory_types = memory_types
+        self._positions: Optional[Dict[str, int]] = None
+    
+    def __len__(self) -> int:
+        return len(self.memory_hashes)
+    
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("relevance score index out of range")
+        return RelevanceScore(
+            memory_hash=self.memory_hashes[index],
+            total_score=float(self.total_score[index]),
+            base_importance=float(self.base_importance[index]),
+            decay_factor=float(self.decay_factor[index]),
+            connection_boost=float(self.connection_boost[index]),
+            access_boost=float(self.access_boost[index]),
+            metadata={
+                'age_days': int(self.age_days[index]),
+                'memory_type': self.memory_types[index] if self.memory_types else 'standard',
+                'retention_period': self.retention_period[index].item(),
+                'connection_count': int(self.connection_count[index]),
+                'is_protected': bool(self.is_protected[index])
+            }
+        )
+    
+    def __iter__(self) -> Iterator[RelevanceScore]:
+        for i in range(len(self)):
+            yield self[i]
+    
+    def get(self, memory_hash: str, default: Optional[RelevanceScore] = None) -> Optional[RelevanceScore]:
+        """The score of one memory by content hash, like ``dict.get``."""
+        if self._positions is None:
+            self._positions = {h: i for i, h in enumerate(self.memory_hashes)}
+        index = self._positions.get(memory_hash)
+        return default if index is None else self[index]
+    
+    def select(self, mask: np.ndarray) -> List[RelevanceScore]:
+        """Materialise only the scores where ``mask`` is true."""
+        return [self[int(i)] for i in np.flatnonzero(mask)]
+
 class ExponentialDecayCalculator(ConsolidationBase):
     """
     Calculates memory relevance using exponential decay.
@@ -48,7 +154,7 @@ class ExponentialDecayCalculator(ConsolidationBase):
         super().__init__(config)
         self.retention_periods = config.retention_periods
         
-    async def process(self, memories: List[Memory], **kwargs) -> List[RelevanceScore]:
+    async def process(self, memories: List[Memory], **kwargs) -> RelevanceScores:
         """Calculate relevance scores for all memories."""
         if not self._validate_memories(memories):
             return []
@@ -57,76 +163,134 @@ class ExponentialDecayCalculator(ConsolidationBase):
         memory_connections = kwargs.get('connections', {})  # hash -> connection_count mapping
         access_patterns = kwargs.get('access_patterns', {})  # hash -> last_accessed mapping
         
-        scores = []
-        for memory in memories:
-            score = await self._calculate_memory_relevance(
-                memory, reference_time, memory_connections, access_patterns
-            )
-            scores.append(score)
+        scores = self._score_memories(memories, reference_time, memory_connections, access_patterns)
         
         self.logger.info(f"Calculated relevance scores for {len(scores)} memories")
         return scores
     
-    async def _calculate_memory_relevance(
+    def _score_memories(
         self,
-        memory: Memory,
+        memories: List[Memory],
         current_time: datetime,
         connections: Dict[str, int],
         access_patterns: Dict[str, datetime]
-    ) -> RelevanceScore:
-        """
-        Calculate memory relevance using exponential decay.
+    ) -> RelevanceScores:
+        """Gather the scoring inputs of each memory into columns and score them together."""
+        count = len(memories)
+        hashes = [memory.content_hash for memory in memories]
+        memory_types = [self._extract_memory_type(memory) for memory in memories]
         
-        Factors:
-        - Age of memory
-        - Base importance score (from metadata or tags)
-        - Retention period (varies by memory type)
-        - Connections to other memories
-        - Recent access patterns
-        """
-        # Get memory age in days
-        age_days = self._get_memory_age_days(memory, current_time)
+        created_at = np.full(count, np.nan)
+        last_accessed = np.full(count, np.nan)
+        for i, memory in enumerate(memories):
+            if memory.created_at:
+                created_at[i] = memory.created_at
+            elif memory.timestamp:
+                created_at[i] = _naive_epoch_seconds(memory.timestamp)
+            else:
+                self.logger.warning(f"Memory {memory.content_hash} has no timestamp")
+            
+            accessed = access_patterns.get(memory.content_hash)
+            if accessed:
+                last_accessed[i] = _naive_epoch_seconds(accessed)
+            elif memory.updated_at:
+                last_accessed[i] = memory.updated_at
         
-        # Extract base importance score
-        base_importance = self._get_base_importance(memory)
+        return self.score_arrays(
+            memory_hashes=hashes,
+            created_at=created_at,
+            last_accessed=last_accessed,
+            retention_periods=np.array([self.retention_periods.get(t, 30) for t in memory_types]),
+            connection_counts=np.array([connections.get(h, 0) for h in hashes], dtype=np.int64),
+            base_importance=np.array([self._get_base_importance(memory) for memory in memories]),
+            is_protected=np.array([self._is_protected_memory(memory) for memory in memories], dtype=bool),
+            reference_time=current_time,
+            memory_types=memory_types
+        )
+    
+    def score_arrays(
+        self,
+        memory_hashes: List[str],
+        created_at: np.ndarray,
+        last_accessed: np.ndarray,
+        retention_periods: np.ndarray,
+        connection_counts: np.ndarray,
+        base_importance: Optional[np.ndarray] = None,
+        is_protected: Optional[np.ndarray] = None,
+        reference_time: Optional[datetime] = None,
+        memory_types: Optional[List[str]] = None
+    ) -> RelevanceScores:
+        """
+        Calculate relevance for many memories at once from columnar inputs.
         
-        # Get retention period for memory type
-        memory_type = self._extract_memory_type(memory)
-        retention_period = self.retention_periods.get(memory_type, 30)
+        Timestamps are epoch seconds with NaN where unknown: a missing
+        ``created_at`` counts as age 0 and a missing ``last_accessed`` as no
+        access boost. ``base_importance`` defaults to 1.0 and ``is_protected``
+        to False. Scores are identical to scoring each memory on its own.
+        """
+        reference = _naive_epoch_seconds(reference_time or datetime.now())
+        created_at = np.asarray(created_at, dtype=np.float64)
+        last_accessed = np.asarray(last_accessed, dtype=np.float64)
+        retention_periods = np.asarray(retention_periods)
+        connection_counts = np.asarray(connection_counts, dtype=np.int64)
+        count = len(memory_hashes)
+        if base_importance is None:
+            base_importance = np.ones(count)
+        if is_protected is None:
+            is_protected = np.zeros(count, dtype=bool)
         
-        # Calculate exponential decay factor
-        decay_factor = math.exp(-age_days / retention_period)
+        # timedelta.days floors, so ages do too
+        age_days = np.floor((reference - created_at) / _SECONDS_PER_DAY)
+        age_days = np.where(np.isnan(age_days), 0, age_days).astype(np.int64)
+        decay_factor = np.exp(-age_days / retention_periods)
         
-        # Calculate connection boost
-        connection_count = connections.get(memory.content_hash, 0)
-        connection_boost = 1 + (0.1 * connection_count)  # 10% boost per connection
+        connection_boost = 1 + (0.1 * connection_counts)  # 10% boost per connection
         
-        # Calculate access boost
-        access_boost = self._calculate_access_boost(memory, access_patterns, current_time)
+        days_since_access = np.floor((reference - last_accessed) / _SECONDS_PER_DAY)
+        access_boost = np.select(
+            [np.isnan(days_since_access), days_since_access <= 1, days_since_access <= 7, days_since_access <= 30],
+            [1.0, 1.5, 1.2, 1.1],
+            default=1.0
+        )
         
-        # Calculate total relevance score
         total_score = base_importance * decay_factor * connection_boost * access_boost
         
         # Ensure protected memories maintain minimum relevance
-        if self._is_protected_memory(memory):
-            total_score = max(total_score, 0.5)  # Minimum 50% relevance for protected memories
+        total_score = np.where(is_protected, np.maximum(total_score, 0.5), total_score)
         
-        return RelevanceScore(
-            memory_hash=memory.content_hash,
+        return RelevanceScores(
+            memory_hashes=list(memory_hashes),
             total_score=total_score,
-            base_importance=base_importance,
+            base_importance=np.asarray(base_importance, dtype=np.float64),
             decay_factor=decay_factor,
             connection_boost=connection_boost,
             access_boost=access_boost,
-            metadata={
-                'age_days': age_days,
-                'memory_type': memory_type,
-                'retention_period': retention_period,
-                'connection_count': connection_count,
-                'is_protected': self._is_protected_memory(memory)
-            }
+            age_days=age_days,
+            retention_period=retention_periods,
+            connection_count=connection_counts,
+            is_protected=np.asarray(is_protected, dtype=bool),
+            memory_types=memory_types
         )
     
+    async def _calculate_memory_relevance(
+        self,
+        memory: Memory,
+        current_time: datetime,
+        connections: Dict[str, int],
+        access_patterns: Dict[str, datetime]
+    ) -> RelevanceScore:
+        """
+        Calculate memory relevance using exponential decay.
+        
+        Factors:
+        - Age of memory
+        - Base importance score (from metadata or tags)
+        - Retention period (varies by memory type)
+        - Connections to other memories
+        - Recent access patterns
+        """
+        return self._score_memories([memory], current_time, connections, access_patterns)[0]
+    
     def _get_base_importance(self, memory: Memory) -> float:
         """
         Extract base importance score from memory metadata or tags.
@@ -145,21 +309,9 @@ class ExponentialDecayCalculator(ConsolidationBase):
                 self.logger.warning(f"Invalid importance_score in memory {memory.content_hash}")
         
         # Derive importance from tags
-        tag_importance = {
-            'critical': 2.0,
-            'important': 1.5,
-            'reference': 1.3,
-            'urgent': 1.4,
-            'project': 1.2,
-            'personal': 1.1,
-            'temporary': 0.7,
-            'draft': 0.8,
-            'note': 0.9
-        }
-        
         max_tag_importance = 1.0
         for tag in memory.tags:
-            tag_score = tag_importance.get(tag.lower(), 1.0)
+            tag_score = TAG_IMPORTANCE.get(tag.lower(), 1.0)
             max_tag_importance = max(max_tag_importance, tag_score)
         
         return max_tag_importance
@@ -205,6 +357,8 @@ class ExponentialDecayCalculator(ConsolidationBase):
         threshold: float = 0.1
     ) -> List[RelevanceScore]:
         """Get memories with relevance scores below the threshold."""
+        if isinstance(scores, RelevanceScores):
+            return scores.select(scores.total_score < threshold)
         return [score for score in scores if score.total_score < threshold]
     
     async def get_high_relevance_memories(
@@ -213,20 +367,48 @@ class ExponentialDecayCalculator(ConsolidationBase):
         threshold: float = 1.0
     ) -> List[RelevanceScore]:
         """Get memories with relevance scores above the threshold."""
+        if isinstance(scores, RelevanceScores):
+            return scores.select(scores.total_score >= threshold)
         return [score for score in scores if score.total_score >= threshold]
     
+    def relevance_metadata(self, score: RelevanceScore) -> Dict[str, Any]:
+        """Metadata fields that record a relevance score on its memory."""
+        return {
+            'relevance_score': score.total_score,
+            'relevance_calculated_at': datetime.now().isoformat(),
+            'decay_factor': score.decay_factor,
+            'connection_boost': score.connection_boost,
+            'access_boost': score.access_boost
+        }
+    
+    def relevance_metadata_patches(self, scores: Sequence[RelevanceScore]) -> Dict[str, Dict[str, Any]]:
+        """relevance_metadata() for every score, keyed by hash, without materialising columnar scores."""
+        if not isinstance(scores, RelevanceScores):
+            return {score.memory_hash: self.relevance_metadata(score) for score in scores}
+        calculated_at = datetime.now().isoformat()
+        return {
+            memory_hash: {
+                'relevance_score': total,
+                'relevance_calculated_at': calculated_at,
+                'decay_factor': decay,
+                'connection_boost': connection,
+                'access_boost': access
+            }
+            for memory_hash, total, decay, connection, access in zip(
+                scores.memory_hashes,
+                scores.total_score.tolist(),
+                scores.decay_factor.tolist(),
+                scores.connection_boost.tolist(),
+                scores.access_boost.tolist()
+            )
+        }
+    
     async def update_memory_relevance_metadata(
         self,
         memory: Memory,
         score: RelevanceScore
     ) -> Memory:
         """Update memory metadata with calculated relevance score."""
-        memory.metadata.update({
-            'relevance_score': score.total_score,
-            'relevance_calculated_at': datetime.now().isoformat(),
-            'decay_factor': score.decay_factor,
-            'connection_boost': score.connection_boost,
-            'access_boost': score.access_boost
-        })
+        memory.metadata.update(self.relevance_metadata(score))
         memory.touch()  # Update the updated_at timestamp
         return memory
\ No newline at end of file
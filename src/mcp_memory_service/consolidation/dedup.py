@@ -0,0 +1,344 @@
+# Copyright 2024 Heinrich Krupp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Near-duplicate detection for a whole memory set in one pass.
+
+Exact duplicates are grouped by a hash of the normalized content. Near
+duplicates are found with MinHash signatures over word shingles and
+locality-sensitive hashing (banding), so only memories sharing a band are
+ever compared; each candidate pair is then verified with the exact Jaccard
+similarity. Prefix/suffix containment is found by sorting, and embedding
+neighbours (optional) by random-hyperplane LSH. Overall cost is
+O(N log N) plus the (small) number of candidate pairs, instead of O(N^2).
+"""
+
+import hashlib
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from ..models.memory import Memory, MemoryEmbeddings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class DuplicateReport:
+    """
+    Result of duplicate detection.
+
+    Attributes:
+        duplicates: Hashes of memories that duplicate a kept memory (O(1) lookup)
+        kept_for: Maps each duplicate hash to the hash of the memory kept in its place
+        groups: Each group of mutually duplicate memories, kept memory first
+        candidate_pairs: Number of pairs verified (for diagnostics)
+    """
+    duplicates: Set[str] = field(default_factory=set)
+    kept_for: Dict[str, str] = field(default_factory=dict)
+    groups: List[List[str]] = field(default_factory=list)
+    candidate_pairs: int = 0
+
+    def __contains__(self, content_hash: str) -> bool:
+        return content_hash in self.duplicates
+
+
+class _UnionFind:
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+
+    def find(self, i: int) -> int:
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, a: int, b: int) -> None:
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[root_b] = root_a
+
+
+class DuplicateDetector:
+    """
+    Finds exact and near-duplicate memories across a memory set.
+
+    Two memories are near duplicates when both are longer than min_length
+    characters and either one contains the other as a prefix or suffix, or
+    the Jaccard similarity of their shingle sets reaches jaccard_threshold
+    (both needing more than min_words words). With embedding_threshold set,
+    memories whose embeddings have at least that cosine similarity are
+    duplicates too.
+
+    Within each group the longest memory (then the oldest) is kept; all the
+    others are reported as duplicates.
+    """
+
+    def __init__(
+        self,
+        jaccard_threshold: float = 0.8,
+        shingle_size: int = 1,
+        num_perm: int = 64,
+        bands: int = 16,
+        min_length: int = 50,
+        min_words: int = 5,
+        embedding_threshold: Optional[float] = None,
+        max_bucket_comparisons: int = 100,
+        seed: int = 42
+    ):
+        """
+        Initialize the detector.
+
+        Args:
+            jaccard_threshold: Minimum shingle-set Jaccard similarity of near duplicates
+            shingle_size: Words per shingle (1 compares word sets)
+            num_perm: MinHash signature length; must be divisible by bands
+            bands: LSH bands; more bands find lower similarities at the cost of more candidates
+            min_length: Memories this short (in characters) only match exactly
+            min_words: Minimum distinct shingles for a Jaccard comparison
+            embedding_threshold: Cosine similarity for embedding neighbours (None disables)
+            max_bucket_comparisons: Cap on comparisons per member of an oversized LSH bucket
+            seed: Seed for the hash permutations, so runs are reproducible
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.jaccard_threshold = jaccard_threshold
+        self.shingle_size = max(1, shingle_size)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.min_length = min_length
+        self.min_words = min_words
+        self.embedding_threshold = embedding_threshold
+        self.max_bucket_comparisons = max_bucket_comparisons
+
+        # Multiply-shift hash family: odd 64-bit multipliers, top 32 bits of a*x + b
+        rng = np.random.RandomState(seed)
+        self._perm_a = rng.randint(0, 1 << 62, size=num_perm, dtype=np.int64).astype(np.uint64) * np.uint64(2) + np.uint64(1)
+        self._perm_b = rng.randint(0, 1 << 62, size=num_perm, dtype=np.int64).astype(np.uint64)
+        self._seed = seed
+
+    @staticmethod
+    def normalize(content: str) -> str:
+        """Lowercase, trim and collapse whitespace."""
+        return " ".join(content.lower().split())
+
+    def _shingles(self, normalized: str) -> Set[str]:
+        words = normalized.split()
+        if self.shingle_size == 1:
+            return set(words)
+        return {
+            " ".join(words[i:i + self.shingle_size])
+            for i in range(max(1, len(words) - self.shingle_size + 1))
+        }
+
+    def _minhash(self, shingle_sets: List[Set[str]]) -> np.ndarray:
+        """
+        MinHash signatures, one row per (non-empty) shingle set.
+        
+        Per hash function, the minimum of h(x) over the shingle hashes x,
+        computed for blocks of sets at once with np.minimum.reduceat.
+        """
+        lengths = np.fromiter((len(shingles) for shingles in shingle_sets), dtype=np.int64, count=len(shingle_sets))
+        # Number distinct shingles once; the hash family then works on these ids
+        vocabulary: Dict[str, int] = {}
+        hashes = np.fromiter(
+            (vocabulary.setdefault(shingle, len(vocabulary)) for shingles in shingle_sets for shingle in shingles),
+            dtype=np.uint64,
+            count=int(lengths.sum())
+        )
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+        signatures = np.empty((len(shingle_sets), self.num_perm), dtype=np.uint64)
+
+        # Blocks of about a million hash values keep the temporary matrix small
+        rows_per_block = max(1, (1 << 20) // self.num_perm)
+        start = 0
+        while start < len(shingle_sets):
+            end = int(np.searchsorted(offsets, offsets[start] + rows_per_block, side="right")) - 1
+            end = min(len(shingle_sets), max(end, start + 1))
+            block = hashes[offsets[start]:offsets[end]]
+            # uint64 arithmetic wraps, i.e. computes a*x + b mod 2^64
+            permuted = (np.outer(block, self._perm_a) + self._perm_b) >> np.uint64(32)
+            signatures[start:end] = np.minimum.reduceat(permuted, offsets[start:end] - offsets[start], axis=0)
+            start = end
+        return signatures
+
+    @staticmethod
+    def _band_buckets(band_keys: np.ndarray) -> List[List[int]]:
+        """Group row positions sharing a key (ignoring singletons) by sorting."""
+        order = np.argsort(band_keys, kind="stable")
+        sorted_keys = band_keys[order]
+        same_as_next = sorted_keys[1:] == sorted_keys[:-1]
+        if not same_as_next.any():
+            return []
+        # Bucket starts are positions whose key differs from the previous one
+        starts = np.flatnonzero(np.concatenate(([True], ~same_as_next)))
+        ends = np.concatenate((starts[1:], [len(order)]))
+        shared = np.flatnonzero(ends - starts > 1)
+        return [order[starts[k]:ends[k]].tolist() for k in shared]
+
+    def _bucket_pairs(self, buckets: Iterable[List[int]]) -> Set[Tuple[int, int]]:
+        """Candidate pairs from LSH buckets, capping comparisons in oversized buckets."""
+        pairs = set()
+        for members in buckets:
+            if len(members) < 2:
+                continue
+            for position, i in enumerate(members):
+                for j in members[position + 1:position + 1 + self.max_bucket_comparisons]:
+                    pairs.add((i, j) if i < j else (j, i))
+        return pairs
+
+    def detect(self, memories: List[Memory], embeddings: Optional[MemoryEmbeddings] = None) -> DuplicateReport:
+        """
+        Find duplicate groups in memories and choose the memory kept in each.
+        
+        Embedding neighbours are looked up by row in ``embeddings`` when given,
+        otherwise in each memory's ``embedding`` list.
+        """
+        report = DuplicateReport()
+        if len(memories) < 2:
+            return report
+
+        normalized = [self.normalize(memory.content) for memory in memories]
+        union_find = _UnionFind(len(memories))
+
+        # Exact duplicates: identical normalized content
+        exact_groups: Dict[str, List[int]] = defaultdict(list)
+        for i, text in enumerate(normalized):
+            if len(text) >= 20:
+                exact_groups[hashlib.sha256(text.encode("utf-8")).hexdigest()].append(i)
+        for members in exact_groups.values():
+            for i in members[1:]:
+                union_find.union(members[0], i)
+
+        # One representative per exact group is enough for the near-duplicate passes
+        long_indices = [
+            members[0] for members in exact_groups.values()
+            if len(normalized[members[0]]) > self.min_length
+        ]
+
+        # Prefix and suffix containment: a string sorts right before the strings it prefixes
+        for key in (lambda i: normalized[i], lambda i: normalized[i][::-1]):
+            ordered = sorted(long_indices, key=key)
+            for a, b in zip(ordered, ordered[1:]):
+                if key(b).startswith(key(a)):
+                    union_find.union(a, b)
+
+        # Near duplicates: MinHash + LSH banding over shingle sets
+        shingle_sets = {}
+        for i in long_indices:
+            shingles = self._shingles(normalized[i])
+            if len(shingles) > self.min_words:
+                shingle_sets[i] = shingles
+        eligible = list(shingle_sets)
+
+        candidates = set()
+        if len(eligible) > 1:
+            signatures = self._minhash([shingle_sets[i] for i in eligible])
+            # Fold each band's rows into one 64-bit key (wrapping arithmetic is intended)
+            multipliers = np.random.RandomState(self._seed).randint(
+                1, 1 << 62, size=self.rows, dtype=np.int64
+            ).astype(np.uint64)
+            buckets = []
+            with np.errstate(over="ignore"):
+                for band in range(self.bands):
+                    band_keys = signatures[:, band * self.rows:(band + 1) * self.rows] @ multipliers
+                    buckets.extend(self._band_buckets(band_keys))
+            candidates = {
+                (eligible[a], eligible[b]) for a, b in self._bucket_pairs(buckets)
+            }
+        report.candidate_pairs = len(candidates)
+        for i, j in candidates:
+            if union_find.find(i) == union_find.find(j):
+                continue
+            first, second = shingle_sets[i], shingle_sets[j]
+            intersection = len(first & second)
+            if intersection / (len(first) + len(second) - intersection) >= self.jaccard_threshold:
+                union_find.union(i, j)
+            elif normalized[i] in normalized[j] or normalized[j] in normalized[i]:
+                union_find.union(i, j)
+
+        if self.embedding_threshold is not None:
+            report.candidate_pairs += self._link_embedding_neighbours(memories, long_indices, union_find, embeddings)
+
+        # Collect groups and keep the longest (then oldest) memory of each
+        groups: Dict[int, List[int]] = defaultdict(list)
+        for i in range(len(memories)):
+            groups[union_find.find(i)].append(i)
+
+        for members in groups.values():
+            if len(members) < 2:
+                continue
+            members.sort(key=lambda i: (-len(normalized[i]), memories[i].created_at or 0.0))
+            kept = memories[members[0]].content_hash
+            group = [kept]
+            for i in members[1:]:
+                content_hash = memories[i].content_hash
+                if content_hash == kept:
+                    continue
+                report.duplicates.add(content_hash)
+                report.kept_for[content_hash] = kept
+                group.append(content_hash)
+            if len(group) > 1:
+                report.groups.append(group)
+
+        logger.info(
+            f"Duplicate detection: {len(report.duplicates)} duplicates in {len(report.groups)} groups "
+            f"among {len(memories)} memories ({report.candidate_pairs} candidate pairs verified)"
+        )
+        return report
+
+    def _link_embedding_neighbours(
+        self,
+        memories: List[Memory],
+        indices: List[int],
+        union_find: _UnionFind,
+        embeddings: Optional[MemoryEmbeddings] = None
+    ) -> int:
+        """Random-hyperplane LSH over embeddings; verified pairs are unioned. Returns pairs checked."""
+        if embeddings is None:
+            embeddings = MemoryEmbeddings.from_memories([memories[i] for i in indices])
+        rows = embeddings.rows([memories[i] for i in indices])
+        with_embeddings = [i for i, row in zip(indices, rows) if row >= 0]
+        if len(with_embeddings) < 2 or embeddings.dimension == 0:
+            return 0
+        dimension = embeddings.dimension
+
+        matrix = np.asarray(embeddings.embeddings[rows[rows >= 0]], dtype=np.float32)
+        matrix /= np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+
+        # 16 bands of 12 hyperplane bits: similar vectors agree on all bits of some band
+        bands, bits_per_band = 16, 12
+        planes = np.random.RandomState(self._seed).standard_normal(
+            (dimension, bands * bits_per_band)
+        ).astype(np.float32)
+        bits = ((matrix @ planes) > 0).reshape(len(with_embeddings), bands, bits_per_band)
+        band_keys = bits.astype(np.int64) @ (1 << np.arange(bits_per_band, dtype=np.int64))
+
+        checked = 0
+        for band in range(bands):
+            for bucket in self._band_buckets(band_keys[:, band]):
+                # Verify whole buckets with one matrix product (in bounded windows)
+                for start in range(0, len(bucket), 2048):
+                    rows = bucket[start:start + 2048]
+                    if len(rows) < 2:
+                        continue
+                    similarities = matrix[rows] @ matrix[rows].T
+                    checked += len(rows) * (len(rows) - 1) // 2
+                    for a, b in zip(*np.nonzero(np.triu(similarities >= self.embedding_threshold, k=1))):
+                        union_find.union(with_embeddings[rows[a]], with_embeddings[rows[b]])
+        return checked
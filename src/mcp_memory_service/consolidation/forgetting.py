@@ -23,9 +23,11 @@ from dataclasses import dataclass
 from pathlib import Path
 import hashlib
 
+from .archive import ArchiveEntry, ForgettingArchive
 from .base import ConsolidationBase, ConsolidationConfig
-from .decay import RelevanceScore
-from ..models.memory import Memory
+from .decay import RelevanceScore, RelevanceScores
+from .dedup import DuplicateDetector, DuplicateReport
+from ..models.memory import Memory, MemoryEmbeddings
 
 @dataclass
 class ForgettingCandidate:
@@ -70,33 +72,59 @@ class ControlledForgettingEngine(ConsolidationBase):
         
         for archive_dir in [self.daily_archive, self.compressed_archive, self.metadata_archive]:
             archive_dir.mkdir(exist_ok=True)
+        
+        # 'sqlite' appends to one indexed archive database; 'json' keeps the
+        # original layout of one file per memory. The directories above stay
+        # so archives written in the json layout remain recoverable.
+        self.archive_format = getattr(config, 'archive_format', 'sqlite')
+        self.archive: Optional[ForgettingArchive] = None
+        if self.archive_format == 'sqlite':
+            self.archive = ForgettingArchive(str(self.archive_path / "forgetting_archive.db"))
+        
+        # Archive entries collected during process() and written as one batch
+        self._pending_entries: Optional[List[ArchiveEntry]] = None
+        
+        self.duplicate_detector = DuplicateDetector(
+            jaccard_threshold=getattr(config, 'duplicate_similarity_threshold', 0.8),
+            embedding_threshold=getattr(config, 'duplicate_embedding_threshold', None)
+        )
     
     async def process(self, memories: List[Memory], relevance_scores: List[RelevanceScore], **kwargs) -> List[ForgettingResult]:
         """Identify and process memories for controlled forgetting."""
         if not self._validate_memories(memories):
             return []
         
-        # Create score lookup
-        score_lookup = {score.memory_hash: score for score in relevance_scores}
+        # Create score lookup; columnar scores already index by hash
+        if isinstance(relevance_scores, RelevanceScores):
+            score_lookup = relevance_scores
+        else:
+            score_lookup = {score.memory_hash: score for score in relevance_scores}
         
         # Get access patterns from kwargs
         access_patterns = kwargs.get('access_patterns', {})
         time_horizon = kwargs.get('time_horizon', 'monthly')
+        embedding_set = kwargs.get('embeddings')
         
         # Identify forgetting candidates
         candidates = await self._identify_forgetting_candidates(
-            memories, score_lookup, access_patterns, time_horizon
+            memories, score_lookup, access_patterns, time_horizon, embedding_set
         )
         
         if not candidates:
             self.logger.info("No memories identified for forgetting")
             return []
         
-        # Process candidates
+        # Process candidates, writing their archive entries in one batch
         results = []
-        for candidate in candidates:
-            result = await self._process_forgetting_candidate(candidate)
-            results.append(result)
+        self._pending_entries = []
+        try:
+            for candidate in candidates:
+                result = await self._process_forgetting_candidate(candidate)
+                results.append(result)
+        finally:
+            pending, self._pending_entries = self._pending_entries, None
+            if self.archive is not None and pending:
+                self.archive.append(pending)
         
         # Log forgetting summary
         actions_summary = {}
@@ -112,12 +140,16 @@ class ControlledForgettingEngine(ConsolidationBase):
         memories: List[Memory],
         score_lookup: Dict[str, RelevanceScore],
         access_patterns: Dict[str, datetime],
-        time_horizon: str
+        time_horizon: str,
+        embedding_set: Optional[MemoryEmbeddings] = None
     ) -> List[ForgettingCandidate]:
         """Identify memories that are candidates for forgetting."""
         candidates = []
         current_time = datetime.now()
         
+        # Duplicate detection runs once over the whole set; lookups below are O(1)
+        duplicate_report = self._find_duplicates(memories, embedding_set)
+        
         for memory in memories:
             # Skip protected memories
             if self._is_protected_memory(memory):
@@ -166,7 +198,7 @@ class ControlledForgettingEngine(ConsolidationBase):
                 archive_priority = min(archive_priority, 2)
             
             # Duplicate content check
-            if self._appears_to_be_duplicate(memory, memories):
+            if memory.content_hash in duplicate_report:
                 forgetting_reasons.append("potential_duplicate")
                 can_be_deleted = True
                 archive_priority = 1
@@ -225,42 +257,18 @@ class ControlledForgettingEngine(ConsolidationBase):
         
         return False
     
+    def _find_duplicates(self, memories: List[Memory], embedding_set: Optional[MemoryEmbeddings] = None) -> DuplicateReport:
+        """Detect exact and near duplicates across memories in one pass."""
+        return self.duplicate_detector.detect(memories, embedding_set)
+    
     def _appears_to_be_duplicate(self, memory: Memory, all_memories: List[Memory]) -> bool:
-        """Check if memory appears to be a duplicate of another memory."""
-        content = memory.content.strip().lower()
-        
-        # Skip very short content for duplicate detection
-        if len(content) < 20:
-            return False
+        """
+        Check if memory duplicates another memory that would be kept.
         
-        for other_memory in all_memories:
-            if other_memory.content_hash == memory.content_hash:
-                continue
-            
-            other_content = other_memory.content.strip().lower()
-            
-            # Exact match
-            if content == other_content:
-                return True
-            
-            # Very similar content (simple check)
-            if len(content) > 50 and len(other_content) > 50:
-                # Check if one is a substring of the other with high overlap
-                if content in other_content or other_content in content:
-                    return True
-                
-                # Check word overlap
-                words1 = set(content.split())
-                words2 = set(other_content.split())
-                
-                if len(words1) > 5 and len(words2) > 5:
-                    overlap = len(words1.intersection(words2))
-                    union = len(words1.union(words2))
-                    
-                    if overlap / union > 0.8:  # 80% word overlap
-                        return True
-        
-        return False
+        Convenience for single lookups; runs full detection over all_memories,
+        so callers checking many memories should use _find_duplicates() once.
+        """
+        return memory.content_hash in self._find_duplicates(all_memories)
     
     async def _process_forgetting_candidate(self, candidate: ForgettingCandidate) -> ForgettingResult:
         """Process a single forgetting candidate."""
@@ -327,22 +335,27 @@ class ControlledForgettingEngine(ConsolidationBase):
         }
         
         # Write to archive
-        with open(archive_file, 'w', encoding='utf-8') as f:
-            json.dump(archive_data, f, indent=2, ensure_ascii=False)
-        
-        # Create metadata entry
-        await self._create_metadata_entry(memory, archive_file, 'archived')
+        metadata = {
+            'archive_priority': candidate.archive_priority,
+            'reasons': candidate.forgetting_reasons
+        }
+        if self.archive is not None:
+            archive_location = self._write_archive_entry(memory, 'archived', archive_data)
+        else:
+            with open(archive_file, 'w', encoding='utf-8') as f:
+                json.dump(archive_data, f, indent=2, ensure_ascii=False)
+            
+            # Create metadata entry
+            await self._create_metadata_entry(memory, archive_file, 'archived')
+            archive_location = str(archive_file)
+            metadata['file_size'] = archive_file.stat().st_size
         
         return ForgettingResult(
             memory_hash=memory.content_hash,
             action_taken='archived',
-            archive_path=str(archive_file),
+            archive_path=archive_location,
             compressed_version=None,
-            metadata={
-                'archive_priority': candidate.archive_priority,
-                'reasons': candidate.forgetting_reasons,
-                'file_size': archive_file.stat().st_size
-            }
+            metadata=metadata
         )
     
     async def _compress_memory(self, candidate: ForgettingCandidate) -> ForgettingResult:
@@ -375,20 +388,31 @@ class ControlledForgettingEngine(ConsolidationBase):
         )
         
         # Archive original for recovery
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        short_hash = memory.content_hash[:12]
-        archive_file = self.compressed_archive / f"original_{timestamp}_{short_hash}.json"
-        
-        with open(archive_file, 'w', encoding='utf-8') as f:
-            json.dump(memory.to_dict(), f, indent=2, ensure_ascii=False)
-        
-        # Create metadata entry
-        await self._create_metadata_entry(memory, archive_file, 'compressed')
+        if self.archive is not None:
+            archive_location = self._write_archive_entry(memory, 'compressed', {
+                'memory': memory.to_dict(),
+                'compression_metadata': {
+                    'reasons': candidate.forgetting_reasons,
+                    'compression_date': datetime.now().isoformat(),
+                    'compressed_hash': compressed_hash
+                }
+            })
+        else:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            short_hash = memory.content_hash[:12]
+            archive_file = self.compressed_archive / f"original_{timestamp}_{short_hash}.json"
+            
+            with open(archive_file, 'w', encoding='utf-8') as f:
+                json.dump(memory.to_dict(), f, indent=2, ensure_ascii=False)
+            
+            # Create metadata entry
+            await self._create_metadata_entry(memory, archive_file, 'compressed')
+            archive_location = str(archive_file)
         
         return ForgettingResult(
             memory_hash=memory.content_hash,
             action_taken='compressed',
-            archive_path=str(archive_file),
+            archive_path=archive_location,
             compressed_version=compressed_memory,
             metadata={
                 'original_length': len(original_content),
@@ -403,10 +427,6 @@ class ControlledForgettingEngine(ConsolidationBase):
         memory = candidate.memory
         
         # Always create a metadata backup before deletion
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        short_hash = memory.content_hash[:12]
-        backup_file = self.metadata_archive / f"deleted_{timestamp}_{short_hash}.json"
-        
         backup_data = {
             'memory': memory.to_dict(),
             'deletion_metadata': {
@@ -416,17 +436,25 @@ class ControlledForgettingEngine(ConsolidationBase):
             }
         }
         
-        with open(backup_file, 'w', encoding='utf-8') as f:
-            json.dump(backup_data, f, indent=2, ensure_ascii=False)
+        if self.archive is not None:
+            backup_location = self._write_archive_entry(memory, 'deleted', backup_data)
+        else:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            short_hash = memory.content_hash[:12]
+            backup_file = self.metadata_archive / f"deleted_{timestamp}_{short_hash}.json"
+            
+            with open(backup_file, 'w', encoding='utf-8') as f:
+                json.dump(backup_data, f, indent=2, ensure_ascii=False)
+            backup_location = str(backup_file)
         
         return ForgettingResult(
             memory_hash=memory.content_hash,
             action_taken='deleted',
-            archive_path=str(backup_file),
+            archive_path=backup_location,
             compressed_version=None,
             metadata={
                 'reasons': candidate.forgetting_reasons,
-                'backup_location': str(backup_file)
+                'backup_location': backup_location
             }
         )
     
@@ -478,6 +506,27 @@ class ControlledForgettingEngine(ConsolidationBase):
         
         return list(terms)[:10]  # Limit to 10 terms
     
+    def _write_archive_entry(self, memory: Memory, action: str, payload: Dict[str, Any]) -> str:
+        """
+        Record a memory in the archive database and return its location.
+        
+        Inside process() the entry joins the run's batch; direct calls
+        write it straight away.
+        """
+        entry = ArchiveEntry(
+            memory_hash=memory.content_hash,
+            action=action,
+            archived_at=datetime.now().isoformat(),
+            payload=payload,
+            memory_type=memory.memory_type,
+            content_length=len(memory.content)
+        )
+        if self._pending_entries is not None:
+            self._pending_entries.append(entry)
+        else:
+            self.archive.append([entry])
+        return f"{self.archive.path}#{memory.content_hash}"
+    
     async def _create_metadata_entry(self, memory: Memory, archive_path: Path, action: str):
         """Create a metadata entry for tracking archived/compressed memories."""
         metadata_file = self.metadata_archive / "forgetting_log.jsonl"
@@ -498,7 +547,12 @@ class ControlledForgettingEngine(ConsolidationBase):
     
     async def recover_memory(self, memory_hash: str) -> Optional[Memory]:
         """Recover a forgotten memory from archives."""
-        # Search through archive directories
+        if self.archive is not None:
+            entry = self.archive.latest(memory_hash)
+            if entry is not None and 'memory' in entry.payload:
+                return Memory.from_dict(entry.payload['memory'])
+        
+        # Search through archive directories written in the json layout
         for archive_dir in [self.daily_archive, self.compressed_archive]:
             for archive_file in archive_dir.glob("*.json"):
                 try:
@@ -517,6 +571,17 @@ class ControlledForgettingEngine(ConsolidationBase):
     
     async def get_forgetting_statistics(self) -> Dict[str, Any]:
         """Get statistics about forgetting operations."""
+        if self.archive is not None:
+            index = self.archive.statistics()
+            return {
+                'total_archived': index['counts'].get('archived', 0),
+                'total_compressed': index['counts'].get('compressed', 0),
+                'total_deleted': index['counts'].get('deleted', 0),
+                'archive_size_bytes': index['size_bytes'],
+                'oldest_archive': index['oldest'],
+                'newest_archive': index['newest']
+            }
+        
         stats = {
             'total_archived': 0,
             'total_compressed': 0,
@@ -349,7 +349,8 @@ class ConsolidationHealthMonitor:
     
     def record_consolidation_performance(self, time_horizon: str, duration: float, 
                                        memories_processed: int, success: bool, 
-                                       errors: List[str] = None):
+                                       errors: List[str] = None,
+                                       stages: List[Dict[str, Any]] = None):
         """Record performance metrics from a consolidation run."""
         entry = {
             'timestamp': datetime.now(),
@@ -358,7 +359,8 @@ class ConsolidationHealthMonitor:
             'memories_processed': memories_processed,
             'success': success,
             'errors': errors or [],
-            'memories_per_second': memories_processed / duration if duration > 0 else 0
+            'memories_per_second': memories_processed / duration if duration > 0 else 0,
+            'stages': stages or []
         }
         
         self.performance_history.append(entry)
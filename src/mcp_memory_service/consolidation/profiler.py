@@ -0,0 +1,226 @@
+# Copyright 2024 Heinrich Krupp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Per-stage profiling of consolidation runs."""
+
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    RESOURCE_AVAILABLE = False
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+# The profiler of the consolidation run executing in the current task
+current_profiler: ContextVar[Optional['PipelineProfiler']] = ContextVar('consolidation_profiler', default=None)
+
+def _peak_rss_bytes() -> int:
+    """Peak resident set size of this process so far (current RSS where no peak is available)."""
+    if RESOURCE_AVAILABLE:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Reported in bytes on macOS and in kilobytes elsewhere
+        return peak if sys.platform == 'darwin' else peak * 1024
+    if PSUTIL_AVAILABLE:
+        return psutil.Process().memory_info().rss
+    return 0
+
+@dataclass
+class StageSpan:
+    """One timed execution of a pipeline stage."""
+    name: str
+    start_seconds: float  # offset from the start of the run
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    rss_delta_bytes: int = 0  # growth of the process's peak RSS during the span
+    items: int = 0
+    storage_calls: int = 0
+
+@dataclass
+class PipelineProfile:
+    """Stage timings of one consolidation run."""
+    time_horizon: str
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    spans: List[StageSpan] = field(default_factory=list)
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Spans aggregated per stage, in pipeline order."""
+        stages: Dict[str, Dict[str, Any]] = {}
+        for span in self.spans:
+            stage = stages.setdefault(span.name, {
+                'stage': span.name,
+                'wall_seconds': 0.0,
+                'cpu_seconds': 0.0,
+                'rss_delta_bytes': 0,
+                'items': 0,
+                'storage_calls': 0
+            })
+            stage['wall_seconds'] += span.wall_seconds
+            stage['cpu_seconds'] += span.cpu_seconds
+            stage['rss_delta_bytes'] += span.rss_delta_bytes
+            stage['items'] += span.items
+            stage['storage_calls'] += span.storage_calls
+        return list(stages.values())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'time_horizon': self.time_horizon,
+            'wall_seconds': self.wall_seconds,
+            'cpu_seconds': self.cpu_seconds,
+            'stages': self.summary(),
+            'spans': [asdict(span) for span in self.spans]
+        }
+
+    def to_trace_events(self) -> Dict[str, Any]:
+        """
+        The run in Chrome trace-event format.
+
+        Loads in Perfetto, speedscope or chrome://tracing, which render it
+        as a flame chart with the per-stage counters attached to each span.
+        """
+        pid = os.getpid()
+        root = f"consolidate {self.time_horizon}"
+        events = [{
+            'name': root, 'cat': 'consolidation', 'ph': 'X',
+            'ts': 0, 'dur': int(self.wall_seconds * 1e6), 'pid': pid, 'tid': 1,
+            'args': {'cpu_seconds': self.cpu_seconds}
+        }]
+        for span in self.spans:
+            events.append({
+                'name': span.name, 'cat': 'consolidation', 'ph': 'X',
+                'ts': int(span.start_seconds * 1e6), 'dur': int(span.wall_seconds * 1e6),
+                'pid': pid, 'tid': 1,
+                'args': {
+                    'cpu_seconds': span.cpu_seconds,
+                    'rss_delta_bytes': span.rss_delta_bytes,
+                    'items': span.items,
+                    'storage_calls': span.storage_calls
+                }
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def to_collapsed_stacks(self) -> str:
+        """
+        The run as collapsed stacks (``frame;frame weight``, weights in µs).
+
+        The input format of flamegraph.pl and inferno; time outside any
+        stage is attributed to the root frame.
+        """
+        root = f"consolidate_{self.time_horizon}"
+        lines = []
+        for stage in self.summary():
+            lines.append(f"{root};{stage['stage']} {int(stage['wall_seconds'] * 1e6)}")
+        unattributed = self.wall_seconds - sum(span.wall_seconds for span in self.spans)
+        if unattributed > 0:
+            lines.append(f"{root} {int(unattributed * 1e6)}")
+        return "\n".join(lines) + "\n"
+
+    def export_trace(self, path: str) -> str:
+        """Write the trace-event JSON to ``path``; returns the path written."""
+        path = os.path.expanduser(path)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_trace_events(), f)
+        return path
+
+class PipelineProfiler:
+    """
+    Records stage spans for one consolidation run.
+
+    Use ``with profiler.stage(name) as span`` around each stage; set
+    ``span.items`` inside the block. Storage calls made through a
+    ProfiledStorage while the run's profiler is current are counted on the
+    innermost open span.
+    """
+
+    def __init__(self, time_horizon: str):
+        self.profile = PipelineProfile(time_horizon=time_horizon)
+        self._started = time.perf_counter()
+        self._cpu_started = time.process_time()
+        self._open: List[StageSpan] = []
+
+    @contextmanager
+    def stage(self, name: str, items: int = 0) -> Iterator[StageSpan]:
+        span = StageSpan(name=name, start_seconds=time.perf_counter() - self._started, items=items)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        rss_start = _peak_rss_bytes()
+        self._open.append(span)
+        try:
+            yield span
+        finally:
+            self._open.remove(span)
+            span.wall_seconds = time.perf_counter() - wall_start
+            span.cpu_seconds = time.process_time() - cpu_start
+            span.rss_delta_bytes = max(0, _peak_rss_bytes() - rss_start)
+            self.profile.spans.append(span)
+
+    def count_storage_call(self) -> None:
+        if self._open:
+            self._open[-1].storage_calls += 1
+
+    def finish(self) -> PipelineProfile:
+        """Close the run and return its profile."""
+        self.profile.wall_seconds = time.perf_counter() - self._started
+        self.profile.cpu_seconds = time.process_time() - self._cpu_started
+        self.profile.spans.sort(key=lambda span: span.start_seconds)
+        return self.profile
+
+@contextmanager
+def profile_stage(name: str, items: int = 0) -> Iterator[Optional[StageSpan]]:
+    """A span on the current run's profiler, or a no-op outside a profiled run."""
+    profiler = current_profiler.get()
+    if profiler is None:
+        yield None
+        return
+    with profiler.stage(name, items) as span:
+        yield span
+
+class ProfiledStorage:
+    """
+    Storage wrapper that counts calls for the current run's profiler.
+
+    Attribute lookups are delegated, so capability checks with
+    ``hasattr``/``getattr`` see exactly what the wrapped storage offers.
+    """
+
+    def __init__(self, storage: Any):
+        self._storage = storage
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._storage, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        def counted(*args, **kwargs):
+            profiler = current_profiler.get()
+            if profiler is not None:
+                profiler.count_storage_call()
+            return attr(*args, **kwargs)
+        return counted
@@ -32,6 +32,7 @@ except ImportError:
 
 from .consolidator import DreamInspiredConsolidator
 from .base import ConsolidationConfig
+from .worker import ConsolidationWorker
 
 class ConsolidationScheduler:
     """
@@ -52,6 +53,12 @@ class ConsolidationScheduler:
         self.enabled = enabled
         self.logger = logging.getLogger(__name__)
         
+        # With execution_mode='process', jobs run in a worker process so they
+        # cannot block the event loop serving requests
+        self.worker: Optional[ConsolidationWorker] = None
+        if getattr(consolidator.config, 'execution_mode', 'inline') == 'process':
+            self.worker = ConsolidationWorker(consolidator)
+        
         # Job execution tracking
         self.job_history = []
         self.last_execution_times = {}
@@ -232,7 +239,10 @@ class ConsolidationScheduler:
         
         try:
             # Run the consolidation
-            report = await self.consolidator.consolidate(time_horizon)
+            if self.worker is not None:
+                report = await self.worker.run(time_horizon)
+            else:
+                report = await self.consolidator.consolidate(time_horizon)
             
             # Record successful execution
             self.execution_stats['successful_jobs'] += 1
@@ -361,6 +371,8 @@ class ConsolidationScheduler:
             'running': self.scheduler.running,
             'jobs': job_info,
             'execution_stats': self.execution_stats.copy(),
+            'execution_mode': 'process' if self.worker is not None else 'inline',
+            'running_stages': dict(self.worker.active_stages) if self.worker is not None else {},
             'last_execution_times': {
                 horizon: time.isoformat() for horizon, time in self.last_execution_times.items()
             },
@@ -0,0 +1,204 @@
+# Copyright 2024 Heinrich Krupp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Persistent state for incremental consolidation runs."""
+
+import os
+import sqlite3
+import threading
+from typing import Iterable, List, Optional, Set, Tuple
+from dataclasses import dataclass
+
+import numpy as np
+
+@dataclass
+class ClusterCentroid:
+    """A stored cluster centroid that new memories can be assigned to."""
+    cluster_id: str
+    time_horizon: str
+    centroid: np.ndarray
+    size: int
+
+class ConsolidationState:
+    """
+    Watermarks, cluster centroids and known association pairs for consolidation.
+
+    Kept in a small SQLite file next to the consolidation archive so it works
+    with any storage backend. Each horizon records the ``updated_at`` up to
+    which memories have been processed; the next run only loads memories
+    changed after it. Association pairs live in an indexed table so duplicate
+    checks no longer need to load every association memory.
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.expanduser(path)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Consolidation runs one horizon at a time; the lock only guards
+        # against the scheduler and a manual run overlapping
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._create_tables()
+
+    def _create_tables(self) -> None:
+        with self._lock:
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS watermarks (
+                    time_horizon TEXT PRIMARY KEY,
+                    last_updated_at REAL NOT NULL,
+                    last_run_at REAL NOT NULL
+                )
+            ''')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS cluster_centroids (
+                    cluster_id TEXT PRIMARY KEY,
+                    time_horizon TEXT NOT NULL,
+                    centroid BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_cluster_centroids_horizon ON cluster_centroids(time_horizon)'
+            )
+            # Pairs are stored with hash_a < hash_b; the primary key serves
+            # lookups by the first hash and the index lookups by the second
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS association_pairs (
+                    hash_a TEXT NOT NULL,
+                    hash_b TEXT NOT NULL,
+                    PRIMARY KEY (hash_a, hash_b)
+                ) WITHOUT ROWID
+            ''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_association_pairs_b ON association_pairs(hash_b)')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS state_flags (
+                    name TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            ''')
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # Watermarks
+
+    def get_watermark(self, time_horizon: str) -> Optional[float]:
+        """The ``updated_at`` up to which this horizon has processed memories, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT last_updated_at FROM watermarks WHERE time_horizon = ?', (time_horizon,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_watermark(self, time_horizon: str, last_updated_at: float, run_at: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO watermarks (time_horizon, last_updated_at, last_run_at) VALUES (?, ?, ?)',
+                (time_horizon, last_updated_at, run_at)
+            )
+            self._conn.commit()
+
+    def reset(self, time_horizon: Optional[str] = None) -> None:
+        """Forget watermarks and centroids (for one horizon or all) so the next run is a full one."""
+        with self._lock:
+            if time_horizon is None:
+                self._conn.execute('DELETE FROM watermarks')
+                self._conn.execute('DELETE FROM cluster_centroids')
+            else:
+                self._conn.execute('DELETE FROM watermarks WHERE time_horizon = ?', (time_horizon,))
+                self._conn.execute('DELETE FROM cluster_centroids WHERE time_horizon = ?', (time_horizon,))
+            self._conn.commit()
+
+    # Cluster centroids
+
+    def reset_centroids(self, time_horizon: str) -> None:
+        """Drop the stored centroids of a horizon before a full run replaces them."""
+        with self._lock:
+            self._conn.execute('DELETE FROM cluster_centroids WHERE time_horizon = ?', (time_horizon,))
+            self._conn.commit()
+
+    def get_centroids(self, time_horizon: str) -> List[ClusterCentroid]:
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT cluster_id, centroid, size FROM cluster_centroids WHERE time_horizon = ? ORDER BY cluster_id',
+                (time_horizon,)
+            ).fetchall()
+        return [
+            ClusterCentroid(
+                cluster_id=cluster_id,
+                time_horizon=time_horizon,
+                centroid=np.frombuffer(blob, dtype=np.float32).copy(),
+                size=size
+            )
+            for cluster_id, blob, size in rows
+        ]
+
+    def save_centroids(self, centroids: Iterable[ClusterCentroid], updated_at: float) -> None:
+        rows = [
+            (c.cluster_id, c.time_horizon, np.asarray(c.centroid, dtype=np.float32).tobytes(), int(c.size), updated_at)
+            for c in centroids
+        ]
+        with self._lock:
+            self._conn.executemany('''
+                INSERT OR REPLACE INTO cluster_centroids (cluster_id, time_horizon, centroid, size, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', rows)
+            self._conn.commit()
+
+    # Association pairs
+
+    @staticmethod
+    def _ordered(pair: Tuple[str, str]) -> Tuple[str, str]:
+        a, b = pair
+        return (a, b) if a <= b else (b, a)
+
+    def add_association_pairs(self, pairs: Iterable[Tuple[str, str]]) -> None:
+        rows = [self._ordered(pair) for pair in pairs if pair[0] != pair[1]]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany('INSERT OR IGNORE INTO association_pairs (hash_a, hash_b) VALUES (?, ?)', rows)
+            self._conn.commit()
+
+    def get_association_pairs(self, content_hashes: Iterable[str]) -> Set[Tuple[str, str]]:
+        """Known pairs that involve any of ``content_hashes``, as sorted tuples."""
+        hashes = list(dict.fromkeys(content_hashes))
+        pairs = set()
+        with self._lock:
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start:start + 500]
+                placeholders = ",".join("?" for _ in chunk)
+                pairs.update(self._conn.execute(f'''
+                    SELECT hash_a, hash_b FROM association_pairs WHERE hash_a IN ({placeholders})
+                    UNION
+                    SELECT hash_a, hash_b FROM association_pairs WHERE hash_b IN ({placeholders})
+                ''', chunk + chunk).fetchall())
+        return pairs
+
+    # Flags
+
+    def get_flag(self, name: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM state_flags WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    def set_flag(self, name: str, value: str) -> None:
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO state_flags (name, value) VALUES (?, ?)', (name, value))
+            self._conn.commit()
@@ -0,0 +1,408 @@
+# Copyright 2024 Heinrich Krupp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Worker process execution for consolidation jobs."""
+
+import asyncio
+import dataclasses
+import functools
+import itertools
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from .base import (
+    ConsolidationConfig, ConsolidationReport, ConsolidationProcessingError,
+    ConsolidationCancelledError, current_checkpoint
+)
+from .consolidator import DreamInspiredConsolidator
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    # Not available on Windows; CPU and memory ceilings are then not enforced
+    RESOURCE_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Storage methods the consolidator uses. Reads go to the worker's own
+# connection when it has one; everything else is executed by the parent.
+READ_METHODS = (
+    'get_all_memories',
+    'get_memories_by_time_range',
+    'get_memories_with_embeddings',
+    'get_memory_connections',
+    'get_access_patterns',
+    'get_relevance_scores'
+)
+WRITE_METHODS = (
+    'store_memory',
+    'update_memory',
+    'delete_memory',
+    'update_memories_metadata',
+    'update_relevance_scores'
+)
+
+LATENCY_PROBE_SECONDS = 0.1  # event-loop lag is sampled at this interval
+RESUME_AFTER_PROBES = 5  # calm probes in a row before a paused worker resumes
+WORKER_NICENESS = 10  # workers run at lower CPU priority where supported
+CHECKPOINT_INTERVAL_SECONDS = 0.05  # how often a worker looks for pause/cancel mid-stage
+
+async def open_sqlite_vec_reader(db_path: str):
+    """Open a read-only sqlite-vec storage for a worker process."""
+    from ..storage.sqlite_vec import SqliteVecMemoryStorage
+    storage = SqliteVecMemoryStorage(db_path)
+    await storage.initialize_read_only()
+    return storage
+
+def default_reader_factory(storage) -> Optional[Callable[[], Awaitable[Any]]]:
+    """
+    A picklable factory for the worker's own read connection.
+
+    Returns None for backends without a read-only mode; the worker then
+    routes its reads through the parent as well.
+    """
+    if hasattr(storage, 'initialize_read_only') and getattr(storage, 'db_path', None):
+        return functools.partial(open_sqlite_vec_reader, storage.db_path)
+    return None
+
+class _WorkerChannel:
+    """Worker end of the pipe: storage calls, progress reports and pause/cancel requests."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.paused = False
+        self.cancelled = False
+        self._call_ids = itertools.count()
+        self._last_check = 0.0
+
+    def _handle_control(self, message) -> bool:
+        if message[0] == 'pause':
+            self.paused = True
+            return True
+        if message[0] == 'resume':
+            self.paused = False
+            return True
+        if message[0] == 'cancel':
+            self.cancelled = True
+            return True
+        return False
+
+    def _wait_while_paused(self) -> None:
+        """Apply pending control messages, block while paused and stop once cancelled."""
+        try:
+            while self.conn.poll():
+                self._handle_control(self.conn.recv())
+            while self.paused and not self.cancelled:
+                self._handle_control(self.conn.recv())
+        except EOFError:
+            # The parent has gone away; nobody is left to receive the result
+            self.cancelled = True
+        if self.cancelled:
+            raise ConsolidationCancelledError("Consolidation job was cancelled")
+        self._last_check = time.monotonic()
+
+    def checkpoint(self) -> None:
+        """Called between units of work inside a stage; polls the pipe at most every CHECKPOINT_INTERVAL_SECONDS."""
+        if time.monotonic() - self._last_check >= CHECKPOINT_INTERVAL_SECONDS:
+            self._wait_while_paused()
+
+    def call(self, method: str, *args, **kwargs) -> Any:
+        """Run a storage method in the parent and wait for its result."""
+        self.conn.send(('call', next(self._call_ids), method, args, kwargs))
+        while True:
+            message = self.conn.recv()
+            if self._handle_control(message):
+                continue
+            kind, _, payload = message
+            if kind == 'result':
+                return payload
+            raise RuntimeError(f"Storage call {method} failed in the parent process: {payload}")
+
+    async def progress(self, stage: str, details: Dict[str, Any]) -> None:
+        """Report a stage to the parent, then block while the parent has asked us to pause."""
+        self.conn.send(('progress', stage, details))
+        self._wait_while_paused()
+
+class WorkerStorage:
+    """
+    The storage a consolidator sees inside a worker process.
+
+    Only methods the parent's storage actually has are exposed, so the
+    consolidator's capability checks (``hasattr``/``getattr``) behave as
+    they would in-process; capability flags are copied from the parent.
+    """
+
+    def __init__(self, channel: _WorkerChannel, methods: Set[str], reader=None, honours_metadata_touch: bool = True):
+        self._channel = channel
+        self._methods = set(methods)
+        self._reader = reader
+        self.honours_metadata_touch = honours_metadata_touch
+
+    def __getattr__(self, name: str):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name in READ_METHODS and self._reader is not None and hasattr(self._reader, name):
+            return getattr(self._reader, name)
+        if name in self._methods:
+            async def forward(*args, **kwargs):
+                return self._channel.call(name, *args, **kwargs)
+            return forward
+        raise AttributeError(name)
+
+def _apply_limits(config: ConsolidationConfig) -> None:
+    """Lower the worker's priority and apply its CPU-time and memory ceilings."""
+    if hasattr(os, 'nice'):
+        try:
+            os.nice(WORKER_NICENESS)
+        except OSError as e:
+            logger.debug(f"Could not lower consolidation worker priority: {e}")
+
+    cpu_seconds = getattr(config, 'worker_cpu_seconds', 0)
+    memory_mb = getattr(config, 'worker_memory_mb', 0)
+    if not RESOURCE_AVAILABLE:
+        if cpu_seconds or memory_mb:
+            logger.warning("Resource limits are not supported on this platform; worker runs unbounded")
+        return
+
+    try:
+        if cpu_seconds > 0:
+            # The soft limit raises SIGXCPU; the hard limit a few seconds later kills
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 5))
+        if memory_mb > 0:
+            limit = memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ValueError, OSError) as e:
+        logger.warning(f"Could not apply consolidation worker limits: {e}")
+
+async def _run_worker(conn, config, time_horizon, kwargs, methods, reader_factory, honours_metadata_touch=True) -> ConsolidationReport:
+    channel = _WorkerChannel(conn)
+    # The parent records the run and writes its trace once the report is back
+    config = dataclasses.replace(config, profile_trace_dir=None)
+    reader = await reader_factory() if reader_factory is not None else None
+    # Only now: RLIMIT_AS counts every mapping, and importing the storage
+    # backend (torch, sentence-transformers) maps far more than the job uses
+    _apply_limits(config)
+    storage = WorkerStorage(channel, methods, reader, honours_metadata_touch)
+    consolidator = DreamInspiredConsolidator(storage, config)
+    consolidator.progress_callback = channel.progress
+    current_checkpoint.set(channel.checkpoint)
+    try:
+        return await consolidator.consolidate(time_horizon, **kwargs)
+    finally:
+        if consolidator.state is not None:
+            consolidator.state.close()
+        if reader is not None and hasattr(reader, 'close'):
+            reader.close()
+
+def _worker_main(conn, config, time_horizon, kwargs, methods, reader_factory, log_level, honours_metadata_touch=True) -> None:
+    """Entry point of the worker process."""
+    # stdout may carry the MCP protocol; keep anything printed in the worker off it
+    sys.stdout = sys.stderr
+    logging.basicConfig(
+        level=log_level,
+        stream=sys.stderr,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    try:
+        report = asyncio.run(_run_worker(
+            conn, config, time_horizon, kwargs, methods, reader_factory, honours_metadata_touch
+        ))
+        conn.send(('done', report))
+    except Exception as e:
+        try:
+            conn.send(('failed', f"{type(e).__name__}: {e}"))
+        except Exception:
+            pass
+    finally:
+        conn.close()
+
+class ConsolidationWorker:
+    """
+    Runs consolidation jobs in a separate process.
+
+    CPU-heavy stages (clustering, associations, compression) then no longer
+    block the event loop serving MCP/HTTP requests. The worker reads through
+    its own read-only connection where the backend supports one; all writes
+    are sent back over a pipe and executed by this process's storage, so the
+    single-writer model of the backends is preserved.
+
+    Progress is reported at every pipeline stage. With
+    ``worker_max_latency_ms`` set, this process samples its own event-loop
+    lag and asks the worker to pause while the lag stays above the ceiling;
+    the worker honours pause and cancel at stage boundaries and at the
+    checkpoints inside the clustering and association loops. Cancelling
+    ``run()`` cancels the job. ``worker_cpu_seconds`` and
+    ``worker_memory_mb`` cap the worker through resource limits (POSIX only).
+    Messages to the worker are sent from the default executor, so large
+    results never block this process's event loop.
+    """
+
+    def __init__(
+        self,
+        consolidator: DreamInspiredConsolidator,
+        reader_factory: Optional[Callable[[], Awaitable[Any]]] = None,
+        progress_callback: Optional[Callable[[str, str, Dict[str, Any]], Awaitable[None]]] = None
+    ):
+        self.consolidator = consolidator
+        self.config = consolidator.config
+        self.reader_factory = reader_factory if reader_factory is not None else default_reader_factory(consolidator.storage)
+        self.progress_callback = progress_callback
+        self.max_latency_ms = getattr(self.config, 'worker_max_latency_ms', 0)
+        self.logger = logging.getLogger(__name__)
+
+        # Current stage of each running job, and how often workers were paused
+        self.active_stages: Dict[str, str] = {}
+        self.pause_count = 0
+        self._send_lock = threading.Lock()
+
+    def _storage_methods(self) -> Set[str]:
+        storage = self.consolidator.storage
+        return {name for name in READ_METHODS + WRITE_METHODS if callable(getattr(storage, name, None))}
+
+    async def run(self, time_horizon: str, **kwargs) -> ConsolidationReport:
+        """Run one consolidation job in a worker process and return its report."""
+        loop = asyncio.get_running_loop()
+        # spawn, not fork: the parent runs database and executor threads
+        context = multiprocessing.get_context('spawn')
+        parent_conn, child_conn = context.Pipe()
+        process = context.Process(
+            target=_worker_main,
+            args=(
+                child_conn, self.config, time_horizon, kwargs,
+                self._storage_methods(), self.reader_factory, logging.getLogger().level,
+                getattr(self.consolidator.storage, 'honours_metadata_touch', True)
+            ),
+            name=f"consolidation-{time_horizon}",
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        self.logger.info(f"Started {time_horizon} consolidation worker (pid {process.pid})")
+
+        throttle = None
+        if self.max_latency_ms > 0:
+            throttle = asyncio.create_task(self._throttle(parent_conn, time_horizon))
+
+        try:
+            report = await self._serve(parent_conn, process, time_horizon)
+        except asyncio.CancelledError:
+            try:
+                self._send_locked(parent_conn, ('cancel',))
+            except (OSError, ValueError):
+                pass
+            raise
+        finally:
+            if throttle is not None:
+                throttle.cancel()
+                try:
+                    await throttle
+                except asyncio.CancelledError:
+                    pass
+            self.active_stages.pop(time_horizon, None)
+            parent_conn.close()
+            await loop.run_in_executor(None, process.join, 5)
+            if process.is_alive():
+                process.terminate()
+
+        self.consolidator._update_consolidation_stats(report)
+        self.consolidator._record_profile(report)
+        self.consolidator._record_performance(report, report.errors)
+        return report
+
+    async def _serve(self, conn, process, time_horizon: str) -> ConsolidationReport:
+        """Answer the worker's storage calls until it reports a result or dies."""
+        loop = asyncio.get_running_loop()
+        while True:
+            ready = await loop.run_in_executor(None, conn.poll, LATENCY_PROBE_SECONDS)
+            if not ready:
+                if not process.is_alive():
+                    raise ConsolidationProcessingError(self._exit_reason(process.exitcode))
+                continue
+
+            try:
+                message = await loop.run_in_executor(None, conn.recv)
+            except EOFError:
+                await loop.run_in_executor(None, process.join, 5)
+                raise ConsolidationProcessingError(self._exit_reason(process.exitcode))
+
+            kind = message[0]
+            if kind == 'call':
+                await self._handle_call(conn, *message[1:])
+            elif kind == 'progress':
+                _, stage, details = message
+                self.active_stages[time_horizon] = stage
+                self.logger.info(f"{time_horizon} consolidation worker: {stage} {details}")
+                if self.progress_callback is not None:
+                    await self.progress_callback(time_horizon, stage, details)
+            elif kind == 'done':
+                return message[1]
+            elif kind == 'failed':
+                raise ConsolidationProcessingError(f"Consolidation worker failed: {message[1]}")
+
+    def _send_locked(self, conn, message) -> None:
+        # Call results and throttle messages may be sent from different executor threads
+        with self._send_lock:
+            conn.send(message)
+
+    async def _send(self, conn, message) -> None:
+        """Pickle and write a message off the event loop; results can be whole memory sets."""
+        await asyncio.get_running_loop().run_in_executor(None, self._send_locked, conn, message)
+
+    async def _handle_call(self, conn, call_id: int, method: str, args: tuple, kwargs: Dict[str, Any]) -> None:
+        if method not in READ_METHODS + WRITE_METHODS:
+            await self._send(conn, ('error', call_id, f"Storage method {method} is not available to workers"))
+            return
+        try:
+            result = await getattr(self.consolidator.storage, method)(*args, **kwargs)
+        except Exception as e:
+            await self._send(conn, ('error', call_id, f"{type(e).__name__}: {e}"))
+            return
+        await self._send(conn, ('result', call_id, result))
+
+    async def _throttle(self, conn, time_horizon: str) -> None:
+        """Pause the worker while this process's event loop lags more than the ceiling."""
+        paused = False
+        calm_probes = 0
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(LATENCY_PROBE_SECONDS)
+            lag_ms = (time.perf_counter() - started - LATENCY_PROBE_SECONDS) * 1000
+
+            if lag_ms > self.max_latency_ms:
+                calm_probes = 0
+                if not paused:
+                    await self._send(conn, ('pause',))
+                    paused = True
+                    self.pause_count += 1
+                    self.logger.info(f"Pausing {time_horizon} consolidation worker: event loop lag {lag_ms:.0f}ms")
+            elif paused:
+                calm_probes += 1
+                if calm_probes >= RESUME_AFTER_PROBES:
+                    await self._send(conn, ('resume',))
+                    paused = False
+                    self.logger.info(f"Resuming {time_horizon} consolidation worker")
+
+    def _exit_reason(self, exitcode: Optional[int]) -> str:
+        sigxcpu = getattr(signal, 'SIGXCPU', None)
+        if exitcode is not None and sigxcpu is not None and exitcode == -sigxcpu:
+            return f"Consolidation worker exceeded its CPU-time limit of {self.config.worker_cpu_seconds}s"
+        return f"Consolidation worker exited unexpectedly (exit code {exitcode})"
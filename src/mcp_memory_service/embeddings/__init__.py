@@ -6,10 +6,12 @@ from .onnx_embeddings import (
     ONNX_AVAILABLE,
     TOKENIZERS_AVAILABLE
 )
+from .cache import EmbeddingCache
 
 __all__ = [
     'ONNXEmbeddingModel',
     'get_onnx_embedding_model',
     'ONNX_AVAILABLE',
-    'TOKENIZERS_AVAILABLE'
+    'TOKENIZERS_AVAILABLE',
+    'EmbeddingCache'
 ]
\ No newline at end of file
@@ -0,0 +1,360 @@
+# Copyright 2024 Heinrich Krupp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Bounded embedding cache shared by the storage backends.
+
+Embeddings are kept in memory in an LRU bounded by entry count and by bytes,
+keyed by a SHA-256 of the model name and the text so keys are stable across
+processes and never mix models. An optional persistent tier stores entries in
+an SQLite side table, so hot queries survive a restart without re-embedding.
+Async callers use aget(), aput_many() and aget_stats(), which do their
+persistent-tier I/O in a worker thread.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Approximate per-entry overhead (key string, array header, dict slot)
+_ENTRY_OVERHEAD_BYTES = 200
+
+# Recency of persistent hits is written back in batches of this many keys
+_TOUCH_FLUSH_ENTRIES = 256
+
+
+class EmbeddingCache:
+    """
+    Thread-safe LRU cache for text embeddings.
+
+    Vectors are stored as packed float64 arrays: values round-trip exactly and
+    take a fraction of the memory of a list of Python floats.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        max_entries: int = 10000,
+        max_bytes: int = 64 * 1024 * 1024,
+        persist_path: Optional[str] = None,
+        persist_max_entries: int = 100000
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            model_name: Embedding model name, part of every cache key
+            max_entries: Maximum number of in-memory entries
+            max_bytes: Maximum approximate size of the in-memory entries
+            persist_path: SQLite file for the persistent tier (None disables it)
+            persist_max_entries: Maximum number of persisted entries
+        """
+        self.model_name = model_name
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max(1, max_bytes)
+        self.persist_path = persist_path
+        self.persist_max_entries = persist_max_entries
+
+        self._entries: "OrderedDict[str, array]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._persistent_hits = 0
+        self._persist_writes = 0
+
+        # The persistent tier has its own lock so disk reads never hold up in-memory hits
+        self._persist_conn: Optional[sqlite3.Connection] = None
+        self._persist_lock = threading.Lock()
+        self._touched: Dict[str, float] = {}
+        if persist_path:
+            self._open_persistent_tier(persist_path)
+
+    @classmethod
+    def from_env(cls, model_name: str) -> "EmbeddingCache":
+        """
+        Create a cache configured from environment variables.
+
+        MCP_EMBEDDING_CACHE_SIZE: maximum in-memory entries (default 10000)
+        MCP_EMBEDDING_CACHE_MAX_MB: maximum in-memory size in MB (default 64)
+        MCP_EMBEDDING_CACHE_PATH: SQLite file enabling the persistent tier (default unset)
+        """
+        return cls(
+            model_name,
+            max_entries=int(os.environ.get("MCP_EMBEDDING_CACHE_SIZE", "10000")),
+            max_bytes=int(float(os.environ.get("MCP_EMBEDDING_CACHE_MAX_MB", "64")) * 1024 * 1024),
+            persist_path=os.environ.get("MCP_EMBEDDING_CACHE_PATH") or None
+        )
+
+    @staticmethod
+    def make_key(model_name: str, text: str) -> str:
+        """Stable cache key for a text embedded with a given model."""
+        return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def _open_persistent_tier(self, path: str) -> None:
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS embedding_cache (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    embedding BLOB NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_embedding_cache_last_used ON embedding_cache(last_used)')
+            conn.commit()
+            self._persist_conn = conn
+            logger.info(f"Persistent embedding cache enabled at {path}")
+        except sqlite3.Error as e:
+            logger.warning(f"Could not open persistent embedding cache at {path}: {e}")
+            self._persist_conn = None
+
+    def _remember(self, key: str, vector: array) -> None:
+        """Insert into the in-memory LRU and evict down to the bounds (lock held)."""
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old.itemsize * len(old) + _ENTRY_OVERHEAD_BYTES
+        self._entries[key] = vector
+        self._bytes += vector.itemsize * len(vector) + _ENTRY_OVERHEAD_BYTES
+
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.itemsize * len(evicted) + _ENTRY_OVERHEAD_BYTES
+            self._evictions += 1
+
+    def _load_persisted(self, key: str) -> Optional[array]:
+        """Look a key up in the persistent tier."""
+        with self._persist_lock:
+            if self._persist_conn is None:
+                return None
+            try:
+                row = self._persist_conn.execute(
+                    'SELECT embedding FROM embedding_cache WHERE key = ?', (key,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"Persistent embedding cache read failed: {e}")
+                return None
+            if row is None:
+                return None
+            # Refresh recency so entries used across restarts survive pruning
+            self._touched[key] = time.time()
+            if len(self._touched) >= _TOUCH_FLUSH_ENTRIES:
+                self._flush_touched()
+                self._commit_persisted()
+        vector = array("d")
+        vector.frombytes(row[0])
+        return vector
+
+    def _flush_touched(self) -> None:
+        """Write pending last_used updates (persist lock held, caller commits)."""
+        if not self._touched:
+            return
+        try:
+            self._persist_conn.executemany(
+                'UPDATE embedding_cache SET last_used = ? WHERE key = ?',
+                [(used, key) for key, used in self._touched.items()]
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"Persistent embedding cache recency update failed: {e}")
+        self._touched.clear()
+
+    def _commit_persisted(self) -> None:
+        try:
+            self._persist_conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Persistent embedding cache commit failed: {e}")
+
+    def _get_in_memory(self, key: str) -> Optional[List[float]]:
+        """In-memory lookup; a miss is counted once the persistent tier has been checked."""
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return vector.tolist()
+
+    def _get_persisted(self, key: str) -> Optional[List[float]]:
+        """Persistent-tier lookup after an in-memory miss."""
+        vector = self._load_persisted(key)
+        with self._lock:
+            if vector is None:
+                self._misses += 1
+                return None
+            self._remember(key, vector)
+            self._hits += 1
+            self._persistent_hits += 1
+            return vector.tolist()
+
+    def get(self, text: str) -> Optional[List[float]]:
+        """Return the cached embedding for text, or None."""
+        key = self.make_key(self.model_name, text)
+        cached = self._get_in_memory(key)
+        if cached is not None:
+            return cached
+        return self._get_persisted(key)
+
+    async def aget(self, text: str) -> Optional[List[float]]:
+        """Like get(), but a persistent-tier read runs in a worker thread instead of the event loop."""
+        key = self.make_key(self.model_name, text)
+        cached = self._get_in_memory(key)
+        if cached is not None:
+            return cached
+        if self._persist_conn is None:
+            return self._get_persisted(key)  # only counts the miss
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._get_persisted, key)
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Return cached embeddings for texts, None for each miss."""
+        return [self.get(text) for text in texts]
+
+    def put(self, text: str, embedding: Sequence[float]) -> None:
+        """Cache an embedding for text."""
+        self.put_many([(text, embedding)])
+
+    def put_many(self, items: Sequence[Any]) -> None:
+        """Cache several (text, embedding) pairs, persisting them in one transaction."""
+        if items:
+            self._persist(self._remember_many(items))
+
+    async def aput_many(self, items: Sequence[Any]) -> None:
+        """Like put_many(), but the persistent-tier write runs in a worker thread instead of the event loop."""
+        if not items:
+            return
+        rows = self._remember_many(items)
+        if self._persist_conn is not None:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._persist, rows)
+
+    def _remember_many(self, items: Sequence[Any]) -> List[tuple]:
+        """Add (text, embedding) pairs to the in-memory LRU; returns their persistent-tier rows."""
+        rows = []
+        now = time.time()
+        with self._lock:
+            for text, embedding in items:
+                key = self.make_key(self.model_name, text)
+                vector = array("d", embedding)
+                self._remember(key, vector)
+                rows.append((key, self.model_name, vector.tobytes(), now))
+        return rows
+
+    def _persist(self, rows: List[tuple]) -> None:
+        """Write rows to the persistent tier in one transaction, pruning it now and then."""
+        with self._persist_lock:
+            if self._persist_conn is not None:
+                try:
+                    # Pending recency updates ride along in this transaction
+                    self._flush_touched()
+                    self._persist_conn.executemany(
+                        'INSERT OR REPLACE INTO embedding_cache (key, model, embedding, last_used) VALUES (?, ?, ?, ?)',
+                        rows
+                    )
+                    self._persist_writes += len(rows)
+                    # Prune occasionally rather than on every write
+                    if self._persist_writes >= max(1, self.persist_max_entries // 10):
+                        self._persist_writes = 0
+                        self._persist_conn.execute('''
+                            DELETE FROM embedding_cache WHERE key NOT IN (
+                                SELECT key FROM embedding_cache ORDER BY last_used DESC LIMIT ?
+                            )
+                        ''', (self.persist_max_entries,))
+                    self._persist_conn.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"Persistent embedding cache write failed: {e}")
+
+    def __contains__(self, text: str) -> bool:
+        with self._lock:
+            return self.make_key(self.model_name, text) in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self, persistent: bool = False) -> None:
+        """Drop the in-memory entries and reset counters; optionally empty the persistent tier too."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._hits = self._misses = self._evictions = self._persistent_hits = 0
+        if persistent:
+            with self._persist_lock:
+                if self._persist_conn is not None:
+                    self._touched.clear()
+                    try:
+                        self._persist_conn.execute('DELETE FROM embedding_cache')
+                        self._persist_conn.commit()
+                    except sqlite3.Error as e:
+                        logger.warning(f"Failed to clear persistent embedding cache: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Cache statistics: size, bounds and hit/miss/eviction counters."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            stats = {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+                "persistent": self._persist_conn is not None
+            }
+            if self._persist_conn is not None:
+                stats["persistent_hits"] = self._persistent_hits
+        with self._persist_lock:
+            if self._persist_conn is not None:
+                try:
+                    stats["persistent_entries"] = self._persist_conn.execute(
+                        'SELECT COUNT(*) FROM embedding_cache'
+                    ).fetchone()[0]
+                except sqlite3.Error:
+                    stats["persistent_entries"] = None
+        return stats
+
+    async def aget_stats(self) -> Dict[str, Any]:
+        """Like get_stats(), with the persistent-tier count run in a worker thread."""
+        if self._persist_conn is None:
+            return self.get_stats()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.get_stats)
+
+    def close(self) -> None:
+        """Flush pending recency updates and close the persistent tier. The in-memory entries stay usable."""
+        with self._persist_lock:
+            if self._persist_conn is not None:
+                self._flush_touched()
+                self._commit_persisted()
+                try:
+                    self._persist_conn.close()
+                except sqlite3.Error:
+                    pass
+                self._persist_conn = None
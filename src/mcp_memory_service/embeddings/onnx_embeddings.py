@@ -13,6 +13,8 @@ from pathlib import Path
 from typing import List, Optional, Union
 import numpy as np
 
+from ..utils.system_detection import get_system_info
+
 logger = logging.getLogger(__name__)
 
 # Try to import ONNX Runtime
@@ -55,14 +57,29 @@ class ONNXEmbeddingModel:
         "https://chroma-onnx-models.s3.amazonaws.com/all-MiniLM-L6-v2/onnx.tar.gz"
     )
     _MODEL_SHA256 = "913d7300ceae3b2dbc2c50d1de4baacab4be7b9380491c27fab7418616a16ec3"
+    # all-MiniLM-L6-v2 was trained on sequences of at most 256 word pieces
+    MAX_SEQ_LENGTH = 256
+    DEFAULT_BATCH_SIZE = 32
     
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2", preferred_providers: Optional[List[str]] = None):
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        preferred_providers: Optional[List[str]] = None,
+        max_seq_length: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        intra_op_threads: Optional[int] = None
+    ):
         """
         Initialize ONNX embedding model.
         
         Args:
             model_name: Name of the model (currently only all-MiniLM-L6-v2 supported)
             preferred_providers: List of ONNX execution providers in order of preference
+            max_seq_length: Token limit; longer inputs are truncated (default MAX_SEQ_LENGTH)
+            batch_size: Default number of texts per inference run
+                (MCP_ONNX_BATCH_SIZE, default DEFAULT_BATCH_SIZE)
+            intra_op_threads: ONNX Runtime intra-op threads (MCP_ONNX_INTRA_OP_THREADS,
+                default from system_detection's optimal thread count)
         """
         if not ONNX_AVAILABLE:
             raise ImportError("ONNX Runtime is required but not installed. Install with: pip install onnxruntime")
@@ -74,6 +91,12 @@ class ONNXEmbeddingModel:
         self._preferred_providers = preferred_providers or ['CPUExecutionProvider']
         self._model = None
         self._tokenizer = None
+        self._input_names = set()
+        self.max_seq_length = max_seq_length or self.MAX_SEQ_LENGTH
+        self.batch_size = batch_size or int(os.environ.get("MCP_ONNX_BATCH_SIZE", str(self.DEFAULT_BATCH_SIZE)))
+        self.intra_op_threads = intra_op_threads or int(
+            os.environ.get("MCP_ONNX_INTRA_OP_THREADS", "0")
+        ) or get_system_info().get_optimal_thread_count()
         
         # Download model if needed
         self._download_model_if_needed()
@@ -132,26 +155,57 @@ class ONNXEmbeddingModel:
             raise FileNotFoundError(f"Tokenizer not found at {tokenizer_path}")
         
         # Initialize ONNX session
-        logger.info(f"Loading ONNX model with providers: {self._preferred_providers}")
+        logger.info(
+            f"Loading ONNX model with providers: {self._preferred_providers}, "
+            f"intra-op threads: {self.intra_op_threads}"
+        )
         self._model = ort.InferenceSession(
             str(model_path),
+            sess_options=self._create_session_options(),
             providers=self._preferred_providers
         )
+        self._input_names = {model_input.name for model_input in self._model.get_inputs()}
         
-        # Initialize tokenizer
+        # Initialize tokenizer: truncate to the model limit (keeping [CLS]/[SEP]);
+        # padding is done per sub-batch in encode()
         self._tokenizer = Tokenizer.from_file(str(tokenizer_path))
+        self._tokenizer.enable_truncation(max_length=self.max_seq_length)
+        self._tokenizer.no_padding()
         
         # Get model info
         self.embedding_dimension = self._model.get_outputs()[0].shape[-1]
         logger.info(f"ONNX model loaded. Embedding dimension: {self.embedding_dimension}")
     
-    def encode(self, texts: Union[str, List[str]], convert_to_numpy: bool = True) -> np.ndarray:
+    def _create_session_options(self) -> "ort.SessionOptions":
+        """Session options: full graph optimization and an explicit thread budget."""
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = self.intra_op_threads
+        # A single sequential graph gains nothing from inter-op parallelism
+        options.inter_op_num_threads = 1
+        return options
+    
+    def encode(
+        self,
+        texts: Union[str, List[str]],
+        convert_to_numpy: bool = True,
+        batch_size: Optional[int] = None,
+        **kwargs
+    ) -> np.ndarray:
         """
         Generate embeddings for texts using ONNX model.
         
+        Texts are tokenized (and truncated to max_seq_length) in one call, sorted
+        by token length and run in sub-batches of batch_size, so each batch is
+        only padded to the longest text in its own length bucket. Results are
+        returned in input order.
+        
         Args:
             texts: Single text or list of texts to encode
             convert_to_numpy: Whether to return numpy array (always True for compatibility)
+            batch_size: Texts per inference run (default self.batch_size)
+            **kwargs: Accepted for SentenceTransformer.encode() compatibility and ignored
             
         Returns:
             Numpy array of embeddings with shape (n_texts, embedding_dim)
@@ -159,16 +213,32 @@ class ONNXEmbeddingModel:
         if isinstance(texts, str):
             texts = [texts]
         
+        embeddings = np.zeros((len(texts), self.embedding_dimension), dtype=np.float32)
+        if not texts:
+            return embeddings
+        
+        batch_size = max(1, batch_size or self.batch_size)
+        
         # Tokenize texts
         encoded = self._tokenizer.encode_batch(texts)
+        lengths = np.array([len(enc.ids) for enc in encoded])
         
-        # Prepare inputs for ONNX model
+        # Length buckets: consecutive runs of the length-sorted order
+        order = np.argsort(lengths, kind="stable")
+        for start in range(0, len(order), batch_size):
+            indices = order[start:start + batch_size]
+            embeddings[indices] = self._encode_batch([encoded[i] for i in indices])
+        
+        return embeddings
+    
+    def _encode_batch(self, encoded) -> np.ndarray:
+        """Run one padded batch of tokenized texts through the model and mean-pool."""
         max_length = max(len(enc.ids) for enc in encoded)
         
         # Pad sequences
-        input_ids = np.zeros((len(texts), max_length), dtype=np.int64)
-        attention_mask = np.zeros((len(texts), max_length), dtype=np.int64)
-        token_type_ids = np.zeros((len(texts), max_length), dtype=np.int64)
+        input_ids = np.zeros((len(encoded), max_length), dtype=np.int64)
+        attention_mask = np.zeros((len(encoded), max_length), dtype=np.int64)
+        token_type_ids = np.zeros((len(encoded), max_length), dtype=np.int64)
         
         for i, enc in enumerate(encoded):
             length = len(enc.ids)
@@ -180,8 +250,9 @@ class ONNXEmbeddingModel:
         ort_inputs = {
             "input_ids": input_ids,
             "attention_mask": attention_mask,
-            "token_type_ids": token_type_ids,
         }
+        if not self._input_names or "token_type_ids" in self._input_names:
+            ort_inputs["token_type_ids"] = token_type_ids
         
         outputs = self._model.run(None, ort_inputs)
         
@@ -195,9 +266,8 @@ class ONNXEmbeddingModel:
         embeddings = sum_embeddings / sum_mask
         
         # Normalize embeddings
-        embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
-        
-        return embeddings
+        norms = np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), a_min=1e-12, a_max=None)
+        return embeddings / norms
     
     @property
     def device(self):
@@ -25,6 +25,7 @@ documentation, knowledge bases, and other content for semantic retrieval.
 from .base import DocumentLoader, DocumentChunk, IngestionResult
 from .chunker import TextChunker
 from .registry import get_loader_for_file, register_loader, SUPPORTED_FORMATS, is_supported_file
+from .pipeline import IngestionPipeline, PipelineResult
 
 # Import loaders to trigger registration
 from . import text_loader
@@ -38,5 +39,7 @@ __all__ = [
     'get_loader_for_file',
     'register_loader',
     'SUPPORTED_FORMATS',
-    'is_supported_file'
+    'is_supported_file',
+    'IngestionPipeline',
+    'PipelineResult'
 ]
\ No newline at end of file
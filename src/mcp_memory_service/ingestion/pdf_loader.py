@@ -17,8 +17,11 @@ PDF document loader for extracting text content from PDF files.
 """
 
 import logging
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import closing
 from pathlib import Path
-from typing import AsyncGenerator, Dict, Any, Optional
+from typing import AsyncGenerator, Callable, Dict, Any, Iterator, Optional, Tuple
 import asyncio
 
 from .base import DocumentLoader, DocumentChunk
@@ -26,6 +29,9 @@ from .chunker import TextChunker, ChunkingStrategy
 
 logger = logging.getLogger(__name__)
 
+# Pages extracted ahead of the chunker; bounds memory regardless of document size
+DEFAULT_PAGE_WINDOW = 8
+
 # Try to import PDF processing library
 try:
     import PyPDF2
@@ -42,6 +48,56 @@ except ImportError:
     logger.debug("pdfplumber not available, falling back to PyPDF2")
 
 
+async def _stream_from_thread(
+    produce: Callable[[], Iterator[Any]],
+    max_buffered: int
+) -> AsyncGenerator[Any, None]:
+    """
+    Run a blocking generator in a worker thread and yield its items as they arrive.
+    
+    At most max_buffered items wait in the queue; beyond that the worker blocks
+    until the consumer catches up. If the consumer stops early, the worker is
+    told to stop and the generator is closed.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, max_buffered))
+    stop = threading.Event()
+    
+    def put(message: Tuple[str, Any]) -> bool:
+        future = asyncio.run_coroutine_threadsafe(queue.put(message), loop)
+        while True:
+            try:
+                future.result(timeout=0.1)
+                return True
+            except FutureTimeoutError:
+                if stop.is_set():
+                    future.cancel()
+                    return False
+    
+    def worker():
+        try:
+            with closing(produce()) as items:
+                for item in items:
+                    if stop.is_set() or not put(("item", item)):
+                        return
+            put(("done", None))
+        except Exception as e:
+            put(("error", e))
+    
+    worker_future = loop.run_in_executor(None, worker)
+    try:
+        while True:
+            kind, value = await queue.get()
+            if kind == "done":
+                break
+            if kind == "error":
+                raise value
+            yield value
+    finally:
+        stop.set()
+        await worker_future
+
+
 class PDFLoader(DocumentLoader):
     """
     Document loader for PDF files.
@@ -51,16 +107,18 @@ class PDFLoader(DocumentLoader):
     - PyPDF2 (fallback): Basic text extraction
     """
     
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200, page_window: int = DEFAULT_PAGE_WINDOW):
         """
         Initialize PDF loader.
         
         Args:
             chunk_size: Target size for text chunks in characters
             chunk_overlap: Number of characters to overlap between chunks
+            page_window: Maximum pages extracted ahead of the chunker
         """
         super().__init__(chunk_size, chunk_overlap)
         self.supported_extensions = ['pdf']
+        self.page_window = page_window
         self.chunker = TextChunker(ChunkingStrategy(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
@@ -103,6 +161,7 @@ class PDFLoader(DocumentLoader):
                 - extract_images: Whether to extract image descriptions (default: False)
                 - extract_tables: Whether to extract table content (default: False)
                 - page_range: Tuple of (start, end) pages to extract (1-indexed)
+                - page_window: Pages extracted ahead of the chunker (default: self.page_window)
             
         Yields:
             DocumentChunk objects containing extracted text and metadata
@@ -119,18 +178,19 @@ class PDFLoader(DocumentLoader):
         extract_images = kwargs.get('extract_images', False)
         extract_tables = kwargs.get('extract_tables', False)
         page_range = kwargs.get('page_range', None)
+        page_window = kwargs.get('page_window', self.page_window)
         
         logger.info(f"Extracting chunks from PDF: {file_path} using {self.backend}")
         
         try:
             if self.backend == 'pdfplumber':
                 async for chunk in self._extract_with_pdfplumber(
-                    file_path, extract_images, extract_tables, page_range
+                    file_path, extract_images, extract_tables, page_range, page_window
                 ):
                     yield chunk
             else:
                 async for chunk in self._extract_with_pypdf2(
-                    file_path, page_range
+                    file_path, page_range, page_window
                 ):
                     yield chunk
                     
@@ -143,16 +203,20 @@ class PDFLoader(DocumentLoader):
         file_path: Path, 
         extract_images: bool,
         extract_tables: bool,
-        page_range: Optional[tuple]
+        page_range: Optional[tuple],
+        page_window: int = DEFAULT_PAGE_WINDOW
     ) -> AsyncGenerator[DocumentChunk, None]:
         """
         Extract text using pdfplumber backend.
         
+        Pages are extracted in a worker thread and chunked as they arrive.
+        
         Args:
             file_path: Path to PDF file
             extract_images: Whether to extract image descriptions
             extract_tables: Whether to extract table content
             page_range: Optional page range to extract
+            page_window: Maximum pages extracted ahead of the chunker
             
         Yields:
             DocumentChunk objects
@@ -184,17 +248,18 @@ class PDFLoader(DocumentLoader):
                         if images:
                             text += f"\n\n[IMAGES: {len(images)} images found on this page]"
                     
+                    # pdfplumber caches parsed page objects; release them as we go
+                    if hasattr(page, 'close'):
+                        page.close()
+                    
                     if text.strip():
                         yield (page_num + 1, text.strip())
         
-        # Run extraction in thread pool to avoid blocking
-        loop = asyncio.get_event_loop()
-        page_generator = await loop.run_in_executor(None, lambda: list(_extract_sync()))
-        
         base_metadata = self.get_base_metadata(file_path)
         chunk_index = 0
         
-        for page_num, page_text in page_generator:
+        # Stream pages from a worker thread so chunks are yielded while later pages parse
+        async for page_num, page_text in _stream_from_thread(_extract_sync, page_window):
             page_metadata = base_metadata.copy()
             page_metadata.update({
                 'page_number': page_num,
@@ -217,14 +282,18 @@ class PDFLoader(DocumentLoader):
     async def _extract_with_pypdf2(
         self, 
         file_path: Path,
-        page_range: Optional[tuple]
+        page_range: Optional[tuple],
+        page_window: int = DEFAULT_PAGE_WINDOW
     ) -> AsyncGenerator[DocumentChunk, None]:
         """
         Extract text using PyPDF2 backend.
         
+        Pages are extracted in a worker thread and chunked as they arrive.
+        
         Args:
             file_path: Path to PDF file
             page_range: Optional page range to extract
+            page_window: Maximum pages extracted ahead of the chunker
             
         Yields:
             DocumentChunk objects
@@ -244,14 +313,11 @@ class PDFLoader(DocumentLoader):
                     if text.strip():
                         yield (page_num + 1, text.strip())
         
-        # Run extraction in thread pool
-        loop = asyncio.get_event_loop()
-        page_generator = await loop.run_in_executor(None, lambda: list(_extract_sync()))
-        
         base_metadata = self.get_base_metadata(file_path)
         chunk_index = 0
         
-        for page_num, page_text in page_generator:
+        # Stream pages from a worker thread so chunks are yielded while later pages parse
+        async for page_num, page_text in _stream_from_thread(_extract_sync, page_window):
             page_metadata = base_metadata.copy()
             page_metadata.update({
                 'page_number': page_num,
@@ -0,0 +1,595 @@
+# Copyright 2024 Heinrich Krupp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Staged pipeline for ingesting many documents at once.
+
+Three stages run concurrently, connected by bounded queues so a fast stage
+waits for a slow one instead of buffering a whole directory in memory:
+
+1. Parse: DocumentLoader.extract_chunks() runs in a process pool, one file
+   per task, so PDF parsing uses all available cores. Chunks stream back in
+   bounded batches while the file is still being parsed.
+2. Embed: chunks from any number of files are grouped into batches and
+   embedded together (when the storage backend exposes generate_embeddings()).
+3. Write: a single writer hands each batch to storage.store_batch(), which
+   stores it in one transaction.
+
+With incremental=True (and a backend providing an ingestion manifest), files
+whose size and mtime match the manifest are skipped without being opened,
+and changed files only have their new chunks stored and their stale chunks
+deleted.
+"""
+
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .base import DocumentChunk
+from .registry import get_loader_for_file
+from ..config import INGESTION_WORKERS
+from ..models.memory import Memory
+
+logger = logging.getLogger(__name__)
+
+# Builds the memory stored for a chunk; returning None skips the chunk
+MemoryFactory = Callable[[Path, DocumentChunk], Optional[Memory]]
+
+# Called after every stored batch with the running totals
+ProgressCallback = Callable[["PipelineResult"], Awaitable[None]]
+
+_DONE = object()
+
+
+@dataclass
+class FileProgress:
+    """Per-file counters."""
+    chunks_processed: int = 0
+    chunks_stored: int = 0
+    chunks_unchanged: int = 0
+    chunks_removed: int = 0
+    unchanged: bool = False
+    error: Optional[str] = None
+
+
+@dataclass
+class PipelineResult:
+    """
+    Outcome of a pipeline run.
+
+    Attributes:
+        total_files: Number of files handed to the pipeline
+        files_parsed: Files whose parse stage has finished (successfully or not)
+        chunks_processed: Chunks extracted from all files
+        chunks_stored: Chunks successfully stored
+        errors: Error messages (file or chunk level)
+        files: Counters per file
+        processing_time: Wall time in seconds
+        files_unchanged: Files skipped because the manifest showed no change
+        chunks_unchanged: Chunks of changed files whose stored memory was kept
+        chunks_removed: Stale chunk memories deleted from changed files
+        files_purged: Manifest entries (and memories) removed for deleted files
+    """
+    total_files: int
+    files_parsed: int = 0
+    chunks_processed: int = 0
+    chunks_stored: int = 0
+    errors: List[str] = field(default_factory=list)
+    files: Dict[Path, FileProgress] = field(default_factory=dict)
+    processing_time: float = 0.0
+    files_unchanged: int = 0
+    chunks_unchanged: int = 0
+    chunks_removed: int = 0
+    files_purged: int = 0
+
+    @property
+    def files_processed(self) -> int:
+        """Files that are fully represented in storage: stored chunks, kept chunks or unchanged."""
+        return sum(
+            1 for progress in self.files.values()
+            if progress.chunks_stored > 0 or progress.chunks_unchanged > 0 or progress.unchanged
+        )
+
+    @property
+    def files_failed(self) -> int:
+        return self.total_files - self.files_processed
+
+    @property
+    def success_rate(self) -> float:
+        if self.chunks_processed == 0:
+            return 0.0
+        return (self.chunks_stored / self.chunks_processed) * 100
+
+
+def _hash_file(path: Path) -> str:
+    """SHA-256 of a file's bytes, read in 1 MB blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _chunk_digest(content: str) -> str:
+    """Identity of a chunk's text, independent of per-run metadata such as extracted_at."""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def _parse_file(
+    file_path: str,
+    chunk_size: int,
+    out: Any,
+    batch_size: int,
+    hash_file: bool = False,
+    known_hash: Optional[str] = None
+) -> None:
+    """
+    Extract the chunks of one file into ``out``. Runs in a worker process.
+
+    Chunks are put on the queue in lists of at most batch_size as they are
+    extracted, so a large PDF is never held or pickled whole; the last item
+    is ``(None, error, file_hash)``. Errors are reported rather than raised
+    so one unreadable file never takes down the pool. With hash_file, the
+    file hash is computed first, and if it equals known_hash the file is not
+    parsed.
+    """
+    path = Path(file_path)
+    file_hash = None
+    error = None
+    try:
+        if hash_file:
+            file_hash = _hash_file(path)
+        if known_hash is None or file_hash != known_hash:
+            loader = get_loader_for_file(path)
+            if loader is None:
+                error = "Unsupported format"
+            else:
+                loader.chunk_size = chunk_size
+
+                async def stream():
+                    batch = []
+                    async for chunk in loader.extract_chunks(path):
+                        batch.append(chunk)
+                        if len(batch) >= batch_size:
+                            out.put((batch, None, None))
+                            batch = []
+                    if batch:
+                        out.put((batch, None, None))
+
+                asyncio.run(stream())
+    except Exception as e:
+        error = str(e)
+    out.put((None, error, file_hash))
+
+
+def _next_batch(out: Any, parsing: Future) -> Tuple[Optional[List[DocumentChunk]], Optional[str], Optional[str]]:
+    """Wait for the next item _parse_file puts on ``out``, or report a parser that died without one."""
+    while True:
+        try:
+            return out.get(timeout=0.1)
+        except queue.Empty:
+            if not parsing.done():
+                continue
+        # Everything a finished parser put is already queued
+        try:
+            return out.get_nowait()
+        except queue.Empty:
+            error = parsing.exception() if not parsing.cancelled() else None
+            return None, str(error) if error else "Parser exited without a result", None
+
+
+def _abandon(out: Any, parsing: Optional[Future]) -> None:
+    """Keep draining a file nobody reads any more, so its parser can't block on a full queue."""
+    if parsing is None or parsing.done():
+        return
+
+    def drain():
+        while not parsing.done():
+            try:
+                out.get(timeout=0.1)
+            except Exception:
+                pass
+
+    threading.Thread(target=drain, name="ingestion-drain", daemon=True).start()
+
+
+@dataclass
+class _FileState:
+    """Incremental bookkeeping for one file during a run."""
+    key: str
+    size: int
+    mtime_ns: int
+    old_chunks: Dict[str, str]
+    new_chunks: Dict[str, str] = field(default_factory=dict)
+    file_hash: Optional[str] = None
+    pending: int = 0
+    parsed: bool = False
+    complete: bool = True
+
+
+class IngestionPipeline:
+    """
+    Parse, embed and store a set of files with overlapping stages.
+
+    Usage:
+        pipeline = IngestionPipeline(storage, memory_factory, workers=4)
+        result = await pipeline.run(files, chunk_size=1000)
+    """
+
+    def __init__(
+        self,
+        storage: Any,
+        memory_factory: MemoryFactory,
+        workers: Optional[int] = None,
+        batch_size: int = 100,
+        queue_size: Optional[int] = None,
+        progress_callback: Optional[ProgressCallback] = None,
+        incremental: bool = False,
+        purge_deleted: bool = False
+    ):
+        """
+        Initialize the pipeline.
+
+        Args:
+            storage: Initialized MemoryStorage backend
+            memory_factory: Builds the Memory for each (file, chunk)
+            workers: Parse processes (default MCP_INGESTION_WORKERS; 0 parses in a thread)
+            batch_size: Chunks per embedding batch and store_batch() call
+            queue_size: Maximum chunks buffered between parse and embed (default 4 batches)
+            progress_callback: Awaited after each stored batch with the running result
+            incremental: Use the storage ingestion manifest to skip unchanged files
+                and replace only the stale chunks of changed ones
+            purge_deleted: With incremental, delete the memories of manifest files
+                under the ingested directory that no longer exist on disk
+        """
+        self.storage = storage
+        self.memory_factory = memory_factory
+        self.workers = INGESTION_WORKERS if workers is None else max(0, workers)
+        self.batch_size = max(1, batch_size)
+        self.queue_size = queue_size or self.batch_size * 4
+        self.progress_callback = progress_callback
+        self.incremental = incremental
+        self.purge_deleted = purge_deleted
+        if incremental and not hasattr(storage, "get_ingestion_manifest"):
+            logger.info(f"{type(storage).__name__} has no ingestion manifest; ingesting all files")
+            self.incremental = False
+        self._states: Dict[Path, _FileState] = {}
+        self._manager = None
+
+    def _create_executor(self) -> Executor:
+        self._manager = None
+        if self.workers > 0:
+            try:
+                # spawn, not fork: the parent runs database and executor threads;
+                # chunks come back through queues served by a manager process
+                context = multiprocessing.get_context('spawn')
+                executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                self._manager = context.Manager()
+                return executor
+            except (OSError, NotImplementedError) as e:
+                logger.warning(f"Process pool unavailable ({e}), parsing in a thread instead")
+        return ThreadPoolExecutor(max_workers=1)
+
+    def _chunk_queue(self) -> Any:
+        """A bounded queue for one file's chunk batches, reachable from the parse executor."""
+        if self._manager is not None:
+            return self._manager.Queue(maxsize=2)
+        return queue.Queue(maxsize=2)
+
+    async def run(self, files: List[Path], chunk_size: int = 1000, root: Optional[Path] = None) -> PipelineResult:
+        """
+        Ingest files and return the combined result.
+
+        Args:
+            files: Files to ingest
+            chunk_size: Target chunk size passed to the loaders
+            root: Directory the files were collected from; required for purge_deleted
+        """
+        start_time = time.time()
+        files = [Path(file_path) for file_path in files]
+        result = PipelineResult(total_files=len(files))
+        result.files = {file_path: FileProgress() for file_path in files}
+        self._states = {}
+
+        if self.incremental:
+            files = await self._skip_unchanged(files, chunk_size, result)
+            if self.purge_deleted and root is not None:
+                await self._purge_deleted(Path(root), result)
+
+        if not files:
+            result.processing_time = time.time() - start_time
+            return result
+
+        chunk_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        # Two batches in flight: one being embedded while the previous one is written
+        batch_queue: asyncio.Queue = asyncio.Queue(maxsize=2)
+
+        self._chunk_size = chunk_size
+        executor = self._create_executor()
+        try:
+            parse_task = asyncio.create_task(self._parse_stage(files, chunk_size, executor, chunk_queue, result))
+            embed_task = asyncio.create_task(self._embed_stage(chunk_queue, batch_queue))
+            write_task = asyncio.create_task(self._write_stage(batch_queue, result))
+            stages = [parse_task, embed_task, write_task]
+            try:
+                await asyncio.gather(*stages)
+            except BaseException:
+                for task in stages:
+                    task.cancel()
+                await asyncio.gather(*stages, return_exceptions=True)
+                raise
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            if self._manager is not None:
+                self._manager.shutdown()
+                self._manager = None
+
+        result.processing_time = time.time() - start_time
+        logger.info(
+            f"Ingestion pipeline stored {result.chunks_stored}/{result.chunks_processed} chunks "
+            f"from {result.files_processed}/{result.total_files} files in {result.processing_time:.2f}s"
+            + (f" ({result.files_unchanged} unchanged, {result.chunks_removed} stale chunks removed)"
+               if self.incremental else "")
+        )
+        return result
+
+    async def _skip_unchanged(self, files: List[Path], chunk_size: int, result: PipelineResult) -> List[Path]:
+        """Compare files with the manifest by size and mtime; return the ones that need parsing."""
+        keys = {file_path: str(file_path.resolve()) for file_path in files}
+        manifest = await self.storage.get_ingestion_manifest(list(keys.values()))
+
+        to_parse = []
+        for file_path in files:
+            try:
+                stat = file_path.stat()
+            except OSError:
+                # Let the parse stage report the error
+                to_parse.append(file_path)
+                continue
+
+            entry = manifest.get(keys[file_path])
+            if (entry and entry["file_hash"] and entry["chunk_size"] == chunk_size
+                    and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns):
+                result.files[file_path].unchanged = True
+                result.files_unchanged += 1
+                result.files_parsed += 1
+                continue
+
+            self._states[file_path] = _FileState(
+                key=keys[file_path],
+                size=stat.st_size,
+                mtime_ns=stat.st_mtime_ns,
+                old_chunks=entry["chunks"] if entry else {},
+                # A touched but identical file is detected by hash without parsing it
+                file_hash=entry["file_hash"] if entry and entry["chunk_size"] == chunk_size else None
+            )
+            to_parse.append(file_path)
+        return to_parse
+
+    async def _purge_deleted(self, root: Path, result: PipelineResult) -> None:
+        """Delete memories and manifest entries of files under root that no longer exist."""
+        prefix = str(root.resolve()).rstrip(os.sep) + os.sep
+        manifest = await self.storage.get_ingestion_manifest(prefix=prefix)
+        deleted_paths = [path for path in manifest if not os.path.exists(path)]
+        if not deleted_paths:
+            return
+
+        hashes = [content_hash for path in deleted_paths for content_hash in manifest[path]["chunks"].values()]
+        result.chunks_removed += await self.storage.delete_many(hashes)
+        await self.storage.delete_ingestion_manifest(deleted_paths)
+        result.files_purged = len(deleted_paths)
+        logger.info(f"Purged {len(deleted_paths)} deleted files from the ingestion manifest")
+
+    async def _finalize_file(self, file_path: Path, result: PipelineResult) -> None:
+        """Once all of a changed file's chunks are written, drop stale chunks and record it."""
+        state = self._states[file_path]
+        progress = result.files[file_path]
+
+        stale = set(state.old_chunks.values()) - set(state.new_chunks.values())
+        if stale:
+            removed = await self.storage.delete_many(list(stale))
+            progress.chunks_removed += removed
+            result.chunks_removed += removed
+
+        # Without a file hash the next run re-parses the file and retries failed chunks
+        await self.storage.save_ingestion_manifest({
+            state.key: {
+                "size": state.size,
+                "mtime_ns": state.mtime_ns,
+                "file_hash": state.file_hash if state.complete else None,
+                "chunk_size": self._chunk_size,
+                "chunks": state.new_chunks
+            }
+        })
+
+    async def _parse_stage(
+        self,
+        files: List[Path],
+        chunk_size: int,
+        executor: Executor,
+        chunk_queue: asyncio.Queue,
+        result: PipelineResult
+    ) -> None:
+        """Parse files in the pool and feed memories to the embed stage as files complete."""
+        loop = asyncio.get_running_loop()
+        # Keep a bounded number of files in flight so parsed chunks can't pile up
+        in_flight = asyncio.Semaphore(max(1, self.workers) * 2)
+
+        async def parse_one(file_path: Path):
+            state = self._states.get(file_path)
+            progress = result.files[file_path]
+            async with in_flight:
+                emitted = 0
+                out = parsing = None
+                try:
+                    out = self._chunk_queue()
+                    parsing = executor.submit(
+                        _parse_file, str(file_path), chunk_size, out, self.batch_size,
+                        state is not None, state.file_hash if state else None
+                    )
+                    while True:
+                        chunks, error, file_hash = await loop.run_in_executor(readers, _next_batch, out, parsing)
+                        if chunks is None:
+                            break
+                        emitted += len(chunks)
+                        await self._queue_chunks(file_path, chunks, state, progress, chunk_queue, result)
+                except asyncio.CancelledError:
+                    _abandon(out, parsing)
+                    raise
+                except Exception as e:
+                    error, file_hash = str(e), None
+                    _abandon(out, parsing)
+
+                if error:
+                    progress.error = error
+                    result.errors.append(f"{file_path.name}: {error}")
+                    # Leave the manifest and existing memories of unreadable files alone
+                    self._states.pop(file_path, None)
+                    state = None
+                elif state is not None and not emitted and file_hash == state.file_hash:
+                    # Touched but identical: refresh size/mtime so the next run skips it
+                    progress.unchanged = True
+                    result.files_unchanged += 1
+                    state.new_chunks = dict(state.old_chunks)
+                elif state is not None:
+                    state.file_hash = file_hash
+                result.files_parsed += 1
+
+                if state is not None:
+                    state.parsed = True
+                    if state.pending == 0:
+                        await self._finalize_file(file_path, result)
+
+        # One thread per file in flight waits on that file's queue
+        readers = ThreadPoolExecutor(max_workers=max(1, self.workers) * 2)
+        try:
+            await asyncio.gather(*(parse_one(Path(file_path)) for file_path in files))
+        finally:
+            readers.shutdown(wait=False)
+        await chunk_queue.put(_DONE)
+
+    async def _queue_chunks(
+        self,
+        file_path: Path,
+        chunks: List[DocumentChunk],
+        state: Optional[_FileState],
+        progress: FileProgress,
+        chunk_queue: asyncio.Queue,
+        result: PipelineResult
+    ) -> None:
+        """Turn a batch of parsed chunks into memories for the embed stage."""
+        for chunk in chunks:
+            progress.chunks_processed += 1
+            result.chunks_processed += 1
+            digest = _chunk_digest(chunk.content)
+            if state is not None and digest in state.old_chunks:
+                # Same text as before: keep the stored memory
+                state.new_chunks[digest] = state.old_chunks[digest]
+                progress.chunks_unchanged += 1
+                result.chunks_unchanged += 1
+                continue
+            try:
+                memory = self.memory_factory(file_path, chunk)
+            except Exception as e:
+                result.errors.append(f"{file_path.name} chunk {chunk.chunk_index}: {str(e)}")
+                if state is not None:
+                    state.complete = False
+                continue
+            if memory is not None:
+                if state is not None:
+                    state.pending += 1
+                await chunk_queue.put((file_path, chunk.chunk_index, memory, digest))
+
+    async def _embed_stage(self, chunk_queue: asyncio.Queue, batch_queue: asyncio.Queue) -> None:
+        """Group chunks across files into batches and embed each batch in one call."""
+        generate_embeddings = getattr(self.storage, "generate_embeddings", None)
+        done = False
+        while not done:
+            item = await chunk_queue.get()
+            if item is _DONE:
+                break
+            batch = [item]
+            # Take whatever else is already parsed, up to a full batch
+            while len(batch) < self.batch_size:
+                try:
+                    item = chunk_queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if item is _DONE:
+                    done = True
+                    break
+                batch.append(item)
+
+            if generate_embeddings is not None:
+                memories = [item[2] for item in batch]
+                try:
+                    embeddings = await generate_embeddings([memory.content for memory in memories])
+                    for memory, embedding in zip(memories, embeddings):
+                        # Failed embeddings are left to store_batch() to retry and report
+                        if not isinstance(embedding, Exception):
+                            memory.embedding = embedding
+                except Exception as e:
+                    logger.warning(f"Batch embedding failed, deferring to store_batch(): {e}")
+
+            await batch_queue.put(batch)
+        await batch_queue.put(_DONE)
+
+    async def _write_stage(self, batch_queue: asyncio.Queue, result: PipelineResult) -> None:
+        """Single writer: store each batch in one store_batch() call."""
+        while True:
+            batch = await batch_queue.get()
+            if batch is _DONE:
+                break
+
+            try:
+                outcomes = await self.storage.store_batch([memory for _, _, memory, _ in batch])
+            except Exception as e:
+                outcomes = [(False, str(e))] * len(batch)
+
+            finished = []
+            for (file_path, chunk_index, memory, digest), (success, message) in zip(batch, outcomes):
+                if success:
+                    result.files[file_path].chunks_stored += 1
+                    result.chunks_stored += 1
+                else:
+                    result.errors.append(f"{file_path.name} chunk {chunk_index}: {message}")
+
+                state = self._states.get(file_path)
+                if state is not None:
+                    if success or message == "Duplicate content detected":
+                        # Either way a memory with this content hash is now stored
+                        state.new_chunks[digest] = memory.content_hash
+                    else:
+                        state.complete = False
+                    state.pending -= 1
+                    if state.parsed and state.pending == 0:
+                        finished.append(file_path)
+
+            for file_path in finished:
+                await self._finalize_file(file_path, result)
+
+            if self.progress_callback is not None:
+                try:
+                    await self.progress_callback(result)
+                except Exception as e:
+                    logger.debug(f"Ingestion progress callback failed: {e}")
@@ -39,7 +39,11 @@ from .config import (
     CONSOLIDATION_ENABLED, EMBEDDING_MODEL_NAME, INCLUDE_HOSTNAME,
     CLOUDFLARE_API_TOKEN, CLOUDFLARE_ACCOUNT_ID, CLOUDFLARE_VECTORIZE_INDEX,
     CLOUDFLARE_D1_DATABASE_ID, CLOUDFLARE_R2_BUCKET, CLOUDFLARE_EMBEDDING_MODEL,
-    CLOUDFLARE_LARGE_CONTENT_THRESHOLD, CLOUDFLARE_MAX_RETRIES, CLOUDFLARE_BASE_DELAY
+    CLOUDFLARE_LARGE_CONTENT_THRESHOLD, CLOUDFLARE_MAX_RETRIES, CLOUDFLARE_BASE_DELAY,
+    CLOUDFLARE_ROW_CACHE_SIZE, CLOUDFLARE_ROW_CACHE_TTL,
+    CLOUDFLARE_WRITE_BATCH_SIZE, CLOUDFLARE_WRITE_FLUSH_INTERVAL,
+    CLOUDFLARE_EMBEDDING_BATCH_SIZE, CLOUDFLARE_EMBEDDING_BATCH_WINDOW,
+    CLOUDFLARE_REQUESTS_PER_SECOND, CLOUDFLARE_REPLICA_PATH, CLOUDFLARE_REPLICA_MAX_STALENESS
 )
 from .storage.base import MemoryStorage
 
@@ -114,7 +118,16 @@ async def mcp_server_lifespan(server: FastMCP) -> AsyncIterator[MCPServerContext
             embedding_model=CLOUDFLARE_EMBEDDING_MODEL,
             large_content_threshold=CLOUDFLARE_LARGE_CONTENT_THRESHOLD,
             max_retries=CLOUDFLARE_MAX_RETRIES,
-            base_delay=CLOUDFLARE_BASE_DELAY
+            base_delay=CLOUDFLARE_BASE_DELAY,
+            row_cache_size=CLOUDFLARE_ROW_CACHE_SIZE,
+            row_cache_ttl=CLOUDFLARE_ROW_CACHE_TTL,
+            write_batch_size=CLOUDFLARE_WRITE_BATCH_SIZE,
+            write_flush_interval=CLOUDFLARE_WRITE_FLUSH_INTERVAL,
+            embedding_batch_size=CLOUDFLARE_EMBEDDING_BATCH_SIZE,
+            embedding_batch_window=CLOUDFLARE_EMBEDDING_BATCH_WINDOW,
+            requests_per_second=CLOUDFLARE_REQUESTS_PER_SECOND,
+            replica_path=CLOUDFLARE_REPLICA_PATH,
+            replica_max_staleness=CLOUDFLARE_REPLICA_MAX_STALENESS
         )
     else:  # ChromaStorage
         storage = StorageClass(
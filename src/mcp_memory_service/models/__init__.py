@@ -12,6 +12,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from .memory import Memory, MemoryQueryResult
+from .memory import Memory, MemoryQueryResult, MemoryEmbeddings
 
-__all__ = ['Memory', 'MemoryQueryResult']
\ No newline at end of file
+__all__ = ['Memory', 'MemoryQueryResult', 'MemoryEmbeddings']
\ No newline at end of file
@@ -19,6 +19,8 @@ from datetime import datetime
 import time
 import logging
 
+import numpy as np
+
 # Try to import dateutil, but fall back to standard datetime parsing if not available
 try:
     from dateutil import parser as dateutil_parser
@@ -249,3 +251,49 @@ class MemoryQueryResult:
             "similarity_score": self.relevance_score,
             "debug_info": self.debug_info
         }
+
+@dataclass
+class MemoryEmbeddings:
+    """
+    Memories loaded together with their stored embedding vectors.
+
+    ``embeddings`` is a contiguous float32 matrix with one row per memory that
+    has a vector; ``index`` maps a content hash to its row. Memories without a
+    stored vector are still listed in ``memories`` but have no row.
+    """
+    memories: List[Memory]
+    embeddings: np.ndarray
+    index: Dict[str, int] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.memories)
+
+    @property
+    def dimension(self) -> int:
+        """Width of the embedding matrix."""
+        return self.embeddings.shape[1] if self.embeddings.ndim == 2 else 0
+
+    def get(self, content_hash: str) -> Optional[np.ndarray]:
+        """Return the vector for a memory, or None if it has none."""
+        row = self.index.get(content_hash)
+        return None if row is None else self.embeddings[row]
+
+    def rows(self, memories: List[Memory]) -> np.ndarray:
+        """Matrix row of each memory, -1 for memories without a vector."""
+        return np.fromiter(
+            (self.index.get(memory.content_hash, -1) for memory in memories),
+            dtype=np.int64,
+            count=len(memories)
+        )
+
+    @classmethod
+    def from_memories(cls, memories: List[Memory]) -> "MemoryEmbeddings":
+        """Build the matrix from the ``embedding`` lists already set on memories."""
+        dimension = next((len(m.embedding) for m in memories if m.embedding), 0)
+        with_vectors = [m for m in memories if m.embedding and len(m.embedding) == dimension]
+        embeddings = np.empty((len(with_vectors), dimension), dtype=np.float32)
+        index = {}
+        for row, memory in enumerate(with_vectors):
+            embeddings[row] = memory.embedding
+            index[memory.content_hash] = row
+        return cls(memories=memories, embeddings=embeddings, index=index)
@@ -187,6 +187,8 @@ from .config import (
     CONSOLIDATION_CONFIG,
     CONSOLIDATION_SCHEDULE,
     INCLUDE_HOSTNAME,
+    INGESTION_BATCH_SIZE,
+    INGESTION_WORKERS,
     # Cloudflare configuration
     CLOUDFLARE_API_TOKEN,
     CLOUDFLARE_ACCOUNT_ID,
@@ -196,7 +198,16 @@ from .config import (
     CLOUDFLARE_EMBEDDING_MODEL,
     CLOUDFLARE_LARGE_CONTENT_THRESHOLD,
     CLOUDFLARE_MAX_RETRIES,
-    CLOUDFLARE_BASE_DELAY
+    CLOUDFLARE_BASE_DELAY,
+    CLOUDFLARE_ROW_CACHE_SIZE,
+    CLOUDFLARE_ROW_CACHE_TTL,
+    CLOUDFLARE_WRITE_BATCH_SIZE,
+    CLOUDFLARE_WRITE_FLUSH_INTERVAL,
+    CLOUDFLARE_EMBEDDING_BATCH_SIZE,
+    CLOUDFLARE_EMBEDDING_BATCH_WINDOW,
+    CLOUDFLARE_REQUESTS_PER_SECOND,
+    CLOUDFLARE_REPLICA_PATH,
+    CLOUDFLARE_REPLICA_MAX_STALENESS
 )
 # Storage imports will be done conditionally in the server class
 from .models.memory import Memory
@@ -529,7 +540,16 @@ class MemoryServer:
                         embedding_model=CLOUDFLARE_EMBEDDING_MODEL,
                         large_content_threshold=CLOUDFLARE_LARGE_CONTENT_THRESHOLD,
                         max_retries=CLOUDFLARE_MAX_RETRIES,
-                        base_delay=CLOUDFLARE_BASE_DELAY
+                        base_delay=CLOUDFLARE_BASE_DELAY,
+                        row_cache_size=CLOUDFLARE_ROW_CACHE_SIZE,
+                        row_cache_ttl=CLOUDFLARE_ROW_CACHE_TTL,
+                        write_batch_size=CLOUDFLARE_WRITE_BATCH_SIZE,
+                        write_flush_interval=CLOUDFLARE_WRITE_FLUSH_INTERVAL,
+                        embedding_batch_size=CLOUDFLARE_EMBEDDING_BATCH_SIZE,
+                        embedding_batch_window=CLOUDFLARE_EMBEDDING_BATCH_WINDOW,
+                        requests_per_second=CLOUDFLARE_REQUESTS_PER_SECOND,
+                        replica_path=CLOUDFLARE_REPLICA_PATH,
+                        replica_max_staleness=CLOUDFLARE_REPLICA_MAX_STALENESS
                     )
                     logger.info(f"Created Cloudflare storage with Vectorize index: {CLOUDFLARE_VECTORIZE_INDEX}")
                 else:
@@ -1241,11 +1261,14 @@ class MemoryServer:
                     types.Tool(
                         name="retrieve_memory",
                         description="""Find relevant memories based on query.
+                        Optional tags and memory_type restrict the search to matching
+                        memories before ranking.
 
                         Example:
                         {
                             "query": "find this memory",
-                            "n_results": 5
+                            "n_results": 5,
+                            "tags": ["project-x"]
                         }""",
                         inputSchema={
                             "type": "object",
@@ -1258,6 +1281,15 @@ class MemoryServer:
                                     "type": "number",
                                     "default": 5,
                                     "description": "Maximum number of results to return."
+                                },
+                                "tags": {
+                                    "type": "array",
+                                    "items": {"type": "string"},
+                                    "description": "Only search memories having any of these tags."
+                                },
+                                "memory_type": {
+                                    "type": "string",
+                                    "description": "Only search memories of this type."
                                 }
                             },
                             "required": ["query"]
@@ -1732,8 +1764,26 @@ class MemoryServer:
                         ),
                         types.Tool(
                             name="consolidation_status",
-                            description="Get status and health information about the consolidation system.",
-                            inputSchema={"type": "object", "properties": {}}
+                            description="""Get status and health information about the consolidation system.
+                            
+                            Includes per-stage timings (wall time, CPU time, peak RSS growth, items and
+                            storage calls) of the latest run of each horizon. Pass a time_horizon to get
+                            only that horizon's profile plus collapsed stacks for flamegraph tools.
+                            
+                            Example:
+                            {
+                                "time_horizon": "weekly"
+                            }""",
+                            inputSchema={
+                                "type": "object",
+                                "properties": {
+                                    "time_horizon": {
+                                        "type": "string",
+                                        "enum": ["daily", "weekly", "monthly", "quarterly", "yearly"],
+                                        "description": "Only show the stage profile of this horizon's latest run."
+                                    }
+                                }
+                            }
                         ),
                         types.Tool(
                             name="consolidation_recommendations",
@@ -1929,6 +1979,20 @@ class MemoryServer:
                                     "type": "number",
                                     "description": "Maximum number of files to process (default: 100).",
                                     "default": 100
+                                },
+                                "parallel_workers": {
+                                    "type": "number",
+                                    "description": "Processes parsing documents in parallel (default: MCP_INGESTION_WORKERS, one per CPU up to 8)."
+                                },
+                                "incremental": {
+                                    "type": "boolean",
+                                    "description": "Skip files unchanged since the last ingestion and replace only changed chunks (default: true).",
+                                    "default": True
+                                },
+                                "purge_deleted": {
+                                    "type": "boolean",
+                                    "description": "Delete memories of previously ingested files that no longer exist in the directory (default: false).",
+                                    "default": False
                                 }
                             },
                             "required": ["directory_path"]
@@ -2282,7 +2346,7 @@ class MemoryServer:
                     
                     # Get database statistics using the utility function
                     from .utils.db_utils import get_database_stats
-                    stats = get_database_stats(storage)
+                    stats = await get_database_stats(storage)
                     
                     # Extract stats from the nested structure
                     collection_stats = stats.get("collection", {})
@@ -2290,22 +2354,26 @@ class MemoryServer:
                     
                     # Calculate unique tags by getting all memories and counting unique tags
                     try:
-                        # Get all memories to count unique tags
-                        all_data = storage.collection.get()
-                        if all_data and all_data.get("metadatas"):
-                            all_tags = set()
-                            for metadata in all_data["metadatas"]:
-                                if metadata and isinstance(metadata, dict):
-                                    tags = metadata.get("tags", [])
-                                    if isinstance(tags, list):
-                                        all_tags.update(tags)
-                                    elif isinstance(tags, str):
-                                        # Handle comma-separated string tags
-                                        tag_list = [tag.strip() for tag in tags.split(",") if tag.strip()]
-                                        all_tags.update(tag_list)
-                            unique_tags = len(all_tags)
+                        if not hasattr(storage, 'collection'):
+                            # Backends without a collection keep a tag index
+                            unique_tags = len(await storage.get_all_tags())
                         else:
-                            unique_tags = 0
+                            # Get all memories to count unique tags
+                            all_data = storage.collection.get()
+                            if all_data and all_data.get("metadatas"):
+                                all_tags = set()
+                                for metadata in all_data["metadatas"]:
+                                    if metadata and isinstance(metadata, dict):
+                                        tags = metadata.get("tags", [])
+                                        if isinstance(tags, list):
+                                            all_tags.update(tags)
+                                        elif isinstance(tags, str):
+                                            # Handle comma-separated string tags
+                                            tag_list = [tag.strip() for tag in tags.split(",") if tag.strip()]
+                                            all_tags.update(tag_list)
+                                unique_tags = len(all_tags)
+                            else:
+                                unique_tags = 0
                     except Exception as tag_error:
                         logger.warning(f"Could not count unique tags: {str(tag_error)}")
                         unique_tags = 0
@@ -2586,6 +2654,8 @@ class MemoryServer:
     async def handle_retrieve_memory(self, arguments: dict) -> List[types.TextContent]:
         query = arguments.get("query")
         n_results = arguments.get("n_results", 5)
+        tags = arguments.get("tags")
+        memory_type = arguments.get("memory_type")
         
         if not query:
             return [types.TextContent(type="text", text="Error: Query is required")]
@@ -2596,7 +2666,10 @@ class MemoryServer:
             
             # Track performance
             start_time = time.time()
-            results = await storage.retrieve(query, n_results)
+            if tags or memory_type:
+                results = await storage.search_filtered(query, n_results, memory_type=memory_type, tags=tags)
+            else:
+                results = await storage.retrieve(query, n_results)
             query_time_ms = (time.time() - start_time) * 1000
             
             # Record query time for performance monitoring
@@ -2889,6 +2962,29 @@ Memories Archived: {report.memories_archived}"""
                 for horizon, timestamp in health['last_consolidation_times'].items():
                     status_lines.append(f"  {horizon}: {timestamp}")
             
+            # Per-stage profiles of the latest runs
+            profiles = self.consolidator.get_last_profiles()
+            time_horizon = arguments.get("time_horizon")
+            if time_horizon:
+                profiles = {time_horizon: profiles[time_horizon]} if time_horizon in profiles else {}
+            
+            for horizon, profile in profiles.items():
+                status_lines.extend([
+                    "",
+                    f"Last {horizon} run profile ({profile.wall_seconds:.2f}s wall, {profile.cpu_seconds:.2f}s cpu):"
+                ])
+                for stage in profile.summary():
+                    status_lines.append(
+                        f"  {stage['stage']}: {stage['wall_seconds']:.3f}s wall, {stage['cpu_seconds']:.3f}s cpu, "
+                        f"+{stage['rss_delta_bytes'] / (1024 * 1024):.1f} MB peak RSS, "
+                        f"{stage['items']} items, {stage['storage_calls']} storage calls"
+                    )
+                if time_horizon:
+                    status_lines.extend(["", "Collapsed stacks (wall µs):", profile.to_collapsed_stacks().rstrip()])
+            
+            if time_horizon and not profiles:
+                status_lines.extend(["", f"No profiled {time_horizon} run yet"])
+            
             return [types.TextContent(type="text", text="\n".join(status_lines))]
             
         except Exception as e:
@@ -3331,7 +3427,6 @@ Memories Archived: {report.memories_archived}"""
                     text=f"Database Health Check Results:\n{json.dumps(result, indent=2)}"
                 )]
             
-            # Skip db_utils completely for health check - implement directly here
             # Get storage type for backend-specific handling
             storage_type = storage.__class__.__name__
             
@@ -3341,56 +3436,9 @@ Memories Archived: {report.memories_archived}"""
             stats = {}
             
             if storage_type == "SqliteVecMemoryStorage":
-                # Direct SQLite-vec validation
-                if not hasattr(storage, 'conn') or storage.conn is None:
-                    is_valid = False
-                    message = "SQLite database connection is not initialized"
-                else:
-                    try:
-                        # Check for required tables
-                        cursor = storage.conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='memories'")
-                        if not cursor.fetchone():
-                            is_valid = False
-                            message = "SQLite database is missing required tables"
-                        else:
-                            # Count memories
-                            cursor = storage.conn.execute('SELECT COUNT(*) FROM memories')
-                            memory_count = cursor.fetchone()[0]
-                            
-                            # Check if embedding tables exist
-                            cursor = storage.conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='memory_embeddings'")
-                            has_embeddings = cursor.fetchone() is not None
-                            
-                            # Check embedding model
-                            has_model = hasattr(storage, 'embedding_model') and storage.embedding_model is not None
-                            
-                            # Collect stats
-                            stats = {
-                                "status": "healthy",
-                                "backend": "sqlite-vec",
-                                "total_memories": memory_count,
-                                "has_embedding_tables": has_embeddings,
-                                "has_embedding_model": has_model,
-                                "embedding_model": storage.embedding_model_name if hasattr(storage, 'embedding_model_name') else "none"
-                            }
-                            
-                            # Get database file size
-                            db_path = storage.db_path if hasattr(storage, 'db_path') else None
-                            if db_path and os.path.exists(db_path):
-                                file_size = os.path.getsize(db_path)
-                                stats["database_size_bytes"] = file_size
-                                stats["database_size_mb"] = round(file_size / (1024 * 1024), 2)
-                            
-                            is_valid = True
-                            message = "SQLite-vec database validation successful"
-                    except Exception as e:
-                        is_valid = False
-                        message = f"SQLite database validation error: {str(e)}"
-                        stats = {
-                            "status": "error",
-                            "error": str(e),
-                            "backend": "sqlite-vec" 
-                        }
+                # Runs its queries on the storage's read pool
+                from .utils.db_utils import check_sqlite_vec_health
+                is_valid, message, stats = await check_sqlite_vec_health(storage)
             
             elif hasattr(storage, 'collection'):
                 # Standard ChromaDB validation
@@ -3658,6 +3706,19 @@ Memories Archived: {report.memories_archived}"""
             chunks_processed = 0
             chunks_stored = 0
             errors = []
+            pending = []  # (chunk_index, memory) pairs waiting for a batched store
+            
+            async def flush_pending():
+                nonlocal chunks_stored
+                if not pending:
+                    return
+                results = await storage.store_batch([memory for _, memory in pending])
+                for (chunk_index, _), (success, error) in zip(pending, results):
+                    if success:
+                        chunks_stored += 1
+                    else:
+                        errors.append(f"Chunk {chunk_index}: {error}")
+                pending.clear()
             
             # Extract and store chunks
             async for chunk in loader.extract_chunks(file_path):
@@ -3678,16 +3739,16 @@ Memories Archived: {report.memories_archived}"""
                         metadata=chunk.metadata
                     )
                     
-                    # Store the memory
-                    success, error = await storage.store(memory)
-                    if success:
-                        chunks_stored += 1
-                    else:
-                        errors.append(f"Chunk {chunk.chunk_index}: {error}")
+                    # Queue the memory; stores happen in batches
+                    pending.append((chunk.chunk_index, memory))
+                    if len(pending) >= INGESTION_BATCH_SIZE:
+                        await flush_pending()
                         
                 except Exception as e:
                     errors.append(f"Chunk {chunk.chunk_index}: {str(e)}")
             
+            await flush_pending()
+            
             processing_time = time.time() - start_time
             success_rate = (chunks_stored / chunks_processed * 100) if chunks_processed > 0 else 0
             
@@ -3722,10 +3783,10 @@ Memories Archived: {report.memories_archived}"""
         """Handle directory ingestion requests."""
         try:
             from pathlib import Path
-            from .ingestion import get_loader_for_file, is_supported_file
+            from .ingestion import IngestionPipeline, is_supported_file
             from .models.memory import Memory
             from .utils import generate_content_hash
-            import time
+            import uuid
             
             # Initialize storage lazily when needed
             storage = await self._ensure_storage_initialized()
@@ -3736,6 +3797,9 @@ Memories Archived: {report.memories_archived}"""
             file_extensions = arguments.get("file_extensions", ["pdf", "txt", "md", "json"])
             chunk_size = arguments.get("chunk_size", 1000)
             max_files = arguments.get("max_files", 100)
+            workers = int(arguments.get("parallel_workers", INGESTION_WORKERS))
+            incremental = arguments.get("incremental", True)
+            purge_deleted = arguments.get("purge_deleted", False)
             
             if not directory_path.exists() or not directory_path.is_dir():
                 return [types.TextContent(
@@ -3744,7 +3808,6 @@ Memories Archived: {report.memories_archived}"""
                 )]
             
             logger.info(f"Starting directory ingestion: {directory_path}")
-            start_time = time.time()
             
             # Find all supported files
             pattern = "**/*" if recursive else "*"
@@ -3775,75 +3838,58 @@ Memories Archived: {report.memories_archived}"""
                     text=f"No supported files found in directory: {directory_path}"
                 )]
             
-            total_chunks_processed = 0
-            total_chunks_stored = 0
-            files_processed = 0
-            files_failed = 0
-            all_errors = []
+            operation_id = f"ingest_directory_{uuid.uuid4().hex[:8]}"
+            await self.send_progress_notification(
+                operation_id, 0, f"Ingesting {len(files_to_process)} files from {directory_path.name}"
+            )
             
-            # Process each file
-            for file_path in files_to_process:
-                try:
-                    logger.info(f"Processing file {files_processed + 1}/{len(files_to_process)}: {file_path.name}")
-                    
-                    # Get appropriate document loader
-                    loader = get_loader_for_file(file_path)
-                    if loader is None:
-                        all_errors.append(f"{file_path.name}: Unsupported format")
-                        files_failed += 1
-                        continue
-                    
-                    # Configure loader
-                    loader.chunk_size = chunk_size
-                    
-                    file_chunks_processed = 0
-                    file_chunks_stored = 0
-                    
-                    # Extract and store chunks from this file
-                    async for chunk in loader.extract_chunks(file_path):
-                        file_chunks_processed += 1
-                        total_chunks_processed += 1
-                        
-                        try:
-                            # Add directory-level tags and file-specific tags
-                            all_tags = tags.copy()
-                            all_tags.append(f"source_dir:{directory_path.name}")
-                            all_tags.append(f"file_type:{file_path.suffix.lstrip('.')}")
-                            
-                            if chunk.metadata.get('tags'):
-                                all_tags.extend(chunk.metadata['tags'])
-                            
-                            # Create memory object
-                            memory = Memory(
-                                content=chunk.content,
-                                content_hash=generate_content_hash(chunk.content, chunk.metadata),
-                                tags=list(set(all_tags)),  # Remove duplicates
-                                memory_type="document",
-                                metadata=chunk.metadata
-                            )
-                            
-                            # Store the memory
-                            success, error = await storage.store(memory)
-                            if success:
-                                file_chunks_stored += 1
-                                total_chunks_stored += 1
-                            else:
-                                all_errors.append(f"{file_path.name} chunk {chunk.chunk_index}: {error}")
-                                
-                        except Exception as e:
-                            all_errors.append(f"{file_path.name} chunk {chunk.chunk_index}: {str(e)}")
-                    
-                    if file_chunks_stored > 0:
-                        files_processed += 1
-                    else:
-                        files_failed += 1
-                        
-                except Exception as e:
-                    files_failed += 1
-                    all_errors.append(f"{file_path.name}: {str(e)}")
+            def build_memory(file_path, chunk):
+                # Add directory-level tags and file-specific tags
+                all_tags = tags.copy()
+                all_tags.append(f"source_dir:{directory_path.name}")
+                all_tags.append(f"file_type:{file_path.suffix.lstrip('.')}")
+                
+                if chunk.metadata.get('tags'):
+                    all_tags.extend(chunk.metadata['tags'])
+                
+                return Memory(
+                    content=chunk.content,
+                    content_hash=generate_content_hash(chunk.content, chunk.metadata),
+                    tags=list(set(all_tags)),  # Remove duplicates
+                    memory_type="document",
+                    metadata=chunk.metadata
+                )
             
-            processing_time = time.time() - start_time
-            success_rate = (total_chunks_stored / total_chunks_processed * 100) if total_chunks_processed > 0 else 0
+            async def report_progress(progress):
+                # Parsing drives the percentage; 100% is sent once everything is stored
+                percent = min(99.0, progress.files_parsed / progress.total_files * 100)
+                await self.send_progress_notification(
+                    operation_id,
+                    percent,
+                    f"{progress.files_parsed}/{progress.total_files} files parsed, "
+                    f"{progress.chunks_stored} chunks stored"
+                )
+            
+            # Parse, embed and store in overlapping stages
+            pipeline = IngestionPipeline(
+                storage,
+                build_memory,
+                workers=workers,
+                batch_size=INGESTION_BATCH_SIZE,
+                progress_callback=report_progress,
+                incremental=incremental,
+                purge_deleted=purge_deleted
+            )
+            result = await pipeline.run(files_to_process, chunk_size=chunk_size, root=directory_path)
+            await self.send_progress_notification(operation_id, 100, "Directory ingestion completed")
+            
+            files_processed = result.files_processed
+            files_failed = result.files_failed
+            total_chunks_processed = result.chunks_processed
+            total_chunks_stored = result.chunks_stored
+            all_errors = result.errors
+            processing_time = result.processing_time
+            success_rate = result.success_rate
             
             # Prepare result message
             result_lines = [
@@ -3855,6 +3901,15 @@ Memories Archived: {report.memories_archived}"""
                 f"⏱️  Processing time: {processing_time:.2f} seconds"
             ]
             
+            if result.files_unchanged or result.chunks_unchanged:
+                result_lines.append(
+                    f"⏭️  Unchanged: {result.files_unchanged} files, {result.chunks_unchanged} chunks kept"
+                )
+            if result.chunks_removed or result.files_purged:
+                result_lines.append(
+                    f"🗑️  Removed: {result.chunks_removed} stale chunks, {result.files_purged} deleted files"
+                )
+            
             if files_failed > 0:
                 result_lines.append(f"❌ Files failed: {files_failed}")
             
@@ -25,6 +25,10 @@ from ..models.memory import Memory, MemoryQueryResult
 class MemoryStorage(ABC):
     """Abstract base class for memory storage implementations."""
     
+    # Whether update_memories_metadata(touch=False) leaves updated_at alone;
+    # incremental consolidation only runs on storages where it does
+    honours_metadata_touch = False
+    
     @abstractmethod
     async def initialize(self) -> None:
         """Initialize the storage backend."""
@@ -35,11 +39,61 @@ class MemoryStorage(ABC):
         """Store a memory. Returns (success, message)."""
         pass
     
+    async def store_batch(self, memories: List[Memory]) -> List[Tuple[bool, str]]:
+        """
+        Store multiple memories. Returns one (success, message) per memory, in input order.
+        
+        The default implementation stores memories one at a time. Backends that can
+        embed and insert in bulk should override it.
+        """
+        results = []
+        for memory in memories:
+            results.append(await self.store(memory))
+        return results
+    
     @abstractmethod
     async def retrieve(self, query: str, n_results: int = 5) -> List[MemoryQueryResult]:
         """Retrieve memories by semantic search."""
         pass
     
+    async def search_filtered(
+        self,
+        query: str,
+        n_results: int = 5,
+        start_timestamp: Optional[float] = None,
+        end_timestamp: Optional[float] = None,
+        memory_type: Optional[str] = None,
+        tags: Optional[List[str]] = None
+    ) -> List[MemoryQueryResult]:
+        """
+        Semantic search restricted to memories matching the given filters.
+        
+        Memories match when created within the time window, of memory_type,
+        and carrying any of tags (each filter only applies when given). The
+        default implementation widens retrieve() until n_results results pass
+        the filters or the backend has no more to return; backends that can
+        filter before ranking override it.
+        """
+        wanted = set(tags or [])
+        
+        def matches(memory: Memory) -> bool:
+            created_at = memory.created_at or 0
+            if start_timestamp is not None and created_at < start_timestamp:
+                return False
+            if end_timestamp is not None and created_at > end_timestamp:
+                return False
+            if memory_type is not None and memory.memory_type != memory_type:
+                return False
+            return not wanted or bool(wanted.intersection(memory.tags or []))
+        
+        k = n_results
+        while True:
+            results = await self.retrieve(query, k)
+            matched = [result for result in results if matches(result.memory)]
+            if len(matched) >= n_results or len(results) < k:
+                return matched[:n_results]
+            k *= 4
+    
     @abstractmethod
     async def search_by_tag(self, tags: List[str]) -> List[Memory]:
         """Search memories by tags."""
@@ -81,6 +135,34 @@ class MemoryStorage(ABC):
         """
         pass
     
+    async def update_memories_metadata(self, updates: Dict[str, Dict[str, Any]], touch: bool = True) -> Tuple[int, str]:
+        """
+        Merge metadata patches into many memories. Returns (count_updated, message).
+        
+        ``updates`` maps content_hash to the metadata keys to set on that memory.
+        With ``touch=False`` the memories' updated_at is left as it was, for
+        derived data such as relevance scores. The default implementation
+        applies the patches one at a time through update_memory_metadata,
+        which always refreshes updated_at, so it cannot honour ``touch``;
+        backends override it to write in one transaction and honour the flag.
+        """
+        updated = 0
+        for content_hash, patch in updates.items():
+            success, _ = await self.update_memory_metadata(content_hash, {"metadata": patch})
+            if success:
+                updated += 1
+        return updated, f"Updated metadata for {updated} of {len(updates)} memories"
+    
+    async def update_relevance_scores(self, scores: Dict[str, Dict[str, Any]]) -> Tuple[int, str]:
+        """
+        Persist consolidation relevance scores. Returns (count_updated, message).
+        
+        ``scores`` maps content_hash to the relevance fields produced by the
+        decay calculator. The default implementation stores them in each
+        memory's metadata; backends with a dedicated score table override it.
+        """
+        return await self.update_memories_metadata(scores, touch=False)
+    
     async def get_stats(self) -> Dict[str, Any]:
         """Get storage statistics. Override for specific implementations."""
         return {
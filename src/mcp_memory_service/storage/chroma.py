@@ -44,6 +44,7 @@ except ImportError:
 from .base import MemoryStorage
 from ..models.memory import Memory, MemoryQueryResult
 from ..utils.hashing import generate_content_hash
+from ..embeddings.cache import EmbeddingCache
 from ..utils.system_detection import (
     get_system_info,
     get_optimal_embedding_settings,
@@ -58,7 +59,6 @@ logger = logging.getLogger(__name__)
 # Global model cache for performance optimization
 import threading
 import hashlib
-from functools import lru_cache
 
 _MODEL_CACHE = {}
 _EMBEDDING_CACHE = {}
@@ -77,6 +77,8 @@ MODEL_FALLBACKS = [
 ]
 
 class ChromaMemoryStorage(MemoryStorage):
+    honours_metadata_touch = True
+
     def __init__(self, path: str, preload_model: bool = True):
         """Initialize ChromaDB storage with hardware-aware embedding function and performance optimizations."""
         # Issue deprecation warning
@@ -102,6 +104,7 @@ class ChromaMemoryStorage(MemoryStorage):
         
         # Performance settings
         self.enable_query_cache = True
+        self._query_embedding_cache: Optional[EmbeddingCache] = None
         self.cache_ttl = 300  # 5 minutes
         self.batch_size = self.embedding_settings.get('batch_size', 32)
         
@@ -326,10 +329,16 @@ class ChromaMemoryStorage(MemoryStorage):
             logger.error(f"Error in _initialize_chromadb_optimized: {str(e)}")
             raise
     
-    @lru_cache(maxsize=1000)
-    def _cached_embed_query(self, query: str) -> tuple:
+    def _cached_embed_query(self, query: str) -> Optional[tuple]:
         """Cache embeddings for identical queries to improve performance."""
         if self.model:
+            if self._query_embedding_cache is None:
+                self._query_embedding_cache = EmbeddingCache.from_env(self.embedding_settings['model_name'])
+            
+            cached = self._query_embedding_cache.get(query)
+            if cached is not None:
+                return tuple(cached)
+            
             try:
                 embedding = self.model.encode(
                     query, 
@@ -337,7 +346,9 @@ class ChromaMemoryStorage(MemoryStorage):
                     show_progress_bar=False,
                     convert_to_numpy=True
                 )
-                return tuple(embedding.tolist())
+                embedding_list = embedding.tolist()
+                self._query_embedding_cache.put(query, embedding_list)
+                return tuple(embedding_list)
             except Exception as e:
                 logger.warning(f"Error in cached embedding: {e}")
                 return None
@@ -936,6 +947,53 @@ class ChromaMemoryStorage(MemoryStorage):
             traceback.print_exc()
             return False, error_msg
 
+    async def update_memories_metadata(self, updates: Dict[str, Dict[str, Any]], touch: bool = True) -> Tuple[int, str]:
+        """
+        Merge metadata patches into many memories with one get and one upsert per chunk.
+
+        With ``touch=False`` the memories' updated_at is left as it was.
+        """
+        if self.collection is None:
+            return 0, "Collection not initialized, cannot update memory metadata"
+        if not updates:
+            return 0, "No updates needed"
+
+        try:
+            now = time.time()
+            now_iso = datetime.utcfromtimestamp(now).isoformat() + "Z"
+            hashes = list(updates)
+            updated = 0
+            for start in range(0, len(hashes), 500):
+                existing = self.collection.get(
+                    where={"content_hash": {"$in": hashes[start:start + 500]}},
+                    include=["documents", "metadatas"]
+                )
+                if not existing["ids"]:
+                    continue
+
+                metadatas = []
+                for metadata in existing["metadatas"]:
+                    merged = dict(metadata)
+                    merged.update(updates[metadata["content_hash"]])
+                    if touch:
+                        merged["updated_at"] = now
+                        merged["updated_at_iso"] = now_iso
+                    metadatas.append(merged)
+
+                self.collection.upsert(
+                    ids=existing["ids"],
+                    documents=existing["documents"],
+                    metadatas=metadatas
+                )
+                updated += len(existing["ids"])
+
+            return updated, f"Updated metadata for {updated} of {len(updates)} memories"
+
+        except Exception as e:
+            error_msg = f"Error updating memory metadata in bulk: {str(e)}"
+            logger.error(error_msg)
+            return 0, error_msg
+
     async def recall(self, query: Optional[str] = None, n_results: int = 5, start_timestamp: Optional[float] = None, end_timestamp: Optional[float] = None) -> List[MemoryQueryResult]:
         """
         Retrieve memories with combined time filtering and optional semantic search.
@@ -1370,7 +1428,8 @@ class ChromaMemoryStorage(MemoryStorage):
                 "cache_misses": _PERFORMANCE_STATS["cache_misses"],
                 "avg_query_time": 0.0,
                 "recent_query_times": _PERFORMANCE_STATS["query_times"][-10:],  # Last 10
-                "cache_hit_ratio": 0.0
+                "cache_hit_ratio": 0.0,
+                "query_embedding_cache": self._query_embedding_cache.get_stats() if self._query_embedding_cache else None
             }
             
             # Calculate average query time
@@ -1393,9 +1452,9 @@ class ChromaMemoryStorage(MemoryStorage):
             _PERFORMANCE_STATS["cache_hits"] = 0
             _PERFORMANCE_STATS["cache_misses"] = 0
         
-        # Clear LRU cache
-        if hasattr(self._cached_embed_query, 'cache_clear'):
-            self._cached_embed_query.cache_clear()
+        # Clear query embedding cache
+        if self._query_embedding_cache is not None:
+            self._query_embedding_cache.clear()
         
         logger.info("Cleared embedding and query caches")
     
@@ -19,22 +19,115 @@ Provides cloud-native storage using Vectorize, D1, and R2.
 
 import json
 import logging
-import hashlib
 import asyncio
 import time
-from typing import List, Dict, Any, Tuple, Optional
+from collections import OrderedDict
+from typing import List, Dict, Any, Iterable, Tuple, Optional, Set
 from datetime import datetime
 import httpx
 
 from .base import MemoryStorage
+from .cloudflare_governor import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_NORMAL,
+    RateGovernor,
+    api_family,
+    background,
+    request_priority
+)
+from .cloudflare_replica import D1_SCHEMA, MEMORY_COLUMNS, MEMORY_INSERT_COLUMNS, TAG_SEPARATOR, D1Replica, updated_at_range
 from ..models.memory import Memory, MemoryQueryResult
 from ..utils.hashing import generate_content_hash
+from ..embeddings.cache import EmbeddingCache
 
 logger = logging.getLogger(__name__)
 
+# D1 allows at most 100 bound parameters per statement
+D1_MAX_PARAMS = 100
+
+# Request size limits of the bulk endpoints
+AI_MAX_BATCH = 100  # texts per Workers AI embedding call
+VECTORIZE_MAX_BATCH = 1000  # vectors per NDJSON upsert
+D1_MAX_BATCH_BYTES = 8 * 1024 * 1024  # content bytes per D1 batch request
+
+# Rows per page when pulling D1 changes into the replica
+REPLICA_PAGE_SIZE = 500
+
+class _MicroBatcher:
+    """
+    Groups concurrent requests into batches.
+    
+    Items are handed to ``flush`` together once ``max_items`` are pending
+    or ``max_delay`` seconds after the first one arrived, whichever comes
+    first. ``flush`` returns one result per item; each caller awaits the
+    result for its own item, and an exception raised by ``flush`` is
+    raised to every caller of that batch.
+    
+    With ``flush_when_idle`` a request arriving while no flush is in
+    progress does not wait for ``max_delay``: it is flushed on the next
+    event-loop iteration, together with whatever was submitted alongside it.
+    """
+    
+    def __init__(self, flush, max_items: int, max_delay: float, flush_when_idle: bool = False):
+        self._flush = flush
+        self.max_items = max(1, max_items)
+        self.max_delay = max_delay
+        self.flush_when_idle = flush_when_idle
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.Handle] = None
+        self._flushes: set = set()
+        self.batches = 0
+        self.items = 0
+    
+    async def submit(self, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_items or self.max_delay <= 0:
+            self._start_flush()
+        elif self._timer is None:
+            if self.flush_when_idle and not self._flushes:
+                self._timer = loop.call_soon(self._start_flush)
+            else:
+                self._timer = loop.call_later(self.max_delay, self._start_flush)
+        return await future
+    
+    def _start_flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        task = asyncio.get_running_loop().create_task(self._flush_batch(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+    
+    async def _flush_batch(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await self._flush([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+    
+    async def drain(self) -> None:
+        """Flush pending items and wait for all flushes in progress."""
+        self._start_flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
 class CloudflareStorage(MemoryStorage):
     """Cloudflare-based storage backend using Vectorize, D1, and R2."""
     
+    honours_metadata_touch = True
+    
     def __init__(self, 
                  api_token: str,
                  account_id: str,
@@ -44,7 +137,18 @@ class CloudflareStorage(MemoryStorage):
                  embedding_model: str = "@cf/baai/bge-base-en-v1.5",
                  large_content_threshold: int = 1024 * 1024,  # 1MB
                  max_retries: int = 3,
-                 base_delay: float = 1.0):
+                 base_delay: float = 1.0,
+                 row_cache_size: int = 1000,
+                 row_cache_ttl: float = 300.0,
+                 r2_max_concurrency: int = 8,
+                 write_batch_size: int = 100,
+                 write_flush_interval: float = 0.05,
+                 embedding_batch_size: int = AI_MAX_BATCH,
+                 embedding_batch_window: float = 0.005,
+                 requests_per_second: float = 10.0,
+                 rate_governor: Optional[RateGovernor] = None,
+                 replica_path: Optional[str] = None,
+                 replica_max_staleness: float = 30.0):
         """
         Initialize Cloudflare storage backend.
         
@@ -58,6 +162,17 @@ class CloudflareStorage(MemoryStorage):
             large_content_threshold: Size threshold for R2 storage
             max_retries: Maximum retry attempts for API calls
             base_delay: Base delay for exponential backoff
+            row_cache_size: Maximum number of D1 rows cached in process (0 disables)
+            row_cache_ttl: Seconds a cached row is served before it is re-read
+            r2_max_concurrency: Maximum concurrent R2 requests
+            write_batch_size: Stores buffered before a write flush is forced
+            write_flush_interval: Seconds a buffered store waits for others while another flush is in progress
+            embedding_batch_size: Texts per Workers AI embedding call (at most AI_MAX_BATCH)
+            embedding_batch_window: Seconds an embedding request waits for others to join its call
+            requests_per_second: Maximum request rate per API family (Vectorize, D1, AI, R2)
+            rate_governor: Governor to share with other instances (one is created when omitted)
+            replica_path: SQLite file for a local replica of the D1 tables (disabled when omitted)
+            replica_max_staleness: Seconds after a refresh before reads start another one in the background
         """
         self.api_token = api_token
         self.account_id = account_id
@@ -81,10 +196,47 @@ class CloudflareStorage(MemoryStorage):
         # HTTP client with connection pooling
         self.client = None
         self._initialized = False
+        self.max_connections = 10
+        
+        # Per-API token buckets; background requests get half the connection pool
+        self.rate_governor = rate_governor or RateGovernor(
+            requests_per_second=requests_per_second,
+            background_concurrency=self.max_connections // 2
+        )
         
         # Embedding cache for performance
-        self._embedding_cache = {}
-        self._cache_max_size = 1000
+        self._embedding_cache = EmbeddingCache.from_env(embedding_model)
+        
+        # Hydrated rows (content resolved from R2, tags joined) by content_hash;
+        # invalidated on every write made through this instance, and bounded
+        # by the TTL for writes made elsewhere
+        self.row_cache_size = row_cache_size
+        self.row_cache_ttl = row_cache_ttl
+        self._row_cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._r2_semaphore = asyncio.Semaphore(max(1, r2_max_concurrency))
+        
+        # Concurrent store() calls share Vectorize upserts and D1 batches; a
+        # store() with no other write in flight goes out without waiting
+        self._write_buffer = _MicroBatcher(
+            self._flush_stores, write_batch_size, write_flush_interval, flush_when_idle=True
+        )
+        
+        # Embedding requests are coalesced into array calls to Workers AI;
+        # identical texts already in flight share one result
+        self._embedding_batcher = _MicroBatcher(
+            self._embed_texts, min(embedding_batch_size, AI_MAX_BATCH), embedding_batch_window
+        )
+        self._embeddings_in_flight: Dict[str, asyncio.Future] = {}
+        self._coalesced_embeddings = 0
+        
+        # Local mirror of D1 for tag, recency and statistics queries; kept
+        # current by writing through and by pulling rows changed in D1
+        self.replica = D1Replica(replica_path) if replica_path else None
+        self.replica_max_staleness = replica_max_staleness
+        self._replica_lock = asyncio.Lock()
+        self._replica_refreshes = 0
+        self._replica_refresh_failures = 0
+        self._replica_sync: Optional[asyncio.Task] = None
     
     async def _get_client(self) -> httpx.AsyncClient:
         """Get or create HTTP client with connection pooling."""
@@ -96,24 +248,42 @@ class CloudflareStorage(MemoryStorage):
             self.client = httpx.AsyncClient(
                 headers=headers,
                 timeout=httpx.Timeout(30.0),
-                limits=httpx.Limits(max_connections=10, max_keepalive_connections=5)
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=5)
             )
         return self.client
     
-    async def _retry_request(self, method: str, url: str, **kwargs) -> httpx.Response:
-        """Make HTTP request with exponential backoff retry logic."""
+    async def _retry_request(self, method: str, url: str, priority: Optional[int] = None, **kwargs) -> httpx.Response:
+        """
+        Make an HTTP request through the rate governor, with retries.
+        
+        The request waits for a token of its API family at ``priority``
+        (by default the priority of the current task, see
+        cloudflare_governor.request_priority). Rate-limit responses pause
+        the family for as long as the server asks, so retries of a 429
+        need no sleep of their own; server and network errors back off
+        exponentially.
+        """
         client = await self._get_client()
+        family = api_family(url)
+        if priority is None:
+            priority = request_priority.get()
         
         for attempt in range(self.max_retries + 1):
+            delay = self.base_delay * (2 ** attempt)
             try:
-                response = await client.request(method, url, **kwargs)
+                await self.rate_governor.acquire(family, priority)
+                if priority == PRIORITY_BACKGROUND:
+                    # Background work may only hold part of the connection pool
+                    async with self.rate_governor.background_slot():
+                        response = await client.request(method, url, **kwargs)
+                else:
+                    response = await client.request(method, url, **kwargs)
+                self.rate_governor.observe(family, response.status_code, response.headers, delay)
                 
                 # Handle rate limiting
                 if response.status_code == 429:
                     if attempt < self.max_retries:
-                        delay = self.base_delay * (2 ** attempt)
-                        logger.warning(f"Rate limited, retrying in {delay}s (attempt {attempt + 1}/{self.max_retries + 1})")
-                        await asyncio.sleep(delay)
+                        logger.warning(f"Rate limited on {family}, retrying (attempt {attempt + 1}/{self.max_retries + 1})")
                         continue
                     else:
                         raise httpx.HTTPError(f"Rate limited after {self.max_retries} retries")
@@ -121,7 +291,6 @@ class CloudflareStorage(MemoryStorage):
                 # Handle server errors
                 if response.status_code >= 500:
                     if attempt < self.max_retries:
-                        delay = self.base_delay * (2 ** attempt)
                         logger.warning(f"Server error {response.status_code}, retrying in {delay}s")
                         await asyncio.sleep(delay)
                         continue
@@ -131,7 +300,6 @@ class CloudflareStorage(MemoryStorage):
                 
             except (httpx.NetworkError, httpx.TimeoutException) as e:
                 if attempt < self.max_retries:
-                    delay = self.base_delay * (2 ** attempt)
                     logger.warning(f"Network error: {e}, retrying in {delay}s")
                     await asyncio.sleep(delay)
                     continue
@@ -142,35 +310,60 @@ class CloudflareStorage(MemoryStorage):
     async def _generate_embedding(self, text: str) -> List[float]:
         """Generate embedding using Workers AI or cache."""
         # Check cache first
-        text_hash = hashlib.sha256(text.encode()).hexdigest()[:16]
-        if text_hash in self._embedding_cache:
-            return self._embedding_cache[text_hash]
+        cached = await self._embedding_cache.aget(text)
+        if cached is not None:
+            return cached
+        
+        in_flight = self._embeddings_in_flight.get(text)
+        if in_flight is None:
+            in_flight = asyncio.ensure_future(self._embedding_batcher.submit((text, request_priority.get())))
+            self._embeddings_in_flight[text] = in_flight
+            in_flight.add_done_callback(lambda future: self._finish_embedding(text, future))
+        else:
+            self._coalesced_embeddings += 1
         
         try:
-            # Use Workers AI to generate embedding
-            payload = {"text": [text]}
-            response = await self._retry_request("POST", self.ai_url, json=payload)
-            result = response.json()
-            
-            if result.get("success") and "result" in result:
-                embedding = result["result"]["data"][0]
-                
-                # Cache the embedding (with size limit)
-                if len(self._embedding_cache) >= self._cache_max_size:
-                    # Remove oldest entry (simple FIFO)
-                    oldest_key = next(iter(self._embedding_cache))
-                    del self._embedding_cache[oldest_key]
-                
-                self._embedding_cache[text_hash] = embedding
-                return embedding
-            else:
-                raise ValueError(f"Workers AI embedding failed: {result}")
-                
+            # Shielded so one caller giving up does not cancel the others
+            return await asyncio.shield(in_flight)
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             logger.error(f"Failed to generate embedding with Workers AI: {e}")
             # TODO: Implement fallback to local sentence-transformers
             raise ValueError(f"Embedding generation failed: {e}")
     
+    def _finish_embedding(self, text: str, future: asyncio.Future) -> None:
+        self._embeddings_in_flight.pop(text, None)
+        # Mark a failure as retrieved even if every caller was cancelled
+        if not future.cancelled():
+            future.exception()
+    
+    async def _generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Embed many texts through the embedding batcher."""
+        return list(await asyncio.gather(*(self._generate_embedding(text) for text in texts)))
+    
+    async def _embed_texts(self, requests: List[Tuple[str, int]]) -> List[List[float]]:
+        """
+        Embed (text, priority) requests with one Workers AI call and cache the results.
+        
+        The call runs at the most urgent priority in the batch, so a query
+        sharing a batch with background writes is not held back by them.
+        """
+        texts = [text for text, _ in requests]
+        priority = min(priority for _, priority in requests)
+        response = await self._retry_request("POST", self.ai_url, json={"text": texts}, priority=priority)
+        result = response.json()
+        
+        if not result.get("success") or "result" not in result:
+            raise ValueError(f"Workers AI embedding failed: {result}")
+        
+        data = result["result"]["data"]
+        if len(data) != len(texts):
+            raise ValueError(f"Workers AI returned {len(data)} embeddings for {len(texts)} texts")
+        
+        await self._embedding_cache.aput_many(list(zip(texts, data)))
+        return data
+    
     async def initialize(self) -> None:
         """Initialize the Cloudflare storage backend."""
         if self._initialized:
@@ -192,52 +385,17 @@ class CloudflareStorage(MemoryStorage):
             self._initialized = True
             logger.info("Cloudflare storage backend initialized successfully")
             
+            # A first sync copies all of D1; it runs in the background while reads use D1
+            if self.replica is not None and await self.replica.refreshed_at() is None:
+                self._start_replica_sync()
+            
         except Exception as e:
             logger.error(f"Failed to initialize Cloudflare storage: {e}")
             raise
     
     async def _initialize_d1_schema(self) -> None:
         """Initialize D1 database schema."""
-        schema_sql = """
-        -- Memory metadata table
-        CREATE TABLE IF NOT EXISTS memories (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            content_hash TEXT UNIQUE NOT NULL,
-            content TEXT NOT NULL,
-            memory_type TEXT,
-            created_at REAL NOT NULL,
-            created_at_iso TEXT NOT NULL,
-            updated_at REAL,
-            updated_at_iso TEXT,
-            metadata_json TEXT,
-            vector_id TEXT UNIQUE,
-            content_size INTEGER DEFAULT 0,
-            r2_key TEXT
-        );
-        
-        -- Tags table
-        CREATE TABLE IF NOT EXISTS tags (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT UNIQUE NOT NULL
-        );
-        
-        -- Memory-tag relationships
-        CREATE TABLE IF NOT EXISTS memory_tags (
-            memory_id INTEGER,
-            tag_id INTEGER,
-            PRIMARY KEY (memory_id, tag_id),
-            FOREIGN KEY (memory_id) REFERENCES memories(id) ON DELETE CASCADE,
-            FOREIGN KEY (tag_id) REFERENCES tags(id) ON DELETE CASCADE
-        );
-        
-        -- Indexes for performance
-        CREATE INDEX IF NOT EXISTS idx_memories_content_hash ON memories(content_hash);
-        CREATE INDEX IF NOT EXISTS idx_memories_created_at ON memories(created_at);
-        CREATE INDEX IF NOT EXISTS idx_memories_vector_id ON memories(vector_id);
-        CREATE INDEX IF NOT EXISTS idx_tags_name ON tags(name);
-        """
-        
-        payload = {"sql": schema_sql}
+        payload = {"sql": D1_SCHEMA}
         response = await self._retry_request("POST", f"{self.d1_url}/query", json=payload)
         result = response.json()
         
@@ -274,108 +432,133 @@ class CloudflareStorage(MemoryStorage):
     
     async def store(self, memory: Memory) -> Tuple[bool, str]:
         """Store a memory in Cloudflare storage."""
+        # Interactive writes queue behind reads but ahead of bulk work
+        priority = max(request_priority.get(), PRIORITY_NORMAL)
+        return await self._write_buffer.submit((memory, priority))
+    
+    async def _flush_stores(self, requests: List[Tuple[Memory, int]]) -> List[Tuple[bool, str]]:
+        """Write buffered store() calls at the most urgent priority among them."""
+        token = request_priority.set(min(priority for _, priority in requests))
         try:
-            # Generate embedding for the content
-            embedding = await self._generate_embedding(memory.content)
-            
-            # Determine storage strategy based on content size
-            content_size = len(memory.content.encode('utf-8'))
-            use_r2 = self.r2_bucket and content_size > self.large_content_threshold
-            
-            # Store large content in R2 if needed
-            r2_key = None
-            stored_content = memory.content
-            
-            if use_r2:
-                r2_key = f"content/{memory.content_hash}.txt"
-                await self._store_r2_content(r2_key, memory.content)
-                stored_content = f"[R2 Content: {r2_key}]"  # Placeholder in D1
-            
-            # Store vector in Vectorize
-            vector_id = f"mem_{memory.content_hash}"
-            vector_metadata = {
-                "content_hash": memory.content_hash,
-                "memory_type": memory.memory_type or "standard",
-                "tags": ",".join(memory.tags) if memory.tags else "",
-                "created_at": memory.created_at_iso or datetime.now().isoformat()
-            }
-            
-            await self._store_vectorize_vector(vector_id, embedding, vector_metadata)
-            
-            # Store metadata in D1
-            await self._store_d1_memory(memory, vector_id, content_size, r2_key, stored_content)
-            
-            logger.info(f"Successfully stored memory: {memory.content_hash}")
-            return True, f"Memory stored successfully (vector_id: {vector_id})"
-            
-        except Exception as e:
-            logger.error(f"Failed to store memory {memory.content_hash}: {e}")
-            return False, f"Storage failed: {str(e)}"
-    
-    async def _store_vectorize_vector(self, vector_id: str, embedding: List[float], metadata: Dict[str, Any]) -> None:
-        """Store vector in Vectorize."""
-        # Try without namespace first to isolate the issue
-        vector_data = {
-            "id": vector_id,
-            "values": embedding,
-            "metadata": metadata
-        }
+            return await self._write_batch([memory for memory, _ in requests])
+        finally:
+            request_priority.reset(token)
+    
+    @background
+    async def store_batch(self, memories: List[Memory]) -> List[Tuple[bool, str]]:
+        """
+        Store many memories with batched embedding, Vectorize and D1 requests.
+        
+        Returns one (success, message) per memory, in input order.
+        """
+        if not memories:
+            return []
+        return await self._write_batch(memories)
+    
+    async def _write_batch(self, memories: List[Memory]) -> List[Tuple[bool, str]]:
+        """
+        Write path shared by store() and store_batch().
         
-        # Convert to NDJSON format as required by the HTTP API
-        import json
-        ndjson_content = json.dumps(vector_data) + "\n"
+        One D1 query finds existing hashes, embeddings are generated in
+        batches, vectors go out as multi-row NDJSON upserts and memories,
+        tags and tag links are inserted with one D1 batch request per
+        D1_MAX_BATCH_BYTES of content. Large content is uploaded to R2
+        first, concurrently.
+        """
+        results: List[Optional[Tuple[bool, str]]] = [None] * len(memories)
         
         try:
-            # Send as raw NDJSON data with correct Content-Type header
-            client = await self._get_client()
-            
-            # Override headers for this specific request
-            headers = {
-                "Authorization": f"Bearer {self.api_token}",
-                "Content-Type": "application/x-ndjson"
-            }
-            
-            response = await client.post(
-                f"{self.vectorize_url}/upsert",
-                content=ndjson_content.encode("utf-8"),
-                headers=headers
-            )
-            
-            # Log the full response for debugging
-            logger.info(f"Vectorize response status: {response.status_code}")
-            logger.info(f"Vectorize response headers: {dict(response.headers)}")
-            response_text = response.text
-            logger.info(f"Vectorize response body: {response_text}")
+            # Duplicates in D1 or earlier in the batch are not re-embedded or re-upserted
+            existing_hashes = await self._find_existing_hashes([memory.content_hash for memory in memories])
+            to_store = []
+            for i, memory in enumerate(memories):
+                if memory.content_hash in existing_hashes:
+                    results[i] = (False, "Duplicate content detected")
+                else:
+                    existing_hashes.add(memory.content_hash)
+                    to_store.append(i)
+            
+            if to_store:
+                embeddings = await self._generate_embeddings([memories[i].content for i in to_store])
+                
+                # Upload large content to R2 before anything references it
+                rows = await asyncio.gather(*(self._prepare_row(memories[i]) for i in to_store))
+                
+                vectors = []
+                for i, embedding in zip(to_store, embeddings):
+                    memory = memories[i]
+                    vectors.append({
+                        "id": f"mem_{memory.content_hash}",
+                        "values": embedding,
+                        "metadata": {
+                            "content_hash": memory.content_hash,
+                            "memory_type": memory.memory_type or "standard",
+                            "tags": ",".join(memory.tags) if memory.tags else "",
+                            "created_at": memory.created_at_iso or datetime.now().isoformat()
+                        }
+                    })
+                await self._store_vectorize_vectors(vectors)
+                
+                # D1 batches are transactions: a failing group fails as a whole
+                for group in self._group_by_content_size(list(zip(to_store, rows))):
+                    try:
+                        await self._store_d1_memories(
+                            [row for _, row in group],
+                            [memories[i] for i, _ in group]
+                        )
+                        for i, _ in group:
+                            results[i] = (True, f"Memory stored successfully (vector_id: mem_{memories[i].content_hash})")
+                        await self._write_through("apply_rows", [
+                            dict(zip(MEMORY_INSERT_COLUMNS, row), tags=memories[i].tags or [])
+                            for i, row in group
+                        ])
+                    except Exception as e:
+                        logger.error(f"Failed to store {len(group)} memories in D1: {e}")
+                        for i, _ in group:
+                            results[i] = (False, f"Storage failed: {str(e)}")
+                
+                self._invalidate_rows(memories[i].content_hash for i in to_store)
             
-            if response.status_code != 200:
-                raise ValueError(f"HTTP {response.status_code}: {response_text}")
+            stored = sum(1 for result in results if result and result[0])
+            logger.info(f"Stored {stored}/{len(memories)} memories")
+            return results
             
+        except Exception as e:
+            logger.error(f"Failed to store memory batch: {e}")
+            return [result if result is not None else (False, f"Storage failed: {str(e)}") for result in results]
+    
+    async def _find_existing_hashes(self, content_hashes: List[str]) -> set:
+        """Content hashes already present in D1, with one query per D1_MAX_PARAMS hashes."""
+        hashes = list(dict.fromkeys(content_hashes))
+        existing = set()
+        for start in range(0, len(hashes), D1_MAX_PARAMS):
+            chunk = hashes[start:start + D1_MAX_PARAMS]
+            placeholders = ",".join(["?"] * len(chunk))
+            payload = {"sql": f"SELECT content_hash FROM memories WHERE content_hash IN ({placeholders})", "params": chunk}
+            response = await self._retry_request("POST", f"{self.d1_url}/query", json=payload)
             result = response.json()
+            
             if not result.get("success"):
-                raise ValueError(f"Failed to store vector: {result}")
-                
-        except Exception as e:
-            # Add more detailed error logging
-            logger.error(f"Vectorize insert failed: {e}")
-            logger.error(f"Vector data was: {vector_data}")
-            logger.error(f"NDJSON content: {ndjson_content.strip()}")
-            logger.error(f"URL was: {self.vectorize_url}/upsert")
-            raise ValueError(f"Failed to store vector: {e}")
-    
-    async def _store_d1_memory(self, memory: Memory, vector_id: str, content_size: int, r2_key: Optional[str], stored_content: str) -> None:
-        """Store memory metadata in D1."""
-        # Insert memory record
-        insert_sql = """
-        INSERT INTO memories (
-            content_hash, content, memory_type, created_at, created_at_iso,
-            updated_at, updated_at_iso, metadata_json, vector_id, content_size, r2_key
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """
+                raise ValueError(f"D1 duplicate check failed: {result}")
+            
+            existing.update(row["content_hash"] for row in result.get("result", [{}])[0].get("results") or [])
+        return existing
+    
+    async def _prepare_row(self, memory: Memory) -> List[Any]:
+        """The memories-table values for a memory, uploading its content to R2 if it is large."""
+        content_size = len(memory.content.encode('utf-8'))
+        r2_key = None
+        stored_content = memory.content
+        
+        if self.r2_bucket and content_size > self.large_content_threshold:
+            r2_key = f"content/{memory.content_hash}.txt"
+            await self._store_r2_content(r2_key, memory.content)
+            stored_content = f"[R2 Content: {r2_key}]"  # Placeholder in D1
         
         now = time.time()
         now_iso = datetime.now().isoformat()
         
-        params = [
+        return [
             memory.content_hash,
             stored_content,
             memory.memory_type,
@@ -384,47 +567,110 @@ class CloudflareStorage(MemoryStorage):
             memory.updated_at or now,
             memory.updated_at_iso or now_iso,
             json.dumps(memory.metadata) if memory.metadata else None,
-            vector_id,
+            f"mem_{memory.content_hash}",
             content_size,
             r2_key
         ]
-        
-        payload = {"sql": insert_sql, "params": params}
-        response = await self._retry_request("POST", f"{self.d1_url}/query", json=payload)
+    
+    @staticmethod
+    def _group_by_content_size(items: List[Tuple[int, List[Any]]]) -> List[List[Tuple[int, List[Any]]]]:
+        """Split rows into groups whose stored content fits in one D1 request."""
+        groups = []
+        group = []
+        group_bytes = 0
+        for item in items:
+            size = len(item[1][1].encode('utf-8'))
+            if group and group_bytes + size > D1_MAX_BATCH_BYTES:
+                groups.append(group)
+                group = []
+                group_bytes = 0
+            group.append(item)
+            group_bytes += size
+        if group:
+            groups.append(group)
+        return groups
+    
+    async def _store_vectorize_vectors(self, vectors: List[Dict[str, Any]]) -> None:
+        """Upsert vectors as NDJSON, VECTORIZE_MAX_BATCH per request."""
+        for start in range(0, len(vectors), VECTORIZE_MAX_BATCH):
+            chunk = vectors[start:start + VECTORIZE_MAX_BATCH]
+            ndjson_content = "".join(json.dumps(vector) + "\n" for vector in chunk)
+            
+            response = await self._retry_request(
+                "POST",
+                f"{self.vectorize_url}/upsert",
+                content=ndjson_content.encode("utf-8"),
+                headers={"Content-Type": "application/x-ndjson"}
+            )
+            logger.debug(f"Vectorize upsert of {len(chunk)} vectors: HTTP {response.status_code}")
+            
+            result = response.json()
+            if not result.get("success"):
+                raise ValueError(f"Failed to store vectors: {result}")
+    
+    async def _d1_batch(self, statements: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Run statements in one D1 request (and one transaction); returns their results."""
+        if not statements:
+            return []
+        response = await self._retry_request("POST", f"{self.d1_url}/query", json={"batch": statements})
         result = response.json()
         
         if not result.get("success"):
-            raise ValueError(f"Failed to store memory in D1: {result}")
-        
-        # Store tags if present
-        if memory.tags:
-            memory_id = result["result"][0]["meta"]["last_row_id"]
-            await self._store_d1_tags(memory_id, memory.tags)
-    
-    async def _store_d1_tags(self, memory_id: int, tags: List[str]) -> None:
-        """Store tags for a memory in D1."""
-        for tag in tags:
-            # Insert tag if not exists
-            tag_sql = "INSERT OR IGNORE INTO tags (name) VALUES (?)"
-            payload = {"sql": tag_sql, "params": [tag]}
-            await self._retry_request("POST", f"{self.d1_url}/query", json=payload)
-            
-            # Link tag to memory
-            link_sql = """
-            INSERT INTO memory_tags (memory_id, tag_id)
-            SELECT ?, id FROM tags WHERE name = ?
-            """
-            payload = {"sql": link_sql, "params": [memory_id, tag]}
-            await self._retry_request("POST", f"{self.d1_url}/query", json=payload)
+            raise ValueError(f"D1 batch failed: {result}")
+        
+        return result.get("result", [])
+    
+    def _tag_statements(self, pairs: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """Statements inserting tags and linking them to memories, given (content_hash, tag) pairs."""
+        statements = []
+        names = list(dict.fromkeys(tag for _, tag in pairs))
+        for start in range(0, len(names), D1_MAX_PARAMS):
+            chunk = names[start:start + D1_MAX_PARAMS]
+            statements.append({
+                "sql": "INSERT OR IGNORE INTO tags (name) VALUES " + ",".join(["(?)"] * len(chunk)),
+                "params": chunk
+            })
+        
+        per_statement = D1_MAX_PARAMS // 2
+        for start in range(0, len(pairs), per_statement):
+            chunk = pairs[start:start + per_statement]
+            statements.append({
+                "sql": f"""
+                INSERT OR IGNORE INTO memory_tags (memory_id, tag_id)
+                SELECT m.id, t.id FROM (VALUES {",".join(["(?, ?)"] * len(chunk))}) AS v
+                JOIN memories m ON m.content_hash = v.column1
+                JOIN tags t ON t.name = v.column2
+                """,
+                "params": [value for pair in chunk for value in pair]
+            })
+        return statements
+    
+    async def _store_d1_memories(self, rows: List[List[Any]], memories: List[Memory]) -> None:
+        """Insert memory rows, their tags and tag links in one D1 batch request."""
+        statements = []
+        per_statement = D1_MAX_PARAMS // len(MEMORY_INSERT_COLUMNS)
+        row_placeholders = "(" + ", ".join(["?"] * len(MEMORY_INSERT_COLUMNS)) + ")"
+        for start in range(0, len(rows), per_statement):
+            chunk = rows[start:start + per_statement]
+            statements.append({
+                "sql": f"INSERT INTO memories ({', '.join(MEMORY_INSERT_COLUMNS)}) VALUES "
+                       + ", ".join([row_placeholders] * len(chunk)),
+                "params": [value for row in chunk for value in row]
+            })
+        
+        pairs = [(memory.content_hash, tag) for memory in memories for tag in dict.fromkeys(memory.tags or [])]
+        statements.extend(self._tag_statements(pairs))
+        await self._d1_batch(statements)
     
     async def _store_r2_content(self, key: str, content: str) -> None:
         """Store content in R2."""
-        response = await self._retry_request(
-            "PUT", 
-            f"{self.r2_url}/{key}",
-            content=content.encode('utf-8'),
-            headers={"Content-Type": "text/plain"}
-        )
+        async with self._r2_semaphore:
+            response = await self._retry_request(
+                "PUT", 
+                f"{self.r2_url}/{key}",
+                content=content.encode('utf-8'),
+                headers={"Content-Type": "text/plain"}
+            )
         
         if response.status_code not in [200, 201]:
             raise ValueError(f"Failed to store content in R2: {response.status_code}")
@@ -451,14 +697,24 @@ class CloudflareStorage(MemoryStorage):
             
             matches = result.get("result", {}).get("matches", [])
             
+            # Hydrate every match with one D1 round trip (per 100 hashes)
+            content_hashes = []
+            for match in matches:
+                content_hash = match.get("metadata", {}).get("content_hash")
+                if content_hash:
+                    content_hashes.append(content_hash)
+                else:
+                    logger.warning(f"No content_hash in vector metadata: {match.get('id')}")
+            memories = await self._load_memories_by_hash(content_hashes)
+            
             # Convert to MemoryQueryResult objects
             results = []
             for match in matches:
-                memory = await self._load_memory_from_match(match)
+                memory = memories.get(match.get("metadata", {}).get("content_hash"))
                 if memory:
                     query_result = MemoryQueryResult(
                         memory=memory,
-                        similarity_score=match.get("score", 0.0)
+                        relevance_score=match.get("score", 0.0)
                     )
                     results.append(query_result)
             
@@ -469,76 +725,278 @@ class CloudflareStorage(MemoryStorage):
             logger.error(f"Failed to retrieve memories: {e}")
             return []
     
-    async def _load_memory_from_match(self, match: Dict[str, Any]) -> Optional[Memory]:
-        """Load full memory from Vectorize match."""
-        try:
-            vector_id = match.get("id")
-            metadata = match.get("metadata", {})
-            content_hash = metadata.get("content_hash")
-            
-            if not content_hash:
-                logger.warning(f"No content_hash in vector metadata: {vector_id}")
-                return None
-            
-            # Load from D1
-            sql = "SELECT * FROM memories WHERE content_hash = ?"
-            payload = {"sql": sql, "params": [content_hash]}
-            response = await self._retry_request("POST", f"{self.d1_url}/query", json=payload)
-            result = response.json()
-            
-            if not result.get("success") or not result.get("result", [{}])[0].get("results"):
-                logger.warning(f"Memory not found in D1: {content_hash}")
+    async def _load_memories_by_hash(self, content_hashes: Iterable[str]) -> Dict[str, Memory]:
+        """Load memories by content hash from the row cache, the replica and a batched D1 query."""
+        memories = {}
+        missing = []
+        for content_hash in dict.fromkeys(content_hashes):
+            row = self._get_cached_row(content_hash)
+            if row is not None:
+                memories[content_hash] = self._memory_from_row(row)
+            else:
+                missing.append(content_hash)
+        
+        if missing and await self._fresh_replica():
+            for memory in await self._memories_from_rows(await self.replica.memories_by_hash(missing)):
+                memories[memory.content_hash] = memory
+            # Vectors may be visible before their rows reach the replica
+            missing = [content_hash for content_hash in missing if content_hash not in memories]
+        
+        if missing:
+            chunks = [missing[i:i + D1_MAX_PARAMS] for i in range(0, len(missing), D1_MAX_PARAMS)]
+            chunk_rows = await asyncio.gather(*(self._query_memory_rows(chunk) for chunk in chunks))
+            rows = [row for chunk in chunk_rows for row in chunk]
+            for memory in await self._memories_from_rows(rows):
+                memories[memory.content_hash] = memory
+            
+            not_found = set(missing) - memories.keys()
+            if not_found:
+                logger.warning(f"Memories not found in D1: {sorted(not_found)}")
+        
+        return memories
+    
+    async def _query_memory_rows(self, content_hashes: List[str]) -> List[Dict[str, Any]]:
+        """Rows (with joined tag names) for up to D1_MAX_PARAMS content hashes."""
+        placeholders = ",".join(["?"] * len(content_hashes))
+        sql = f"SELECT {MEMORY_COLUMNS} FROM memories m WHERE m.content_hash IN ({placeholders})"
+        payload = {"sql": sql, "params": content_hashes}
+        response = await self._retry_request("POST", f"{self.d1_url}/query", json=payload)
+        result = response.json()
+        
+        if not result.get("success"):
+            raise ValueError(f"D1 memory lookup failed: {result}")
+        
+        return result.get("result", [{}])[0].get("results") or []
+    
+    async def _memories_from_rows(self, rows: List[Dict[str, Any]]) -> List[Memory]:
+        """
+        Build memories from D1 rows selected with MEMORY_COLUMNS.
+        
+        R2-backed content is fetched concurrently (bounded by the R2
+        semaphore) and the hydrated rows are added to the row cache.
+        """
+        async def hydrate(row: Dict[str, Any]) -> Optional[Memory]:
+            try:
+                row = dict(row)
+                content = row["content"]
+                if row.get("r2_key") and content.startswith("[R2 Content:"):
+                    row["content"] = await self._load_r2_content(row["r2_key"])
+                tag_names = row.pop("tag_names", None)
+                row["tags"] = tag_names.split(TAG_SEPARATOR) if tag_names else []
+                
+                self._cache_row(row)
+                return self._memory_from_row(row)
+            except Exception as e:
+                logger.error(f"Failed to load memory from row: {e}")
                 return None
-            
-            row = result["result"][0]["results"][0]
-            
-            # Load content from R2 if needed
-            content = row["content"]
-            if row.get("r2_key") and content.startswith("[R2 Content:"):
-                content = await self._load_r2_content(row["r2_key"])
-            
-            # Load tags
-            tags = await self._load_memory_tags(row["id"])
-            
-            # Reconstruct Memory object
-            memory = Memory(
-                content=content,
-                content_hash=content_hash,
-                tags=tags,
-                memory_type=row.get("memory_type"),
-                metadata=json.loads(row["metadata_json"]) if row.get("metadata_json") else {},
-                created_at=row.get("created_at"),
-                created_at_iso=row.get("created_at_iso"),
-                updated_at=row.get("updated_at"),
-                updated_at_iso=row.get("updated_at_iso")
-            )
-            
-            return memory
-            
-        except Exception as e:
-            logger.error(f"Failed to load memory from match: {e}")
+        
+        memories = await asyncio.gather(*(hydrate(row) for row in rows))
+        return [memory for memory in memories if memory is not None]
+    
+    def _memory_from_row(self, row: Dict[str, Any]) -> Memory:
+        """Reconstruct a Memory from a hydrated row."""
+        return Memory(
+            content=row["content"],
+            content_hash=row["content_hash"],
+            tags=list(row["tags"]),
+            memory_type=row.get("memory_type"),
+            metadata=json.loads(row["metadata_json"]) if row.get("metadata_json") else {},
+            created_at=row.get("created_at"),
+            created_at_iso=row.get("created_at_iso"),
+            updated_at=row.get("updated_at"),
+            updated_at_iso=row.get("updated_at_iso")
+        )
+    
+    def _get_cached_row(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        entry = self._row_cache.get(content_hash)
+        if entry is None:
             return None
+        cached_at, row = entry
+        if time.monotonic() - cached_at > self.row_cache_ttl:
+            del self._row_cache[content_hash]
+            return None
+        self._row_cache.move_to_end(content_hash)
+        return row
     
-    async def _load_r2_content(self, r2_key: str) -> str:
-        """Load content from R2."""
-        response = await self._retry_request("GET", f"{self.r2_url}/{r2_key}")
-        return response.text
+    def _cache_row(self, row: Dict[str, Any]) -> None:
+        if self.row_cache_size <= 0:
+            return
+        self._row_cache[row["content_hash"]] = (time.monotonic(), row)
+        self._row_cache.move_to_end(row["content_hash"])
+        while len(self._row_cache) > self.row_cache_size:
+            self._row_cache.popitem(last=False)
     
-    async def _load_memory_tags(self, memory_id: int) -> List[str]:
-        """Load tags for a memory from D1."""
-        sql = """
-        SELECT t.name FROM tags t
-        JOIN memory_tags mt ON t.id = mt.tag_id
-        WHERE mt.memory_id = ?
+    def _invalidate_rows(self, content_hashes: Optional[Iterable[str]] = None) -> None:
+        """Drop cached rows (all of them when no hashes are given)."""
+        if content_hashes is None:
+            self._row_cache.clear()
+            return
+        for content_hash in content_hashes:
+            self._row_cache.pop(content_hash, None)
+    
+    async def _fresh_replica(self) -> bool:
+        """
+        Whether reads can be served from the replica.
+        
+        A replica that has never synced is not used: its first sync runs in
+        the background and reads go to D1 until it completes. A replica older
+        than replica_max_staleness is still served while a refresh runs in the
+        background. Mutations resolve their targets in D1, never here.
         """
-        payload = {"sql": sql, "params": [memory_id]}
+        if self.replica is None:
+            return False
+        
+        refreshed_at = await self.replica.refreshed_at()
+        if refreshed_at is None:
+            self._start_replica_sync()
+            return False
+        if time.time() - refreshed_at > self.replica_max_staleness:
+            self._start_replica_sync()
+        return True
+    
+    def _start_replica_sync(self) -> None:
+        """Start a replica sync in the background unless one is running."""
+        if self._replica_sync is None or self._replica_sync.done():
+            self._replica_sync = asyncio.create_task(self._sync_replica())
+    
+    @background
+    async def _sync_replica(self) -> None:
+        """Sync the replica with D1, at background priority so user requests go first."""
+        async with self._replica_lock:
+            refreshed_at = await self.replica.refreshed_at()
+            if refreshed_at is not None and time.time() - refreshed_at <= self.replica_max_staleness:
+                return
+            try:
+                await self._refresh_replica()
+                if refreshed_at is None:
+                    logger.info(f"D1 replica synced: {await self.replica.count()} memories")
+            except Exception as e:
+                self._replica_refresh_failures += 1
+                if refreshed_at is None:
+                    logger.warning(f"Failed to sync D1 replica, reads stay on D1: {e}")
+                else:
+                    logger.warning(f"Failed to refresh D1 replica, serving it stale: {e}")
+    
+    async def _d1_rows(self, sql: str, params: Optional[List[Any]] = None) -> List[Dict[str, Any]]:
+        payload = {"sql": sql, "params": params or []}
         response = await self._retry_request("POST", f"{self.d1_url}/query", json=payload)
         result = response.json()
         
-        if result.get("success") and result.get("result", [{}])[0].get("results"):
-            return [row["name"] for row in result["result"][0]["results"]]
+        if not result.get("success"):
+            raise ValueError(f"D1 query failed: {result}")
+        
+        return result.get("result", [{}])[0].get("results") or []
+    
+    async def _refresh_replica(self) -> None:
+        """
+        Pull the D1 changes made since the replica's watermark.
+        
+        Rows are read in (updated_at, id) order, so the watermark can be
+        advanced after every page. Deletes, and rows written without moving
+        updated_at, leave no trace in that order; they are caught by
+        _reconcile_replica whenever the row counts disagree.
+        """
+        updated_at, last_id = await self.replica.get_watermark()
+        while True:
+            rows = await self._d1_rows(f"""
+            SELECT {MEMORY_COLUMNS} FROM memories m
+            WHERE m.updated_at > ? OR (m.updated_at = ? AND m.id > ?)
+            ORDER BY m.updated_at, m.id
+            LIMIT ?
+            """, [updated_at, updated_at, last_id, REPLICA_PAGE_SIZE])
+            if not rows:
+                break
+            
+            await self.replica.apply_rows(rows)
+            self._invalidate_rows(row["content_hash"] for row in rows)
+            updated_at, last_id = rows[-1]["updated_at"], rows[-1]["id"]
+            await self.replica.set_watermark(updated_at, last_id)
+            if len(rows) < REPLICA_PAGE_SIZE:
+                break
+        
+        remote = (await self._d1_rows(
+            "SELECT COUNT(*) as count, MIN(updated_at) as low, MAX(updated_at) as high FROM memories"
+        ))[0]
+        if remote["count"] != await self.replica.count():
+            await self._reconcile_replica(remote["low"], remote["high"])
+        
+        await self.replica.mark_refreshed()
+        self._replica_refreshes += 1
+    
+    async def _reconcile_replica(self, remote_low: Optional[float], remote_high: Optional[float]) -> None:
+        """
+        Find the rows the replica has but D1 no longer has, and vice versa.
+        
+        Row counts are compared per updated_at range (rows without one form a
+        range of their own); ranges that disagree are halved until they hold
+        at most REPLICA_PAGE_SIZE rows, and only those ranges' content hashes
+        are compared. A few deletes cost a handful of COUNT queries on the
+        updated_at index instead of listing every hash in D1.
+        """
+        local_low, local_high = await self.replica.updated_at_bounds()
+        lows = [value for value in (remote_low, local_low) if value is not None]
+        highs = [value for value in (remote_high, local_high) if value is not None]
+        ranges: List[Optional[Tuple[float, float]]] = [None]
+        if lows:
+            ranges.append((min(lows) - 1, max(highs)))
+        
+        removed: Set[str] = set()
+        missing: Set[str] = set()
+        while ranges:
+            conditions = [updated_at_range(bounds) for bounds in ranges]
+            counts = await asyncio.gather(*(
+                self._d1_rows(f"SELECT COUNT(*) as count FROM memories WHERE {condition}", params)
+                for condition, params in conditions
+            ))
+            
+            next_ranges = []
+            for bounds, (condition, params), remote_rows in zip(ranges, conditions, counts):
+                remote_count = remote_rows[0]["count"]
+                local_count = await self.replica.count_in_range(bounds)
+                if remote_count == local_count:
+                    continue
+                if bounds is None or remote_count + local_count <= REPLICA_PAGE_SIZE or bounds[1] - bounds[0] < 1e-3:
+                    remote_hashes = {row["content_hash"] for row in await self._d1_rows(
+                        f"SELECT content_hash FROM memories WHERE {condition}", params
+                    )}
+                    local_hashes = set(await self.replica.content_hashes(bounds))
+                    removed |= local_hashes - remote_hashes
+                    missing |= remote_hashes - local_hashes
+                else:
+                    middle = (bounds[0] + bounds[1]) / 2
+                    next_ranges += [(bounds[0], middle), (middle, bounds[1])]
+            ranges = next_ranges
+        
+        # A row whose updated_at differs between the two shows up on both sides; it is re-pulled
+        await self.replica.remove(removed - missing)
+        self._invalidate_rows(removed)
+        
+        missing_hashes = sorted(missing)
+        chunks = [missing_hashes[i:i + D1_MAX_PARAMS] for i in range(0, len(missing_hashes), D1_MAX_PARAMS)]
+        for rows in await asyncio.gather(*(self._query_memory_rows(chunk) for chunk in chunks)):
+            await self.replica.apply_rows(rows)
+        
+        logger.info(f"Reconciled D1 replica: {len(removed - missing)} removed, {len(missing)} added")
+    
+    async def _write_through(self, method: str, *args) -> None:
+        """
+        Mirror a write that succeeded in D1 onto the replica.
         
-        return []
+        The replica is only a cache: a failure here is logged and repaired
+        by the next refresh instead of failing the write.
+        """
+        if self.replica is None:
+            return
+        try:
+            await getattr(self.replica, method)(*args)
+        except Exception as e:
+            logger.warning(f"Failed to write through to D1 replica: {e}")
+    
+    async def _load_r2_content(self, r2_key: str) -> str:
+        """Load content from R2."""
+        async with self._r2_semaphore:
+            response = await self._retry_request("GET", f"{self.r2_url}/{r2_key}")
+        return response.text
     
     async def search_by_tag(self, tags: List[str]) -> List[Memory]:
         """Search memories by tags."""
@@ -546,13 +1004,20 @@ class CloudflareStorage(MemoryStorage):
             if not tags:
                 return []
             
+            if await self._fresh_replica():
+                memories = await self._memories_from_rows(await self.replica.search_by_tags(tags))
+                logger.info(f"Found {len(memories)} memories with tags: {tags} (replica)")
+                return memories
+            
             # Build SQL query for tag search
             placeholders = ",".join(["?"] * len(tags))
             sql = f"""
-            SELECT DISTINCT m.* FROM memories m
-            JOIN memory_tags mt ON m.id = mt.memory_id
-            JOIN tags t ON mt.tag_id = t.id
-            WHERE t.name IN ({placeholders})
+            SELECT {MEMORY_COLUMNS} FROM memories m
+            WHERE m.id IN (
+                SELECT mt.memory_id FROM memory_tags mt
+                JOIN tags t ON mt.tag_id = t.id
+                WHERE t.name IN ({placeholders})
+            )
             ORDER BY m.created_at DESC
             """
             
@@ -563,12 +1028,8 @@ class CloudflareStorage(MemoryStorage):
             if not result.get("success"):
                 raise ValueError(f"D1 tag search failed: {result}")
             
-            memories = []
-            if result.get("result", [{}])[0].get("results"):
-                for row in result["result"][0]["results"]:
-                    memory = await self._load_memory_from_row(row)
-                    if memory:
-                        memories.append(memory)
+            rows = result.get("result", [{}])[0].get("results") or []
+            memories = await self._memories_from_rows(rows)
             
             logger.info(f"Found {len(memories)} memories with tags: {tags}")
             return memories
@@ -577,35 +1038,6 @@ class CloudflareStorage(MemoryStorage):
             logger.error(f"Failed to search by tags: {e}")
             return []
     
-    async def _load_memory_from_row(self, row: Dict[str, Any]) -> Optional[Memory]:
-        """Load memory from D1 row data."""
-        try:
-            # Load content from R2 if needed
-            content = row["content"]
-            if row.get("r2_key") and content.startswith("[R2 Content:"):
-                content = await self._load_r2_content(row["r2_key"])
-            
-            # Load tags
-            tags = await self._load_memory_tags(row["id"])
-            
-            memory = Memory(
-                content=content,
-                content_hash=row["content_hash"],
-                tags=tags,
-                memory_type=row.get("memory_type"),
-                metadata=json.loads(row["metadata_json"]) if row.get("metadata_json") else {},
-                created_at=row.get("created_at"),
-                created_at_iso=row.get("created_at_iso"),
-                updated_at=row.get("updated_at"),
-                updated_at_iso=row.get("updated_at_iso")
-            )
-            
-            return memory
-            
-        except Exception as e:
-            logger.error(f"Failed to load memory from row: {e}")
-            return None
-    
     async def delete(self, content_hash: str) -> Tuple[bool, str]:
         """Delete a memory by its hash."""
         try:
@@ -639,6 +1071,8 @@ class CloudflareStorage(MemoryStorage):
             
             if not result.get("success"):
                 raise ValueError(f"Failed to delete from D1: {result}")
+            self._invalidate_rows([content_hash])
+            await self._write_through("remove", [content_hash])
             
             logger.info(f"Successfully deleted memory: {content_hash}")
             return True, "Memory deleted successfully"
@@ -667,15 +1101,21 @@ class CloudflareStorage(MemoryStorage):
         except Exception as e:
             logger.warning(f"Failed to delete R2 content {r2_key}: {e}")
     
+    @background
     async def delete_by_tag(self, tag: str) -> Tuple[int, str]:
         """Delete memories by tag."""
         try:
-            # Find memories with the tag
-            memories = await self.search_by_tag([tag])
+            # Find memories with the tag in D1; the replica may be stale
+            rows = await self._d1_rows("""
+            SELECT m.content_hash FROM memories m
+            JOIN memory_tags mt ON mt.memory_id = m.id
+            JOIN tags t ON t.id = mt.tag_id
+            WHERE t.name = ?
+            """, [tag])
             
             deleted_count = 0
-            for memory in memories:
-                success, _ = await self.delete(memory.content_hash)
+            for row in rows:
+                success, _ = await self.delete(row["content_hash"])
                 if success:
                     deleted_count += 1
             
@@ -686,6 +1126,7 @@ class CloudflareStorage(MemoryStorage):
             logger.error(f"Failed to delete by tag {tag}: {e}")
             return 0, f"Deletion failed: {str(e)}"
     
+    @background
     async def cleanup_duplicates(self) -> Tuple[int, str]:
         """Remove duplicate memories based on content hash."""
         try:
@@ -707,6 +1148,7 @@ class CloudflareStorage(MemoryStorage):
             duplicate_groups = result.get("result", [{}])[0].get("results", [])
             
             total_deleted = 0
+            cleaned = []
             for group in duplicate_groups:
                 content_hash = group["content_hash"]
                 keep_id = group["keep_id"]
@@ -720,6 +1162,13 @@ class CloudflareStorage(MemoryStorage):
                 if result.get("success") and result.get("result", [{}])[0].get("meta"):
                     deleted = result["result"][0]["meta"].get("changes", 0)
                     total_deleted += deleted
+                    cleaned.append(content_hash)
+                self._invalidate_rows([content_hash])
+            
+            # The replica mirrors one row per hash; dropping it makes the next
+            # refresh's reconciliation pull the surviving row back from D1
+            if cleaned:
+                await self._write_through("remove", cleaned)
             
             logger.info(f"Cleaned up {total_deleted} duplicate memories")
             return total_deleted, f"Removed {total_deleted} duplicates"
@@ -732,16 +1181,13 @@ class CloudflareStorage(MemoryStorage):
         """Update memory metadata without recreating the entry."""
         try:
             # Build update SQL
-            update_fields = []
-            params = []
+            fields = {}
             
             if "metadata" in updates:
-                update_fields.append("metadata_json = ?")
-                params.append(json.dumps(updates["metadata"]))
+                fields["metadata_json"] = json.dumps(updates["metadata"])
             
             if "memory_type" in updates:
-                update_fields.append("memory_type = ?")
-                params.append(updates["memory_type"])
+                fields["memory_type"] = updates["memory_type"]
             
             if "tags" in updates:
                 # Handle tags separately - they require relational updates
@@ -749,18 +1195,16 @@ class CloudflareStorage(MemoryStorage):
             
             # Always update updated_at timestamp
             if not preserve_timestamps or "updated_at" not in updates:
-                update_fields.append("updated_at = ?")
-                update_fields.append("updated_at_iso = ?")
-                now = time.time()
-                now_iso = datetime.now().isoformat()
-                params.extend([now, now_iso])
+                fields["updated_at"] = time.time()
+                fields["updated_at_iso"] = datetime.now().isoformat()
             
-            if not update_fields:
+            if not fields:
                 return True, "No updates needed"
             
             # Update memory record
-            sql = f"UPDATE memories SET {', '.join(update_fields)} WHERE content_hash = ?"
-            params.append(content_hash)
+            assignments = ", ".join(f"{column} = ?" for column in fields)
+            sql = f"UPDATE memories SET {assignments} WHERE content_hash = ?"
+            params = list(fields.values()) + [content_hash]
             
             payload = {"sql": sql, "params": params}
             response = await self._retry_request("POST", f"{self.d1_url}/query", json=payload)
@@ -768,6 +1212,8 @@ class CloudflareStorage(MemoryStorage):
             
             if not result.get("success"):
                 raise ValueError(f"Failed to update memory: {result}")
+            self._invalidate_rows([content_hash])
+            await self._write_through("update_memory", content_hash, fields)
             
             # Handle tag updates if provided
             if "tags" in updates:
@@ -780,6 +1226,36 @@ class CloudflareStorage(MemoryStorage):
             logger.error(f"Failed to update memory metadata {content_hash}: {e}")
             return False, f"Update failed: {str(e)}"
     
+    async def update_memories_metadata(self, updates: Dict[str, Dict[str, Any]], touch: bool = True) -> Tuple[int, str]:
+        """
+        Merge metadata patches into many memories in one D1 batch.
+        
+        Each patch is merged into metadata_json with json_patch(), so keys not
+        in the patch are kept. With ``touch=False`` updated_at is left as it was;
+        such writes reach this instance's replica by write-through only.
+        """
+        if not updates:
+            return 0, "No updates needed"
+        try:
+            fields = {"updated_at": time.time(), "updated_at_iso": datetime.now().isoformat()} if touch else {}
+            assignments = "".join(f", {column} = ?" for column in fields)
+            statements = [
+                {
+                    "sql": f"UPDATE memories SET metadata_json = json_patch(COALESCE(metadata_json, '{{}}'), ?){assignments} "
+                           "WHERE content_hash = ?",
+                    "params": [json.dumps(patch)] + list(fields.values()) + [content_hash]
+                }
+                for content_hash, patch in updates.items()
+            ]
+            results = await self._d1_batch(statements)
+            updated = sum(result.get("meta", {}).get("changes", 0) for result in results)
+            self._invalidate_rows(updates)
+            await self._write_through("patch_metadata", updates, fields)
+            return updated, f"Updated metadata for {updated} of {len(updates)} memories"
+        except Exception as e:
+            logger.error(f"Failed to update metadata in bulk: {e}")
+            return 0, f"Update failed: {str(e)}"
+    
     async def _update_memory_tags(self, content_hash: str, new_tags: List[str]) -> None:
         """Update tags for a memory."""
         # Get memory ID
@@ -793,18 +1269,19 @@ class CloudflareStorage(MemoryStorage):
         
         memory_id = result["result"][0]["results"][0]["id"]
         
-        # Delete existing tag relationships
-        delete_sql = "DELETE FROM memory_tags WHERE memory_id = ?"
-        payload = {"sql": delete_sql, "params": [memory_id]}
-        await self._retry_request("POST", f"{self.d1_url}/query", json=payload)
-        
-        # Add new tags
-        if new_tags:
-            await self._store_d1_tags(memory_id, new_tags)
+        # Replace the tag relationships in one batch
+        statements = [{"sql": "DELETE FROM memory_tags WHERE memory_id = ?", "params": [memory_id]}]
+        statements.extend(self._tag_statements([(content_hash, tag) for tag in dict.fromkeys(new_tags or [])]))
+        await self._d1_batch(statements)
+        self._invalidate_rows([content_hash])
+        await self._write_through("update_memory", content_hash, {}, list(new_tags or []))
     
     async def get_stats(self) -> Dict[str, Any]:
         """Get storage statistics."""
         try:
+            if await self._fresh_replica():
+                return await self._stats_response(await self.replica.statistics())
+            
             # Get memory count and size from D1
             sql = """
             SELECT 
@@ -820,19 +1297,7 @@ class CloudflareStorage(MemoryStorage):
             result = response.json()
             
             if result.get("success") and result.get("result", [{}])[0].get("results"):
-                stats = result["result"][0]["results"][0]
-                
-                return {
-                    "total_memories": stats.get("total_memories", 0),
-                    "total_content_size_bytes": stats.get("total_content_size", 0),
-                    "total_vectors": stats.get("total_vectors", 0),
-                    "r2_stored_count": stats.get("r2_stored_count", 0),
-                    "storage_backend": "cloudflare",
-                    "vectorize_index": self.vectorize_index,
-                    "d1_database": self.d1_database_id,
-                    "r2_bucket": self.r2_bucket,
-                    "status": "operational"
-                }
+                return await self._stats_response(result["result"][0]["results"][0])
             
             return {
                 "total_memories": 0,
@@ -849,9 +1314,43 @@ class CloudflareStorage(MemoryStorage):
                 "error": str(e)
             }
     
+    async def _stats_response(self, stats: Dict[str, Any]) -> Dict[str, Any]:
+        """get_stats() output for the memory aggregates read from D1 or the replica."""
+        response = {
+            "total_memories": stats.get("total_memories", 0),
+            "total_content_size_bytes": stats.get("total_content_size", 0),
+            "total_vectors": stats.get("total_vectors", 0),
+            "r2_stored_count": stats.get("r2_stored_count", 0),
+            "storage_backend": "cloudflare",
+            "vectorize_index": self.vectorize_index,
+            "d1_database": self.d1_database_id,
+            "r2_bucket": self.r2_bucket,
+            "embedding_cache": await self._embedding_cache.aget_stats(),
+            "rate_limits": self.rate_governor.get_stats(),
+            "embedding_batching": {
+                "requests": self._embedding_batcher.batches,
+                "texts": self._embedding_batcher.items,
+                "coalesced": self._coalesced_embeddings
+            },
+            "status": "operational"
+        }
+        if self.replica:
+            refreshed_at = await self.replica.refreshed_at()
+            response["replica"] = {
+                "path": self.replica.path,
+                "max_staleness_seconds": self.replica_max_staleness,
+                "age_seconds": round(time.time() - refreshed_at, 3) if refreshed_at else None,
+                "refreshes": self._replica_refreshes,
+                "refresh_failures": self._replica_refresh_failures
+            }
+        return response
+    
     async def get_all_tags(self) -> List[str]:
         """Get all unique tags in the storage."""
         try:
+            if await self._fresh_replica():
+                return await self.replica.all_tags()
+            
             sql = "SELECT name FROM tags ORDER BY name"
             payload = {"sql": sql}
             response = await self._retry_request("POST", f"{self.d1_url}/query", json=payload)
@@ -869,17 +1368,19 @@ class CloudflareStorage(MemoryStorage):
     async def get_recent_memories(self, n: int = 10) -> List[Memory]:
         """Get n most recent memories."""
         try:
-            sql = "SELECT * FROM memories ORDER BY created_at DESC LIMIT ?"
+            if await self._fresh_replica():
+                memories = await self._memories_from_rows(await self.replica.recent(n))
+                logger.info(f"Retrieved {len(memories)} recent memories (replica)")
+                return memories
+            
+            sql = f"SELECT {MEMORY_COLUMNS} FROM memories m ORDER BY m.created_at DESC LIMIT ?"
             payload = {"sql": sql, "params": [n]}
             response = await self._retry_request("POST", f"{self.d1_url}/query", json=payload)
             result = response.json()
             
             memories = []
-            if result.get("success") and result.get("result", [{}])[0].get("results"):
-                for row in result["result"][0]["results"]:
-                    memory = await self._load_memory_from_row(row)
-                    if memory:
-                        memories.append(memory)
+            if result.get("success"):
+                memories = await self._memories_from_rows(result.get("result", [{}])[0].get("results") or [])
             
             logger.info(f"Retrieved {len(memories)} recent memories")
             return memories
@@ -890,11 +1391,27 @@ class CloudflareStorage(MemoryStorage):
     
     async def close(self) -> None:
         """Close the storage backend and cleanup resources."""
+        await self._write_buffer.drain()
+        await self._embedding_batcher.drain()
+        
         if self.client:
             await self.client.aclose()
             self.client = None
         
-        # Clear embedding cache
+        self._invalidate_rows()
+        
+        if self._replica_sync is not None and not self._replica_sync.done():
+            self._replica_sync.cancel()
+            try:
+                await self._replica_sync
+            except asyncio.CancelledError:
+                pass
+        
+        if self.replica:
+            await self.replica.close()
+        
+        # Clear embedding cache (persisted entries are kept for the next start)
         self._embedding_cache.clear()
+        self._embedding_cache.close()
         
         logger.info("Cloudflare storage backend closed")
\ No newline at end of file
@@ -0,0 +1,286 @@
+# Copyright 2024 Heinrich Krupp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Request rate governor for the Cloudflare storage backend.
+
+Every Cloudflare API call first takes a token from the bucket of its API
+family (Vectorize, D1, Workers AI, R2). Buckets adapt to the server: a 429
+halves the family's rate and pauses it for as long as the server asks
+(``Retry-After`` or the ``RateLimit-*`` headers), after which the rate
+recovers with each successful request. Waiting requests are served by
+priority, so interactive reads are not stuck behind a migration's writes,
+and background requests may only hold part of the connection pool.
+"""
+
+import asyncio
+import functools
+import heapq
+import itertools
+import logging
+import time
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_CRITICAL = 0  # interactive reads
+PRIORITY_NORMAL = 1
+PRIORITY_BACKGROUND = 2  # bulk and maintenance writes
+
+PRIORITY_NAMES = {PRIORITY_CRITICAL: 'critical', PRIORITY_NORMAL: 'normal', PRIORITY_BACKGROUND: 'background'}
+
+# Priority of the requests made by the current task
+request_priority: ContextVar[int] = ContextVar('cloudflare_request_priority', default=PRIORITY_CRITICAL)
+
+def background(func):
+    """Run an async method's Cloudflare requests at background priority."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        token = request_priority.set(PRIORITY_BACKGROUND)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            request_priority.reset(token)
+    return wrapper
+
+def api_family(url: str) -> str:
+    """The rate-limit family of a Cloudflare API URL."""
+    for marker, family in (('/vectorize/', 'vectorize'), ('/d1/', 'd1'), ('/ai/run/', 'ai'), ('/r2/', 'r2')):
+        if marker in url:
+            return family
+    return 'other'
+
+def retry_after_seconds(headers: Any) -> Optional[float]:
+    """
+    Seconds the server asked us to wait, or None.
+
+    Reads ``Retry-After`` (seconds or an HTTP date) and, when the remaining
+    quota is exhausted, ``RateLimit-Reset``.
+    """
+    try:
+        retry_after = headers.get('retry-after')
+        if retry_after is not None:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+        remaining = headers.get('ratelimit-remaining')
+        reset = headers.get('ratelimit-reset')
+        if remaining is not None and reset is not None and float(remaining) <= 0:
+            return max(0.0, float(reset))
+    except (TypeError, ValueError, AttributeError):
+        pass
+    return None
+
+
+class TokenBucket:
+    """
+    Adaptive token bucket with a priority queue of waiters.
+
+    Tokens are granted from a timer rather than by polling: whenever a
+    token is due, the highest-priority (then oldest) waiter gets it.
+    """
+
+    # Rate recovery per successful request, as a fraction of the maximum rate
+    RECOVERY_STEP = 0.05
+    MIN_RATE_FRACTION = 0.05
+
+    def __init__(self, name: str, rate: float, burst: int):
+        self.name = name
+        self.max_rate = max(0.01, rate)
+        self.rate = self.max_rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.paused_until = 0.0
+        self._updated = time.monotonic()
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        self.granted = 0
+        self.throttled = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _try_take(self) -> bool:
+        now = time.monotonic()
+        self._refill(now)
+        if now < self.paused_until or self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    async def acquire(self, priority: int = PRIORITY_CRITICAL) -> float:
+        """Wait for a token; returns the seconds spent waiting."""
+        started = time.monotonic()
+        if not self.queue_depth() and self._try_take():
+            self.granted += 1
+            return 0.0
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # The dispatcher skips cancelled waiters; let the next one through
+            self._dispatch()
+            raise
+
+        waited = time.monotonic() - started
+        self.granted += 1
+        self.total_wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        return waited
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._waiters:
+            future = self._waiters[0][2]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if not self._try_take():
+                break
+            heapq.heappop(self._waiters)
+            future.set_result(None)
+
+        if self._waiters:
+            now = time.monotonic()
+            delay = max(self.paused_until - now, (1 - self.tokens) / self.rate, 0.001)
+            self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    def throttle(self, pause_seconds: float) -> None:
+        """Back off after a 429: halve the rate and pause the bucket."""
+        self.throttled += 1
+        self.rate = max(self.max_rate * self.MIN_RATE_FRACTION, self.rate / 2)
+        self.tokens = 0.0
+        self.paused_until = max(self.paused_until, time.monotonic() + pause_seconds)
+        logger.warning(
+            f"Cloudflare {self.name} rate limited; pausing {pause_seconds:.2f}s, rate now {self.rate:.2f}/s"
+        )
+
+    def pause(self, pause_seconds: float) -> None:
+        """Hold the bucket without changing its rate (quota exhausted but not yet throttled)."""
+        self.paused_until = max(self.paused_until, time.monotonic() + pause_seconds)
+
+    def recover(self) -> None:
+        self.rate = min(self.max_rate, self.rate + self.max_rate * self.RECOVERY_STEP)
+
+    def queue_depth(self, priority: Optional[int] = None) -> int:
+        return sum(
+            1 for waiter_priority, _, future in self._waiters
+            if not future.done() and (priority is None or waiter_priority == priority)
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'rate': round(self.rate, 3),
+            'max_rate': self.max_rate,
+            'tokens': round(self.tokens, 3),
+            'queue_depth': {name: self.queue_depth(priority) for priority, name in PRIORITY_NAMES.items()},
+            'paused_seconds': round(max(0.0, self.paused_until - time.monotonic()), 3),
+            'granted': self.granted,
+            'throttled': self.throttled,
+            'total_wait_seconds': round(self.total_wait_seconds, 3),
+            'max_wait_seconds': round(self.max_wait_seconds, 3)
+        }
+
+
+class RateGovernor:
+    """
+    Token buckets per Cloudflare API family plus a cap on background concurrency.
+
+    One governor can be shared by several CloudflareStorage instances on the
+    same account (pass it as ``rate_governor``) so they draw from the same
+    budget.
+    """
+
+    def __init__(
+        self,
+        requests_per_second: float = 10.0,
+        burst: Optional[int] = None,
+        family_limits: Optional[Dict[str, Tuple[float, int]]] = None,
+        background_concurrency: int = 5
+    ):
+        """
+        Initialize the governor.
+
+        Args:
+            requests_per_second: Default maximum rate of each API family
+            burst: Default bucket size (twice the rate when not given)
+            family_limits: Per-family (rate, burst) overrides, e.g. {'ai': (5, 5)}
+            background_concurrency: Maximum background requests in flight
+        """
+        self.requests_per_second = requests_per_second
+        self.burst = burst if burst is not None else max(1, int(requests_per_second * 2))
+        self.family_limits = dict(family_limits or {})
+        self.background_concurrency = max(1, background_concurrency)
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._background_slots = asyncio.Semaphore(self.background_concurrency)
+        self._background_in_flight = 0
+
+    def bucket(self, family: str) -> TokenBucket:
+        if family not in self._buckets:
+            rate, burst = self.family_limits.get(family, (self.requests_per_second, self.burst))
+            self._buckets[family] = TokenBucket(family, rate, burst)
+        return self._buckets[family]
+
+    async def acquire(self, family: str, priority: int) -> float:
+        return await self.bucket(family).acquire(priority)
+
+    def background_slot(self) -> '_BackgroundSlot':
+        """Async context manager limiting how many background requests are in flight."""
+        return _BackgroundSlot(self)
+
+    def observe(self, family: str, status_code: int, headers: Any, fallback_delay: float) -> None:
+        """Feed a response back: throttle on 429, honour quota hints, recover on success."""
+        bucket = self.bucket(family)
+        hinted = retry_after_seconds(headers)
+        if status_code == 429:
+            bucket.throttle(hinted if hinted is not None else fallback_delay)
+        elif hinted is not None:
+            bucket.pause(hinted)
+        elif status_code < 400:
+            bucket.recover()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'background_in_flight': self._background_in_flight,
+            'background_concurrency': self.background_concurrency,
+            'families': {family: bucket.get_stats() for family, bucket in sorted(self._buckets.items())}
+        }
+
+
+class _BackgroundSlot:
+    def __init__(self, governor: RateGovernor):
+        self._governor = governor
+
+    async def __aenter__(self):
+        await self._governor._background_slots.acquire()
+        self._governor._background_in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._governor._background_in_flight -= 1
+        self._governor._background_slots.release()
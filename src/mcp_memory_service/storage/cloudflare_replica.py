@@ -0,0 +1,341 @@
+# Copyright 2024 Heinrich Krupp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Local SQLite mirror of the Cloudflare D1 tables.
+
+The replica uses the D1 schema itself, so the same queries run against
+either database and return rows of the same shape. CloudflareStorage keeps
+it current by pulling rows changed since an ``(updated_at, id)`` watermark
+and by writing through on every change it makes; tag, recency and
+statistics queries can then be answered locally.
+"""
+
+import asyncio
+import functools
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Schema of the D1 database (and of the local replica)
+D1_SCHEMA = """
+-- Memory metadata table
+CREATE TABLE IF NOT EXISTS memories (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    content_hash TEXT UNIQUE NOT NULL,
+    content TEXT NOT NULL,
+    memory_type TEXT,
+    created_at REAL NOT NULL,
+    created_at_iso TEXT NOT NULL,
+    updated_at REAL,
+    updated_at_iso TEXT,
+    metadata_json TEXT,
+    vector_id TEXT UNIQUE,
+    content_size INTEGER DEFAULT 0,
+    r2_key TEXT
+);
+
+-- Tags table
+CREATE TABLE IF NOT EXISTS tags (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT UNIQUE NOT NULL
+);
+
+-- Memory-tag relationships
+CREATE TABLE IF NOT EXISTS memory_tags (
+    memory_id INTEGER,
+    tag_id INTEGER,
+    PRIMARY KEY (memory_id, tag_id),
+    FOREIGN KEY (memory_id) REFERENCES memories(id) ON DELETE CASCADE,
+    FOREIGN KEY (tag_id) REFERENCES tags(id) ON DELETE CASCADE
+);
+
+-- Indexes for performance
+CREATE INDEX IF NOT EXISTS idx_memories_content_hash ON memories(content_hash);
+CREATE INDEX IF NOT EXISTS idx_memories_created_at ON memories(created_at);
+CREATE INDEX IF NOT EXISTS idx_memories_updated_at ON memories(updated_at);
+CREATE INDEX IF NOT EXISTS idx_memories_vector_id ON memories(vector_id);
+CREATE INDEX IF NOT EXISTS idx_tags_name ON tags(name);
+"""
+
+# Tag names of a memory, joined with the ASCII unit separator (char(31))
+# so tags containing commas survive the round trip
+TAG_SEPARATOR = "\x1f"
+MEMORY_COLUMNS = """
+    m.*, (
+        SELECT GROUP_CONCAT(t.name, char(31)) FROM memory_tags mt
+        JOIN tags t ON t.id = mt.tag_id
+        WHERE mt.memory_id = m.id
+    ) AS tag_names
+"""
+
+# Columns written on insert; ids are local to each database
+MEMORY_INSERT_COLUMNS = (
+    "content_hash", "content", "memory_type", "created_at", "created_at_iso",
+    "updated_at", "updated_at_iso", "metadata_json", "vector_id", "content_size", "r2_key"
+)
+
+def updated_at_range(bounds: Optional[Tuple[float, float]]) -> Tuple[str, List[float]]:
+    """
+    WHERE condition and parameters for an updated_at range of memories.
+
+    ``(low, high)`` selects ``low < updated_at <= high``; None selects the
+    rows without an updated_at. Used for D1 and replica queries alike.
+    """
+    if bounds is None:
+        return "updated_at IS NULL", []
+    return "updated_at > ? AND updated_at <= ?", [bounds[0], bounds[1]]
+
+def _on_replica_thread(method):
+    """Make a D1Replica method awaitable, running it on the replica's thread."""
+    @functools.wraps(method)
+    async def wrapper(self, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(method, self, *args))
+    return wrapper
+
+class D1Replica:
+    """
+    Read-through mirror of the D1 memories, tags and memory_tags tables.
+
+    The public methods are coroutines. The connection is opened, used and
+    closed on a single worker thread, so SQLite work never blocks the event
+    loop and needs no locking.
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.expanduser(path)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="d1-replica")
+        self._conn: Optional[sqlite3.Connection] = None
+        # Queued first; every later call runs after it on the same thread
+        self._executor.submit(self._open)
+
+    def _open(self) -> None:
+        self._conn = sqlite3.connect(self.path)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA foreign_keys = ON')
+        self._conn.executescript(D1_SCHEMA)
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS replica_state (
+                name TEXT PRIMARY KEY,
+                value REAL
+            )
+        ''')
+        self._conn.commit()
+
+    def _close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def close(self) -> None:
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._close)
+        self._executor.shutdown(wait=False)
+
+    # Sync state
+
+    def _get_state(self, name: str) -> Optional[float]:
+        row = self._conn.execute('SELECT value FROM replica_state WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, name: str, value: float) -> None:
+        self._conn.execute('INSERT OR REPLACE INTO replica_state (name, value) VALUES (?, ?)', (name, value))
+
+    @_on_replica_thread
+    def get_watermark(self) -> Tuple[float, int]:
+        """The D1 ``(updated_at, id)`` up to which rows have been pulled."""
+        return (self._get_state('watermark_updated_at') or 0.0, int(self._get_state('watermark_id') or 0))
+
+    @_on_replica_thread
+    def set_watermark(self, updated_at: float, d1_id: int) -> None:
+        self._set_state('watermark_updated_at', updated_at)
+        self._set_state('watermark_id', d1_id)
+        self._conn.commit()
+
+    @_on_replica_thread
+    def mark_refreshed(self, refreshed_at: Optional[float] = None) -> None:
+        self._set_state('refreshed_at', refreshed_at if refreshed_at is not None else time.time())
+        self._conn.commit()
+
+    @_on_replica_thread
+    def refreshed_at(self) -> Optional[float]:
+        """When the replica last completed a refresh (epoch seconds), or None if never."""
+        return self._get_state('refreshed_at')
+
+    @_on_replica_thread
+    def reset(self) -> None:
+        """Drop all mirrored data so the next refresh is a full one."""
+        self._conn.execute('DELETE FROM memory_tags')
+        self._conn.execute('DELETE FROM memories')
+        self._conn.execute('DELETE FROM tags')
+        self._conn.execute('DELETE FROM replica_state')
+        self._conn.commit()
+
+    # Writes
+
+    @_on_replica_thread
+    def apply_rows(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """
+        Insert or update memories from rows in D1 shape.
+
+        A row's tags come from its ``tag_names`` (TAG_SEPARATOR-joined) or
+        ``tags`` (list) and replace the memory's current tags.
+        """
+        count = 0
+        with self._conn:
+            for row in rows:
+                values = [row.get(column) for column in MEMORY_INSERT_COLUMNS]
+                self._conn.execute(f'''
+                    INSERT INTO memories ({", ".join(MEMORY_INSERT_COLUMNS)})
+                    VALUES ({", ".join("?" for _ in MEMORY_INSERT_COLUMNS)})
+                    ON CONFLICT(content_hash) DO UPDATE SET
+                    {", ".join(f"{column} = excluded.{column}" for column in MEMORY_INSERT_COLUMNS[1:])}
+                ''', values)
+                memory_id = self._conn.execute(
+                    'SELECT id FROM memories WHERE content_hash = ?', (row["content_hash"],)
+                ).fetchone()[0]
+
+                tags = row.get("tags")
+                if tags is None:
+                    tags = row["tag_names"].split(TAG_SEPARATOR) if row.get("tag_names") else []
+                self._replace_tags(memory_id, tags)
+                count += 1
+        return count
+
+    def _replace_tags(self, memory_id: int, tags: List[str]) -> None:
+        self._conn.execute('DELETE FROM memory_tags WHERE memory_id = ?', (memory_id,))
+        for tag in dict.fromkeys(tags):
+            self._conn.execute('INSERT OR IGNORE INTO tags (name) VALUES (?)', (tag,))
+            self._conn.execute(
+                'INSERT OR IGNORE INTO memory_tags (memory_id, tag_id) SELECT ?, id FROM tags WHERE name = ?',
+                (memory_id, tag)
+            )
+
+    @_on_replica_thread
+    def update_memory(self, content_hash: str, fields: Dict[str, Any], tags: Optional[List[str]] = None) -> None:
+        """Apply an update made in D1 to the mirrored row."""
+        with self._conn:
+            if fields:
+                assignments = ", ".join(f"{column} = ?" for column in fields)
+                self._conn.execute(
+                    f'UPDATE memories SET {assignments} WHERE content_hash = ?',
+                    list(fields.values()) + [content_hash]
+                )
+            if tags is not None:
+                row = self._conn.execute('SELECT id FROM memories WHERE content_hash = ?', (content_hash,)).fetchone()
+                if row:
+                    self._replace_tags(row[0], tags)
+
+    @_on_replica_thread
+    def patch_metadata(self, patches: Dict[str, Dict[str, Any]], fields: Dict[str, Any]) -> None:
+        """Apply metadata patches merged in D1, setting the same other columns on every row."""
+        assignments = "".join(f", {column} = ?" for column in fields)
+        with self._conn:
+            self._conn.executemany(
+                f"UPDATE memories SET metadata_json = json_patch(COALESCE(metadata_json, '{{}}'), ?){assignments} "
+                "WHERE content_hash = ?",
+                [[json.dumps(patch)] + list(fields.values()) + [content_hash] for content_hash, patch in patches.items()]
+            )
+
+    @_on_replica_thread
+    def remove(self, content_hashes: Iterable[str]) -> int:
+        hashes = list(content_hashes)
+        removed = 0
+        with self._conn:
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start:start + 500]
+                placeholders = ",".join("?" for _ in chunk)
+                removed += self._conn.execute(
+                    f'DELETE FROM memories WHERE content_hash IN ({placeholders})', chunk
+                ).rowcount
+        return removed
+
+    # Reads
+
+    def _rows(self, sql: str, params: Iterable[Any] = ()) -> List[Dict[str, Any]]:
+        return [dict(row) for row in self._conn.execute(sql, list(params)).fetchall()]
+
+    @_on_replica_thread
+    def memories_by_hash(self, content_hashes: List[str]) -> List[Dict[str, Any]]:
+        rows = []
+        for start in range(0, len(content_hashes), 500):
+            chunk = content_hashes[start:start + 500]
+            placeholders = ",".join("?" for _ in chunk)
+            rows.extend(self._rows(
+                f'SELECT {MEMORY_COLUMNS} FROM memories m WHERE m.content_hash IN ({placeholders})', chunk
+            ))
+        return rows
+
+    @_on_replica_thread
+    def search_by_tags(self, tags: List[str]) -> List[Dict[str, Any]]:
+        placeholders = ",".join("?" for _ in tags)
+        return self._rows(f'''
+            SELECT {MEMORY_COLUMNS} FROM memories m
+            WHERE m.id IN (
+                SELECT mt.memory_id FROM memory_tags mt
+                JOIN tags t ON mt.tag_id = t.id
+                WHERE t.name IN ({placeholders})
+            )
+            ORDER BY m.created_at DESC
+        ''', tags)
+
+    @_on_replica_thread
+    def recent(self, n: int) -> List[Dict[str, Any]]:
+        return self._rows(f'SELECT {MEMORY_COLUMNS} FROM memories m ORDER BY m.created_at DESC LIMIT ?', [n])
+
+    @_on_replica_thread
+    def all_tags(self) -> List[str]:
+        return [row["name"] for row in self._rows('''
+            SELECT name FROM tags WHERE id IN (SELECT tag_id FROM memory_tags) ORDER BY name
+        ''')]
+
+    @_on_replica_thread
+    def content_hashes(self, bounds: Optional[Tuple[float, float]]) -> List[str]:
+        """Content hashes of the memories in an updated_at range (see updated_at_range)."""
+        condition, params = updated_at_range(bounds)
+        return [row["content_hash"] for row in self._rows(f'SELECT content_hash FROM memories WHERE {condition}', params)]
+
+    @_on_replica_thread
+    def count(self) -> int:
+        return self._conn.execute('SELECT COUNT(*) FROM memories').fetchone()[0]
+
+    @_on_replica_thread
+    def count_in_range(self, bounds: Optional[Tuple[float, float]]) -> int:
+        """Number of memories in an updated_at range (see updated_at_range)."""
+        condition, params = updated_at_range(bounds)
+        return self._conn.execute(f'SELECT COUNT(*) FROM memories WHERE {condition}', params).fetchone()[0]
+
+    @_on_replica_thread
+    def updated_at_bounds(self) -> Tuple[Optional[float], Optional[float]]:
+        """Smallest and largest updated_at of the mirrored memories."""
+        return tuple(self._conn.execute('SELECT MIN(updated_at), MAX(updated_at) FROM memories').fetchone())
+
+    @_on_replica_thread
+    def statistics(self) -> Dict[str, Any]:
+        """The same aggregates CloudflareStorage.get_stats() reads from D1."""
+        return self._rows('''
+            SELECT
+                COUNT(*) as total_memories,
+                SUM(content_size) as total_content_size,
+                COUNT(DISTINCT vector_id) as total_vectors,
+                COUNT(r2_key) as r2_stored_count
+            FROM memories
+        ''')[0]
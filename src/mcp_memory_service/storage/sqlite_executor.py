@@ -0,0 +1,148 @@
+# Copyright 2024 Heinrich Krupp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Dedicated database executor for the SQLite-vec storage backend.
+
+All SQL issued by SqliteVecMemoryStorage runs here instead of on the asyncio
+thread. Writes are serialized through a single writer thread that owns the
+primary connection, while reads are spread over a small pool of read-only
+connections. With the database in WAL mode, readers never block the writer
+(and vice versa), so concurrent searches keep being served while a bulk
+ingest is writing.
+"""
+
+import asyncio
+import logging
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Callable that opens a new connection; receives read_only=True for pool connections
+ConnectionFactory = Callable[[bool], sqlite3.Connection]
+
+
+class SqliteExecutor:
+    """
+    Runs SQLite work on background threads.
+
+    The writer connection is opened once and only ever used from the writer
+    thread. Each reader thread lazily opens its own read-only connection the
+    first time it picks up work. In-memory databases cannot be shared between
+    connections, so for those every operation is routed to the writer.
+    """
+
+    def __init__(self, db_path: str, connection_factory: ConnectionFactory, read_pool_size: int = 4):
+        """
+        Initialize the executor.
+
+        Args:
+            db_path: Path to the SQLite database file
+            connection_factory: Callable opening a configured connection
+            read_pool_size: Number of read-only connections (0 routes reads to the writer)
+        """
+        self.db_path = db_path
+        self._connection_factory = connection_factory
+        self.read_pool_size = 0 if self._is_memory_database(db_path) else max(0, read_pool_size)
+
+        self._writer: Optional[ThreadPoolExecutor] = None
+        self._readers: Optional[ThreadPoolExecutor] = None
+        self._write_conn: Optional[sqlite3.Connection] = None
+        self._local = threading.local()
+        self._read_conns: List[sqlite3.Connection] = []
+        self._read_conns_lock = threading.Lock()
+
+    @staticmethod
+    def _is_memory_database(db_path: str) -> bool:
+        return not db_path or db_path == ":memory:" or "mode=memory" in db_path
+
+    @property
+    def connection(self) -> Optional[sqlite3.Connection]:
+        """The writer connection (None until started)."""
+        return self._write_conn
+
+    @property
+    def running(self) -> bool:
+        return self._writer is not None
+
+    async def start(self) -> sqlite3.Connection:
+        """Start the worker threads and open the writer connection."""
+        if self._writer is None:
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-vec-writer")
+            if self.read_pool_size > 0:
+                self._readers = ThreadPoolExecutor(
+                    max_workers=self.read_pool_size,
+                    thread_name_prefix="sqlite-vec-reader"
+                )
+
+        if self._write_conn is None:
+            loop = asyncio.get_running_loop()
+            self._write_conn = await loop.run_in_executor(self._writer, self._connection_factory, False)
+            logger.info(f"SQLite executor started with {self.read_pool_size} read connection(s)")
+
+        return self._write_conn
+
+    async def run_write(self, operation: Callable[..., Any], *args) -> Any:
+        """Run operation(conn, *args) on the writer thread."""
+        if self._writer is None or self._write_conn is None:
+            raise RuntimeError("SQLite executor is not running")
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer, self._call_with_writer, operation, args)
+
+    async def run_read(self, operation: Callable[..., Any], *args) -> Any:
+        """Run operation(conn, *args) on a read-only connection from the pool."""
+        if self._readers is None:
+            return await self.run_write(operation, *args)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, self._call_with_reader, operation, args)
+
+    def _call_with_writer(self, operation: Callable[..., Any], args: tuple) -> Any:
+        return operation(self._write_conn, *args)
+
+    def _call_with_reader(self, operation: Callable[..., Any], args: tuple) -> Any:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connection_factory(True)
+            self._local.conn = conn
+            with self._read_conns_lock:
+                self._read_conns.append(conn)
+        return operation(conn, *args)
+
+    def close(self) -> None:
+        """Stop the worker threads and close every connection."""
+        if self._readers is not None:
+            self._readers.shutdown(wait=True)
+            self._readers = None
+
+        with self._read_conns_lock:
+            for conn in self._read_conns:
+                try:
+                    conn.close()
+                except sqlite3.Error as e:
+                    logger.warning(f"Failed to close read connection: {e}")
+            self._read_conns.clear()
+        self._local = threading.local()
+
+        if self._writer is not None:
+            self._writer.shutdown(wait=True)
+            self._writer = None
+
+        if self._write_conn is not None:
+            self._write_conn.close()
+            self._write_conn = None
@@ -23,10 +23,14 @@ import logging
 import traceback
 import time
 import os
+import re
 from typing import List, Dict, Any, Tuple, Optional, Set, Callable
 from datetime import datetime
 import asyncio
 import random
+from urllib.request import pathname2url
+
+import numpy as np
 
 # Import sqlite-vec with fallback
 try:
@@ -46,7 +50,9 @@ except ImportError:
     print("WARNING: sentence_transformers not available. Install for embedding support.")
 
 from .base import MemoryStorage
-from ..models.memory import Memory, MemoryQueryResult
+from .sqlite_executor import SqliteExecutor
+from ..embeddings.cache import EmbeddingCache
+from ..models.memory import Memory, MemoryQueryResult, MemoryEmbeddings
 from ..utils.hashing import generate_content_hash
 from ..utils.system_detection import (
     get_system_info,
@@ -59,7 +65,12 @@ logger = logging.getLogger(__name__)
 
 # Global model cache for performance optimization
 _MODEL_CACHE = {}
-_EMBEDDING_CACHE = {}
+
+# sqlite-vec rejects KNN queries asking for more neighbours than this
+_VEC0_MAX_K = 4096
+
+# Filtered search strategies (see SqliteVecMemoryStorage.search_filtered)
+_SEARCH_STRATEGIES = ("auto", "prefilter", "overfetch")
 
 
 class SqliteVecMemoryStorage(MemoryStorage):
@@ -70,6 +81,8 @@ class SqliteVecMemoryStorage(MemoryStorage):
     for vector similarity search while maintaining the same interface.
     """
     
+    honours_metadata_touch = True
+    
     def __init__(self, db_path: str, embedding_model: str = "all-MiniLM-L6-v2"):
         """
         Initialize SQLite-vec storage.
@@ -86,21 +99,42 @@ class SqliteVecMemoryStorage(MemoryStorage):
         
         # Performance settings
         self.enable_cache = True
+        self.embedding_cache = EmbeddingCache.from_env(embedding_model)
         self.batch_size = 32
+        self.read_pool_size = int(os.environ.get("MCP_MEMORY_SQLITE_READ_POOL_SIZE", "4"))
+        
+        # Filtered search: rank matching rows directly when they are at most this
+        # fraction of all memories, otherwise over-fetch from the KNN index
+        self.prefilter_selectivity = float(os.environ.get("MCP_MEMORY_SQLITE_PREFILTER_SELECTIVITY", "0.05"))
+        self.overfetch_margin = 1.5
+        self._search_stats: Dict[str, Dict[str, float]] = {}
+        
+        # All SQL runs on the executor's threads, never on the event loop
+        self._db: Optional[SqliteExecutor] = None
+        
+        # initialize() is a cheap no-op once the storage is ready; the lock
+        # keeps concurrent first calls from initializing twice
+        self._initialized = False
+        self._init_lock = asyncio.Lock()
         
         # Ensure directory exists
         os.makedirs(os.path.dirname(self.db_path) if os.path.dirname(self.db_path) else '.', exist_ok=True)
         
         logger.info(f"Initialized SQLite-vec storage at: {self.db_path}")
     
-    async def _execute_with_retry(self, operation: Callable, max_retries: int = 3, initial_delay: float = 0.1):
+    async def _execute_with_retry(self, operation: Callable, max_retries: int = 3, initial_delay: float = 0.1, read_only: bool = False):
         """
         Execute a database operation with exponential backoff retry logic.
         
+        The operation is called as operation(conn) on the database executor:
+        on the writer thread by default, or on a pooled read-only connection
+        when read_only is set.
+        
         Args:
             operation: The database operation to execute
             max_retries: Maximum number of retry attempts
             initial_delay: Initial delay in seconds before first retry
+            read_only: Whether the operation only reads
             
         Returns:
             The result of the operation
@@ -113,7 +147,9 @@ class SqliteVecMemoryStorage(MemoryStorage):
         
         for attempt in range(max_retries + 1):
             try:
-                return operation()
+                if read_only:
+                    return await self._db.run_read(operation)
+                return await self._db.run_write(operation)
             except sqlite3.OperationalError as e:
                 last_exception = e
                 error_msg = str(e).lower()
@@ -140,8 +176,211 @@ class SqliteVecMemoryStorage(MemoryStorage):
         # If we get here, all retries failed
         raise last_exception
     
+    async def _fetchall(self, query: str, params=()) -> List[tuple]:
+        """Run a read query on the read pool and return all rows."""
+        return await self._execute_with_retry(
+            lambda conn: conn.execute(query, params).fetchall(),
+            read_only=True
+        )
+    
+    async def _fetchone(self, query: str, params=()) -> Optional[tuple]:
+        """Run a read query on the read pool and return the first row."""
+        return await self._execute_with_retry(
+            lambda conn: conn.execute(query, params).fetchone(),
+            read_only=True
+        )
+    
+    def _get_pragmas(self) -> Dict[str, str]:
+        """Build the pragma set for new connections (defaults plus MCP_MEMORY_SQLITE_PRAGMAS)."""
+        # Apply default pragmas for concurrent access
+        pragmas = {
+            "journal_mode": "WAL",  # Enable WAL mode for concurrent access
+            "busy_timeout": "5000",  # 5 second timeout for locked database
+            "synchronous": "NORMAL",  # Balanced performance/safety
+            "cache_size": "10000",  # Increase cache size
+            "temp_store": "MEMORY"  # Use memory for temp tables
+        }
+        
+        # Check for custom pragmas from environment variable
+        custom_pragmas = os.environ.get("MCP_MEMORY_SQLITE_PRAGMAS", "")
+        if custom_pragmas:
+            # Parse custom pragmas (format: "pragma1=value1,pragma2=value2")
+            for pragma_pair in custom_pragmas.split(","):
+                pragma_pair = pragma_pair.strip()
+                if "=" in pragma_pair:
+                    pragma_name, pragma_value = pragma_pair.split("=", 1)
+                    pragmas[pragma_name.strip()] = pragma_value.strip()
+                    logger.debug(f"Custom pragma from env: {pragma_name}={pragma_value}")
+        
+        return pragmas
+    
+    def _open_connection(self, read_only: bool = False) -> sqlite3.Connection:
+        """
+        Open a connection with the sqlite-vec extension loaded and pragmas applied.
+        
+        Called from the executor threads. Read-only connections skip pragmas that
+        would modify the database file and are additionally marked query_only.
+        """
+        if read_only:
+            uri = f"file:{pathname2url(os.path.abspath(self.db_path))}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        
+        # Load sqlite-vec extension
+        conn.enable_load_extension(True)
+        sqlite_vec.load(conn)
+        conn.enable_load_extension(False)
+        
+        pragmas = self._get_pragmas()
+        if read_only:
+            for pragma_name in ("journal_mode", "synchronous", "auto_vacuum"):
+                pragmas.pop(pragma_name, None)
+            pragmas["query_only"] = "ON"
+        
+        # Apply all pragmas
+        applied_pragmas = []
+        for pragma_name, pragma_value in pragmas.items():
+            try:
+                conn.execute(f"PRAGMA {pragma_name}={pragma_value}")
+                applied_pragmas.append(f"{pragma_name}={pragma_value}")
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to set pragma {pragma_name}={pragma_value}: {e}")
+        
+        if not read_only:
+            logger.info(f"SQLite pragmas applied: {', '.join(applied_pragmas)}")
+        
+        return conn
+    
+    def _create_memories_table(self, conn: sqlite3.Connection) -> None:
+        """Create the regular table for memory data."""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS memories (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                content_hash TEXT UNIQUE NOT NULL,
+                content TEXT NOT NULL,
+                tags TEXT,
+                memory_type TEXT,
+                metadata TEXT,
+                created_at REAL,
+                updated_at REAL,
+                created_at_iso TEXT,
+                updated_at_iso TEXT
+            )
+        ''')
+    
+    def _create_vector_table(self, conn: sqlite3.Connection) -> None:
+        """Create the vec0 table (needs the embedding dimension) and secondary indexes."""
+        conn.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS memory_embeddings USING vec0(
+                content_embedding FLOAT[{self.embedding_dimension}]
+            )
+        ''')
+        
+        # Create indexes for better performance
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_content_hash ON memories(content_hash)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_created_at ON memories(created_at)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_updated_at ON memories(updated_at)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_memory_type ON memories(memory_type)')
+    
+    def _create_tags_table(self, conn: sqlite3.Connection) -> None:
+        """Create the normalized tag table and index any memories that have no tag rows yet."""
+        # (tag, memory_id) primary key on a WITHOUT ROWID table is a covering index
+        # for tag lookups; the memory_id index serves updates and deletes
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS memory_tags (
+                tag TEXT NOT NULL,
+                memory_id INTEGER NOT NULL,
+                PRIMARY KEY (tag, memory_id)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_memory_tags_memory_id ON memory_tags(memory_id)')
+        
+        # Migration: databases created before memory_tags existed (or written by
+        # an older version) have memories whose tags are not indexed yet
+        rows = conn.execute('''
+            SELECT id, tags FROM memories
+            WHERE tags IS NOT NULL AND tags != ''
+              AND id NOT IN (SELECT memory_id FROM memory_tags)
+        ''').fetchall()
+        if rows:
+            for memory_id, tags_str in rows:
+                self._insert_memory_tags(conn, memory_id, self._parse_tags(tags_str))
+            logger.info(f"Indexed tags for {len(rows)} existing memories")
+        conn.commit()
+    
+    def _create_manifest_table(self, conn: sqlite3.Connection) -> None:
+        """Create the document ingestion manifest (one row per ingested file)."""
+        # chunks maps a digest of each chunk's text to the content_hash of the
+        # memory stored for it, so re-ingestion can keep unchanged chunks
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS ingestion_manifest (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                file_hash TEXT,
+                chunk_size INTEGER,
+                chunks TEXT NOT NULL DEFAULT '{}',
+                ingested_at REAL NOT NULL
+            )
+        ''')
+        conn.commit()
+    
+    def _create_relevance_table(self, conn: sqlite3.Connection) -> None:
+        """Create the narrow per-memory relevance score table used by consolidation."""
+        # Keeping scores out of the metadata JSON lets a consolidation run
+        # rewrite a few REAL columns instead of every memory's metadata blob
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS memory_relevance (
+                memory_id INTEGER PRIMARY KEY,
+                relevance_score REAL NOT NULL,
+                decay_factor REAL,
+                connection_boost REAL,
+                access_boost REAL,
+                calculated_at REAL NOT NULL
+            )
+        ''')
+        conn.commit()
+    
+    @staticmethod
+    def _parse_tags(tags_str: Optional[str]) -> List[str]:
+        """Split a stored tags column (comma-separated, or a legacy JSON array) into tags."""
+        if not tags_str:
+            return []
+        if tags_str.startswith("["):
+            try:
+                tags = json.loads(tags_str)
+                if isinstance(tags, list):
+                    return [str(tag).strip() for tag in tags if str(tag).strip()]
+            except json.JSONDecodeError:
+                pass
+        return [tag.strip() for tag in tags_str.split(",") if tag.strip()]
+    
+    @staticmethod
+    def _insert_memory_tags(conn: sqlite3.Connection, memory_id: int, tags: List[str]) -> None:
+        """Add tag rows for a memory (caller commits)."""
+        conn.executemany(
+            'INSERT OR IGNORE INTO memory_tags (tag, memory_id) VALUES (?, ?)',
+            [(tag, memory_id) for tag in dict.fromkeys(tags)]
+        )
+    
     async def initialize(self):
-        """Initialize the SQLite database with vec0 extension."""
+        """
+        Initialize the SQLite database with vec0 extension.
+        
+        Safe to call repeatedly and concurrently: after the first successful
+        call it returns immediately.
+        """
+        if self._initialized:
+            return
+        
+        async with self._init_lock:
+            if self._initialized:
+                return
+            await self._initialize()
+    
+    async def _initialize(self):
+        """Open connections, load the embedding model and create the schema."""
         try:
             if not SQLITE_VEC_AVAILABLE:
                 raise ImportError("sqlite-vec is not available. Install with: pip install sqlite-vec")
@@ -149,76 +388,23 @@ class SqliteVecMemoryStorage(MemoryStorage):
             if not SENTENCE_TRANSFORMERS_AVAILABLE:
                 raise ImportError("sentence-transformers is not available. Install with: pip install sentence-transformers torch")
             
-            # Connect to database
-            self.conn = sqlite3.connect(self.db_path)
-            self.conn.enable_load_extension(True)
-            
-            # Load sqlite-vec extension
-            sqlite_vec.load(self.conn)
-            self.conn.enable_load_extension(False)
-            
-            # Apply default pragmas for concurrent access
-            default_pragmas = {
-                "journal_mode": "WAL",  # Enable WAL mode for concurrent access
-                "busy_timeout": "5000",  # 5 second timeout for locked database
-                "synchronous": "NORMAL",  # Balanced performance/safety
-                "cache_size": "10000",  # Increase cache size
-                "temp_store": "MEMORY"  # Use memory for temp tables
-            }
+            # Start the database executor; the writer connection is opened on its thread
+            if self._db is None:
+                self._db = SqliteExecutor(self.db_path, self._open_connection, self.read_pool_size)
+            self.conn = await self._db.start()
             
-            # Check for custom pragmas from environment variable
-            custom_pragmas = os.environ.get("MCP_MEMORY_SQLITE_PRAGMAS", "")
-            if custom_pragmas:
-                # Parse custom pragmas (format: "pragma1=value1,pragma2=value2")
-                for pragma_pair in custom_pragmas.split(","):
-                    pragma_pair = pragma_pair.strip()
-                    if "=" in pragma_pair:
-                        pragma_name, pragma_value = pragma_pair.split("=", 1)
-                        default_pragmas[pragma_name.strip()] = pragma_value.strip()
-                        logger.info(f"Custom pragma from env: {pragma_name}={pragma_value}")
-            
-            # Apply all pragmas
-            applied_pragmas = []
-            for pragma_name, pragma_value in default_pragmas.items():
-                try:
-                    self.conn.execute(f"PRAGMA {pragma_name}={pragma_value}")
-                    applied_pragmas.append(f"{pragma_name}={pragma_value}")
-                except sqlite3.Error as e:
-                    logger.warning(f"Failed to set pragma {pragma_name}={pragma_value}: {e}")
-            
-            logger.info(f"SQLite pragmas applied: {', '.join(applied_pragmas)}")
-            
-            # Create regular table for memory data
-            self.conn.execute('''
-                CREATE TABLE IF NOT EXISTS memories (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    content_hash TEXT UNIQUE NOT NULL,
-                    content TEXT NOT NULL,
-                    tags TEXT,
-                    memory_type TEXT,
-                    metadata TEXT,
-                    created_at REAL,
-                    updated_at REAL,
-                    created_at_iso TEXT,
-                    updated_at_iso TEXT
-                )
-            ''')
+            await self._db.run_write(self._create_memories_table)
+            await self._db.run_write(self._create_tags_table)
+            await self._db.run_write(self._create_manifest_table)
+            await self._db.run_write(self._create_relevance_table)
             
             # Initialize embedding model BEFORE creating vector table
             await self._initialize_embedding_model()
             
             # Now create virtual table with correct dimensions
-            self.conn.execute(f'''
-                CREATE VIRTUAL TABLE IF NOT EXISTS memory_embeddings USING vec0(
-                    content_embedding FLOAT[{self.embedding_dimension}]
-                )
-            ''')
-            
-            # Create indexes for better performance
-            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_content_hash ON memories(content_hash)')
-            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_created_at ON memories(created_at)')
-            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_memory_type ON memories(memory_type)')
+            await self._db.run_write(self._create_vector_table)
             
+            self._initialized = True
             logger.info(f"SQLite-vec storage initialized successfully with embedding dimension: {self.embedding_dimension}")
             
         except Exception as e:
@@ -227,6 +413,51 @@ class SqliteVecMemoryStorage(MemoryStorage):
             logger.error(traceback.format_exc())
             raise RuntimeError(error_msg)
     
+    async def initialize_read_only(self):
+        """
+        Open read-only connections to an existing database.
+        
+        For processes that only read, such as consolidation workers whose writes
+        go through the serving process: no schema changes, and the embedding
+        model is not loaded. Every connection is opened with query_only set.
+        """
+        if self._initialized:
+            return
+        
+        async with self._init_lock:
+            if self._initialized:
+                return
+            if not SQLITE_VEC_AVAILABLE:
+                raise ImportError("sqlite-vec is not available. Install with: pip install sqlite-vec")
+            
+            if self._db is None:
+                self._db = SqliteExecutor(self.db_path, lambda read_only: self._open_connection(True), self.read_pool_size)
+            self.conn = await self._db.start()
+            
+            # Without the model the dimension comes from the vec0 schema; the
+            # default would drop every embedding of any other size
+            dimension = await self._read_embedding_dimension()
+            if dimension:
+                self.embedding_dimension = dimension
+            self._initialized = True
+            logger.info(f"SQLite-vec storage opened read-only at: {self.db_path} (embedding dimension: {self.embedding_dimension})")
+    
+    async def _read_embedding_dimension(self) -> Optional[int]:
+        """Return the dimension declared by the memory_embeddings vec0 table, or None if absent."""
+        row = await self._fetchone(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'memory_embeddings'"
+        )
+        if not row or not row[0]:
+            return None
+        match = re.search(r'float\[(\d+)\]', row[0], re.IGNORECASE)
+        if match:
+            return int(match.group(1))
+        # Fall back to the length of a stored vector (float32)
+        row = await self._fetchone('SELECT content_embedding FROM memory_embeddings LIMIT 1')
+        if row and row[0]:
+            return len(row[0]) // 4
+        return None
+    
     async def _initialize_embedding_model(self):
         """Initialize the embedding model (ONNX or SentenceTransformer based on configuration)."""
         global _MODEL_CACHE
@@ -358,7 +589,19 @@ class SqliteVecMemoryStorage(MemoryStorage):
             self.embedding_dimension = 384  # Standard dimension for all-MiniLM-L6-v2
             return  # Exit early to avoid the test_embedding code
     
-    def _generate_embedding(self, text: str) -> List[float]:
+    def _validate_embedding(self, embedding_list: List[float]) -> None:
+        """Raise ValueError if an embedding is empty, has the wrong dimension or invalid values."""
+        if not embedding_list:
+            raise ValueError("Generated embedding is empty")
+        
+        if len(embedding_list) != self.embedding_dimension:
+            raise ValueError(f"Embedding dimension mismatch: expected {self.embedding_dimension}, got {len(embedding_list)}")
+        
+        # Validate values are finite
+        if not all(isinstance(x, (int, float)) and not (x != x) and x != float('inf') and x != float('-inf') for x in embedding_list):
+            raise ValueError("Embedding contains invalid values (NaN or infinity)")
+    
+    def _generate_embedding(self, text: str, use_cache: bool = True) -> List[float]:
         """Generate embedding for text."""
         if not self.embedding_model:
             # Return dummy embedding for testing when model is not available
@@ -367,29 +610,21 @@ class SqliteVecMemoryStorage(MemoryStorage):
 
         try:
             # Check cache first
-            if self.enable_cache:
-                cache_key = hash(text)
-                if cache_key in _EMBEDDING_CACHE:
-                    return _EMBEDDING_CACHE[cache_key]
+            if self.enable_cache and use_cache:
+                cached = self.embedding_cache.get(text)
+                if cached is not None:
+                    return cached
             
             # Generate embedding
             embedding = self.embedding_model.encode([text], convert_to_numpy=True)[0]
             embedding_list = embedding.tolist()
             
             # Validate embedding
-            if not embedding_list:
-                raise ValueError("Generated embedding is empty")
-            
-            if len(embedding_list) != self.embedding_dimension:
-                raise ValueError(f"Embedding dimension mismatch: expected {self.embedding_dimension}, got {len(embedding_list)}")
-            
-            # Validate values are finite
-            if not all(isinstance(x, (int, float)) and not (x != x) and x != float('inf') and x != float('-inf') for x in embedding_list):
-                raise ValueError("Embedding contains invalid values (NaN or infinity)")
+            self._validate_embedding(embedding_list)
             
             # Cache the result
-            if self.enable_cache:
-                _EMBEDDING_CACHE[cache_key] = embedding_list
+            if self.enable_cache and use_cache:
+                self.embedding_cache.put(text, embedding_list)
             
             return embedding_list
             
@@ -397,6 +632,67 @@ class SqliteVecMemoryStorage(MemoryStorage):
             logger.error(f"Failed to generate embedding: {str(e)}")
             raise RuntimeError(f"Failed to generate embedding: {str(e)}") from e
     
+    async def _embed_text(self, text: str) -> List[float]:
+        """Embed one text for an async caller; persistent cache I/O stays off the event loop."""
+        if self.embedding_model and self.enable_cache:
+            cached = await self.embedding_cache.aget(text)
+            if cached is not None:
+                return cached
+            embedding = self._generate_embedding(text, use_cache=False)
+            await self.embedding_cache.aput_many([(text, embedding)])
+            return embedding
+        return self._generate_embedding(text)
+    
+    def _generate_embeddings_batch(self, texts: List[str]) -> List[Any]:
+        """
+        Generate embeddings for many texts with batched encode() calls.
+        
+        Texts are encoded in sub-batches of self.batch_size. Returns one entry per
+        text, in order: the embedding list, or the exception raised for it.
+        """
+        if not self.embedding_model:
+            return [self._generate_embedding(text) for text in texts]
+        
+        results: List[Any] = self.embedding_cache.get_many(texts) if self.enable_cache else [None] * len(texts)
+        pending = [i for i, cached in enumerate(results) if cached is None]
+        
+        for start in range(0, len(pending), self.batch_size):
+            indices = pending[start:start + self.batch_size]
+            try:
+                embeddings = self.embedding_model.encode([texts[i] for i in indices], convert_to_numpy=True)
+            except Exception as e:
+                logger.error(f"Failed to generate embeddings for batch: {str(e)}")
+                for i in indices:
+                    results[i] = RuntimeError(f"Failed to generate embedding: {str(e)}")
+                continue
+            
+            for i, embedding in zip(indices, embeddings):
+                embedding_list = embedding.tolist()
+                try:
+                    self._validate_embedding(embedding_list)
+                except ValueError as e:
+                    results[i] = RuntimeError(f"Failed to generate embedding: {str(e)}")
+                    continue
+                results[i] = embedding_list
+            
+            if self.enable_cache:
+                self.embedding_cache.put_many([
+                    (texts[i], results[i]) for i in indices if not isinstance(results[i], Exception)
+                ])
+        
+        return results
+    
+    async def generate_embeddings(self, texts: List[str]) -> List[Any]:
+        """
+        Embed texts in batches off the event loop.
+        
+        Returns one entry per text: the embedding list, or the exception raised
+        for it. Embeddings can be set on Memory.embedding before store_batch()
+        so embedding and writing overlap during ingestion.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._generate_embeddings_batch, texts)
+    
     async def store(self, memory: Memory) -> Tuple[bool, str]:
         """Store a memory in the SQLite-vec database."""
         try:
@@ -404,16 +700,18 @@ class SqliteVecMemoryStorage(MemoryStorage):
                 return False, "Database not initialized"
             
             # Check for duplicates
-            cursor = self.conn.execute(
-                'SELECT content_hash FROM memories WHERE content_hash = ?',
-                (memory.content_hash,)
-            )
-            if cursor.fetchone():
+            def find_duplicate(conn):
+                return conn.execute(
+                    'SELECT content_hash FROM memories WHERE content_hash = ?',
+                    (memory.content_hash,)
+                ).fetchone()
+            
+            if await self._execute_with_retry(find_duplicate, read_only=True):
                 return False, "Duplicate content detected"
             
             # Generate and validate embedding
             try:
-                embedding = self._generate_embedding(memory.content)
+                embedding = await self._embed_text(memory.content)
             except Exception as e:
                 logger.error(f"Failed to generate embedding for memory {memory.content_hash}: {str(e)}")
                 return False, f"Failed to generate embedding: {str(e)}"
@@ -422,62 +720,194 @@ class SqliteVecMemoryStorage(MemoryStorage):
             tags_str = ",".join(memory.tags) if memory.tags else ""
             metadata_str = json.dumps(memory.metadata) if memory.metadata else "{}"
             
-            # Insert into memories table (metadata) with retry logic
-            def insert_memory():
-                cursor = self.conn.execute('''
-                    INSERT INTO memories (
-                        content_hash, content, tags, memory_type,
-                        metadata, created_at, updated_at, created_at_iso, updated_at_iso
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
+            # Insert the memory row and its embedding as one unit of work on the
+            # writer thread, so concurrent stores never interleave transactions
+            def insert_memory(conn):
+                try:
+                    cursor = conn.execute('''
+                        INSERT INTO memories (
+                            content_hash, content, tags, memory_type,
+                            metadata, created_at, updated_at, created_at_iso, updated_at_iso
+                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', (
+                        memory.content_hash,
+                        memory.content,
+                        tags_str,
+                        memory.memory_type,
+                        metadata_str,
+                        memory.created_at,
+                        memory.updated_at,
+                        memory.created_at_iso,
+                        memory.updated_at_iso
+                    ))
+                    memory_rowid = cursor.lastrowid
+                    
+                    # Check if we can insert with specific rowid
+                    try:
+                        conn.execute('''
+                            INSERT INTO memory_embeddings (rowid, content_embedding)
+                            VALUES (?, ?)
+                        ''', (
+                            memory_rowid,
+                            serialize_float32(embedding)
+                        ))
+                    except sqlite3.Error as e:
+                        # If rowid insert fails, try without specifying rowid
+                        logger.warning(f"Failed to insert with rowid {memory_rowid}: {e}. Trying without rowid.")
+                        conn.execute('''
+                            INSERT INTO memory_embeddings (content_embedding)
+                            VALUES (?)
+                        ''', (
+                            serialize_float32(embedding),
+                        ))
+                    
+                    self._insert_memory_tags(conn, memory_rowid, self._parse_tags(tags_str))
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+            
+            await self._execute_with_retry(insert_memory)
+            
+            logger.info(f"Successfully stored memory: {memory.content_hash}")
+            return True, "Memory stored successfully"
+            
+        except Exception as e:
+            error_msg = f"Failed to store memory: {str(e)}"
+            logger.error(error_msg)
+            logger.error(traceback.format_exc())
+            return False, error_msg
+    
+    async def store_batch(self, memories: List[Memory]) -> List[Tuple[bool, str]]:
+        """
+        Store many memories with one duplicate query, batched embedding and a single transaction.
+        
+        Returns one (success, message) per memory, in input order. A memory that
+        fails (duplicate, embedding error, insert error) does not abort the rest
+        of the batch. Memories that already carry an embedding of the right
+        dimension are not re-embedded.
+        """
+        if not memories:
+            return []
+        
+        if not self.conn:
+            return [(False, "Database not initialized")] * len(memories)
+        
+        results: List[Optional[Tuple[bool, str]]] = [None] * len(memories)
+        
+        try:
+            # Check for duplicates against the database in one query per chunk of hashes
+            hashes = list({memory.content_hash for memory in memories})
+            
+            def find_existing(conn):
+                existing = set()
+                for start in range(0, len(hashes), 500):
+                    chunk = hashes[start:start + 500]
+                    placeholders = ",".join("?" for _ in chunk)
+                    cursor = conn.execute(
+                        f'SELECT content_hash FROM memories WHERE content_hash IN ({placeholders})',
+                        chunk
+                    )
+                    existing.update(row[0] for row in cursor.fetchall())
+                return existing
+            
+            existing_hashes = await self._execute_with_retry(find_existing, read_only=True)
+            
+            # Duplicates within the batch keep their first occurrence
+            to_store = []
+            for i, memory in enumerate(memories):
+                if memory.content_hash in existing_hashes:
+                    results[i] = (False, "Duplicate content detected")
+                else:
+                    existing_hashes.add(memory.content_hash)
+                    to_store.append(i)
+            
+            # Reuse valid precomputed embeddings; generate the rest off the event loop
+            embeddings: List[Any] = [None] * len(to_store)
+            missing = []
+            for position, i in enumerate(to_store):
+                embedding = memories[i].embedding
+                if embedding is not None and len(embedding) == self.embedding_dimension:
+                    embeddings[position] = list(embedding)
+                else:
+                    missing.append(position)
+            if missing:
+                generated = await self.generate_embeddings([memories[to_store[position]].content for position in missing])
+                for position, embedding in zip(missing, generated):
+                    embeddings[position] = embedding
+            
+            rows = []
+            for i, embedding in zip(to_store, embeddings):
+                if isinstance(embedding, Exception):
+                    logger.error(f"Failed to generate embedding for memory {memories[i].content_hash}: {str(embedding)}")
+                    results[i] = (False, f"Failed to generate embedding: {str(embedding)}")
+                    continue
+                memory = memories[i]
+                rows.append((i, (
                     memory.content_hash,
                     memory.content,
-                    tags_str,
+                    ",".join(memory.tags) if memory.tags else "",
                     memory.memory_type,
-                    metadata_str,
+                    json.dumps(memory.metadata) if memory.metadata else "{}",
                     memory.created_at,
                     memory.updated_at,
                     memory.created_at_iso,
                     memory.updated_at_iso
-                ))
-                return cursor.lastrowid
-            
-            memory_rowid = await self._execute_with_retry(insert_memory)
+                ), serialize_float32(embedding)))
             
-            # Insert into embeddings table with retry logic
-            def insert_embedding():
-                # Check if we can insert with specific rowid
+            # Insert all rows and vectors inside one transaction; a savepoint per
+            # memory lets a single failing row be skipped without losing the batch
+            def insert_batch(conn):
+                outcomes = {}
                 try:
-                    self.conn.execute('''
-                        INSERT INTO memory_embeddings (rowid, content_embedding)
-                        VALUES (?, ?)
-                    ''', (
-                        memory_rowid,
-                        serialize_float32(embedding)
-                    ))
-                except sqlite3.Error as e:
-                    # If rowid insert fails, try without specifying rowid
-                    logger.warning(f"Failed to insert with rowid {memory_rowid}: {e}. Trying without rowid.")
-                    self.conn.execute('''
-                        INSERT INTO memory_embeddings (content_embedding)
-                        VALUES (?)
-                    ''', (
-                        serialize_float32(embedding),
-                    ))
-            
-            await self._execute_with_retry(insert_embedding)
+                    # Open the transaction explicitly; otherwise releasing the first
+                    # savepoint would commit it
+                    if not conn.in_transaction:
+                        conn.execute('BEGIN')
+                    for i, values, embedding_blob in rows:
+                        conn.execute('SAVEPOINT store_batch_row')
+                        try:
+                            cursor = conn.execute('''
+                                INSERT INTO memories (
+                                    content_hash, content, tags, memory_type,
+                                    metadata, created_at, updated_at, created_at_iso, updated_at_iso
+                                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                            ''', values)
+                            conn.execute('''
+                                INSERT INTO memory_embeddings (rowid, content_embedding)
+                                VALUES (?, ?)
+                            ''', (cursor.lastrowid, embedding_blob))
+                            self._insert_memory_tags(conn, cursor.lastrowid, self._parse_tags(values[2]))
+                            conn.execute('RELEASE SAVEPOINT store_batch_row')
+                            outcomes[i] = (True, "Memory stored successfully")
+                        except sqlite3.IntegrityError:
+                            conn.execute('ROLLBACK TO SAVEPOINT store_batch_row')
+                            conn.execute('RELEASE SAVEPOINT store_batch_row')
+                            outcomes[i] = (False, "Duplicate content detected")
+                        except sqlite3.Error as e:
+                            conn.execute('ROLLBACK TO SAVEPOINT store_batch_row')
+                            conn.execute('RELEASE SAVEPOINT store_batch_row')
+                            outcomes[i] = (False, f"Failed to store memory: {str(e)}")
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                return outcomes
             
-            # Commit with retry logic
-            await self._execute_with_retry(self.conn.commit)
+            if rows:
+                outcomes = await self._execute_with_retry(insert_batch)
+                for i, outcome in outcomes.items():
+                    results[i] = outcome
             
-            logger.info(f"Successfully stored memory: {memory.content_hash}")
-            return True, "Memory stored successfully"
+            stored = sum(1 for result in results if result and result[0])
+            logger.info(f"Stored {stored}/{len(memories)} memories in batch")
+            return results
             
         except Exception as e:
-            error_msg = f"Failed to store memory: {str(e)}"
+            error_msg = f"Failed to store memory batch: {str(e)}"
             logger.error(error_msg)
             logger.error(traceback.format_exc())
-            return False, error_msg
+            return [result if result is not None else (False, error_msg) for result in results]
     
     async def retrieve(self, query: str, n_results: int = 5) -> List[MemoryQueryResult]:
         """Retrieve memories using semantic search."""
@@ -492,23 +922,25 @@ class SqliteVecMemoryStorage(MemoryStorage):
             
             # Generate query embedding
             try:
-                query_embedding = self._generate_embedding(query)
+                query_embedding = await self._embed_text(query)
             except Exception as e:
                 logger.error(f"Failed to generate query embedding: {str(e)}")
                 return []
             
             # First, check if embeddings table has data
-            cursor = self.conn.execute('SELECT COUNT(*) FROM memory_embeddings')
-            embedding_count = cursor.fetchone()[0]
+            embedding_count = await self._execute_with_retry(
+                lambda conn: conn.execute('SELECT COUNT(*) FROM memory_embeddings').fetchone()[0],
+                read_only=True
+            )
             
             if embedding_count == 0:
                 logger.warning("No embeddings found in database. Memories may have been stored without embeddings.")
                 return []
             
             # Perform vector similarity search using JOIN with retry logic
-            def search_memories():
+            def search_memories(conn):
                 # Try direct rowid join first
-                cursor = self.conn.execute('''
+                cursor = conn.execute('''
                     SELECT m.content_hash, m.content, m.tags, m.memory_type, m.metadata,
                            m.created_at, m.updated_at, m.created_at_iso, m.updated_at_iso, 
                            e.distance
@@ -528,12 +960,12 @@ class SqliteVecMemoryStorage(MemoryStorage):
                 if not results:
                     # Log debug info
                     logger.debug("No results from vector search. Checking database state...")
-                    mem_count = self.conn.execute('SELECT COUNT(*) FROM memories').fetchone()[0]
+                    mem_count = conn.execute('SELECT COUNT(*) FROM memories').fetchone()[0]
                     logger.debug(f"Memories table has {mem_count} rows, embeddings table has {embedding_count} rows")
                 
                 return results
             
-            search_results = await self._execute_with_retry(search_memories)
+            search_results = await self._execute_with_retry(search_memories, read_only=True)
             
             results = []
             for row in search_results:
@@ -580,6 +1012,257 @@ class SqliteVecMemoryStorage(MemoryStorage):
             logger.error(traceback.format_exc())
             return []
     
+    def _build_filter_clause(
+        self,
+        start_timestamp: Optional[float] = None,
+        end_timestamp: Optional[float] = None,
+        memory_type: Optional[str] = None,
+        tags: Optional[List[str]] = None
+    ) -> Tuple[str, List[Any]]:
+        """Build a WHERE condition (without the keyword) on the memories table aliased as m."""
+        conditions = []
+        params = []
+        
+        if start_timestamp is not None:
+            conditions.append("m.created_at >= ?")
+            params.append(float(start_timestamp))
+        
+        if end_timestamp is not None:
+            conditions.append("m.created_at <= ?")
+            params.append(float(end_timestamp))
+        
+        if memory_type:
+            conditions.append("m.memory_type = ?")
+            params.append(memory_type)
+        
+        if tags:
+            # Match any of the tags, same semantics as search_by_tag
+            placeholders = ",".join("?" for _ in tags)
+            conditions.append(f"m.id IN (SELECT memory_id FROM memory_tags WHERE tag IN ({placeholders}))")
+            params.extend(tags)
+        
+        return " AND ".join(conditions), params
+    
+    def _record_search_latency(self, strategy: str, elapsed_ms: float, fallback: bool = False) -> None:
+        """Accumulate per-strategy latency for filtered searches."""
+        stats = self._search_stats.setdefault(strategy, {
+            "count": 0, "total_ms": 0.0, "max_ms": 0.0, "last_ms": 0.0, "fallbacks": 0
+        })
+        stats["count"] += 1
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        stats["last_ms"] = elapsed_ms
+        if fallback:
+            stats["fallbacks"] += 1
+    
+    def get_search_stats(self) -> Dict[str, Dict[str, float]]:
+        """Get latency statistics for filtered searches, keyed by strategy."""
+        return {
+            strategy: {
+                "count": stats["count"],
+                "avg_ms": round(stats["total_ms"] / stats["count"], 2) if stats["count"] else 0.0,
+                "max_ms": round(stats["max_ms"], 2),
+                "last_ms": round(stats["last_ms"], 2),
+                "fallbacks": stats["fallbacks"]
+            }
+            for strategy, stats in self._search_stats.items()
+        }
+    
+    async def _filtered_search(
+        self,
+        query: str,
+        n_results: int,
+        start_timestamp: Optional[float] = None,
+        end_timestamp: Optional[float] = None,
+        memory_type: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        strategy: str = "auto"
+    ) -> List[MemoryQueryResult]:
+        """Run a filtered semantic search. Raises on failure; see search_filtered."""
+        if strategy not in _SEARCH_STRATEGIES:
+            raise ValueError(f"Unknown search strategy '{strategy}', expected one of {_SEARCH_STRATEGIES}")
+        
+        start_time = time.perf_counter()
+        query_blob = serialize_float32(await self._embed_text(query))
+        filter_where, filter_params = self._build_filter_clause(start_timestamp, end_timestamp, memory_type, tags)
+        where_sql = f"WHERE {filter_where}" if filter_where else ""
+        columns = '''m.content_hash, m.content, m.tags, m.memory_type, m.metadata,
+                   m.created_at, m.updated_at, m.created_at_iso, m.updated_at_iso'''
+        
+        def prefilter(conn):
+            # Exact ranking of the matching memories only
+            return conn.execute(f'''
+                SELECT {columns}, vec_distance_l2(e.content_embedding, ?) AS distance
+                FROM memories m
+                JOIN memory_embeddings e ON e.rowid = m.id
+                {where_sql}
+                ORDER BY distance
+                LIMIT ?
+            ''', [query_blob] + filter_params + [n_results]).fetchall()
+        
+        def overfetch(conn, k, max_k):
+            # KNN over the whole index, filtered afterwards; widen k until enough rows
+            # survive or k covers the whole index. k is a vec0 constraint rather than
+            # a LIMIT, so it does not depend on SQLite pushing the LIMIT down.
+            rounds = 0
+            while True:
+                rounds += 1
+                rows = conn.execute(f'''
+                    SELECT {columns}, e.distance
+                    FROM memories m
+                    JOIN (
+                        SELECT rowid, distance
+                        FROM memory_embeddings
+                        WHERE content_embedding MATCH ? AND k = ?
+                    ) e ON m.id = e.rowid
+                    {where_sql}
+                    ORDER BY e.distance
+                    LIMIT ?
+                ''', [query_blob, k] + filter_params + [n_results]).fetchall()
+                if len(rows) >= n_results or k >= max_k:
+                    return rows, rounds, k
+                k = min(k * 4, max_k)
+        
+        def search(conn):
+            total = conn.execute('SELECT COUNT(*) FROM memory_embeddings').fetchone()[0]
+            if filter_where:
+                candidates = conn.execute(
+                    f'SELECT COUNT(*) FROM memories m {where_sql}', filter_params
+                ).fetchone()[0]
+            else:
+                candidates = total
+            
+            info = {"strategy": strategy, "candidates": candidates, "rounds": 0, "fallback": False}
+            if total == 0 or candidates == 0:
+                return [], info
+            
+            # Size k so that, at the observed selectivity, n_results matches are expected
+            selectivity = min(1.0, candidates / total)
+            estimated_k = int(n_results / selectivity * self.overfetch_margin) + 1
+            max_k = min(total, _VEC0_MAX_K)
+            
+            chosen = strategy
+            if chosen == "auto":
+                if selectivity <= self.prefilter_selectivity or estimated_k > max_k:
+                    chosen = "prefilter"
+                else:
+                    chosen = "overfetch"
+            info["strategy"] = chosen
+            
+            if chosen == "prefilter":
+                info["rounds"] = 1
+                return prefilter(conn), info
+            
+            rows, rounds, k = overfetch(conn, max(n_results, min(estimated_k, max_k)), max_k)
+            info["rounds"] = rounds
+            if len(rows) < n_results and k < total:
+                # The index cannot return enough neighbours; rank the matches directly
+                info["fallback"] = True
+                info["rounds"] += 1
+                rows = prefilter(conn)
+            return rows, info
+        
+        rows, info = await self._execute_with_retry(search, read_only=True)
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        self._record_search_latency(info["strategy"], elapsed_ms, info["fallback"])
+        
+        results = []
+        for row in rows:
+            try:
+                content_hash, content, tags_str, row_memory_type, metadata_str = row[:5]
+                created_at, updated_at, created_at_iso, updated_at_iso, distance = row[5:]
+                
+                memory = Memory(
+                    content=content,
+                    content_hash=content_hash,
+                    tags=[tag.strip() for tag in tags_str.split(",") if tag.strip()] if tags_str else [],
+                    memory_type=row_memory_type,
+                    metadata=json.loads(metadata_str) if metadata_str else {},
+                    created_at=created_at,
+                    updated_at=updated_at,
+                    created_at_iso=created_at_iso,
+                    updated_at_iso=updated_at_iso
+                )
+                
+                results.append(MemoryQueryResult(
+                    memory=memory,
+                    relevance_score=max(0.0, 1.0 - distance),
+                    debug_info={
+                        "distance": distance,
+                        "backend": "sqlite-vec",
+                        "time_filtered": start_timestamp is not None or end_timestamp is not None,
+                        "search_strategy": info["strategy"],
+                        "candidates": info["candidates"],
+                        "rounds": info["rounds"],
+                        "search_time_ms": round(elapsed_ms, 2)
+                    }
+                ))
+            
+            except Exception as parse_error:
+                logger.warning(f"Failed to parse memory result: {parse_error}")
+                continue
+        
+        logger.info(
+            f"Filtered search ({info['strategy']}{', fallback' if info['fallback'] else ''}) returned "
+            f"{len(results)}/{n_results} from {info['candidates']} candidates in {elapsed_ms:.1f}ms"
+        )
+        return results
+    
+    async def search_filtered(
+        self,
+        query: str,
+        n_results: int = 5,
+        start_timestamp: Optional[float] = None,
+        end_timestamp: Optional[float] = None,
+        memory_type: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        strategy: str = "auto"
+    ) -> List[MemoryQueryResult]:
+        """
+        Semantic search restricted to memories matching the given filters.
+        
+        The filters constrain the candidate set before ranking, so exactly
+        n_results are returned whenever at least that many memories match.
+        
+        Strategies:
+            prefilter: rank only the matching memories by exact distance.
+            overfetch: query the KNN index with k sized from the filter
+                selectivity and widen k until enough rows pass the filter,
+                falling back to prefilter when the index limit is reached.
+            auto: prefilter when at most MCP_MEMORY_SQLITE_PREFILTER_SELECTIVITY
+                of all memories match, overfetch otherwise.
+        
+        Args:
+            query: Semantic search query
+            n_results: Number of results to return
+            start_timestamp: Only include memories created at or after this time
+            end_timestamp: Only include memories created at or before this time
+            memory_type: Only include memories of this type
+            tags: Only include memories having any of these tags
+            strategy: "auto", "prefilter" or "overfetch"
+        
+        Returns:
+            List of MemoryQueryResult objects ordered by relevance. Per-strategy
+            latency is available from get_search_stats().
+        """
+        try:
+            if not self.conn:
+                logger.error("Database not initialized")
+                return []
+            
+            if not self.embedding_model:
+                logger.warning("No embedding model available, cannot perform semantic search")
+                return []
+            
+            return await self._filtered_search(
+                query, n_results, start_timestamp, end_timestamp, memory_type, tags, strategy
+            )
+        
+        except Exception as e:
+            logger.error(f"Failed to run filtered search: {str(e)}")
+            logger.error(traceback.format_exc())
+            return []
+
     async def search_by_tag(self, tags: List[str]) -> List[Memory]:
         """Search memories by tags."""
         try:
@@ -590,20 +1273,20 @@ class SqliteVecMemoryStorage(MemoryStorage):
             if not tags:
                 return []
             
-            # Build query for tag search (OR logic)
-            tag_conditions = " OR ".join(["tags LIKE ?" for _ in tags])
-            tag_params = [f"%{tag}%" for tag in tags]
+            # Tag search (OR logic) through the memory_tags index
+            tags = [tag.strip() for tag in tags if tag.strip()]
+            placeholders = ",".join("?" for _ in tags)
             
-            cursor = self.conn.execute(f'''
+            rows = await self._fetchall(f'''
                 SELECT content_hash, content, tags, memory_type, metadata,
                        created_at, updated_at, created_at_iso, updated_at_iso
                 FROM memories
-                WHERE {tag_conditions}
+                WHERE id IN (SELECT memory_id FROM memory_tags WHERE tag IN ({placeholders}))
                 ORDER BY created_at DESC
-            ''', tag_params)
+            ''', tags)
             
             results = []
-            for row in cursor.fetchall():
+            for row in rows:
                 try:
                     content_hash, content, tags_str, memory_type, metadata_str = row[:5]
                     created_at, updated_at, created_at_iso, updated_at_iso = row[5:]
@@ -648,25 +1331,31 @@ class SqliteVecMemoryStorage(MemoryStorage):
             if not tags:
                 return []
             
+            tags = list(dict.fromkeys(tag.strip() for tag in tags if tag.strip()))
+            placeholders = ",".join("?" for _ in tags)
+            
             # Build query based on operation
             if operation.upper() == "AND":
-                # All tags must be present (each tag must appear in the tags field)
-                tag_conditions = " AND ".join(["tags LIKE ?" for _ in tags])
+                # All tags must be present: the memory matches once per requested tag
+                tag_condition = f'''id IN (
+                    SELECT memory_id FROM memory_tags WHERE tag IN ({placeholders})
+                    GROUP BY memory_id HAVING COUNT(*) = ?
+                )'''
+                tag_params = tags + [len(tags)]
             else:  # OR operation (default for backward compatibility)
-                tag_conditions = " OR ".join(["tags LIKE ?" for _ in tags])
+                tag_condition = f"id IN (SELECT memory_id FROM memory_tags WHERE tag IN ({placeholders}))"
+                tag_params = tags
             
-            tag_params = [f"%{tag}%" for tag in tags]
-            
-            cursor = self.conn.execute(f'''
+            rows = await self._fetchall(f'''
                 SELECT content_hash, content, tags, memory_type, metadata,
                        created_at, updated_at, created_at_iso, updated_at_iso
                 FROM memories 
-                WHERE {tag_conditions}
+                WHERE {tag_condition}
                 ORDER BY updated_at DESC
             ''', tag_params)
             
             results = []
-            for row in cursor.fetchall():
+            for row in rows:
                 try:
                     content_hash, content, tags_str, memory_type, metadata_str, created_at, updated_at, created_at_iso, updated_at_iso = row
                     
@@ -706,20 +1395,26 @@ class SqliteVecMemoryStorage(MemoryStorage):
             if not self.conn:
                 return False, "Database not initialized"
             
-            # Get the id first to delete corresponding embedding
-            cursor = self.conn.execute('SELECT id FROM memories WHERE content_hash = ?', (content_hash,))
-            row = cursor.fetchone()
-            
-            if row:
+            def delete_memory(conn):
+                # Get the id first to delete corresponding embedding
+                row = conn.execute('SELECT id FROM memories WHERE content_hash = ?', (content_hash,)).fetchone()
+                if not row:
+                    return None
+                
                 memory_id = row[0]
-                # Delete from both tables
-                self.conn.execute('DELETE FROM memory_embeddings WHERE rowid = ?', (memory_id,))
-                cursor = self.conn.execute('DELETE FROM memories WHERE content_hash = ?', (content_hash,))
-                self.conn.commit()
-            else:
+                # Delete from all tables
+                conn.execute('DELETE FROM memory_embeddings WHERE rowid = ?', (memory_id,))
+                conn.execute('DELETE FROM memory_tags WHERE memory_id = ?', (memory_id,))
+                conn.execute('DELETE FROM memory_relevance WHERE memory_id = ?', (memory_id,))
+                cursor = conn.execute('DELETE FROM memories WHERE content_hash = ?', (content_hash,))
+                conn.commit()
+                return cursor.rowcount
+            
+            rowcount = await self._execute_with_retry(delete_memory)
+            if rowcount is None:
                 return False, f"Memory with hash {content_hash} not found"
             
-            if cursor.rowcount > 0:
+            if rowcount > 0:
                 logger.info(f"Deleted memory: {content_hash}")
                 return True, f"Successfully deleted memory {content_hash}"
             else:
@@ -736,13 +1431,12 @@ class SqliteVecMemoryStorage(MemoryStorage):
             if not self.conn:
                 return None
             
-            cursor = self.conn.execute('''
+            row = await self._fetchone('''
                 SELECT content_hash, content, tags, memory_type, metadata,
                        created_at, updated_at, created_at_iso, updated_at_iso
                 FROM memories WHERE content_hash = ?
             ''', (content_hash,))
             
-            row = cursor.fetchone()
             if not row:
                 return None
             
@@ -777,18 +1471,20 @@ class SqliteVecMemoryStorage(MemoryStorage):
             if not self.conn:
                 return 0, "Database not initialized"
             
-            # Get the ids first to delete corresponding embeddings
-            cursor = self.conn.execute('SELECT id FROM memories WHERE tags LIKE ?', (f"%{tag}%",))
-            memory_ids = [row[0] for row in cursor.fetchall()]
-            
-            # Delete from both tables
-            for memory_id in memory_ids:
-                self.conn.execute('DELETE FROM memory_embeddings WHERE rowid = ?', (memory_id,))
-            
-            cursor = self.conn.execute('DELETE FROM memories WHERE tags LIKE ?', (f"%{tag}%",))
-            self.conn.commit()
-            
-            count = cursor.rowcount
+            def delete_tagged(conn):
+                # Get the ids first to delete corresponding embeddings
+                cursor = conn.execute('SELECT memory_id FROM memory_tags WHERE tag = ?', (tag.strip(),))
+                memory_ids = [(row[0],) for row in cursor.fetchall()]
+                
+                # Delete from all tables
+                conn.executemany('DELETE FROM memory_embeddings WHERE rowid = ?', memory_ids)
+                conn.executemany('DELETE FROM memory_tags WHERE memory_id = ?', memory_ids)
+                conn.executemany('DELETE FROM memory_relevance WHERE memory_id = ?', memory_ids)
+                cursor = conn.executemany('DELETE FROM memories WHERE id = ?', memory_ids)
+                conn.commit()
+                return cursor.rowcount if memory_ids else 0
+            
+            count = await self._execute_with_retry(delete_tagged)
             logger.info(f"Deleted {count} memories with tag: {tag}")
             
             if count > 0:
@@ -808,17 +1504,22 @@ class SqliteVecMemoryStorage(MemoryStorage):
                 return 0, "Database not initialized"
             
             # Find duplicates (keep the first occurrence)
-            cursor = self.conn.execute('''
-                DELETE FROM memories 
-                WHERE rowid NOT IN (
-                    SELECT MIN(rowid) 
-                    FROM memories 
-                    GROUP BY content_hash
-                )
-            ''')
-            self.conn.commit()
-            
-            count = cursor.rowcount
+            def delete_duplicates(conn):
+                cursor = conn.execute('''
+                    DELETE FROM memories 
+                    WHERE rowid NOT IN (
+                        SELECT MIN(rowid) 
+                        FROM memories 
+                        GROUP BY content_hash
+                    )
+                ''')
+                count = cursor.rowcount
+                conn.execute('DELETE FROM memory_tags WHERE memory_id NOT IN (SELECT id FROM memories)')
+                conn.execute('DELETE FROM memory_relevance WHERE memory_id NOT IN (SELECT id FROM memories)')
+                conn.commit()
+                return count
+            
+            count = await self._execute_with_retry(delete_duplicates)
             logger.info(f"Cleaned up {count} duplicate memories")
             
             if count > 0:
@@ -837,43 +1538,10 @@ class SqliteVecMemoryStorage(MemoryStorage):
             if not self.conn:
                 return False, "Database not initialized"
             
-            # Get current memory
-            cursor = self.conn.execute('''
-                SELECT content, tags, memory_type, metadata, created_at, created_at_iso
-                FROM memories WHERE content_hash = ?
-            ''', (content_hash,))
-            
-            row = cursor.fetchone()
-            if not row:
-                return False, f"Memory with hash {content_hash} not found"
-            
-            content, current_tags, current_type, current_metadata_str, created_at, created_at_iso = row
-            
-            # Parse current metadata
-            current_metadata = json.loads(current_metadata_str) if current_metadata_str else {}
-            
-            # Apply updates
-            new_tags = current_tags
-            new_type = current_type
-            new_metadata = current_metadata.copy()
-            
-            # Handle tag updates
-            if "tags" in updates:
-                if isinstance(updates["tags"], list):
-                    new_tags = ",".join(updates["tags"])
-                else:
-                    return False, "Tags must be provided as a list of strings"
-            
-            # Handle memory type updates
-            if "memory_type" in updates:
-                new_type = updates["memory_type"]
-            
-            # Handle metadata updates
-            if "metadata" in updates:
-                if isinstance(updates["metadata"], dict):
-                    new_metadata.update(updates["metadata"])
-                else:
-                    return False, "Metadata must be provided as a dictionary"
+            if "tags" in updates and not isinstance(updates["tags"], list):
+                return False, "Tags must be provided as a list of strings"
+            if "metadata" in updates and not isinstance(updates["metadata"], dict):
+                return False, "Metadata must be provided as a dictionary"
             
             # Handle other custom fields
             protected_fields = {
@@ -881,31 +1549,57 @@ class SqliteVecMemoryStorage(MemoryStorage):
                 "embedding", "created_at", "created_at_iso", "updated_at", "updated_at_iso"
             }
             
-            for key, value in updates.items():
-                if key not in protected_fields:
-                    new_metadata[key] = value
-            
-            # Update timestamps
-            now = time.time()
-            now_iso = datetime.utcfromtimestamp(now).isoformat() + "Z"
-            
-            if not preserve_timestamps:
-                created_at = now
-                created_at_iso = now_iso
-            
-            # Update the memory
-            self.conn.execute('''
-                UPDATE memories SET
-                    tags = ?, memory_type = ?, metadata = ?,
-                    updated_at = ?, updated_at_iso = ?,
-                    created_at = ?, created_at_iso = ?
-                WHERE content_hash = ?
-            ''', (
-                new_tags, new_type, json.dumps(new_metadata),
-                now, now_iso, created_at, created_at_iso, content_hash
-            ))
+            # Read, merge and write on the writer connection, so concurrent
+            # updates of the same memory cannot interleave and lose changes
+            def update_memory(conn):
+                row = conn.execute('''
+                    SELECT id, tags, memory_type, metadata, created_at, created_at_iso
+                    FROM memories WHERE content_hash = ?
+                ''', (content_hash,)).fetchone()
+                if not row:
+                    return False
+                
+                memory_id, current_tags, current_type, current_metadata_str, created_at, created_at_iso = row
+                
+                # Apply updates
+                new_tags = ",".join(updates["tags"]) if "tags" in updates else current_tags
+                new_type = updates.get("memory_type", current_type)
+                new_metadata = json.loads(current_metadata_str) if current_metadata_str else {}
+                if "metadata" in updates:
+                    new_metadata.update(updates["metadata"])
+                for key, value in updates.items():
+                    if key not in protected_fields:
+                        new_metadata[key] = value
+                
+                # Update timestamps
+                now = time.time()
+                now_iso = datetime.utcfromtimestamp(now).isoformat() + "Z"
+                if not preserve_timestamps:
+                    created_at = now
+                    created_at_iso = now_iso
+                
+                try:
+                    conn.execute('''
+                        UPDATE memories SET
+                            tags = ?, memory_type = ?, metadata = ?,
+                            updated_at = ?, updated_at_iso = ?,
+                            created_at = ?, created_at_iso = ?
+                        WHERE id = ?
+                    ''', (
+                        new_tags, new_type, json.dumps(new_metadata),
+                        now, now_iso, created_at, created_at_iso, memory_id
+                    ))
+                    if "tags" in updates:
+                        conn.execute('DELETE FROM memory_tags WHERE memory_id = ?', (memory_id,))
+                        self._insert_memory_tags(conn, memory_id, self._parse_tags(new_tags))
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                return True
             
-            self.conn.commit()
+            if not await self._execute_with_retry(update_memory):
+                return False, f"Memory with hash {content_hash} not found"
             
             # Create summary of updated fields
             updated_fields = []
@@ -932,17 +1626,172 @@ class SqliteVecMemoryStorage(MemoryStorage):
             logger.error(traceback.format_exc())
             return False, error_msg
     
-    def get_stats(self) -> Dict[str, Any]:
+    async def update_memories_metadata(self, updates: Dict[str, Dict[str, Any]], touch: bool = True) -> Tuple[int, str]:
+        """
+        Merge metadata patches into many memories in one transaction.
+        
+        Each patch is merged into the stored metadata the same way
+        update_memory_metadata merges ``updates["metadata"]``; updated_at is
+        refreshed (unless ``touch`` is False) and created_at is preserved.
+        Unknown hashes are skipped.
+        
+        Args:
+            updates: Mapping of content_hash to the metadata keys to set
+            touch: Whether to refresh updated_at
+            
+        Returns:
+            Tuple of (count_updated, message)
+        """
+        if not updates:
+            return 0, "No updates"
+        try:
+            if not self.conn:
+                return 0, "Database not initialized"
+            
+            content_hashes = list(updates.keys())
+            now = time.time()
+            now_iso = datetime.utcfromtimestamp(now).isoformat() + "Z"
+            
+            def update_metadata(conn):
+                rows = []
+                try:
+                    for start in range(0, len(content_hashes), 500):
+                        chunk = content_hashes[start:start + 500]
+                        placeholders = ",".join("?" for _ in chunk)
+                        for content_hash, metadata_str in conn.execute(
+                            f'SELECT content_hash, metadata FROM memories WHERE content_hash IN ({placeholders})', chunk
+                        ).fetchall():
+                            metadata = json.loads(metadata_str) if metadata_str else {}
+                            metadata.update(updates[content_hash])
+                            if touch:
+                                rows.append((json.dumps(metadata), now, now_iso, content_hash))
+                            else:
+                                rows.append((json.dumps(metadata), content_hash))
+                    if touch:
+                        conn.executemany(
+                            'UPDATE memories SET metadata = ?, updated_at = ?, updated_at_iso = ? WHERE content_hash = ?',
+                            rows
+                        )
+                    else:
+                        conn.executemany('UPDATE memories SET metadata = ? WHERE content_hash = ?', rows)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                return len(rows)
+            
+            updated = await self._execute_with_retry(update_metadata)
+            logger.info(f"Updated metadata for {updated} of {len(updates)} memories")
+            return updated, f"Updated metadata for {updated} of {len(updates)} memories"
+            
+        except Exception as e:
+            error_msg = f"Error updating memory metadata in bulk: {str(e)}"
+            logger.error(error_msg)
+            logger.error(traceback.format_exc())
+            return 0, error_msg
+    
+    async def update_relevance_scores(self, scores: Dict[str, Dict[str, Any]]) -> Tuple[int, str]:
+        """
+        Upsert consolidation relevance scores into the memory_relevance table.
+        
+        Only the numeric score columns are written; the memory's metadata and
+        updated_at are left untouched. Unknown hashes are skipped.
+        
+        Args:
+            scores: Mapping of content_hash to relevance fields
+                (relevance_score, decay_factor, connection_boost, access_boost)
+            
+        Returns:
+            Tuple of (count_updated, message)
+        """
+        if not scores:
+            return 0, "No scores"
+        try:
+            if not self.conn:
+                return 0, "Database not initialized"
+            
+            now = time.time()
+            rows = [
+                (
+                    score['relevance_score'], score.get('decay_factor'), score.get('connection_boost'),
+                    score.get('access_boost'), now, content_hash
+                )
+                for content_hash, score in scores.items()
+            ]
+            
+            def upsert_scores(conn):
+                try:
+                    cursor = conn.executemany('''
+                        INSERT OR REPLACE INTO memory_relevance
+                            (memory_id, relevance_score, decay_factor, connection_boost, access_boost, calculated_at)
+                        SELECT id, ?, ?, ?, ?, ? FROM memories WHERE content_hash = ?
+                    ''', rows)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                return cursor.rowcount
+            
+            updated = await self._execute_with_retry(upsert_scores)
+            logger.info(f"Stored relevance scores for {updated} of {len(scores)} memories")
+            return updated, f"Stored relevance scores for {updated} of {len(scores)} memories"
+            
+        except Exception as e:
+            error_msg = f"Error storing relevance scores: {str(e)}"
+            logger.error(error_msg)
+            logger.error(traceback.format_exc())
+            return 0, error_msg
+    
+    async def get_relevance_scores(self, content_hashes: Optional[List[str]] = None) -> Dict[str, Dict[str, float]]:
+        """
+        Read relevance scores from the memory_relevance table.
+        
+        Args:
+            content_hashes: Only return scores for these memories (default: all)
+            
+        Returns:
+            Mapping of content_hash to its relevance fields and calculated_at
+        """
+        try:
+            await self.initialize()
+            
+            query = '''
+                SELECT m.content_hash, r.relevance_score, r.decay_factor,
+                       r.connection_boost, r.access_boost, r.calculated_at
+                FROM memory_relevance r JOIN memories m ON m.id = r.memory_id
+            '''
+            rows = []
+            if content_hashes is None:
+                rows = await self._fetchall(query)
+            else:
+                for start in range(0, len(content_hashes), 500):
+                    chunk = content_hashes[start:start + 500]
+                    placeholders = ",".join("?" for _ in chunk)
+                    rows.extend(await self._fetchall(f"{query} WHERE m.content_hash IN ({placeholders})", chunk))
+            
+            return {
+                content_hash: {
+                    'relevance_score': relevance_score,
+                    'decay_factor': decay_factor,
+                    'connection_boost': connection_boost,
+                    'access_boost': access_boost,
+                    'calculated_at': calculated_at
+                }
+                for content_hash, relevance_score, decay_factor, connection_boost, access_boost, calculated_at in rows
+            }
+            
+        except Exception as e:
+            logger.error(f"Error getting relevance scores: {str(e)}")
+            return {}
+    
+    async def get_stats(self) -> Dict[str, Any]:
         """Get storage statistics."""
         try:
             if not self.conn:
                 return {"error": "Database not initialized"}
             
-            cursor = self.conn.execute('SELECT COUNT(*) FROM memories')
-            total_memories = cursor.fetchone()[0]
-            
-            cursor = self.conn.execute('SELECT COUNT(DISTINCT tags) FROM memories WHERE tags != ""')
-            unique_tags = cursor.fetchone()[0]
+            total_memories = (await self._fetchone('SELECT COUNT(*) FROM memories'))[0]
+            unique_tags = (await self._fetchone('SELECT COUNT(DISTINCT tag) FROM memory_tags'))[0]
             
             # Get database file size
             file_size = os.path.getsize(self.db_path) if os.path.exists(self.db_path) else 0
@@ -954,7 +1803,9 @@ class SqliteVecMemoryStorage(MemoryStorage):
                 "database_size_bytes": file_size,
                 "database_size_mb": round(file_size / (1024 * 1024), 2),
                 "embedding_model": self.embedding_model_name,
-                "embedding_dimension": self.embedding_dimension
+                "embedding_dimension": self.embedding_dimension,
+                "embedding_cache": await self.embedding_cache.aget_stats(),
+                "filtered_search": self.get_search_stats()
             }
             
         except Exception as e:
@@ -1017,76 +1868,14 @@ class SqliteVecMemoryStorage(MemoryStorage):
             
             # Determine whether to use semantic search or just time-based filtering
             if query and self.embedding_model:
-                # Combined semantic search with time filtering
+                # Rank within the time window instead of post-filtering the global top-K
                 try:
-                    # Generate query embedding
-                    query_embedding = self._generate_embedding(query)
-                    
-                    # Build SQL query with time filtering
-                    base_query = '''
-                        SELECT m.content_hash, m.content, m.tags, m.memory_type, m.metadata,
-                               m.created_at, m.updated_at, m.created_at_iso, m.updated_at_iso, 
-                               e.distance
-                        FROM memories m
-                        JOIN (
-                            SELECT rowid, distance 
-                            FROM memory_embeddings 
-                            WHERE content_embedding MATCH ?
-                            ORDER BY distance
-                            LIMIT ?
-                        ) e ON m.id = e.rowid
-                    '''
-                    
-                    if time_where:
-                        base_query += f" WHERE {time_where}"
-                    
-                    base_query += " ORDER BY e.distance"
-                    
-                    # Prepare parameters: embedding, limit, then time filter params
-                    query_params = [serialize_float32(query_embedding), n_results] + params
-                    
-                    cursor = self.conn.execute(base_query, query_params)
-                    
-                    results = []
-                    for row in cursor.fetchall():
-                        try:
-                            # Parse row data
-                            content_hash, content, tags_str, memory_type, metadata_str = row[:5]
-                            created_at, updated_at, created_at_iso, updated_at_iso, distance = row[5:]
-                            
-                            # Parse tags and metadata
-                            tags = [tag.strip() for tag in tags_str.split(",") if tag.strip()] if tags_str else []
-                            metadata = json.loads(metadata_str) if metadata_str else {}
-                            
-                            # Create Memory object
-                            memory = Memory(
-                                content=content,
-                                content_hash=content_hash,
-                                tags=tags,
-                                memory_type=memory_type,
-                                metadata=metadata,
-                                created_at=created_at,
-                                updated_at=updated_at,
-                                created_at_iso=created_at_iso,
-                                updated_at_iso=updated_at_iso
-                            )
-                            
-                            # Calculate relevance score (lower distance = higher relevance)
-                            relevance_score = max(0.0, 1.0 - distance)
-                            
-                            results.append(MemoryQueryResult(
-                                memory=memory,
-                                relevance_score=relevance_score,
-                                debug_info={"distance": distance, "backend": "sqlite-vec", "time_filtered": bool(time_where)}
-                            ))
-                            
-                        except Exception as parse_error:
-                            logger.warning(f"Failed to parse memory result: {parse_error}")
-                            continue
-                    
+                    results = await self._filtered_search(
+                        query, n_results, start_timestamp=start_timestamp, end_timestamp=end_timestamp
+                    )
                     logger.info(f"Retrieved {len(results)} memories for semantic query with time filter")
                     return results
-                    
+                
                 except Exception as query_error:
                     logger.error(f"Error in semantic search with time filter: {str(query_error)}")
                     # Fall back to time-based retrieval on error
@@ -1107,10 +1896,10 @@ class SqliteVecMemoryStorage(MemoryStorage):
             # Add limit parameter
             params.append(n_results)
             
-            cursor = self.conn.execute(base_query, params)
+            rows = await self._fetchall(base_query, params)
             
             results = []
-            for row in cursor.fetchall():
+            for row in rows:
                 try:
                     content_hash, content, tags_str, memory_type, metadata_str = row[:5]
                     created_at, updated_at, created_at_iso, updated_at_iso = row[5:]
@@ -1162,7 +1951,7 @@ class SqliteVecMemoryStorage(MemoryStorage):
                 logger.error("Database not initialized, cannot retrieve memories")
                 return []
             
-            cursor = self.conn.execute('''
+            rows = await self._fetchall('''
                 SELECT content_hash, content, tags, memory_type, metadata,
                        created_at, updated_at, created_at_iso, updated_at_iso
                 FROM memories
@@ -1170,7 +1959,7 @@ class SqliteVecMemoryStorage(MemoryStorage):
             ''')
             
             results = []
-            for row in cursor.fetchall():
+            for row in rows:
                 try:
                     content_hash, content, tags_str, memory_type, metadata_str = row[:5]
                     created_at, updated_at, created_at_iso, updated_at_iso = row[5:]
@@ -1208,7 +1997,7 @@ class SqliteVecMemoryStorage(MemoryStorage):
         """Get memories within a specific time range."""
         try:
             await self.initialize()
-            cursor = self.conn.execute('''
+            rows = await self._fetchall('''
                 SELECT content_hash, content, tags, memory_type, metadata,
                        created_at, updated_at, created_at_iso, updated_at_iso
                 FROM memories
@@ -1217,7 +2006,7 @@ class SqliteVecMemoryStorage(MemoryStorage):
             ''', (start_time, end_time))
             
             results = []
-            for row in cursor.fetchall():
+            for row in rows:
                 try:
                     content_hash, content, tags_str, memory_type, metadata_str = row[:5]
                     created_at, updated_at, created_at_iso, updated_at_iso = row[5:]
@@ -1251,12 +2040,95 @@ class SqliteVecMemoryStorage(MemoryStorage):
             logger.error(f"Error getting memories by time range: {str(e)}")
             return []
 
+    async def get_memories_with_embeddings(
+        self,
+        start_time: Optional[float] = None,
+        end_time: Optional[float] = None
+    ) -> Optional[MemoryEmbeddings]:
+        """
+        Load memories together with their stored vectors in one pass.
+        
+        The vectors come straight from ``memory_embeddings`` and are decoded
+        into a single contiguous float32 matrix, so consolidation can cluster
+        and score without re-embedding or building per-memory lists.
+        
+        Args:
+            start_time: Only include memories created at or after this timestamp
+            end_time: Only include memories created at or before this timestamp
+            
+        Returns:
+            MemoryEmbeddings ordered by created_at DESC, or None on error
+        """
+        try:
+            await self.initialize()
+            
+            conditions = []
+            params = []
+            if start_time is not None:
+                conditions.append('m.created_at >= ?')
+                params.append(start_time)
+            if end_time is not None:
+                conditions.append('m.created_at <= ?')
+                params.append(end_time)
+            where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            
+            rows = await self._fetchall(f'''
+                SELECT m.content_hash, m.content, m.tags, m.memory_type, m.metadata,
+                       m.created_at, m.updated_at, m.created_at_iso, m.updated_at_iso,
+                       e.content_embedding
+                FROM memories m
+                LEFT JOIN memory_embeddings e ON e.rowid = m.id
+                {where_clause}
+                ORDER BY m.created_at DESC
+            ''', params)
+            
+            memories = []
+            blobs = []
+            index = {}
+            vector_bytes = self.embedding_dimension * 4
+            for row in rows:
+                try:
+                    content_hash, content, tags_str, memory_type, metadata_str = row[:5]
+                    created_at, updated_at, created_at_iso, updated_at_iso, blob = row[5:]
+                    
+                    memories.append(Memory(
+                        content=content,
+                        content_hash=content_hash,
+                        tags=self._parse_tags(tags_str),
+                        memory_type=memory_type,
+                        metadata=json.loads(metadata_str) if metadata_str else {},
+                        created_at=created_at,
+                        updated_at=updated_at,
+                        created_at_iso=created_at_iso,
+                        updated_at_iso=updated_at_iso
+                    ))
+                    
+                    if blob is not None and len(blob) == vector_bytes and content_hash not in index:
+                        index[content_hash] = len(blobs)
+                        blobs.append(blob)
+                        
+                except Exception as parse_error:
+                    logger.warning(f"Failed to parse memory result: {parse_error}")
+                    continue
+            
+            # One copy from the joined blobs into a contiguous (n, dim) matrix
+            embeddings = np.frombuffer(bytearray().join(blobs), dtype=np.float32).reshape(
+                len(blobs), self.embedding_dimension
+            )
+            
+            logger.info(f"Retrieved {len(memories)} memories with {len(blobs)} embeddings")
+            return MemoryEmbeddings(memories=memories, embeddings=embeddings, index=index)
+            
+        except Exception as e:
+            logger.error(f"Error getting memories with embeddings: {str(e)}")
+            return None
+
     async def get_memory_connections(self) -> Dict[str, int]:
         """Get memory connection statistics."""
         try:
             await self.initialize()
             # For now, return basic statistics based on tags and content similarity
-            cursor = self.conn.execute('''
+            rows = await self._fetchall('''
                 SELECT tags, COUNT(*) as count
                 FROM memories
                 WHERE tags IS NOT NULL AND tags != ''
@@ -1264,7 +2136,7 @@ class SqliteVecMemoryStorage(MemoryStorage):
             ''')
             
             connections = {}
-            for row in cursor.fetchall():
+            for row in rows:
                 tags_str, count = row
                 if tags_str:
                     tags = [tag.strip() for tag in tags_str.split(",") if tag.strip()]
@@ -1282,7 +2154,7 @@ class SqliteVecMemoryStorage(MemoryStorage):
         try:
             await self.initialize()
             # Return recent access patterns based on updated_at timestamps
-            cursor = self.conn.execute('''
+            rows = await self._fetchall('''
                 SELECT content_hash, updated_at_iso
                 FROM memories
                 WHERE updated_at_iso IS NOT NULL
@@ -1291,7 +2163,7 @@ class SqliteVecMemoryStorage(MemoryStorage):
             ''')
             
             patterns = {}
-            for row in cursor.fetchall():
+            for row in rows:
                 content_hash, updated_at_iso = row
                 try:
                     patterns[content_hash] = datetime.fromisoformat(updated_at_iso.replace('Z', '+00:00'))
@@ -1377,10 +2249,10 @@ class SqliteVecMemoryStorage(MemoryStorage):
                 query += ' OFFSET ?'
                 params.append(offset)
             
-            cursor = self.conn.execute(query, params)
+            rows = await self._fetchall(query, params)
             memories = []
             
-            for row in cursor.fetchall():
+            for row in rows:
                 memory = self._row_to_memory(row)
                 if memory:
                     memories.append(memory)
@@ -1391,6 +2263,170 @@ class SqliteVecMemoryStorage(MemoryStorage):
             logger.error(f"Error getting all memories: {str(e)}")
             return []
 
+    async def get_all_tags(self) -> List[str]:
+        """Get all unique tags, read from the memory_tags index."""
+        try:
+            rows = await self._fetchall('SELECT DISTINCT tag FROM memory_tags ORDER BY tag')
+            return [row[0] for row in rows]
+            
+        except Exception as e:
+            logger.error(f"Error getting all tags: {str(e)}")
+            return []
+
+    async def get_tag_counts(self) -> Dict[str, int]:
+        """Get the number of memories carrying each tag, most used first."""
+        try:
+            rows = await self._fetchall('''
+                SELECT tag, COUNT(*) AS count FROM memory_tags
+                GROUP BY tag ORDER BY count DESC, tag
+            ''')
+            return {tag: count for tag, count in rows}
+            
+        except Exception as e:
+            logger.error(f"Error getting tag counts: {str(e)}")
+            return {}
+
+    async def delete_many(self, content_hashes: List[str]) -> int:
+        """Delete several memories by content hash in one transaction. Returns the number deleted."""
+        if not content_hashes:
+            return 0
+        try:
+            if not self.conn:
+                return 0
+            
+            def delete_memories(conn):
+                deleted = 0
+                try:
+                    for start in range(0, len(content_hashes), 500):
+                        chunk = content_hashes[start:start + 500]
+                        placeholders = ",".join("?" for _ in chunk)
+                        ids = [row[0] for row in conn.execute(
+                            f'SELECT id FROM memories WHERE content_hash IN ({placeholders})', chunk
+                        ).fetchall()]
+                        if not ids:
+                            continue
+                        id_placeholders = ",".join("?" for _ in ids)
+                        conn.execute(f'DELETE FROM memory_embeddings WHERE rowid IN ({id_placeholders})', ids)
+                        conn.execute(f'DELETE FROM memory_tags WHERE memory_id IN ({id_placeholders})', ids)
+                        conn.execute(f'DELETE FROM memory_relevance WHERE memory_id IN ({id_placeholders})', ids)
+                        deleted += conn.execute(f'DELETE FROM memories WHERE id IN ({id_placeholders})', ids).rowcount
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                return deleted
+            
+            deleted = await self._execute_with_retry(delete_memories)
+            logger.info(f"Deleted {deleted} memories")
+            return deleted
+            
+        except Exception as e:
+            logger.error(f"Failed to delete memories: {str(e)}")
+            return 0
+
+    async def get_ingestion_manifest(
+        self,
+        paths: Optional[List[str]] = None,
+        prefix: Optional[str] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Get ingestion manifest entries keyed by file path.
+        
+        Args:
+            paths: Only these paths (default: all)
+            prefix: Only paths starting with this prefix, e.g. a directory
+            
+        Returns:
+            {path: {size, mtime_ns, file_hash, chunk_size, chunks, ingested_at}}
+        """
+        try:
+            query = '''
+                SELECT path, size, mtime_ns, file_hash, chunk_size, chunks, ingested_at
+                FROM ingestion_manifest
+            '''
+            rows = []
+            if paths is not None:
+                for start in range(0, len(paths), 500):
+                    chunk = paths[start:start + 500]
+                    placeholders = ",".join("?" for _ in chunk)
+                    rows.extend(await self._fetchall(f'{query} WHERE path IN ({placeholders})', tuple(chunk)))
+            elif prefix is not None:
+                # substr() rather than LIKE: paths may contain % and _
+                rows = await self._fetchall(f'{query} WHERE substr(path, 1, ?) = ?', (len(prefix), prefix))
+            else:
+                rows = await self._fetchall(query)
+            
+            return {
+                row[0]: {
+                    "size": row[1],
+                    "mtime_ns": row[2],
+                    "file_hash": row[3],
+                    "chunk_size": row[4],
+                    "chunks": json.loads(row[5]) if row[5] else {},
+                    "ingested_at": row[6]
+                }
+                for row in rows
+            }
+            
+        except Exception as e:
+            logger.error(f"Error reading ingestion manifest: {str(e)}")
+            return {}
+
+    async def save_ingestion_manifest(self, entries: Dict[str, Dict[str, Any]]) -> bool:
+        """Insert or replace ingestion manifest entries keyed by file path."""
+        if not entries:
+            return True
+        try:
+            now = time.time()
+            rows = [(
+                path,
+                entry["size"],
+                entry["mtime_ns"],
+                entry.get("file_hash"),
+                entry.get("chunk_size"),
+                json.dumps(entry.get("chunks", {})),
+                entry.get("ingested_at", now)
+            ) for path, entry in entries.items()]
+            
+            def save_entries(conn):
+                try:
+                    conn.executemany('''
+                        INSERT OR REPLACE INTO ingestion_manifest
+                            (path, size, mtime_ns, file_hash, chunk_size, chunks, ingested_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ''', rows)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+            
+            await self._execute_with_retry(save_entries)
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error saving ingestion manifest: {str(e)}")
+            return False
+
+    async def delete_ingestion_manifest(self, paths: List[str]) -> bool:
+        """Remove ingestion manifest entries (does not delete their memories)."""
+        if not paths:
+            return True
+        try:
+            def delete_entries(conn):
+                try:
+                    conn.executemany('DELETE FROM ingestion_manifest WHERE path = ?', [(path,) for path in paths])
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+            
+            await self._execute_with_retry(delete_entries)
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error deleting ingestion manifest entries: {str(e)}")
+            return False
+
     async def get_recent_memories(self, n: int = 10) -> List[Memory]:
         """
         Get n most recent memories.
@@ -1413,8 +2449,7 @@ class SqliteVecMemoryStorage(MemoryStorage):
         try:
             await self.initialize()
             
-            cursor = self.conn.execute('SELECT COUNT(*) FROM memories')
-            result = cursor.fetchone()
+            result = await self._fetchone('SELECT COUNT(*) FROM memories')
             return result[0] if result else 0
             
         except Exception as e:
@@ -1422,8 +2457,16 @@ class SqliteVecMemoryStorage(MemoryStorage):
             return 0
 
     def close(self):
-        """Close the database connection."""
+        """Close the database connection and stop the executor threads."""
+        self._initialized = False
+        self.embedding_cache.close()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
         if self.conn:
-            self.conn.close()
+            try:
+                self.conn.close()
+            except sqlite3.Error:
+                pass
             self.conn = None
             logger.info("SQLite-vec storage connection closed")
\ No newline at end of file
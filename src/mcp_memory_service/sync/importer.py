@@ -151,6 +151,7 @@ class MemoryImporter:
         }
         
         # Process each memory
+        new_memories = []
         for memory_data in memories_data:
             content_hash = memory_data.get("content_hash")
             
@@ -169,20 +170,29 @@ class MemoryImporter:
                 memory = await self._create_memory_from_dict(
                     memory_data, source_machine, add_source_tags, json_file
                 )
-                
-                # Store the memory (unless dry run)
-                if not dry_run:
-                    await self.storage.store(memory)
-                
-                # Track success
                 existing_hashes.add(content_hash)
-                file_stats["imported"] += 1
-                file_stats["sources"][source_machine]["imported"] += 1
+                new_memories.append(memory)
                 
             except Exception as e:
                 logger.error(f"Error creating memory from data: {str(e)}")
                 continue
         
+        # Store the new memories in one batch (unless dry run)
+        if dry_run:
+            results = [(True, "Dry run")] * len(new_memories)
+        else:
+            results = await self.storage.store_batch(new_memories)
+        
+        for memory, (success, message) in zip(new_memories, results):
+            if success:
+                file_stats["imported"] += 1
+                file_stats["sources"][source_machine]["imported"] += 1
+            elif "duplicate" in message.lower():
+                file_stats["duplicates"] += 1
+                file_stats["sources"][source_machine]["duplicates"] += 1
+            else:
+                logger.error(f"Error storing memory {memory.content_hash}: {message}")
+        
         return file_stats
     
     async def _create_memory_from_dict(
@@ -12,13 +12,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-"""Utilities for database validation and health checks."""
+"""
+Utilities for database validation and health checks.
+
+SQLite-vec queries go through the storage's executor (``_fetchone``,
+``_fetchall`` and ``_execute_with_retry``), never through ``storage.conn``
+on the event loop.
+"""
 from typing import Dict, Any, Tuple
 import logging
 import os
 import json
 from datetime import datetime
-import importlib
 
 logger = logging.getLogger(__name__)
 
@@ -57,21 +62,19 @@ async def validate_database(storage) -> Tuple[bool, str]:
             try:
                 # Make sure the tables exist
                 try:
-                    cursor = storage.conn.execute('SELECT name FROM sqlite_master WHERE type="table" AND name="memories"')
-                    if not cursor.fetchone():
+                    if not await storage._fetchone("SELECT name FROM sqlite_master WHERE type='table' AND name='memories'"):
                         return False, "SQLite database is missing required tables"
                 except Exception as table_error:
                     return False, f"Failed to check for tables: {str(table_error)}"
                 
                 # Try a simple query to verify database connection
-                cursor = storage.conn.execute('SELECT COUNT(*) FROM memories')
-                memory_count = cursor.fetchone()[0]
+                memory_count = (await storage._fetchone('SELECT COUNT(*) FROM memories'))[0]
                 logger.info(f"SQLite-vec database contains {memory_count} memories")
                 
                 # Test if embedding generation works (if model is available)
                 if hasattr(storage, 'embedding_model') and storage.embedding_model:
                     test_text = "Database validation test"
-                    embedding = storage._generate_embedding(test_text)
+                    embedding = await storage._embed_text(test_text)
                     if not embedding or len(embedding) != storage.embedding_dimension:
                         logger.warning("Embedding generation may not be working properly")
                 else:
@@ -140,7 +143,47 @@ async def validate_database(storage) -> Tuple[bool, str]:
         logger.error(f"Database validation failed: {str(e)}")
         return False, f"Database validation failed: {str(e)}"
 
-def get_database_stats(storage) -> Dict[str, Any]:
+async def check_sqlite_vec_health(storage) -> Tuple[bool, str, Dict[str, Any]]:
+    """Validate an SQLite-vec storage and collect the statistics shown by the health check."""
+    if not hasattr(storage, 'conn') or storage.conn is None:
+        return False, "SQLite database connection is not initialized", {}
+    
+    try:
+        # Check for required tables
+        if not await storage._fetchone("SELECT name FROM sqlite_master WHERE type='table' AND name='memories'"):
+            return False, "SQLite database is missing required tables", {}
+        
+        memory_count = (await storage._fetchone('SELECT COUNT(*) FROM memories'))[0]
+        has_embeddings = await storage._fetchone(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name='memory_embeddings'"
+        ) is not None
+        has_model = hasattr(storage, 'embedding_model') and storage.embedding_model is not None
+        
+        stats = {
+            "status": "healthy",
+            "backend": "sqlite-vec",
+            "total_memories": memory_count,
+            "has_embedding_tables": has_embeddings,
+            "has_embedding_model": has_model,
+            "embedding_model": storage.embedding_model_name if hasattr(storage, 'embedding_model_name') else "none"
+        }
+        
+        # Get database file size
+        db_path = storage.db_path if hasattr(storage, 'db_path') else None
+        if db_path and os.path.exists(db_path):
+            file_size = os.path.getsize(db_path)
+            stats["database_size_bytes"] = file_size
+            stats["database_size_mb"] = round(file_size / (1024 * 1024), 2)
+        
+        return True, "SQLite-vec database validation successful", stats
+    except Exception as e:
+        return False, f"SQLite database validation error: {str(e)}", {
+            "status": "error",
+            "error": str(e),
+            "backend": "sqlite-vec"
+        }
+
+async def get_database_stats(storage) -> Dict[str, Any]:
     """Get detailed database statistics with proper error handling."""
     try:
         # Check if storage is properly initialized
@@ -158,7 +201,7 @@ def get_database_stats(storage) -> Dict[str, Any]:
             # Use the storage's own stats method if available
             if hasattr(storage, 'get_stats') and callable(storage.get_stats):
                 try:
-                    stats = storage.get_stats()
+                    stats = await storage.get_stats()
                     stats["status"] = "healthy"
                     return stats
                 except Exception as stats_error:
@@ -174,20 +217,19 @@ def get_database_stats(storage) -> Dict[str, Any]:
             
             try:
                 # Check if tables exist
-                cursor = storage.conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
-                tables = [row[0] for row in cursor.fetchall()]
+                tables = [row[0] for row in await storage._fetchall("SELECT name FROM sqlite_master WHERE type='table'")]
                 
                 # Count memories if the table exists
                 memory_count = 0
                 if 'memories' in tables:
-                    cursor = storage.conn.execute('SELECT COUNT(*) FROM memories')
-                    memory_count = cursor.fetchone()[0]
+                    memory_count = (await storage._fetchone('SELECT COUNT(*) FROM memories'))[0]
                 
                 # Get unique tags if the table exists
                 unique_tags = 0
-                if 'memories' in tables:
-                    cursor = storage.conn.execute('SELECT COUNT(DISTINCT tags) FROM memories WHERE tags != ""')
-                    unique_tags = cursor.fetchone()[0]
+                if 'memory_tags' in tables:
+                    unique_tags = (await storage._fetchone('SELECT COUNT(DISTINCT tag) FROM memory_tags'))[0]
+                elif 'memories' in tables:
+                    unique_tags = (await storage._fetchone("SELECT COUNT(DISTINCT tags) FROM memories WHERE tags != ''"))[0]
                 
                 # Get database file size
                 db_path = storage.db_path if hasattr(storage, 'db_path') else "unknown"
@@ -207,8 +249,7 @@ def get_database_stats(storage) -> Dict[str, Any]:
                 tables_info = {}
                 for table in tables:
                     try:
-                        cursor = storage.conn.execute(f"SELECT COUNT(*) FROM {table}")
-                        count = cursor.fetchone()[0]
+                        count = (await storage._fetchone(f"SELECT COUNT(*) FROM {table}"))[0]
                         tables_info[table] = {"count": count}
                     except Exception:
                         tables_info[table] = {"count": "unknown"}
@@ -304,53 +345,20 @@ async def repair_database(storage) -> Tuple[bool, str]:
         
         # SQLite-vec backend repair
         if storage_type == "SqliteVecMemoryStorage":
-            # For SQLite, we'll try to check and recreate the tables if needed
-            if not hasattr(storage, 'conn') or storage.conn is None:
-                # Try to reconnect
-                try:
-                    storage.conn = storage.conn or __import__('sqlite3').connect(storage.db_path)
-                    
-                    # Try to reload the extension
-                    if importlib.util.find_spec('sqlite_vec'):
-                        import sqlite_vec
-                        storage.conn.enable_load_extension(True)
-                        sqlite_vec.load(storage.conn)
-                        storage.conn.enable_load_extension(False)
-                    
-                    # Recreate tables if needed
-                    storage.conn.execute('''
-                        CREATE TABLE IF NOT EXISTS memories (
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            content_hash TEXT UNIQUE NOT NULL,
-                            content TEXT NOT NULL,
-                            tags TEXT,
-                            memory_type TEXT,
-                            metadata TEXT,
-                            created_at REAL,
-                            updated_at REAL,
-                            created_at_iso TEXT,
-                            updated_at_iso TEXT
-                        )
-                    ''')
-                    
-                    # Create virtual table for vector embeddings
-                    embedding_dimension = getattr(storage, 'embedding_dimension', 384)
-                    storage.conn.execute(f'''
-                        CREATE VIRTUAL TABLE IF NOT EXISTS memory_embeddings USING vec0(
-                            content_embedding FLOAT[{embedding_dimension}]
-                        )
-                    ''')
-                    
-                    # Create indexes for better performance
-                    storage.conn.execute('CREATE INDEX IF NOT EXISTS idx_content_hash ON memories(content_hash)')
-                    storage.conn.execute('CREATE INDEX IF NOT EXISTS idx_created_at ON memories(created_at)')
-                    storage.conn.execute('CREATE INDEX IF NOT EXISTS idx_memory_type ON memories(memory_type)')
-                    
-                    storage.conn.commit()
-                    return True, "SQLite-vec database repaired"
-                    
-                except Exception as e:
-                    return False, f"SQLite-vec repair failed: {str(e)}"
+            # Recreate missing tables and indexes; the DDL runs on the storage's
+            # writer thread like every other write
+            try:
+                if not hasattr(storage, 'conn') or storage.conn is None:
+                    # Not connected: a fresh initialize() opens the executor and creates the schema
+                    storage._initialized = False
+                    await storage.initialize()
+                else:
+                    await storage._execute_with_retry(storage._create_memories_table)
+                    await storage._execute_with_retry(storage._create_tags_table)
+                    await storage._execute_with_retry(storage._create_vector_table)
+                return True, "SQLite-vec database repaired"
+            except Exception as e:
+                return False, f"SQLite-vec repair failed: {str(e)}"
         
         # ChromaDB backend repair
         elif hasattr(storage, 'collection'):
@@ -100,7 +100,7 @@ async def detailed_health_check(storage: SqliteVecMemoryStorage = Depends(get_st
         
         # Try to get detailed statistics from storage
         try:
-            stats = storage.get_stats()
+            stats = await storage.get_stats()
             if "error" not in stats:
                 storage_info.update(stats)
                 storage_info["accessible"] = True
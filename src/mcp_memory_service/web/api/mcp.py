@@ -65,7 +65,9 @@ MCP_TOOLS = [
             "type": "object",
             "properties": {
                 "query": {"type": "string", "description": "Search query for finding relevant memories"},
-                "limit": {"type": "integer", "description": "Maximum number of memories to return", "default": 10}
+                "limit": {"type": "integer", "description": "Maximum number of memories to return", "default": 10},
+                "tags": {"type": "array", "items": {"type": "string"}, "description": "Only search memories having any of these tags"},
+                "memory_type": {"type": "string", "description": "Only search memories of this type"}
             },
             "required": ["query"]
         }
@@ -201,8 +203,13 @@ async def handle_tool_call(storage, tool_name: str, arguments: Dict[str, Any]) -
     elif tool_name == "retrieve_memory":
         query = arguments.get("query")
         limit = arguments.get("limit", 10)
+        tags = arguments.get("tags")
+        memory_type = arguments.get("memory_type")
         
-        results = await storage.retrieve(query=query, n_results=limit)
+        if tags or memory_type:
+            results = await storage.search_filtered(query, n_results=limit, memory_type=memory_type, tags=tags)
+        else:
+            results = await storage.retrieve(query=query, n_results=limit)
         
         return {
             "results": [
@@ -248,7 +255,7 @@ async def handle_tool_call(storage, tool_name: str, arguments: Dict[str, Any]) -
         }
     
     elif tool_name == "check_database_health":
-        stats = storage.get_stats()
+        stats = await storage.get_stats()
         
         return {
             "status": "healthy",
@@ -273,7 +280,7 @@ async def list_mcp_tools():
 async def mcp_health():
     """MCP-specific health check."""
     storage = get_storage()
-    stats = storage.get_stats()
+    stats = await storage.get_stats()
     
     return {
         "status": "healthy",
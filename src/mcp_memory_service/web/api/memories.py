@@ -75,6 +75,18 @@ class MemoryCreateResponse(BaseModel):
     memory: Optional[MemoryResponse] = None
 
 
+class MemoryBatchCreateRequest(BaseModel):
+    """Request model for creating several memories at once."""
+    memories: List[MemoryCreateRequest] = Field(..., min_length=1, max_length=1000, description="Memories to store")
+
+
+class MemoryBatchCreateResponse(BaseModel):
+    """Response model for batch memory creation."""
+    results: List[MemoryCreateResponse]
+    stored: int
+    failed: int
+
+
 class MemoryDeleteResponse(BaseModel):
     """Response model for memory deletion."""
     success: bool
@@ -97,6 +109,62 @@ def memory_to_response(memory: Memory) -> MemoryResponse:
     )
 
 
+def build_memory(request: MemoryCreateRequest, http_request: Request) -> Memory:
+    """Create a Memory from a create request, adding hostname tagging when enabled."""
+    # Generate content hash
+    content_hash = generate_content_hash(request.content)
+    
+    # Prepare tags and metadata with optional hostname
+    final_tags = request.tags or []
+    final_metadata = request.metadata or {}
+    
+    if INCLUDE_HOSTNAME:
+        # Prioritize client-provided hostname, then header, then fallback to server
+        hostname = None
+        
+        # 1. Check if client provided hostname in request body
+        if request.client_hostname:
+            hostname = request.client_hostname
+            
+        # 2. Check for X-Client-Hostname header
+        elif http_request.headers.get('X-Client-Hostname'):
+            hostname = http_request.headers.get('X-Client-Hostname')
+            
+        # 3. Fallback to server hostname (original behavior)
+        else:
+            hostname = socket.gethostname()
+        
+        source_tag = f"source:{hostname}"
+        if source_tag not in final_tags:
+            final_tags.append(source_tag)
+        final_metadata["hostname"] = hostname
+    
+    # Create memory object
+    return Memory(
+        content=request.content,
+        content_hash=content_hash,
+        tags=final_tags,
+        memory_type=request.memory_type,
+        metadata=final_metadata
+    )
+
+
+async def broadcast_memory_stored(memory: Memory) -> None:
+    """Broadcast an SSE event for a successfully stored memory."""
+    try:
+        memory_data = {
+            "content_hash": memory.content_hash,
+            "content": memory.content,
+            "tags": memory.tags,
+            "memory_type": memory.memory_type
+        }
+        event = create_memory_stored_event(memory_data)
+        await sse_manager.broadcast_event(event)
+    except Exception as e:
+        # Don't fail the request if SSE broadcasting fails
+        logger.warning(f"Failed to broadcast memory_stored event: {e}")
+
+
 @router.post("/memories", response_model=MemoryCreateResponse, tags=["memories"])
 async def store_memory(
     request: MemoryCreateRequest,
@@ -110,60 +178,15 @@ async def store_memory(
     The system automatically generates a unique hash for the content.
     """
     try:
-        # Generate content hash
-        content_hash = generate_content_hash(request.content)
-        
-        # Prepare tags and metadata with optional hostname
-        final_tags = request.tags or []
-        final_metadata = request.metadata or {}
-        
-        if INCLUDE_HOSTNAME:
-            # Prioritize client-provided hostname, then header, then fallback to server
-            hostname = None
-            
-            # 1. Check if client provided hostname in request body
-            if request.client_hostname:
-                hostname = request.client_hostname
-                
-            # 2. Check for X-Client-Hostname header
-            elif http_request.headers.get('X-Client-Hostname'):
-                hostname = http_request.headers.get('X-Client-Hostname')
-                
-            # 3. Fallback to server hostname (original behavior)
-            else:
-                hostname = socket.gethostname()
-            
-            source_tag = f"source:{hostname}"
-            if source_tag not in final_tags:
-                final_tags.append(source_tag)
-            final_metadata["hostname"] = hostname
-        
-        # Create memory object
-        memory = Memory(
-            content=request.content,
-            content_hash=content_hash,
-            tags=final_tags,
-            memory_type=request.memory_type,
-            metadata=final_metadata
-        )
+        memory = build_memory(request, http_request)
+        content_hash = memory.content_hash
         
         # Store the memory
         success, message = await storage.store(memory)
         
         if success:
             # Broadcast SSE event for successful memory storage
-            try:
-                memory_data = {
-                    "content_hash": content_hash,
-                    "content": memory.content,
-                    "tags": memory.tags,
-                    "memory_type": memory.memory_type
-                }
-                event = create_memory_stored_event(memory_data)
-                await sse_manager.broadcast_event(event)
-            except Exception as e:
-                # Don't fail the request if SSE broadcasting fails
-                logger.warning(f"Failed to broadcast memory_stored event: {e}")
+            await broadcast_memory_stored(memory)
             
             return MemoryCreateResponse(
                 success=True,
@@ -182,6 +205,45 @@ async def store_memory(
         raise HTTPException(status_code=500, detail=f"Failed to store memory: {str(e)}")
 
 
+@router.post("/memories/batch", response_model=MemoryBatchCreateResponse, tags=["memories"])
+async def store_memories_batch(
+    request: MemoryBatchCreateRequest,
+    http_request: Request,
+    storage: SqliteVecMemoryStorage = Depends(get_storage)
+):
+    """
+    Store several memories in one request.
+    
+    Memories are embedded in batches and written in a single transaction.
+    Each memory gets its own result, in request order; a duplicate or invalid
+    entry does not fail the rest of the batch.
+    """
+    try:
+        memories = [build_memory(item, http_request) for item in request.memories]
+        results = await storage.store_batch(memories)
+        
+        responses = []
+        for memory, (success, message) in zip(memories, results):
+            if success:
+                await broadcast_memory_stored(memory)
+            responses.append(MemoryCreateResponse(
+                success=success,
+                message=message,
+                content_hash=memory.content_hash,
+                memory=memory_to_response(memory) if success else None
+            ))
+        
+        stored = sum(1 for response in responses if response.success)
+        return MemoryBatchCreateResponse(
+            results=responses,
+            stored=stored,
+            failed=len(responses) - stored
+        )
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to store memories: {str(e)}")
+
+
 @router.get("/memories", response_model=MemoryListResponse, tags=["memories"])
 async def list_memories(
     page: int = Query(1, ge=1, description="Page number (1-based)"),
@@ -41,6 +41,8 @@ class SemanticSearchRequest(BaseModel):
     query: str = Field(..., description="The search query for semantic similarity")
     n_results: int = Field(default=10, ge=1, le=100, description="Maximum number of results to return")
     similarity_threshold: Optional[float] = Field(None, ge=0.0, le=1.0, description="Minimum similarity score")
+    tags: Optional[List[str]] = Field(None, description="Only search memories having any of these tags")
+    memory_type: Optional[str] = Field(None, description="Only search memories of this type")
 
 
 class TagSearchRequest(BaseModel):
@@ -105,11 +107,19 @@ async def semantic_search(
     start_time = time.time()
     
     try:
-        # Perform semantic search using the storage layer
-        query_results = await storage.retrieve(
-            query=request.query,
-            n_results=request.n_results
-        )
+        # Perform semantic search using the storage layer; filters apply before ranking
+        if request.tags or request.memory_type:
+            query_results = await storage.search_filtered(
+                request.query,
+                n_results=request.n_results,
+                memory_type=request.memory_type,
+                tags=request.tags
+            )
+        else:
+            query_results = await storage.retrieve(
+                query=request.query,
+                n_results=request.n_results
+            )
         
         # Filter by similarity threshold if specified
         if request.similarity_threshold is not None:
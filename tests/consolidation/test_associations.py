@@ -1,6 +1,7 @@
 """Unit tests for the creative association engine."""
 
 import pytest
+import numpy as np
 from datetime import datetime, timedelta
 
 from mcp_memory_service.consolidation.associations import (
@@ -8,7 +9,7 @@ from mcp_memory_service.consolidation.associations import (
     AssociationAnalysis
 )
 from mcp_memory_service.consolidation.base import MemoryAssociation
-from mcp_memory_service.models.memory import Memory
+from mcp_memory_service.models.memory import Memory, MemoryEmbeddings
 
 
 @pytest.mark.unit
@@ -331,6 +332,138 @@ class TestCreativeAssociationEngine:
             # Restore original value
             association_engine.max_pairs_per_run = original_max
     
+    def test_blocked_scoring_matches_pairwise(self, association_engine, large_memory_set):
+        """Test that tiled scoring finds exactly the sweet-spot pairs a pairwise scan would."""
+        memories = large_memory_set[:40]
+        association_engine.block_size = 7  # Uneven tiles, including a partial one
+        association_engine.max_pairs_per_run = 10_000
+        association_engine.min_similarity = 0.955
+        association_engine.max_similarity = 0.97
+        
+        vectors, with_vectors, without_vectors = association_engine._normalized_embeddings(memories)
+        assert without_vectors == []
+        candidates = association_engine._find_candidate_pairs(vectors, with_vectors, set())
+        found = {tuple(sorted((m1.content_hash, m2.content_hash))): sim for m1, m2, sim in candidates}
+        
+        expected = set()
+        for i in range(len(memories)):
+            for j in range(i + 1, len(memories)):
+                a = np.array(memories[i].embedding)
+                b = np.array(memories[j].embedding)
+                similarity = (np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)) + 1) / 2
+                if 0.955 <= similarity <= 0.97:
+                    expected.add(tuple(sorted((memories[i].content_hash, memories[j].content_hash))))
+        
+        assert expected
+        # Allow pairs sitting on a boundary to differ by float32 rounding
+        assert len(set(found) ^ expected) <= 2
+        assert all(0.955 <= sim <= 0.97 for sim in found.values())
+    
+    def test_candidate_sampling_respects_pair_cap(self, association_engine, large_memory_set):
+        """Test that the sweet-spot sample is capped at max_pairs_per_run without duplicates."""
+        association_engine.block_size = 16
+        association_engine.max_pairs_per_run = 25
+        association_engine.min_similarity = 0.0
+        association_engine.max_similarity = 1.0
+        
+        vectors, with_vectors, _ = association_engine._normalized_embeddings(large_memory_set)
+        candidates = association_engine._find_candidate_pairs(vectors, with_vectors, set())
+        
+        keys = {tuple(sorted((m1.content_hash, m2.content_hash))) for m1, m2, _ in candidates}
+        assert len(candidates) == 25
+        assert len(keys) == 25
+        assert all(m1.content_hash != m2.content_hash for m1, m2, _ in candidates)
+    
+    def test_block_budget_limits_tiles(self, association_engine):
+        """Test that max_blocks_per_run bounds the number of tiles scored."""
+        association_engine.block_size = 10
+        association_engine.max_blocks_per_run = 3
+        assert len(association_engine._block_pairs(100)) == 3
+        
+        association_engine.max_blocks_per_run = 0  # Unlimited
+        assert len(association_engine._block_pairs(100)) == 55  # 10 blocks, upper triangle
+    
+    def test_existing_associations_masked_in_tiles(self, association_engine, large_memory_set):
+        """Test that existing associations are excluded before sampling."""
+        memories = large_memory_set[:30]
+        association_engine.block_size = 8
+        association_engine.max_pairs_per_run = 10_000
+        association_engine.min_similarity = 0.0
+        association_engine.max_similarity = 1.0
+        
+        existing = {
+            (memories[0].content_hash, memories[1].content_hash),
+            (memories[25].content_hash, memories[3].content_hash),  # Unsorted, spans tiles
+        }
+        vectors, with_vectors, _ = association_engine._normalized_embeddings(memories)
+        candidates = association_engine._find_candidate_pairs(vectors, with_vectors, existing)
+        
+        keys = {tuple(sorted((m1.content_hash, m2.content_hash))) for m1, m2, _ in candidates}
+        assert len(keys) == 30 * 29 // 2 - 2
+        assert not keys & {tuple(sorted(pair)) for pair in existing}
+
+    @pytest.mark.asyncio
+    async def test_changed_memories_pair_with_the_whole_set(self, association_engine, large_memory_set):
+        """Test that with changed= every pair involves a changed memory, including unchanged partners."""
+        memories = large_memory_set[:30]
+        changed = [memories[20], memories[5], memories[13]]
+        changed_hashes = {m.content_hash for m in changed}
+        association_engine.block_size = 4  # The changed rows end inside a tile
+        association_engine.max_pairs_per_run = 10_000
+        association_engine.max_blocks_per_run = 0
+        association_engine.min_similarity = 0.0
+        association_engine.max_similarity = 1.0
+
+        candidates = []
+
+        async def record(mem1, mem2, similarity):
+            candidates.append((mem1.content_hash, mem2.content_hash))
+            return AssociationAnalysis(mem1.content_hash, mem2.content_hash, similarity, [], [], None, [], 0.0)
+
+        association_engine._analyze_association = record
+        await association_engine.process(memories, changed=changed)
+
+        keys = {tuple(sorted(pair)) for pair in candidates}
+        assert all(a in changed_hashes or b in changed_hashes for a, b in keys)
+        # 3 changed x 27 unchanged, plus the 3 pairs among the changed ones
+        assert len(keys) == 3 * 27 + 3
+
+    @pytest.mark.asyncio
+    async def test_preloaded_embedding_matrix_is_used(self, association_engine, sample_memories):
+        """Test that vectors come from the preloaded matrix when memories carry none."""
+        memories = sample_memories[:5]
+        embedding_set = MemoryEmbeddings.from_memories(memories)
+        stripped = [
+            Memory(content=m.content, content_hash=m.content_hash, tags=m.tags,
+                   created_at=m.created_at, embedding=None)
+            for m in memories
+        ]
+        
+        vectors, with_vectors, without_vectors = association_engine._normalized_embeddings(
+            stripped, embedding_set
+        )
+        assert len(with_vectors) == 5
+        assert without_vectors == []
+        assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0, atol=1e-5)
+    
+    @pytest.mark.asyncio
+    async def test_memories_without_vectors_use_text_fallback(self, association_engine):
+        """Test that memories without vectors are still paired via text similarity."""
+        now = datetime.now().timestamp()
+        memories = [
+            Memory(content=f"python database indexing notes part {i}", content_hash=f"text{i}",
+                   tags=["python"], embedding=None, created_at=now)
+            for i in range(4)
+        ]
+        
+        pairs = association_engine._sample_memory_pairs(memories, 100)
+        assert len(pairs) == 6  # All pairs, no repeats
+        
+        associations = await association_engine.process(memories)
+        assert isinstance(associations, list)
+        for assoc in associations:
+            assert 0.3 <= assoc.similarity_score <= 0.7
+    
     @pytest.mark.asyncio
     async def test_empty_memories_list(self, association_engine):
         """Test handling of empty or insufficient memories list."""
@@ -6,7 +6,7 @@ from datetime import datetime, timedelta
 
 from mcp_memory_service.consolidation.clustering import SemanticClusteringEngine
 from mcp_memory_service.consolidation.base import MemoryCluster
-from mcp_memory_service.models.memory import Memory
+from mcp_memory_service.models.memory import Memory, MemoryEmbeddings
 
 
 @pytest.mark.unit
@@ -128,6 +128,32 @@ class TestSemanticClusteringEngine:
         clusters = await clustering_engine.process(memories_no_embeddings)
         assert clusters == []
     
+    @pytest.mark.asyncio
+    async def test_clustering_with_embedding_matrix(self, clustering_engine):
+        """Test clustering reads vectors from a preloaded embedding matrix."""
+        rng = np.random.default_rng(0)
+        base = rng.random(320, dtype=np.float32)
+        memories = []
+        for i in range(6):
+            memories.append(Memory(
+                content=f"Matrix backed memory about deployments {i}",
+                content_hash=f"matrix_{i}",
+                tags=["deploy"],
+                embedding=None,  # Vectors only live in the matrix
+                created_at=datetime.now().timestamp()
+            ))
+        embeddings = (base + rng.normal(0, 0.01, (6, 320))).astype(np.float32)
+        embedding_set = MemoryEmbeddings(
+            memories=memories,
+            embeddings=embeddings,
+            index={m.content_hash: row for row, m in enumerate(memories)}
+        )
+        
+        assert await clustering_engine.process(memories) == []
+        clusters = await clustering_engine.process(memories, embeddings=embedding_set)
+        assert len(clusters) == 1
+        assert set(clusters[0].memory_hashes) == {m.content_hash for m in memories}
+    
     @pytest.mark.asyncio
     async def test_theme_keyword_extraction(self, clustering_engine):
         """Test extraction of theme keywords from clusters."""
@@ -416,4 +442,144 @@ class TestSemanticClusteringEngine:
             # Should count tag frequencies correctly  
             assert isinstance(tag_dist, dict)
             assert tag_dist.get("python", 0) >= 2  # Appears multiple times
-            assert tag_dist.get("programming", 0) >= 2  # Appears multiple times
\ No newline at end of file
+            assert tag_dist.get("programming", 0) >= 2  # Appears multiple times    
+    @staticmethod
+    def _planted_memories(n_topics, per_topic, dim=64, noise=0.05, seed=7):
+        """Memories drawn around well-separated random topic directions."""
+        rng = np.random.default_rng(seed)
+        topics = rng.normal(size=(n_topics, dim))
+        memories = []
+        for t in range(n_topics):
+            for i in range(per_topic):
+                memories.append(Memory(
+                    content=f"Topic {t} note {i}",
+                    content_hash=f"topic{t}_{i}",
+                    tags=[f"topic{t}"],
+                    embedding=(topics[t] + rng.normal(0, noise, dim)).tolist(),
+                    created_at=datetime.now().timestamp()
+                ))
+        return memories
+    
+    @pytest.mark.asyncio
+    async def test_minibatch_kmeans_recovers_topics(self, clustering_engine):
+        """Test that mini-batch k-means keeps each planted topic within one cluster."""
+        memories = self._planted_memories(n_topics=4, per_topic=40)
+        clustering_engine.algorithm = 'minibatch_kmeans'
+        
+        clusters = await clustering_engine.process(memories)
+        
+        assert clusters
+        for cluster in clusters:
+            assert cluster.metadata['algorithm'] == 'minibatch_kmeans'
+            topics = {h.split('_')[0] for h in cluster.memory_hashes}
+            assert len(topics) == 1
+            assert 0.9 <= cluster.coherence_score <= 1.0
+        clustered = sum(len(c.memory_hashes) for c in clusters)
+        assert clustered == len(memories)
+    
+    @pytest.mark.asyncio
+    async def test_minibatch_kmeans_leaves_outliers_unclustered(self, clustering_engine):
+        """Test that embeddings far from every centroid are labelled noise, not forced into a cluster."""
+        memories = self._planted_memories(n_topics=4, per_topic=40)
+        rng = np.random.default_rng(11)
+        outliers = [
+            Memory(
+                content=f"Outlier {i}",
+                content_hash=f"outlier_{i}",
+                tags=["outlier"],
+                embedding=rng.normal(size=64).tolist(),
+                created_at=datetime.now().timestamp()
+            )
+            for i in range(5)
+        ]
+        embeddings = np.array([m.embedding for m in memories + outliers])
+        
+        labels = await clustering_engine._minibatch_kmeans_clustering(embeddings)
+        
+        topic_labels = set(labels[:len(memories)].tolist())
+        assert -1 not in topic_labels
+        for label in labels[len(memories):]:
+            # Noise, or a seed centroid of its own; never part of a topic
+            assert label == -1 or (label not in topic_labels and np.sum(labels == label) == 1)
+        
+        clustering_engine.algorithm = 'minibatch_kmeans'
+        clusters = await clustering_engine.process(memories + outliers)
+        clustered = {h for c in clusters for h in c.memory_hashes}
+        assert clustered == {m.content_hash for m in memories}
+    
+    @pytest.mark.asyncio
+    async def test_memory_budget_switches_pairwise_algorithm(self, clustering_engine):
+        """Test that pairwise algorithms fall back to mini-batch k-means over the memory budget."""
+        clustering_engine.algorithm = 'dbscan'
+        clustering_engine.memory_budget_bytes = 1024 * 1024
+        
+        assert clustering_engine._select_algorithm(100) == 'dbscan'
+        assert clustering_engine._select_algorithm(1000) == 'minibatch_kmeans'  # 8MB of distances
+        
+        clustering_engine.algorithm = 'simple'
+        assert clustering_engine._select_algorithm(100) == 'simple'
+        assert clustering_engine._select_algorithm(100_000) == 'minibatch_kmeans'
+        
+        clustering_engine.algorithm = 'minibatch_kmeans'
+        assert clustering_engine._select_algorithm(100) == 'minibatch_kmeans'
+    
+    @pytest.mark.asyncio
+    async def test_simple_clustering_matches_pairwise_reference(self, clustering_engine, large_memory_set):
+        """Test that the vectorised simple clustering keeps the original greedy semantics."""
+        embeddings = np.array([m.embedding for m in large_memory_set])
+        
+        # Original double-loop implementation
+        expected = np.full(len(embeddings), -1)
+        current = 0
+        for i in range(len(embeddings)):
+            if expected[i] != -1:
+                continue
+            members = [i]
+            expected[i] = current
+            for j in range(i + 1, len(embeddings)):
+                if expected[j] != -1:
+                    continue
+                similarity = np.dot(embeddings[i], embeddings[j]) / (
+                    np.linalg.norm(embeddings[i]) * np.linalg.norm(embeddings[j])
+                )
+                if similarity >= 0.7:
+                    expected[j] = current
+                    members.append(j)
+            if len(members) >= clustering_engine.min_cluster_size:
+                current += 1
+            else:
+                for member in members:
+                    expected[member] = -1
+        
+        labels = await clustering_engine._simple_clustering(embeddings)
+        assert np.array_equal(labels, expected)
+    
+    @pytest.mark.asyncio
+    async def test_merge_follows_greedy_order(self, clustering_engine):
+        """Test that vectorised merging groups each cluster with later similar, unmerged clusters."""
+        def make(cluster_id, centroid):
+            return MemoryCluster(
+                cluster_id=cluster_id,
+                memory_hashes=[f"{cluster_id}_a", f"{cluster_id}_b"],
+                centroid_embedding=centroid,
+                coherence_score=0.8,
+                created_at=datetime.now(),
+                theme_keywords=[cluster_id]
+            )
+        
+        clusters = [
+            make("a", [1.0, 0.0, 0.0]),
+            make("b", [0.0, 1.0, 0.0]),
+            make("c", [0.99, 0.1, 0.0]),   # Merges into a
+            make("d", [0.1, 0.99, 0.0]),   # Merges into b
+            make("e", [0.0, 0.0, 1.0]),    # Stays alone
+        ]
+        
+        merged = await clustering_engine.merge_similar_clusters(clusters, similarity_threshold=0.95)
+        
+        groups = sorted(sorted(c.memory_hashes) for c in merged)
+        assert groups == [
+            ["a_a", "a_b", "c_a", "c_b"],
+            ["b_a", "b_b", "d_a", "d_b"],
+            ["e_a", "e_b"],
+        ]
@@ -1,12 +1,14 @@
 """Integration tests for the main dream-inspired consolidator."""
 
+import os
 import pytest
+import numpy as np
 from datetime import datetime, timedelta
-from unittest.mock import AsyncMock, MagicMock
+from unittest.mock import AsyncMock, MagicMock, patch
 
 from mcp_memory_service.consolidation.consolidator import DreamInspiredConsolidator
 from mcp_memory_service.consolidation.base import ConsolidationReport
-from mcp_memory_service.models.memory import Memory
+from mcp_memory_service.models.memory import Memory, MemoryEmbeddings
 
 
 @pytest.mark.integration
@@ -136,6 +138,41 @@ class TestDreamInspiredConsolidator:
         assert isinstance(report, ConsolidationReport)
         assert current_memory_count >= original_memory_count
     
+    @pytest.mark.asyncio
+    async def test_forgetting_finds_embedding_duplicates_in_loaded_matrix(self, consolidation_config, mock_storage):
+        """Test that embedding-neighbour dedup reads the loaded matrix, not memory.embedding."""
+        consolidation_config.duplicate_embedding_threshold = 0.95
+        now = datetime.now().timestamp()
+        vector = [0.3, 0.2, 0.1, 0.4, 0.5] * 64
+        mock_storage.memories.clear()
+        for content_hash, content, embedding in [
+            ("dup_a", "Alpha release notes describe the new sync engine in great detail", vector),
+            ("dup_b", "Sync engine rewrite shipped with the alpha build, see changelog entry", [v * 1.01 for v in vector]),
+            ("other", "Recipe for sourdough bread with a long cold fermentation overnight", [0.5, -0.4, 0.3, -0.2, 0.1] * 64),
+        ]:
+            mock_storage.memories[content_hash] = Memory(
+                content=content, content_hash=content_hash, embedding=embedding, created_at=now
+            )
+        
+        async def get_memories_with_embeddings(start_time=None, end_time=None):
+            # Like the sqlite-vec loader: vectors only in the matrix
+            loaded = MemoryEmbeddings.from_memories(list(mock_storage.memories.values()))
+            for memory in loaded.memories:
+                memory.embedding = None
+            return loaded
+        
+        mock_storage.get_memories_with_embeddings = get_memories_with_embeddings
+        consolidator = DreamInspiredConsolidator(mock_storage, consolidation_config)
+        detect = consolidator.forgetting_engine.duplicate_detector.detect
+        
+        with patch.object(consolidator.forgetting_engine.duplicate_detector, "detect", wraps=detect) as spy:
+            await consolidator.consolidate("monthly")
+        
+        memories, embeddings = spy.call_args.args
+        assert isinstance(embeddings, MemoryEmbeddings)
+        report = detect(memories, embeddings)
+        assert report.groups and set(report.groups[0]) == {"dup_a", "dup_b"}
+    
     @pytest.mark.asyncio
     async def test_health_check(self, consolidator):
         """Test consolidation system health check."""
@@ -299,6 +336,242 @@ class TestDreamInspiredConsolidator:
         current_memories = list(mock_storage.memories.values())
         assert len(current_memories) >= len(original_memories)
     
+    @pytest.mark.asyncio
+    async def test_relevance_scores_written_in_one_batch(self, consolidator, mock_storage):
+        """Test that relevance scores go through one bulk metadata call when the storage has it."""
+        mock_storage.update_memories_metadata = AsyncMock(return_value=(0, ""))
+        mock_storage.update_memory = AsyncMock(return_value=True)
+        memories = list(mock_storage.memories.values())
+        
+        scores = await consolidator._update_relevance_scores(memories, "daily")
+        
+        mock_storage.update_memories_metadata.assert_awaited_once()
+        mock_storage.update_memory.assert_not_awaited()
+        patches = mock_storage.update_memories_metadata.await_args.args[0]
+        assert set(patches) == {m.content_hash for m in memories}
+        by_hash = {s.memory_hash: s for s in scores}
+        for content_hash, patch in patches.items():
+            assert patch['relevance_score'] == by_hash[content_hash].total_score
+            assert set(patch) == {
+                'relevance_score', 'relevance_calculated_at', 'decay_factor',
+                'connection_boost', 'access_boost'
+            }
+    
+    @pytest.mark.asyncio
+    async def test_relevance_scores_table_option(self, consolidation_config, mock_storage):
+        """Test that relevance_storage='table' routes scores to the storage's score table."""
+        consolidation_config.relevance_storage = 'table'
+        consolidator = DreamInspiredConsolidator(mock_storage, consolidation_config)
+        mock_storage.update_relevance_scores = AsyncMock(return_value=(0, ""))
+        mock_storage.update_memories_metadata = AsyncMock(return_value=(0, ""))
+        
+        await consolidator._update_relevance_scores(list(mock_storage.memories.values()), "daily")
+        
+        mock_storage.update_relevance_scores.assert_awaited_once()
+        mock_storage.update_memories_metadata.assert_not_awaited()
+    
+    @pytest.mark.asyncio
+    async def test_relevance_scores_fallback_to_update_memory(self, consolidator, mock_storage):
+        """Test that storages without bulk APIs still get one update_memory call per memory."""
+        mock_storage.update_memory = AsyncMock(return_value=True)
+        memories = list(mock_storage.memories.values())
+        
+        await consolidator._update_relevance_scores(memories, "daily")
+        
+        assert mock_storage.update_memory.await_count == len(memories)
+        assert all('relevance_score' in m.metadata for m in memories)
+    
+    @pytest.mark.asyncio
+    async def test_report_includes_stage_profile(self, consolidator, consolidation_config, temp_archive_path):
+        """Test that each run attaches per-stage timings and can export a trace."""
+        consolidation_config.profile_trace_dir = os.path.join(temp_archive_path, "traces")
+        
+        report = await consolidator.consolidate("weekly")
+        
+        assert report.profile is not None
+        stages = {stage["stage"]: stage for stage in report.profile.summary()}
+        assert {"load", "decay", "writeback", "clustering", "associations"} <= set(stages)
+        assert stages["load"]["items"] == report.memories_processed
+        assert stages["load"]["storage_calls"] >= 1
+        assert stages["writeback"]["storage_calls"] >= 1
+        
+        assert consolidator.get_last_profiles()["weekly"] is report.profile
+        assert consolidator.get_performance_history()[-1]["stages"] == report.profile.summary()
+        traces = os.listdir(consolidation_config.profile_trace_dir)
+        assert len(traces) == 1 and traces[0].startswith("consolidation_weekly_")
+    
+    @pytest.fixture
+    def incremental_consolidator(self, mock_storage, consolidation_config, temp_archive_path):
+        consolidation_config.incremental_enabled = True
+        consolidation_config.state_path = os.path.join(temp_archive_path, "consolidation_state.db")
+        consolidator = DreamInspiredConsolidator(mock_storage, consolidation_config)
+        yield consolidator
+        consolidator.state.close()
+    
+    @pytest.mark.asyncio
+    async def test_incremental_runs_only_process_changes(self, incremental_consolidator, mock_storage):
+        """Test that runs after the first only cluster memories changed since the watermark."""
+        def clustered(report):
+            return {stage["stage"]: stage for stage in report.profile.summary()}["clustering"]["items"]
+        
+        def scored(report):
+            return {stage["stage"]: stage for stage in report.profile.summary()}["decay"]["items"]
+        
+        first = await incremental_consolidator.consolidate("weekly")
+        assert first.memories_processed > 0
+        assert clustered(first) == first.memories_processed
+        assert incremental_consolidator.state.get_watermark("weekly") is not None
+        
+        # Score writes are not changes; only the memories the first run stored
+        # (associations, summaries) are new, and only they are re-scored
+        second = await incremental_consolidator.consolidate("weekly")
+        assert second.memories_processed >= first.memories_processed
+        assert clustered(second) == second.memories_processed - first.memories_processed
+        assert scored(second) == clustered(second)
+        
+        new_memory = Memory(
+            content="A freshly stored note about incremental consolidation",
+            content_hash="fresh001",
+            tags=["fresh"],
+            embedding=[0.3, 0.2, 0.1, 0.4, 0.5] * 64,
+            created_at=datetime.now().timestamp()
+        )
+        mock_storage.memories[new_memory.content_hash] = new_memory
+        
+        third = await incremental_consolidator.consolidate("weekly")
+        assert clustered(third) == third.memories_processed - second.memories_processed >= 1
+        
+        # Watermarks are per horizon, and full=True ignores them
+        monthly = await incremental_consolidator.consolidate("monthly")
+        assert monthly.memories_processed > 1
+        full = await incremental_consolidator.consolidate("weekly", full=True)
+        assert clustered(full) == full.memories_processed
+    
+    @pytest.mark.asyncio
+    async def test_incremental_rescores_changed_and_due_memories(self, incremental_consolidator, mock_storage):
+        """Test that unchanged memories are only re-scored once their stored score is older than the refresh interval."""
+        await incremental_consolidator.consolidate("weekly")
+        memories = list(mock_storage.memories.values())
+        stale, fresh = memories[0], memories[1]
+        stale.metadata['relevance_calculated_at'] = (datetime.now() - timedelta(days=30)).isoformat()
+        fresh.touch()
+        
+        loaded = await incremental_consolidator._get_memories_for_horizon("weekly")
+        changed = [m for m in loaded.memories if m.content_hash == fresh.content_hash]
+        selected = await incremental_consolidator._select_for_scoring(loaded.memories, changed)
+        
+        # Memories the first run stored itself have no score yet and are due too
+        unscored = {m.content_hash for m in loaded.memories if 'relevance_calculated_at' not in m.metadata}
+        assert {m.content_hash for m in selected} == {stale.content_hash, fresh.content_hash} | unscored
+        assert len(selected) < len(loaded.memories)
+    
+    @pytest.mark.asyncio
+    async def test_incremental_associations_pair_changed_with_all(self, incremental_consolidator, mock_storage):
+        """Test that incremental runs associate changed memories against the whole loaded set."""
+        original = set(mock_storage.memories)
+        await incremental_consolidator.consolidate("weekly")
+        fresh = mock_storage.memories["hash001"]
+        fresh.touch()
+        
+        with patch.object(incremental_consolidator.association_engine, "process", AsyncMock(return_value=[])) as process:
+            await incremental_consolidator.consolidate("weekly")
+        
+        memories = process.await_args.args[0]
+        changed = {m.content_hash for m in process.await_args.kwargs["changed"]}
+        assert len(memories) == len(mock_storage.memories)
+        assert fresh.content_hash in changed
+        assert changed & original == {fresh.content_hash}
+    
+    @pytest.mark.asyncio
+    async def test_due_scores_read_from_the_relevance_table(self, incremental_consolidator, mock_storage):
+        """Test that with relevance_storage='table' due memories are chosen from the score table."""
+        incremental_consolidator.config.relevance_storage = 'table'
+        memories = list(mock_storage.memories.values())
+        now = datetime.now().timestamp()
+        mock_storage.get_relevance_scores = AsyncMock(return_value={
+            memories[0].content_hash: {'relevance_score': 0.5, 'calculated_at': now},
+            memories[1].content_hash: {'relevance_score': 0.5, 'calculated_at': now - 30 * 86400},
+        })
+
+        selected = await incremental_consolidator._select_for_scoring(memories, [])
+
+        assert mock_storage.get_relevance_scores.await_count == 1
+        assert {m.content_hash for m in selected} == {m.content_hash for m in memories[1:]}
+
+    @pytest.mark.asyncio
+    async def test_storages_that_always_touch_get_full_runs(self, incremental_consolidator, mock_storage):
+        """Test that incremental mode is skipped when writing scores would refresh updated_at."""
+        await incremental_consolidator.consolidate("weekly")
+        mock_storage.honours_metadata_touch = False
+        
+        report = await incremental_consolidator.consolidate("weekly")
+        
+        stages = {stage["stage"]: stage for stage in report.profile.summary()}
+        assert stages["clustering"]["items"] == report.memories_processed
+    
+    @pytest.mark.asyncio
+    async def test_edits_during_a_run_are_not_skipped(self, incremental_consolidator, mock_storage):
+        """Test that the watermark is taken when loading starts, not when the run ends."""
+        await incremental_consolidator.consolidate("weekly")
+        edited = next(iter(mock_storage.memories.values()))
+        
+        original = incremental_consolidator._get_memories_for_horizon
+        
+        async def load_then_edit(*args, **kwargs):
+            loaded = await original(*args, **kwargs)
+            edited.touch()  # edited after this run loaded its memories
+            return loaded
+        
+        with patch.object(incremental_consolidator, "_get_memories_for_horizon", side_effect=load_then_edit):
+            await incremental_consolidator.consolidate("weekly")
+        
+        report = await incremental_consolidator.consolidate("weekly")
+        stages = {stage["stage"]: stage for stage in report.profile.summary()}
+        assert stages["clustering"]["items"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_incremental_assigns_to_stored_centroids(self, incremental_consolidator, mock_storage):
+        """Test that changed memories close to a stored centroid join it instead of being re-clustered."""
+        from mcp_memory_service.consolidation.state import ClusterCentroid
+        
+        state = incremental_consolidator.state
+        centroid = np.array([0.3, 0.2, 0.1, 0.4, 0.5] * 64, dtype=np.float32)
+        state.save_centroids([ClusterCentroid("existing", "weekly", centroid, 10)], updated_at=0.0)
+        state.set_watermark("weekly", datetime.now().timestamp(), datetime.now().timestamp())
+        
+        memory = Memory(
+            content="Close to the stored centroid",
+            content_hash="close001",
+            tags=["fresh"],
+            embedding=(centroid * 1.01).tolist(),
+            created_at=datetime.now().timestamp()
+        )
+        loaded = MemoryEmbeddings.from_memories([memory])
+        
+        clusters = await incremental_consolidator._cluster_memories("weekly", [memory], loaded, incremental=True)
+        
+        assert clusters == []
+        stored = state.get_centroids("weekly")
+        assert [c.cluster_id for c in stored] == ["existing"]
+        assert stored[0].size == 11
+    
+    @pytest.mark.asyncio
+    async def test_existing_associations_from_state(self, incremental_consolidator, mock_storage):
+        """Test that association pairs are seeded once and then read from the indexed table."""
+        memories = list(mock_storage.memories.values())
+        a, b = memories[0].content_hash, memories[1].content_hash
+        mock_storage.memories["assoc"] = Memory(
+            content="Association", content_hash="assoc", memory_type="association",
+            metadata={"source_memory_hashes": [b, a]}
+        )
+        
+        pairs = await incremental_consolidator._get_existing_associations(memories[:1])
+        assert pairs == {tuple(sorted((a, b)))}
+        
+        # Seeded once: later association memories only reach the table when stored through the consolidator
+        del mock_storage.memories["assoc"]
+        assert await incremental_consolidator._get_existing_associations(memories[1:2]) == {tuple(sorted((a, b)))}
+    
     @pytest.mark.asyncio
     async def test_large_memory_set_performance(self, consolidation_config, mock_large_storage):
         """Test performance with larger memory sets."""
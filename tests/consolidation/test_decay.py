@@ -1,9 +1,10 @@
 """Unit tests for the exponential decay calculator."""
 
 import pytest
+import numpy as np
 from datetime import datetime, timedelta
 
-from mcp_memory_service.consolidation.decay import ExponentialDecayCalculator, RelevanceScore
+from mcp_memory_service.consolidation.decay import ExponentialDecayCalculator, RelevanceScore, RelevanceScores
 from mcp_memory_service.models.memory import Memory
 
 
@@ -299,4 +300,64 @@ class TestExponentialDecayCalculator:
         
         # Should still work, just without embedding-based features
         assert len(scores) == 1
-        assert scores[0].total_score > 0
\ No newline at end of file
+        assert scores[0].total_score > 0    
+    @pytest.mark.asyncio
+    async def test_process_returns_columnar_scores(self, decay_calculator, sample_memories):
+        """Test that process() returns columns that behave like a list of RelevanceScore."""
+        scores = await decay_calculator.process(sample_memories)
+        
+        assert isinstance(scores, RelevanceScores)
+        assert len(scores) == len(sample_memories)
+        assert [s.memory_hash for s in scores] == [m.content_hash for m in sample_memories]
+        
+        first = scores[0]
+        assert isinstance(first, RelevanceScore)
+        assert first.total_score == pytest.approx(float(scores.total_score[0]))
+        assert scores[-1].memory_hash == sample_memories[-1].content_hash
+        assert scores.get(sample_memories[2].content_hash).memory_hash == sample_memories[2].content_hash
+        assert scores.get("missing") is None
+        
+        with pytest.raises(IndexError):
+            scores[len(scores)]
+    
+    def test_score_arrays(self, decay_calculator):
+        """Test columnar scoring with missing timestamps, boosts and protection."""
+        now = datetime(2024, 6, 1, 12, 0, 0)
+        day = 86400.0
+        reference = (now - datetime(1970, 1, 1)).total_seconds()
+        
+        scores = decay_calculator.score_arrays(
+            memory_hashes=["a", "b", "c", "d"],
+            created_at=np.array([reference - 30 * day, reference - 10.5 * day, np.nan, reference - 400 * day]),
+            last_accessed=np.array([np.nan, reference - 0.5 * day, reference - 6 * day, reference - 20 * day]),
+            retention_periods=np.array([30, 7, 30, 30]),
+            connection_counts=np.array([0, 2, 0, 0]),
+            base_importance=np.array([1.0, 1.5, 1.0, 1.0]),
+            is_protected=np.array([False, False, False, True]),
+            reference_time=now
+        )
+        
+        assert scores.age_days.tolist() == [30, 10, 0, 400]
+        assert scores.access_boost.tolist() == [1.0, 1.5, 1.2, 1.1]
+        assert scores.decay_factor[0] == pytest.approx(np.exp(-1))
+        assert scores.connection_boost[1] == pytest.approx(1.2)
+        assert scores.total_score[1] == pytest.approx(1.5 * np.exp(-10 / 7) * 1.2 * 1.5)
+        assert scores.total_score[2] == pytest.approx(1.2)
+        # Protected memories keep at least 50% relevance
+        assert scores.total_score[3] == 0.5
+    
+    @pytest.mark.asyncio
+    async def test_columnar_threshold_helpers(self, decay_calculator, sample_memories):
+        """Test that threshold helpers and metadata patches work on columnar scores."""
+        scores = await decay_calculator.process(sample_memories)
+        threshold = float(np.median(scores.total_score))
+        
+        low = await decay_calculator.get_low_relevance_memories(scores, threshold=threshold)
+        high = await decay_calculator.get_high_relevance_memories(scores, threshold=threshold)
+        assert len(low) + len(high) == len(scores)
+        assert all(s.total_score < threshold for s in low)
+        
+        patches = decay_calculator.relevance_metadata_patches(scores)
+        assert set(patches) == {m.content_hash for m in sample_memories}
+        assert patches[scores[0].memory_hash].keys() == decay_calculator.relevance_metadata(scores[0]).keys()
+        assert patches[scores[0].memory_hash]['relevance_score'] == scores[0].total_score
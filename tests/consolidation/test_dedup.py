@@ -0,0 +1,107 @@
+"""Unit tests for one-pass duplicate detection."""
+
+import random
+
+import pytest
+
+from mcp_memory_service.consolidation.dedup import DuplicateDetector
+from mcp_memory_service.models.memory import Memory
+
+
+def make_memory(content, content_hash, created_at=None, embedding=None):
+    return Memory(content=content, content_hash=content_hash, created_at=created_at, embedding=embedding)
+
+
+def brute_force_duplicates(memories, threshold=0.8):
+    """Pairwise reference implementation of the duplicate rules."""
+    pairs = set()
+    for i, first in enumerate(memories):
+        a = DuplicateDetector.normalize(first.content)
+        for j in range(i + 1, len(memories)):
+            b = DuplicateDetector.normalize(memories[j].content)
+            if len(a) >= 20 and a == b:
+                pairs.add((i, j))
+            elif len(a) > 50 and len(b) > 50:
+                words_a, words_b = set(a.split()), set(b.split())
+                if len(words_a) > 5 and len(words_b) > 5:
+                    if len(words_a & words_b) / len(words_a | words_b) >= threshold:
+                        pairs.add((i, j))
+    return pairs
+
+
+@pytest.mark.unit
+class TestDuplicateDetector:
+
+    def test_exact_duplicates_keep_one(self):
+        memories = [
+            make_memory("The deployment checklist lives in the wiki", "a", created_at=1.0),
+            make_memory("  the deployment checklist   LIVES in the wiki ", "b", created_at=2.0),
+            make_memory("Completely unrelated note about lunch plans", "c"),
+        ]
+        report = DuplicateDetector().detect(memories)
+
+        assert report.duplicates == {"b"}
+        assert report.kept_for == {"b": "a"}
+        assert "c" not in report
+
+    def test_short_content_is_never_a_duplicate(self):
+        memories = [make_memory("ok", "a"), make_memory("ok", "b")]
+        assert not DuplicateDetector().detect(memories).duplicates
+
+    def test_near_duplicates_and_containment(self):
+        base = ("Configure the staging database with connection pooling enabled and a "
+                "thirty second statement timeout for every service")
+        memories = [
+            make_memory(base, "original"),
+            make_memory(base.replace("thirty", "forty"), "edited"),
+            make_memory(base + " in the cluster", "extended"),
+            make_memory("Quarterly planning notes covering hiring budget and roadmap items for the team", "other"),
+        ]
+        report = DuplicateDetector().detect(memories)
+
+        # The longest memory of the group is kept
+        assert report.duplicates == {"original", "edited"}
+        assert report.kept_for["original"] == "extended"
+        assert "other" not in report
+
+    def test_matches_pairwise_rules_on_random_corpus(self):
+        rng = random.Random(7)
+        vocabulary = [f"word{i}" for i in range(300)]
+        memories = []
+        for i in range(300):
+            if memories and rng.random() < 0.3:
+                # Near copy of an earlier memory with one word changed
+                words = rng.choice(memories).content.split()
+                words[rng.randrange(len(words))] = rng.choice(vocabulary)
+                content = " ".join(words)
+            else:
+                content = " ".join(rng.choice(vocabulary) for _ in range(rng.randint(12, 25)))
+            memories.append(make_memory(content, f"h{i}", created_at=float(i)))
+
+        report = DuplicateDetector().detect(memories)
+        expected = brute_force_duplicates(memories)
+
+        # Every pair the pairwise rule finds ends up in one group
+        group_of = {}
+        for index, group in enumerate(report.groups):
+            for content_hash in group:
+                group_of[content_hash] = index
+        for i, j in expected:
+            assert memories[i].content_hash in group_of
+            assert group_of.get(memories[i].content_hash) == group_of.get(memories[j].content_hash)
+
+    def test_embedding_neighbours(self):
+        rng = random.Random(3)
+        vector = [rng.gauss(0, 1) for _ in range(32)]
+        close = [value + rng.gauss(0, 0.01) for value in vector]
+        far = [rng.gauss(0, 1) for _ in range(32)]
+        memories = [
+            make_memory("Alpha release notes describe the new sync engine in great detail", "a", embedding=vector),
+            make_memory("Sync engine rewrite shipped with the alpha build, see changelog entry", "b", embedding=close),
+            make_memory("Recipe for sourdough bread with a long cold fermentation overnight", "c", embedding=far),
+        ]
+
+        assert not DuplicateDetector().detect(memories).duplicates
+        report = DuplicateDetector(embedding_threshold=0.95).detect(memories)
+        assert len(report.duplicates) == 1
+        assert "c" not in report
@@ -24,6 +24,11 @@ class TestControlledForgettingEngine:
     def forgetting_engine(self, consolidation_config):
         return ControlledForgettingEngine(consolidation_config)
     
+    @pytest.fixture
+    def json_forgetting_engine(self, consolidation_config):
+        consolidation_config.archive_format = 'json'
+        return ControlledForgettingEngine(consolidation_config)
+    
     @pytest.fixture
     def sample_relevance_scores(self, sample_memories):
         """Create sample relevance scores for memories."""
@@ -282,7 +287,7 @@ class TestControlledForgettingEngine:
         assert isinstance(is_duplicate, bool)
     
     @pytest.mark.asyncio
-    async def test_archive_memory(self, forgetting_engine):
+    async def test_archive_memory(self, json_forgetting_engine):
         """Test archiving a memory to filesystem."""
         memory = Memory(
             content="Memory to archive",
@@ -310,7 +315,7 @@ class TestControlledForgettingEngine:
             can_be_deleted=False
         )
         
-        result = await forgetting_engine._archive_memory(candidate)
+        result = await json_forgetting_engine._archive_memory(candidate)
         
         assert isinstance(result, ForgettingResult)
         assert result.action_taken == "archived"
@@ -371,7 +376,7 @@ class TestControlledForgettingEngine:
         assert "compression_ratio" in compressed.metadata
     
     @pytest.mark.asyncio
-    async def test_delete_memory(self, forgetting_engine):
+    async def test_delete_memory(self, json_forgetting_engine):
         """Test deleting a memory with backup."""
         memory = Memory(
             content="Memory to delete",
@@ -399,7 +404,7 @@ class TestControlledForgettingEngine:
             can_be_deleted=True
         )
         
-        result = await forgetting_engine._delete_memory(candidate)
+        result = await json_forgetting_engine._delete_memory(candidate)
         
         assert isinstance(result, ForgettingResult)
         assert result.action_taken == "deleted"
@@ -414,6 +419,69 @@ class TestControlledForgettingEngine:
         assert "deletion_metadata" in backup_data
         assert backup_data["memory"]["content_hash"] == "delete_test"
     
+    @pytest.mark.asyncio
+    async def test_archive_database_batches_and_indexes(self, forgetting_engine, sample_memories, sample_relevance_scores):
+        """Test that a run writes one archive database instead of a file per memory."""
+        low_scores = [
+            RelevanceScore(
+                memory_hash=score.memory_hash,
+                total_score=0.01,
+                base_importance=score.base_importance,
+                decay_factor=score.decay_factor,
+                connection_boost=score.connection_boost,
+                access_boost=score.access_boost,
+                metadata=score.metadata
+            )
+            for score in sample_relevance_scores
+        ]
+        
+        results = await forgetting_engine.process(sample_memories, low_scores, time_horizon="yearly")
+        written = [r for r in results if r.action_taken in ("archived", "compressed", "deleted")]
+        assert written
+        
+        # No per-memory files, and every result points into the archive database
+        for archive_dir in (forgetting_engine.daily_archive, forgetting_engine.compressed_archive):
+            assert list(archive_dir.glob("*.json")) == []
+        assert all(r.archive_path.startswith(forgetting_engine.archive.path) for r in written)
+        
+        stats = await forgetting_engine.get_forgetting_statistics()
+        for action in ("archived", "compressed", "deleted"):
+            assert stats[f"total_{action}"] == sum(1 for r in written if r.action_taken == action)
+        assert stats["archive_size_bytes"] > 0
+        assert stats["oldest_archive"] <= stats["newest_archive"]
+        
+        # Every written memory is recoverable by hash, including deleted ones
+        for result in written:
+            recovered = await forgetting_engine.recover_memory(result.memory_hash)
+            assert recovered is not None
+            assert recovered.content_hash == result.memory_hash
+    
+    @pytest.mark.asyncio
+    async def test_recovery_falls_back_to_json_archives(self, json_forgetting_engine, consolidation_config):
+        """Test that memories archived in the json layout remain recoverable after switching."""
+        memory = Memory(
+            content="Archived before the switch",
+            content_hash="legacy_archive",
+            tags=["test"],
+            created_at=datetime.now().timestamp()
+        )
+        score = RelevanceScore(
+            memory_hash="legacy_archive", total_score=0.05, base_importance=1.0,
+            decay_factor=0.1, connection_boost=1.0, access_boost=1.0, metadata={}
+        )
+        await json_forgetting_engine._archive_memory(ForgettingCandidate(
+            memory=memory, relevance_score=score, forgetting_reasons=["low_relevance"],
+            archive_priority=1, can_be_deleted=False
+        ))
+        
+        consolidation_config.archive_format = 'sqlite'
+        engine = ControlledForgettingEngine(consolidation_config)
+        recovered = await engine.recover_memory("legacy_archive")
+        
+        assert recovered is not None
+        assert recovered.content == memory.content
+        assert await engine.recover_memory("never_archived") is None
+    
     @pytest.mark.asyncio
     async def test_memory_recovery(self, forgetting_engine):
         """Test recovery of forgotten memories."""
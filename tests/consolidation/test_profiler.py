@@ -0,0 +1,92 @@
+"""Unit tests for the consolidation pipeline profiler."""
+
+import json
+import time
+
+import pytest
+
+from mcp_memory_service.consolidation.profiler import (
+    PipelineProfiler,
+    ProfiledStorage,
+    current_profiler,
+    profile_stage
+)
+
+
+class CountedStorage:
+    db_path = "/tmp/example.db"
+
+    async def get_all_memories(self):
+        return []
+
+
+@pytest.mark.unit
+class TestPipelineProfiler:
+    """Test stage spans, aggregation and trace export."""
+    
+    def test_spans_are_aggregated_per_stage(self):
+        """Test that repeated stages are summed and ordered by first start."""
+        profiler = PipelineProfiler("weekly")
+        with profiler.stage("load") as span:
+            span.items = 10
+        with profiler.stage("writeback", items=3):
+            time.sleep(0.01)
+        with profiler.stage("clustering", items=10):
+            pass
+        with profiler.stage("writeback", items=2):
+            pass
+        profile = profiler.finish()
+        
+        summary = profile.summary()
+        assert [stage["stage"] for stage in summary] == ["load", "writeback", "clustering"]
+        assert summary[0]["items"] == 10
+        assert summary[1]["items"] == 5
+        assert summary[1]["wall_seconds"] >= 0.01
+        assert profile.wall_seconds >= sum(span.wall_seconds for span in profile.spans)
+        assert all(span.cpu_seconds >= 0 and span.rss_delta_bytes >= 0 for span in profile.spans)
+    
+    @pytest.mark.asyncio
+    async def test_storage_calls_counted_on_open_span(self):
+        """Test that ProfiledStorage counts calls for the current run only."""
+        storage = ProfiledStorage(CountedStorage())
+        assert storage.db_path == "/tmp/example.db"
+        assert not hasattr(storage, "update_relevance_scores")
+        
+        # Outside a run calls pass through uncounted
+        assert await storage.get_all_memories() == []
+        
+        profiler = PipelineProfiler("daily")
+        token = current_profiler.set(profiler)
+        try:
+            with profile_stage("load"):
+                await storage.get_all_memories()
+                await storage.get_all_memories()
+            await storage.get_all_memories()  # outside any stage
+        finally:
+            current_profiler.reset(token)
+        
+        assert [span.storage_calls for span in profiler.finish().spans] == [2]
+    
+    def test_profile_stage_without_run_is_noop(self):
+        with profile_stage("decay") as span:
+            assert span is None
+    
+    def test_trace_exports(self, tmp_path):
+        """Test the trace-event JSON and collapsed-stack outputs."""
+        profiler = PipelineProfiler("monthly")
+        with profiler.stage("decay", items=4):
+            pass
+        profile = profiler.finish()
+        
+        path = profile.export_trace(str(tmp_path / "traces" / "run.trace.json"))
+        with open(path) as f:
+            trace = json.load(f)
+        events = trace["traceEvents"]
+        assert events[0]["name"] == "consolidate monthly"
+        assert events[1]["name"] == "decay"
+        assert events[1]["ph"] == "X"
+        assert events[1]["args"]["items"] == 4
+        
+        lines = profile.to_collapsed_stacks().splitlines()
+        assert lines[0].startswith("consolidate_monthly;decay ")
+        assert all(int(line.rsplit(" ", 1)[1]) >= 0 for line in lines)
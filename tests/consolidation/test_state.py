@@ -0,0 +1,75 @@
+"""Unit tests for the incremental consolidation state store."""
+
+import os
+import pytest
+import numpy as np
+
+from mcp_memory_service.consolidation.state import ClusterCentroid, ConsolidationState
+
+
+@pytest.mark.unit
+class TestConsolidationState:
+    """Test watermarks, centroids and association pairs persistence."""
+    
+    @pytest.fixture
+    def state(self, temp_archive_path):
+        state = ConsolidationState(os.path.join(temp_archive_path, "state", "consolidation_state.db"))
+        yield state
+        state.close()
+    
+    def test_watermarks_per_horizon(self, state):
+        """Test that each horizon keeps its own watermark and reset clears it."""
+        assert state.get_watermark("weekly") is None
+        
+        state.set_watermark("weekly", 100.0, 101.0)
+        state.set_watermark("monthly", 50.0, 51.0)
+        state.set_watermark("weekly", 200.0, 201.0)
+        
+        assert state.get_watermark("weekly") == 200.0
+        assert state.get_watermark("monthly") == 50.0
+        
+        state.reset("weekly")
+        assert state.get_watermark("weekly") is None
+        assert state.get_watermark("monthly") == 50.0
+    
+    def test_centroid_round_trip(self, state):
+        """Test that centroids survive as float32 vectors and are scoped by horizon."""
+        centroid = np.array([0.1, 0.2, 0.3], dtype=np.float32)
+        state.save_centroids([ClusterCentroid("c1", "weekly", centroid, 4)], updated_at=1.0)
+        state.save_centroids([ClusterCentroid("c2", "monthly", centroid * 2, 7)], updated_at=1.0)
+        
+        weekly = state.get_centroids("weekly")
+        assert [c.cluster_id for c in weekly] == ["c1"]
+        np.testing.assert_array_equal(weekly[0].centroid, centroid)
+        assert weekly[0].size == 4
+        
+        # Saving again replaces the row
+        state.save_centroids([ClusterCentroid("c1", "weekly", centroid, 9)], updated_at=2.0)
+        assert state.get_centroids("weekly")[0].size == 9
+        
+        state.reset_centroids("weekly")
+        assert state.get_centroids("weekly") == []
+        assert len(state.get_centroids("monthly")) == 1
+    
+    def test_association_pairs_lookup(self, state):
+        """Test that pairs are order independent and looked up by either member."""
+        state.add_association_pairs([("b", "a"), ("a", "b"), ("c", "d"), ("e", "e")])
+        
+        assert state.get_association_pairs(["a"]) == {("a", "b")}
+        assert state.get_association_pairs(["b", "d"]) == {("a", "b"), ("c", "d")}
+        assert state.get_association_pairs(["e"]) == set()
+        assert state.get_association_pairs([]) == set()
+    
+    def test_state_persists_across_instances(self, state):
+        """Test that a new instance on the same file sees earlier state."""
+        state.set_watermark("quarterly", 10.0, 11.0)
+        state.add_association_pairs([("x", "y")])
+        state.set_flag("association_pairs_seeded", "yes")
+        
+        reopened = ConsolidationState(state.path)
+        try:
+            assert reopened.get_watermark("quarterly") == 10.0
+            assert reopened.get_association_pairs(["y"]) == {("x", "y")}
+            assert reopened.get_flag("association_pairs_seeded") == "yes"
+        finally:
+            reopened.close()
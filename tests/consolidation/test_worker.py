@@ -0,0 +1,163 @@
+"""Unit tests for running consolidation in a worker process."""
+
+import asyncio
+import functools
+import os
+import threading
+import time
+
+import pytest
+
+from mcp_memory_service.consolidation.base import ConsolidationCancelledError, ConsolidationProcessingError
+from mcp_memory_service.consolidation.consolidator import DreamInspiredConsolidator
+from mcp_memory_service.consolidation.worker import ConsolidationWorker, WorkerStorage, _WorkerChannel
+
+
+class FakeConnection:
+    """Records what the parent sends to the worker."""
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(message)
+        self.send_thread = threading.current_thread()
+
+
+class QueuedConnection(FakeConnection):
+    """Worker end of a pipe with messages from the parent already queued."""
+
+    def __init__(self, *incoming):
+        super().__init__()
+        self.incoming = list(incoming)
+
+    def poll(self, timeout=0):
+        return bool(self.incoming)
+
+    def recv(self):
+        if not self.incoming:
+            raise EOFError
+        return self.incoming.pop(0)
+
+
+async def exit_immediately(code):
+    os._exit(code)
+
+
+@pytest.mark.unit
+class TestConsolidationWorker:
+    """Test process isolation, storage forwarding and throttling."""
+
+    @pytest.fixture
+    def consolidator(self, mock_storage, consolidation_config):
+        return DreamInspiredConsolidator(mock_storage, consolidation_config)
+
+    @pytest.mark.asyncio
+    async def test_worker_runs_consolidation_and_writes_through_parent(self, consolidator, mock_storage):
+        """Test that a job in the worker reads and writes through the parent's storage."""
+        stages = []
+
+        async def on_progress(time_horizon, stage, details):
+            stages.append(stage)
+
+        before = len(mock_storage.memories)
+        worker = ConsolidationWorker(consolidator, progress_callback=on_progress)
+        report = await worker.run('weekly')
+
+        assert report.time_horizon == 'weekly'
+        assert report.memories_processed > 0
+        assert report.errors == []
+        assert stages[0] == 'loading'
+        assert 'scoring' in stages
+        assert worker.active_stages == {}
+
+        # Relevance metadata and new associations were written in this process
+        assert any('relevance_score' in m.metadata for m in mock_storage.memories.values())
+        assert len(mock_storage.memories) >= before + report.associations_discovered
+        assert consolidator.consolidation_stats['total_runs'] == 1
+        assert len(consolidator.health_monitor.performance_history) == 1
+        assert consolidator.health_monitor.performance_history[0]['stages']
+
+    @pytest.mark.asyncio
+    async def test_worker_crash_raises(self, consolidator):
+        """Test that a worker dying without a result is reported as a processing error."""
+        worker = ConsolidationWorker(consolidator, reader_factory=functools.partial(exit_immediately, 3))
+
+        with pytest.raises(ConsolidationProcessingError, match="exit code 3"):
+            await worker.run('daily')
+
+    def test_worker_storage_exposes_parent_methods_only(self):
+        """Test that capability checks inside the worker match the parent's storage."""
+        storage = WorkerStorage(_WorkerChannel(FakeConnection()), {'get_all_memories', 'update_memory'})
+
+        assert hasattr(storage, 'update_memory')
+        assert not hasattr(storage, 'update_relevance_scores')
+        assert getattr(storage, 'get_memories_with_embeddings', None) is None
+
+    def test_worker_storage_carries_touch_capability(self, consolidation_config, temp_archive_path):
+        """Test that a storage that always touches updated_at still gets full runs in the worker."""
+        consolidation_config.incremental_enabled = True
+        consolidation_config.state_path = os.path.join(temp_archive_path, "consolidation_state.db")
+        storage = WorkerStorage(_WorkerChannel(FakeConnection()), set(), honours_metadata_touch=False)
+        consolidator = DreamInspiredConsolidator(storage, consolidation_config)
+        consolidator.state.set_watermark('weekly', time.time(), time.time())
+
+        assert consolidator._get_watermark('weekly') is None
+        storage.honours_metadata_touch = True
+        assert consolidator._get_watermark('weekly') is not None
+        consolidator.state.close()
+
+    @pytest.mark.asyncio
+    async def test_throttle_pauses_and_resumes(self, consolidator, monkeypatch):
+        """Test that event-loop lag above the ceiling pauses the worker until it recovers."""
+        monkeypatch.setattr('mcp_memory_service.consolidation.worker.LATENCY_PROBE_SECONDS', 0.01)
+        monkeypatch.setattr('mcp_memory_service.consolidation.worker.RESUME_AFTER_PROBES', 2)
+        consolidator.config.worker_max_latency_ms = 50
+        worker = ConsolidationWorker(consolidator)
+        conn = FakeConnection()
+
+        throttle = asyncio.create_task(worker._throttle(conn, 'weekly'))
+        await asyncio.sleep(0.03)
+        time.sleep(0.2)  # block the loop like a slow foreground request would
+        await asyncio.sleep(0.1)
+        throttle.cancel()
+
+        assert conn.sent[:2] == [('pause',), ('resume',)]
+        assert worker.pause_count == 1
+
+    def test_checkpoint_blocks_while_paused_and_raises_on_cancel(self, monkeypatch):
+        """Test that a worker mid-stage waits out a pause and stops when cancelled."""
+        monkeypatch.setattr('mcp_memory_service.consolidation.worker.CHECKPOINT_INTERVAL_SECONDS', 0)
+        channel = _WorkerChannel(QueuedConnection(('pause',), ('resume',)))
+        channel.checkpoint()
+        assert not channel.paused and not channel.conn.incoming
+
+        channel = _WorkerChannel(QueuedConnection(('pause',), ('cancel',)))
+        with pytest.raises(ConsolidationCancelledError):
+            channel.checkpoint()
+
+        # A parent that has gone away cancels the job as well
+        channel = _WorkerChannel(QueuedConnection(('pause',)))
+        with pytest.raises(ConsolidationCancelledError):
+            channel.checkpoint()
+
+    def test_checkpoint_polls_at_most_every_interval(self):
+        """Test that tight loops calling checkpoint() don't poll the pipe every iteration."""
+        channel = _WorkerChannel(QueuedConnection())
+        channel.checkpoint()
+        channel.conn.incoming.append(('cancel',))
+        channel.checkpoint()
+        assert not channel.cancelled
+
+    @pytest.mark.asyncio
+    async def test_call_results_are_sent_off_the_event_loop(self, consolidator):
+        """Test that storage results are written to the pipe from an executor thread."""
+        worker = ConsolidationWorker(consolidator)
+        conn = FakeConnection()
+
+        await worker._handle_call(conn, 7, 'get_all_memories', (), {})
+
+        kind, call_id, result = conn.sent[0]
+        assert (kind, call_id) == ('result', 7)
+        assert len(result) == len(consolidator.storage.memories)
+        assert conn.send_thread is not threading.main_thread()
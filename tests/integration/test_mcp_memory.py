@@ -56,7 +56,7 @@ async def main():
     
     # Get database stats
     print("\n=== Database Stats ===")
-    stats = storage.get_stats()
+    stats = await storage.get_stats()
     import json
     print(json.dumps(stats, indent=2))
     
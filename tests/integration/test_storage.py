@@ -67,7 +67,7 @@ def test_health_check(storage):
             print(f"Validation result: {is_valid} - {message}")
             
             # Test stats
-            stats = get_database_stats(storage)
+            stats = await get_database_stats(storage)
             print(f"Stats: {stats}")
             
             return is_valid, stats
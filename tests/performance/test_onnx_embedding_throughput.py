@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the ONNX embedding engine.
+
+Encodes a corpus of mixed-length texts (short notes to multi-paragraph
+documents) and reports texts/sec for a range of batch sizes. The
+"single batch" row reproduces the previous behaviour: every text in one
+InferenceSession.run, padded to the longest input.
+
+Requires onnxruntime and tokenizers; the model is downloaded on first use.
+
+Usage:
+    python tests/performance/test_onnx_embedding_throughput.py [n_texts]
+"""
+
+import os
+import random
+import sys
+import time
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from mcp_memory_service.embeddings.onnx_embeddings import get_onnx_embedding_model
+
+WORDS = (
+    "memory service vector search embedding storage consolidation semantic "
+    "cluster association decay tag query database index model token batch"
+).split()
+
+
+def make_corpus(n_texts: int, seed: int = 42):
+    """Texts from 3 to 400 words, skewed towards short ones like real memories."""
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(n_texts):
+        length = min(400, int(rng.expovariate(1 / 40)) + 3)
+        texts.append(" ".join(rng.choice(WORDS) for _ in range(length)))
+    return texts
+
+
+def time_encode(model, texts, batch_size, repeats=3):
+    """Best-of-N wall time for encoding all texts."""
+    model.encode(texts[:batch_size], batch_size=batch_size)  # warm-up
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model.encode(texts, batch_size=batch_size)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_benchmark(n_texts: int = 512):
+    model = get_onnx_embedding_model()
+    if model is None:
+        print("ONNX runtime not available; install onnxruntime and tokenizers")
+        return
+
+    texts = make_corpus(n_texts)
+    print(f"ONNX embedding throughput: {n_texts} texts, "
+          f"max_seq_length={model.max_seq_length}, intra-op threads={model.intra_op_threads}")
+    print(f"  {'batch size':<14} {'seconds':>9} {'texts/sec':>11}")
+
+    baseline = time_encode(model, texts, len(texts), repeats=1)
+    print(f"  {'single batch':<14} {baseline:9.3f} {n_texts / baseline:11.1f}")
+
+    best_rate, best_size = 0.0, None
+    for batch_size in (1, 8, 16, 32, 64, 128):
+        elapsed = time_encode(model, texts, batch_size)
+        rate = n_texts / elapsed
+        if rate > best_rate:
+            best_rate, best_size = rate, batch_size
+        print(f"  {batch_size:<14} {elapsed:9.3f} {rate:11.1f}")
+
+    # Bucketing must not change the embeddings
+    reference = model.encode(texts[:64], batch_size=1)
+    bucketed = model.encode(texts[:64], batch_size=32)
+    max_diff = float(abs(reference - bucketed).max())
+
+    print(f"\nBest: batch size {best_size}, {best_rate / (n_texts / baseline):.1f}x the single-batch rate")
+    print(f"Max difference batch_size=1 vs 32: {max_diff:.2e}")
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 512)
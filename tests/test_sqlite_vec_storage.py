@@ -8,6 +8,7 @@ import tempfile
 import os
 import shutil
 import json
+import threading
 from unittest.mock import Mock, patch
 import time
 
@@ -87,6 +88,42 @@ class TestSqliteVecStorage:
         finally:
             shutil.rmtree(temp_dir, ignore_errors=True)
     
+    @pytest.mark.asyncio
+    async def test_initialize_is_idempotent(self, storage):
+        """Test that repeated and concurrent initialize() calls reuse the ready storage."""
+        conn = storage.conn
+        with patch.object(storage, '_initialize') as full_init:
+            await asyncio.gather(*[storage.initialize() for _ in range(5)])
+            await storage.count_all_memories()
+            full_init.assert_not_called()
+        assert storage.conn is conn
+
+    @pytest.mark.asyncio
+    async def test_concurrent_first_initialize_runs_once(self):
+        """Test that concurrent first initialize() calls initialize the storage exactly once."""
+        temp_dir = tempfile.mkdtemp()
+        storage = SqliteVecMemoryStorage(os.path.join(temp_dir, "test_init_once.db"))
+        calls = 0
+        full_init = storage._initialize
+
+        async def counting_initialize():
+            nonlocal calls
+            calls += 1
+            await full_init()
+
+        try:
+            with patch.object(storage, '_initialize', counting_initialize):
+                await asyncio.gather(*[storage.initialize() for _ in range(10)])
+                assert calls == 1
+
+                # close() clears the ready flag, so the next call initializes again
+                storage.close()
+                await storage.initialize()
+                assert calls == 2
+        finally:
+            storage.close()
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
     @pytest.mark.asyncio
     async def test_store_memory(self, storage, sample_memory):
         """Test storing a memory."""
@@ -221,7 +258,60 @@ class TestSqliteVecStorage:
         remaining = await storage.search_by_tag(["tag3"])
         assert len(remaining) == 1
         assert remaining[0].content_hash == memory3.content_hash
-    
+
+    @pytest.mark.asyncio
+    async def test_tag_index(self, storage):
+        """Test that tag queries match whole tags and the index follows updates and deletes."""
+        python_memory = Memory(
+            content="Python memory",
+            content_hash=generate_content_hash("Python memory"),
+            tags=["python", "code"]
+        )
+        py_memory = Memory(
+            content="Py memory",
+            content_hash=generate_content_hash("Py memory"),
+            tags=["py"]
+        )
+        await storage.store(python_memory)
+        await storage.store(py_memory)
+
+        # "py" must not match "python"
+        results = await storage.search_by_tag(["py"])
+        assert [m.content_hash for m in results] == [py_memory.content_hash]
+
+        results = await storage.search_by_tags(["python", "code"], operation="AND")
+        assert [m.content_hash for m in results] == [python_memory.content_hash]
+        results = await storage.search_by_tags(["python", "py"], operation="AND")
+        assert results == []
+        results = await storage.search_by_tags(["python", "py"], operation="OR")
+        assert len(results) == 2
+
+        assert await storage.get_all_tags() == ["code", "py", "python"]
+        assert (await storage.get_stats())["unique_tags"] == 3
+
+        # Updates replace the indexed tags
+        await storage.update_memory_metadata(py_memory.content_hash, {"tags": ["code"]})
+        assert await storage.get_tag_counts() == {"code": 2, "python": 1}
+
+        count, _ = await storage.delete_by_tag("py")
+        assert count == 0
+        count, _ = await storage.delete_by_tag("code")
+        assert count == 2
+        assert await storage.get_all_tags() == []
+
+    @pytest.mark.asyncio
+    async def test_tag_index_migration(self, storage, sample_memory):
+        """Test that memories stored before the tag table existed are indexed on initialize."""
+        await storage.store(sample_memory)
+        storage.conn.execute('DROP TABLE memory_tags')
+        storage.conn.commit()
+
+        await storage._db.run_write(storage._create_tags_table)
+
+        results = await storage.search_by_tag(["sqlite-vec"])
+        assert len(results) == 1
+        assert results[0].content_hash == sample_memory.content_hash
+
     @pytest.mark.asyncio
     async def test_delete_by_nonexistent_tag(self, storage):
         """Test deleting by a non-existent tag."""
@@ -431,9 +521,10 @@ class TestSqliteVecStorage:
         # created_at should be updated (newer)
         assert created_at > original_created_at
     
-    def test_get_stats(self, storage):
+    @pytest.mark.asyncio
+    async def test_get_stats(self, storage):
         """Test getting storage statistics."""
-        stats = storage.get_stats()
+        stats = await storage.get_stats()
         
         assert isinstance(stats, dict)
         assert stats["backend"] == "sqlite-vec"
@@ -447,7 +538,7 @@ class TestSqliteVecStorage:
         """Test getting statistics with data."""
         await storage.store(sample_memory)
         
-        stats = storage.get_stats()
+        stats = await storage.get_stats()
         
         assert stats["total_memories"] >= 1
         assert stats["database_size_bytes"] > 0
@@ -558,7 +649,239 @@ class TestSqliteVecStorage:
                 (memory.content_hash,)
             )
             assert cursor.fetchone() is not None
+    
+    @pytest.mark.asyncio
+    async def test_sql_runs_off_event_loop(self, storage, sample_memory):
+        """Test that SQL is executed on the storage executor threads."""
+        await storage.store(sample_memory)
+        
+        loop_thread = threading.get_ident()
+        reader_threads = await asyncio.gather(*[
+            storage._execute_with_retry(lambda conn: threading.get_ident(), read_only=True)
+            for _ in range(8)
+        ])
+        writer_thread = await storage._execute_with_retry(lambda conn: threading.get_ident())
+        
+        assert loop_thread not in reader_threads
+        assert writer_thread != loop_thread
+        assert writer_thread not in reader_threads
+        
+        # Reads from the pool see committed writes
+        results = await asyncio.gather(*[storage.search_by_tag(["test"]) for _ in range(8)])
+        assert all(len(r) == 1 for r in results)
 
+    @pytest.mark.asyncio
+    async def test_store_batch(self, storage, sample_memory):
+        """Test batch storage with duplicates in the database and in the batch."""
+        await storage.store(sample_memory)
+
+        memories = []
+        for i in range(25):
+            content = f"Batch test memory {i}"
+            memories.append(Memory(
+                content=content,
+                content_hash=generate_content_hash(content),
+                tags=["batch"]
+            ))
+        batch = [sample_memory] + memories + [memories[0]]
+
+        results = await storage.store_batch(batch)
+
+        assert len(results) == len(batch)
+        assert results[0][0] is False
+        assert "duplicate" in results[0][1].lower()
+        assert all(success for success, _ in results[1:-1])
+        assert results[-1][0] is False
+
+        cursor = storage.conn.execute('SELECT COUNT(*) FROM memories')
+        assert cursor.fetchone()[0] == 26
+        cursor = storage.conn.execute('SELECT COUNT(*) FROM memory_embeddings')
+        assert cursor.fetchone()[0] == 26
+
+        stored = await storage.search_by_tag(["batch"])
+        assert len(stored) == 25
+
+    @pytest.mark.asyncio
+    async def test_recall_filters_before_ranking(self, storage):
+        """Test that time-window recall returns n_results even outside the global top-K."""
+        import numpy as np
+        
+        def encode(texts, convert_to_numpy=True):
+            # Deterministic per-text vectors so rankings are reproducible without a model
+            return np.stack([
+                np.random.default_rng(sum(text.encode())).random(storage.embedding_dimension, dtype=np.float32)
+                for text in texts
+            ])
+        storage.embedding_model = Mock()
+        storage.embedding_model.encode.side_effect = encode
+        
+        now = time.time()
+        memories = []
+        for i in range(40):
+            content = f"Filtered search memory {i}"
+            memories.append(Memory(
+                content=content,
+                content_hash=generate_content_hash(content),
+                tags=["old" if i < 6 else "recent"],
+                memory_type="fact" if i < 6 else "note",
+                created_at=now - 30 * 86400 - i if i < 6 else now - i
+            ))
+        await storage.store_batch(memories)
+
+        window_start, window_end = now - 31 * 86400, now - 29 * 86400
+        results = await storage.recall("search memory", n_results=5,
+                                       start_timestamp=window_start, end_timestamp=window_end)
+        assert len(results) == 5
+        assert all(window_start <= r.memory.created_at <= window_end for r in results)
+
+        # Both strategies rank the same candidate set
+        by_strategy = {}
+        for strategy in ("prefilter", "overfetch"):
+            results = await storage.search_filtered("search memory", n_results=6,
+                                                    memory_type="fact", strategy=strategy)
+            assert len(results) == 6
+            assert all(r.memory.memory_type == "fact" for r in results)
+            assert all(r.debug_info["search_strategy"] == strategy for r in results)
+            by_strategy[strategy] = [r.memory.content_hash for r in results]
+        assert by_strategy["prefilter"] == by_strategy["overfetch"]
+        
+        # A selective filter forced through overfetch widens k until every match is found
+        results = await storage.search_filtered("search memory", n_results=6, tags=["old"], strategy="overfetch")
+        assert len(results) == 6
+        assert all(r.memory.tags == ["old"] for r in results)
+
+        stats = storage.get_search_stats()
+        assert stats["prefilter"]["count"] >= 1
+        assert stats["overfetch"]["count"] == 1
+
+
+    @pytest.mark.asyncio
+    async def test_get_memories_with_embeddings(self, storage):
+        """Test the bulk loader returns stored vectors as one float32 matrix."""
+        import numpy as np
+        
+        now = time.time()
+        memories = []
+        for i in range(10):
+            content = f"Embedding matrix memory {i}"
+            memories.append(Memory(
+                content=content,
+                content_hash=generate_content_hash(content),
+                tags=["matrix"],
+                created_at=now - i * 86400
+            ))
+        await storage.store_batch(memories)
+        
+        loaded = await storage.get_memories_with_embeddings()
+        assert len(loaded) == 10
+        assert loaded.embeddings.dtype == np.float32
+        assert loaded.embeddings.shape == (10, storage.embedding_dimension)
+        assert loaded.embeddings.flags.c_contiguous
+        assert loaded.memories[0].tags == ["matrix"]
+        
+        # Rows hold exactly the vectors stored in memory_embeddings
+        def stored_vector(memory):
+            return storage.conn.execute(
+                'SELECT e.rowid, e.content_embedding FROM memory_embeddings e '
+                'JOIN memories m ON e.rowid = m.id WHERE m.content_hash = ?',
+                (memory.content_hash,)
+            ).fetchone()
+        _, blob = stored_vector(memories[3])
+        np.testing.assert_array_equal(loaded.get(memories[3].content_hash), np.frombuffer(blob, dtype=np.float32))
+        rows = loaded.rows(loaded.memories)
+        assert sorted(rows.tolist()) == list(range(10))
+        
+        # A memory whose vector is missing is still returned, without a row
+        rowid, _ = stored_vector(memories[0])
+        storage.conn.execute('DELETE FROM memory_embeddings WHERE rowid = ?', (rowid,))
+        storage.conn.commit()
+        
+        recent = await storage.get_memories_with_embeddings(start_time=now - 2.5 * 86400)
+        assert len(recent) == 3
+        assert recent.embeddings.shape == (2, storage.embedding_dimension)
+        assert recent.get(memories[0].content_hash) is None
+        assert recent.rows([memories[0]]).tolist() == [-1]
+
+    @pytest.mark.asyncio
+    async def test_concurrent_metadata_updates_are_not_lost(self, storage, sample_memory):
+        """Test that concurrent updates of one memory each merge into the latest metadata."""
+        await storage.store(sample_memory)
+        
+        results = await asyncio.gather(*(
+            storage.update_memory_metadata(sample_memory.content_hash, {"metadata": {f"key_{i}": i}})
+            for i in range(10)
+        ))
+        
+        assert all(success for success, _ in results)
+        row = storage.conn.execute(
+            'SELECT metadata FROM memories WHERE content_hash = ?', (sample_memory.content_hash,)
+        ).fetchone()
+        metadata = json.loads(row[0])
+        assert all(metadata[f"key_{i}"] == i for i in range(10))
+    
+    @pytest.mark.asyncio
+    async def test_update_memories_metadata(self, storage):
+        """Test bulk metadata patches are merged in one call and skip unknown hashes."""
+        memories = []
+        for i in range(5):
+            content = f"Bulk metadata memory {i}"
+            memories.append(Memory(
+                content=content,
+                content_hash=generate_content_hash(content),
+                metadata={"keep": i}
+            ))
+        await storage.store_batch(memories)
+        
+        patches = {m.content_hash: {"relevance_score": i / 10} for i, m in enumerate(memories)}
+        patches["missing_hash"] = {"relevance_score": 1.0}
+        updated, message = await storage.update_memories_metadata(patches)
+        
+        assert updated == 5
+        for i, memory in enumerate(memories):
+            row = storage.conn.execute(
+                'SELECT metadata FROM memories WHERE content_hash = ?', (memory.content_hash,)
+            ).fetchone()
+            metadata = json.loads(row[0])
+            assert metadata["keep"] == i
+            assert metadata["relevance_score"] == i / 10
+        
+        # Derived data can be written without marking the memories as changed
+        before = storage.conn.execute(
+            'SELECT updated_at FROM memories WHERE content_hash = ?', (memories[0].content_hash,)
+        ).fetchone()[0]
+        await storage.update_memories_metadata({memories[0].content_hash: {"relevance_score": 0.9}}, touch=False)
+        row = storage.conn.execute(
+            'SELECT metadata, updated_at FROM memories WHERE content_hash = ?', (memories[0].content_hash,)
+        ).fetchone()
+        assert json.loads(row[0])["relevance_score"] == 0.9
+        assert row[1] == before
+    
+    @pytest.mark.asyncio
+    async def test_relevance_score_table(self, storage, sample_memory):
+        """Test relevance scores round-trip through memory_relevance without touching metadata."""
+        await storage.store(sample_memory)
+        before = storage.conn.execute(
+            'SELECT metadata, updated_at FROM memories WHERE content_hash = ?', (sample_memory.content_hash,)
+        ).fetchone()
+        
+        score = {"relevance_score": 0.42, "decay_factor": 0.9, "connection_boost": 1.0, "access_boost": 1.2}
+        updated, _ = await storage.update_relevance_scores({sample_memory.content_hash: score, "missing_hash": score})
+        assert updated == 1
+        
+        # Upsert replaces the previous row
+        await storage.update_relevance_scores({sample_memory.content_hash: {**score, "relevance_score": 0.5}})
+        scores = await storage.get_relevance_scores([sample_memory.content_hash])
+        assert scores[sample_memory.content_hash]["relevance_score"] == 0.5
+        assert scores[sample_memory.content_hash]["access_boost"] == 1.2
+        
+        after = storage.conn.execute(
+            'SELECT metadata, updated_at FROM memories WHERE content_hash = ?', (sample_memory.content_hash,)
+        ).fetchone()
+        assert after == before
+        
+        # Deleting the memory drops its score row
+        await storage.delete(sample_memory.content_hash)
+        assert storage.conn.execute('SELECT COUNT(*) FROM memory_relevance').fetchone()[0] == 0
 
 class TestSqliteVecStorageWithoutEmbeddings:
     """Test SQLite-vec storage when sentence transformers is not available."""
@@ -660,7 +983,7 @@ if __name__ == "__main__":
             print(f"Tag search: Found {len(tag_results)} results")
             
             # Get stats
-            stats = storage.get_stats()
+            stats = await storage.get_stats()
             print(f"Stats: {stats['total_memories']} memories, {stats['database_size_mb']} MB")
             
             storage.close()
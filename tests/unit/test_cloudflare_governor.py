@@ -0,0 +1,141 @@
+# Copyright 2024 Heinrich Krupp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the Cloudflare request rate governor."""
+
+import asyncio
+import time
+from email.utils import formatdate
+from unittest.mock import Mock
+
+import pytest
+
+from src.mcp_memory_service.storage.cloudflare_governor import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_CRITICAL,
+    RateGovernor,
+    TokenBucket,
+    api_family,
+    background,
+    request_priority,
+    retry_after_seconds
+)
+
+
+def test_api_family():
+    base = "https://api.cloudflare.com/client/v4/accounts/a"
+    assert api_family(f"{base}/vectorize/v2/indexes/i/query") == "vectorize"
+    assert api_family(f"{base}/d1/database/d/query") == "d1"
+    assert api_family(f"{base}/ai/run/@cf/baai/bge-base-en-v1.5") == "ai"
+    assert api_family(f"{base}/r2/buckets/b/objects/k") == "r2"
+    assert api_family("https://example.com") == "other"
+
+
+def test_retry_after_parsing():
+    assert retry_after_seconds({"retry-after": "3"}) == 3.0
+    assert 8 <= retry_after_seconds({"retry-after": formatdate(time.time() + 10, usegmt=True)}) <= 10
+    assert retry_after_seconds({"ratelimit-remaining": "0", "ratelimit-reset": "7"}) == 7.0
+    assert retry_after_seconds({"ratelimit-remaining": "5", "ratelimit-reset": "7"}) is None
+    assert retry_after_seconds({}) is None
+    assert retry_after_seconds(Mock()) is None
+
+
+@pytest.mark.asyncio
+async def test_bucket_spends_burst_then_paces():
+    bucket = TokenBucket("d1", rate=50, burst=2)
+    
+    started = time.monotonic()
+    for _ in range(4):
+        await bucket.acquire()
+    
+    # Two tokens from the burst, two more at 50/s
+    assert time.monotonic() - started >= 0.035
+    assert bucket.get_stats()["granted"] == 4
+
+
+@pytest.mark.asyncio
+async def test_critical_requests_jump_the_queue():
+    """Test that queued critical requests are served before earlier background ones."""
+    bucket = TokenBucket("d1", rate=100, burst=1)
+    await bucket.acquire()
+    order = []
+    
+    async def request(name, priority):
+        await bucket.acquire(priority)
+        order.append(name)
+    
+    tasks = [asyncio.create_task(request(f"write-{i}", PRIORITY_BACKGROUND)) for i in range(3)]
+    await asyncio.sleep(0)
+    assert bucket.get_stats()["queue_depth"]["background"] == 3
+    tasks.append(asyncio.create_task(request("read", PRIORITY_CRITICAL)))
+    await asyncio.gather(*tasks)
+    
+    assert order[0] == "read"
+    assert order[1:] == ["write-0", "write-1", "write-2"]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_is_skipped():
+    bucket = TokenBucket("ai", rate=100, burst=1)
+    await bucket.acquire()
+    
+    cancelled = asyncio.create_task(bucket.acquire())
+    waiting = asyncio.create_task(bucket.acquire())
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    
+    await asyncio.wait_for(waiting, timeout=1)
+    assert bucket.queue_depth() == 0
+
+
+@pytest.mark.asyncio
+async def test_throttle_pauses_halves_rate_and_recovers():
+    governor = RateGovernor(requests_per_second=20)
+    bucket = governor.bucket("vectorize")
+    
+    governor.observe("vectorize", 429, {"retry-after": "0.1"}, fallback_delay=5)
+    stats = governor.get_stats()["families"]["vectorize"]
+    assert stats["throttled"] == 1
+    assert stats["rate"] == 10
+    assert 0 < stats["paused_seconds"] <= 0.1
+    
+    started = time.monotonic()
+    await governor.acquire("vectorize", PRIORITY_CRITICAL)
+    assert time.monotonic() - started >= 0.09
+    
+    for _ in range(10):
+        governor.observe("vectorize", 200, {}, fallback_delay=5)
+    assert bucket.rate == 20
+    
+    # Exhausted quota hints pause without counting as a throttle
+    governor.observe("vectorize", 200, {"ratelimit-remaining": "0", "ratelimit-reset": "1"}, fallback_delay=5)
+    assert bucket.throttled == 1
+    assert bucket.get_stats()["paused_seconds"] > 0.5
+
+
+@pytest.mark.asyncio
+async def test_background_decorator_and_slots():
+    governor = RateGovernor(background_concurrency=1)
+    
+    @background
+    async def write():
+        assert request_priority.get() == PRIORITY_BACKGROUND
+        async with governor.background_slot():
+            assert governor.get_stats()["background_in_flight"] == 1
+            await asyncio.sleep(0.01)
+    
+    await asyncio.gather(write(), write())
+    
+    assert request_priority.get() == PRIORITY_CRITICAL
+    assert governor.get_stats()["background_in_flight"] == 0
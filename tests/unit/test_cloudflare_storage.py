@@ -16,10 +16,18 @@
 
 import pytest
 import asyncio
+import json
+import re
+import sqlite3
+import threading
+import time
 from unittest.mock import Mock, AsyncMock, patch
 from typing import List
 
+import httpx
+
 from src.mcp_memory_service.storage.cloudflare import CloudflareStorage
+from src.mcp_memory_service.storage.cloudflare_governor import PRIORITY_BACKGROUND, PRIORITY_NORMAL
 from src.mcp_memory_service.models.memory import Memory
 from src.mcp_memory_service.utils.hashing import generate_content_hash
 
@@ -37,6 +45,141 @@ def cloudflare_storage():
     )
 
 
+class FakeCloudflare:
+    """
+    Stand-in for the Cloudflare HTTP APIs, served through an httpx mock transport.
+    
+    D1 statements run against an in-memory SQLite database, Vectorize
+    queries return the configured matches, and R2 objects live in a dict.
+    Every request is logged so tests can count round trips per API.
+    """
+    
+    def __init__(self):
+        self.db = sqlite3.connect(":memory:")
+        self.db.row_factory = sqlite3.Row
+        self.matches = []
+        self.vectors = {}
+        self.ai_batches = []
+        self.ai_error = None
+        self.rate_limited = {}  # API family -> number of 429s still to return
+        self.r2_objects = {}
+        self.r2_delay = 0.0
+        self.r2_in_flight = 0
+        self.r2_max_in_flight = 0
+        self.requests = []
+        self.d1_statements = []
+    
+    def install(self, storage):
+        storage.client = httpx.AsyncClient(transport=httpx.MockTransport(self.handle))
+        return storage
+    
+    def count(self, api):
+        return sum(1 for logged in self.requests if logged == api)
+    
+    def add_memory(self, storage, content, tags=(), r2=False):
+        """Insert a memory row (and tags) directly into the fake D1."""
+        content_hash = generate_content_hash(content)
+        r2_key = f"content/{content_hash}.txt" if r2 else None
+        if r2:
+            self.r2_objects[r2_key] = content
+            content = f"[R2 Content: {r2_key}]"
+        cursor = self.db.execute(
+            "INSERT INTO memories (content_hash, content, memory_type, created_at, created_at_iso, "
+            "metadata_json, vector_id, r2_key) VALUES (?, ?, 'note', 1700000000, '2023-11-14T22:13:20', '{}', ?, ?)",
+            (content_hash, content, f"mem_{content_hash}", r2_key)
+        )
+        for tag in tags:
+            self.db.execute("INSERT OR IGNORE INTO tags (name) VALUES (?)", (tag,))
+            self.db.execute(
+                "INSERT INTO memory_tags (memory_id, tag_id) SELECT ?, id FROM tags WHERE name = ?",
+                (cursor.lastrowid, tag)
+            )
+        self.matches.append({"id": f"mem_{content_hash}", "score": 0.9, "metadata": {"content_hash": content_hash}})
+        return content_hash
+    
+    async def handle(self, request):
+        path = request.url.path
+        for family, remaining in self.rate_limited.items():
+            if remaining and f"/{family}/" in path:
+                self.rate_limited[family] -= 1
+                self.requests.append("429")
+                return httpx.Response(429, headers={"Retry-After": "0.1"}, json={"success": False})
+        if "/ai/run/" in path:
+            self.requests.append("ai")
+            texts = json.loads(request.content)["text"]
+            self.ai_batches.append(texts)
+            if self.ai_error:
+                return httpx.Response(200, json={"success": False, "errors": [{"message": self.ai_error}]})
+            return httpx.Response(200, json={"success": True, "result": {"data": [[0.1, 0.2, 0.3] for _ in texts]}})
+        if path.endswith("/upsert") and "/vectorize/" in path:
+            self.requests.append("vectorize")
+            for line in request.content.decode("utf-8").splitlines():
+                vector = json.loads(line)
+                if vector["id"] not in self.vectors:
+                    self.matches.append({"id": vector["id"], "score": 0.9, "metadata": vector["metadata"]})
+                self.vectors[vector["id"]] = vector
+            return httpx.Response(200, json={"success": True, "result": {"mutationId": "m1"}})
+        if path.endswith("/delete-by-ids") and "/vectorize/" in path:
+            self.requests.append("vectorize")
+            ids = set(json.loads(request.content))
+            self.matches = [match for match in self.matches if match["id"] not in ids]
+            for vector_id in ids:
+                self.vectors.pop(vector_id, None)
+            return httpx.Response(200, json={"success": True, "result": {"mutationId": "m2"}})
+        if path.endswith("/query") and "/vectorize/" in path:
+            self.requests.append("vectorize")
+            top_k = json.loads(request.content)["topK"]
+            return httpx.Response(200, json={"success": True, "result": {"matches": self.matches[:top_k]}})
+        if "/d1/" in path:
+            self.requests.append("d1")
+            body = json.loads(request.content)
+            if "batch" in body:
+                # Batched statements run in one transaction
+                try:
+                    with self.db:
+                        results = [self._run_d1(statement) for statement in body["batch"]]
+                except sqlite3.Error as e:
+                    return httpx.Response(200, json={"success": False, "errors": [{"message": str(e)}]})
+                return httpx.Response(200, json={"success": True, "result": results})
+            return httpx.Response(200, json={"success": True, "result": [self._run_d1(body)]})
+        if "/r2/" in path and request.method == "PUT":
+            self.requests.append("r2")
+            self.r2_objects[re.sub(r"^.*/objects/", "", path)] = request.content.decode("utf-8")
+            return httpx.Response(200)
+        if "/r2/" in path:
+            self.requests.append("r2")
+            key = re.sub(r"^.*/objects/", "", path)
+            self.r2_in_flight += 1
+            self.r2_max_in_flight = max(self.r2_max_in_flight, self.r2_in_flight)
+            try:
+                await asyncio.sleep(self.r2_delay)
+            finally:
+                self.r2_in_flight -= 1
+            if key not in self.r2_objects:
+                return httpx.Response(404)
+            return httpx.Response(200, text=self.r2_objects[key])
+        return httpx.Response(404, json={"success": False})
+    
+    def _run_d1(self, body):
+        self.d1_statements.append(body["sql"])
+        if "params" not in body and body["sql"].count(";") > 1:
+            self.db.executescript(body["sql"])
+            return {"results": [], "meta": {"changes": 0}}
+        cursor = self.db.execute(body["sql"], body.get("params", []))
+        rows = [dict(row) for row in cursor.fetchall()]
+        return {"results": rows, "meta": {"changes": cursor.rowcount, "last_row_id": cursor.lastrowid}}
+
+
+@pytest.fixture
+def cloudflare_api(cloudflare_storage):
+    """A FakeCloudflare wired into cloudflare_storage, with the D1 schema created."""
+    api = FakeCloudflare()
+    api.install(cloudflare_storage)
+    asyncio.run(cloudflare_storage._initialize_d1_schema())
+    api.requests.clear()
+    return api
+
+
 @pytest.fixture
 def sample_memory():
     """Create a sample memory for testing."""
@@ -121,14 +264,15 @@ class TestCloudflareStorage:
         
         # Mock rate limited response followed by success
         responses = [
-            Mock(status_code=429, raise_for_status=Mock(side_effect=httpx.HTTPStatusError("Rate limited", request=Mock(), response=Mock()))),
-            Mock(status_code=200, raise_for_status=Mock(), json=Mock(return_value={"success": True}))
+            Mock(status_code=429, headers={}, raise_for_status=Mock(side_effect=httpx.HTTPStatusError("Rate limited", request=Mock(), response=Mock()))),
+            Mock(status_code=200, headers={}, raise_for_status=Mock(), json=Mock(return_value={"success": True}))
         ]
+        cloudflare_storage.base_delay = 0.01  # Speed up test
         
         with patch('httpx.AsyncClient.request', side_effect=responses):
-            with patch('asyncio.sleep'):  # Speed up test
-                response = await cloudflare_storage._retry_request("GET", "https://test.com")
-                assert response.status_code == 200
+            response = await cloudflare_storage._retry_request("GET", "https://test.com")
+            assert response.status_code == 200
+            assert cloudflare_storage.rate_governor.get_stats()["families"]["other"]["throttled"] == 1
     
     @pytest.mark.asyncio
     async def test_initialization_schema_creation(self, cloudflare_storage):
@@ -158,9 +302,9 @@ class TestCloudflareStorage:
         mock_vectorize_response = Mock()
         mock_vectorize_response.json.return_value = {"success": True}
         
-        with patch.object(cloudflare_storage, '_generate_embedding', return_value=mock_embedding):
+        with patch.object(cloudflare_storage, '_generate_embeddings', return_value=[mock_embedding]):
             with patch.object(cloudflare_storage, '_retry_request') as mock_request:
-                mock_request.side_effect = [mock_vectorize_response, mock_d1_response, mock_d1_response]
+                mock_request.side_effect = [mock_d1_response, mock_vectorize_response, mock_d1_response]
                 
                 success, message = await cloudflare_storage.store(sample_memory)
                 
@@ -187,7 +331,7 @@ class TestCloudflareStorage:
         mock_response.json.return_value = {"success": True, "result": [{"meta": {"last_row_id": 123}}]}
         mock_response.status_code = 200
         
-        with patch.object(cloudflare_storage, '_generate_embedding', return_value=mock_embedding):
+        with patch.object(cloudflare_storage, '_generate_embeddings', return_value=[mock_embedding]):
             with patch.object(cloudflare_storage, '_retry_request', return_value=mock_response):
                 success, message = await cloudflare_storage.store(memory)
                 
@@ -360,11 +504,605 @@ class TestCloudflareStorage:
         # Create a mock client
         mock_client = AsyncMock()
         cloudflare_storage.client = mock_client
-        cloudflare_storage._embedding_cache = {"test": [1, 2, 3]}
+        cloudflare_storage._embedding_cache.put("test", [1, 2, 3])
         
         await cloudflare_storage.close()
         
         # Verify client was closed and cache cleared
         mock_client.aclose.assert_called_once()
         assert cloudflare_storage.client is None
-        assert len(cloudflare_storage._embedding_cache) == 0
\ No newline at end of file
+        assert len(cloudflare_storage._embedding_cache) == 0
+
+
+class TestCloudflareBatchedRetrieval:
+    """Test retrieval against a local mock of the Cloudflare APIs."""
+    
+    @pytest.mark.asyncio
+    async def test_retrieve_hydrates_matches_in_one_d1_query(self, cloudflare_storage, cloudflare_api):
+        """Test that top-k retrieval costs one D1 query regardless of k."""
+        hashes = [
+            cloudflare_api.add_memory(cloudflare_storage, f"memory {i}", tags=["shared", f"tag-{i}", "a,b"])
+            for i in range(10)
+        ]
+        large_hash = cloudflare_api.add_memory(cloudflare_storage, "large memory", tags=["r2"], r2=True)
+        
+        results = await cloudflare_storage.retrieve("query", n_results=11)
+        
+        assert [r.memory.content_hash for r in results] == hashes + [large_hash]
+        assert sorted(results[3].memory.tags) == ["a,b", "shared", "tag-3"]
+        assert results[-1].memory.content == "large memory"
+        assert results[-1].memory.tags == ["r2"]
+        assert results[0].similarity_score == 0.9
+        assert cloudflare_api.count("vectorize") == 1
+        assert cloudflare_api.count("d1") == 1
+        assert cloudflare_api.count("r2") == 1
+    
+    @pytest.mark.asyncio
+    async def test_row_cache_serves_repeat_queries_until_invalidated(self, cloudflare_storage, cloudflare_api):
+        """Test that cached rows skip D1 and writes through the storage invalidate them."""
+        content_hash = cloudflare_api.add_memory(cloudflare_storage, "cached memory", tags=["one"], r2=True)
+        
+        await cloudflare_storage.retrieve("query")
+        results = await cloudflare_storage.retrieve("query")
+        
+        assert results[0].memory.content == "cached memory"
+        assert cloudflare_api.count("d1") == 1
+        assert cloudflare_api.count("r2") == 1
+        
+        # Callers may mutate returned memories without affecting the cache
+        results[0].memory.tags.append("mutated")
+        
+        success, _ = await cloudflare_storage.update_memory_metadata(content_hash, {"tags": ["two"]})
+        assert success
+        d1_before = cloudflare_api.count("d1")
+        
+        results = await cloudflare_storage.retrieve("query")
+        
+        assert results[0].memory.tags == ["two"]
+        assert cloudflare_api.count("d1") == d1_before + 1
+    
+    @pytest.mark.asyncio
+    async def test_row_cache_respects_size_and_ttl(self, cloudflare_storage, cloudflare_api):
+        cloudflare_storage.row_cache_size = 2
+        hashes = [cloudflare_api.add_memory(cloudflare_storage, f"memory {i}") for i in range(3)]
+        
+        await cloudflare_storage.retrieve("query", n_results=3)
+        assert list(cloudflare_storage._row_cache) == hashes[1:]
+        
+        cloudflare_storage.row_cache_ttl = 0
+        await asyncio.sleep(0.01)
+        await cloudflare_storage.retrieve("query", n_results=3)
+        assert cloudflare_api.count("d1") == 2
+    
+    @pytest.mark.asyncio
+    async def test_r2_reads_are_concurrent_and_bounded(self, cloudflare_api):
+        """Test that R2 bodies are fetched concurrently, up to r2_max_concurrency."""
+        storage = cloudflare_api.install(CloudflareStorage(
+            api_token="test-token",
+            account_id="test-account",
+            vectorize_index="test-index",
+            d1_database_id="test-db",
+            r2_bucket="test-bucket",
+            r2_max_concurrency=2
+        ))
+        cloudflare_api.r2_delay = 0.02
+        for i in range(6):
+            cloudflare_api.add_memory(storage, f"large memory {i}", r2=True)
+        
+        memories = await storage.search_by_tag(["missing"])
+        assert memories == []
+        results = await storage.retrieve("query", n_results=6)
+        
+        assert len(results) == 6
+        assert cloudflare_api.r2_max_in_flight == 2
+    
+    @pytest.mark.asyncio
+    async def test_search_by_tag_and_recent_join_tags(self, cloudflare_storage, cloudflare_api):
+        cloudflare_api.add_memory(cloudflare_storage, "first", tags=["x", "y"])
+        cloudflare_api.add_memory(cloudflare_storage, "second", tags=["y"])
+        
+        tagged = await cloudflare_storage.search_by_tag(["x"])
+        recent = await cloudflare_storage.get_recent_memories(5)
+        
+        assert [m.content for m in tagged] == ["first"]
+        assert sorted(tagged[0].tags) == ["x", "y"]
+        assert {m.content for m in recent} == {"first", "second"}
+        assert cloudflare_api.count("d1") == 2
+    
+    @pytest.mark.asyncio
+    async def test_search_filtered_widens_until_enough_matches(self, cloudflare_storage, cloudflare_api):
+        """Test the default filtered search keeps widening top-k past non-matching neighbours."""
+        for i in range(8):
+            cloudflare_api.add_memory(cloudflare_storage, f"unrelated {i}", tags=["other"])
+        wanted = [cloudflare_api.add_memory(cloudflare_storage, f"wanted {i}", tags=["x"]) for i in range(2)]
+        
+        results = await cloudflare_storage.search_filtered("query", n_results=2, tags=["x"])
+        
+        assert [r.memory.content_hash for r in results] == wanted
+        assert cloudflare_api.count("vectorize") == 3  # top-k of 2, 8, then 32
+        
+        # The index running out ends the search with whatever matched
+        results = await cloudflare_storage.search_filtered("query", n_results=5, memory_type="fact")
+        assert results == []
+
+
+
+class TestCloudflareBatchedWrites:
+    """Test the bulk write path against a local mock of the Cloudflare APIs."""
+    
+    @staticmethod
+    def make_memories(count, tags=("shared",)):
+        return [
+            Memory(
+                content=f"batch memory {i}",
+                content_hash=generate_content_hash(f"batch memory {i}"),
+                tags=list(tags) + [f"tag-{i}"],
+                memory_type="note"
+            )
+            for i in range(count)
+        ]
+    
+    @pytest.mark.asyncio
+    async def test_store_batch_uses_a_handful_of_requests(self, cloudflare_storage, cloudflare_api):
+        """Test that 150 tagged memories cost a constant number of requests."""
+        memories = self.make_memories(150)
+        
+        results = await cloudflare_storage.store_batch(memories)
+        
+        assert all(success for success, _ in results)
+        assert cloudflare_api.count("ai") == 2  # 100 + 50 texts
+        assert cloudflare_api.count("vectorize") == 1
+        assert cloudflare_api.count("d1") == 3  # 2 duplicate checks + 1 batch
+        assert len(cloudflare_api.vectors) == 150
+        
+        stored = await cloudflare_storage.search_by_tag(["tag-42"])
+        assert [m.content for m in stored] == ["batch memory 42"]
+        assert sorted(stored[0].tags) == ["shared", "tag-42"]
+        assert len(await cloudflare_storage.search_by_tag(["shared"])) == 150
+    
+    @pytest.mark.asyncio
+    async def test_store_batch_reports_duplicates_per_memory(self, cloudflare_storage, cloudflare_api):
+        memories = self.make_memories(3)
+        await cloudflare_storage.store_batch(memories[:1])
+        cloudflare_api.requests.clear()
+        
+        results = await cloudflare_storage.store_batch(memories + memories[1:2])
+        
+        assert [success for success, _ in results] == [False, True, True, False]
+        assert results[0][1] == "Duplicate content detected"
+        assert len(cloudflare_api.vectors) == 3
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_stores_share_one_flush(self, cloudflare_storage, cloudflare_api):
+        """Test that the write buffer groups concurrent store() calls."""
+        memories = self.make_memories(5)
+        
+        results = await asyncio.gather(*(cloudflare_storage.store(memory) for memory in memories))
+        
+        assert all(success for success, _ in results)
+        assert cloudflare_api.count("ai") == 1
+        assert cloudflare_api.count("vectorize") == 1
+        assert cloudflare_api.count("d1") == 2
+    
+    @pytest.mark.asyncio
+    async def test_lone_store_does_not_wait_for_the_window(self, cloudflare_storage, cloudflare_api):
+        """Test that a store() with no other write in flight is flushed at once, at normal priority."""
+        cloudflare_storage._write_buffer.max_delay = 5
+        priorities = []
+        acquire = cloudflare_storage.rate_governor.acquire
+        
+        async def record(family, priority):
+            priorities.append(priority)
+            return await acquire(family, priority)
+        cloudflare_storage.rate_governor.acquire = record
+        
+        success, _ = await asyncio.wait_for(cloudflare_storage.store(self.make_memories(1)[0]), timeout=1)
+        
+        assert success
+        assert set(priorities) == {PRIORITY_NORMAL}
+    
+    @pytest.mark.asyncio
+    async def test_stores_wait_for_the_window_behind_a_flush(self, cloudflare_storage, cloudflare_api):
+        """Test that stores arriving during a flush are grouped into the next one."""
+        memories = self.make_memories(4)
+        
+        first = asyncio.create_task(cloudflare_storage.store(memories[0]))
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        results = await asyncio.gather(first, *(cloudflare_storage.store(memory) for memory in memories[1:]))
+        
+        assert all(success for success, _ in results)
+        assert cloudflare_storage._write_buffer.batches == 2
+        assert cloudflare_api.count("vectorize") == 2
+    
+    @pytest.mark.asyncio
+    async def test_failed_d1_batch_fails_its_memories(self, cloudflare_storage, cloudflare_api):
+        cloudflare_api.db.execute("DROP TABLE memory_tags")
+        
+        results = await cloudflare_storage.store_batch(self.make_memories(2))
+        
+        assert [success for success, _ in results] == [False, False]
+        assert "D1 batch failed" in results[0][1]
+        assert cloudflare_api.db.execute("SELECT COUNT(*) FROM memories").fetchone()[0] == 0
+    
+    @pytest.mark.asyncio
+    async def test_large_content_goes_to_r2(self, cloudflare_storage, cloudflare_api):
+        cloudflare_storage.large_content_threshold = 10
+        memory = Memory(content="x" * 50, content_hash=generate_content_hash("x" * 50), tags=[])
+        
+        success, _ = await cloudflare_storage.store(memory)
+        
+        assert success
+        assert cloudflare_api.r2_objects[f"content/{memory.content_hash}.txt"] == "x" * 50
+        results = await cloudflare_storage.retrieve("x")
+        assert results[0].memory.content == "x" * 50
+
+
+
+class TestCloudflareEmbeddingBatching:
+    """Test coalescing of Workers AI embedding requests."""
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_share_one_call(self, cloudflare_storage, cloudflare_api):
+        """Test that distinct texts are batched and identical texts are single-flighted."""
+        texts = ["alpha", "beta", "alpha", "gamma", "beta"]
+        
+        embeddings = await asyncio.gather(*(cloudflare_storage._generate_embedding(text) for text in texts))
+        
+        assert len(embeddings) == 5
+        assert cloudflare_api.ai_batches == [["alpha", "beta", "gamma"]]
+        assert cloudflare_storage._embeddings_in_flight == {}
+        
+        stats = await cloudflare_storage.get_stats()
+        assert stats["embedding_batching"] == {"requests": 1, "texts": 3, "coalesced": 2}
+        
+        # Later requests are answered from the embedding cache
+        await cloudflare_storage._generate_embedding("alpha")
+        assert len(cloudflare_api.ai_batches) == 1
+    
+    @pytest.mark.asyncio
+    async def test_batches_are_capped(self, cloudflare_api):
+        storage = cloudflare_api.install(CloudflareStorage(
+            api_token="test-token",
+            account_id="test-account",
+            vectorize_index="test-index",
+            d1_database_id="test-db",
+            embedding_batch_size=4
+        ))
+        
+        await storage._generate_embeddings([f"text {i}" for i in range(10)])
+        
+        assert [len(batch) for batch in cloudflare_api.ai_batches] == [4, 4, 2]
+    
+    @pytest.mark.asyncio
+    async def test_failure_reaches_every_caller(self, cloudflare_storage, cloudflare_api):
+        cloudflare_api.ai_error = "quota exceeded"
+        
+        results = await asyncio.gather(
+            cloudflare_storage._generate_embedding("one"),
+            cloudflare_storage._generate_embedding("one"),
+            cloudflare_storage._generate_embedding("two"),
+            return_exceptions=True
+        )
+        
+        assert all(isinstance(result, ValueError) for result in results)
+        assert "quota exceeded" in str(results[0])
+        assert len(cloudflare_api.ai_batches) == 1
+        
+        # Failures are not cached
+        cloudflare_api.ai_error = None
+        assert len(await cloudflare_storage._generate_embedding("one")) == 3
+    
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_does_not_cancel_others(self, cloudflare_storage, cloudflare_api):
+        first = asyncio.ensure_future(cloudflare_storage._generate_embedding("shared"))
+        second = asyncio.ensure_future(cloudflare_storage._generate_embedding("shared"))
+        await asyncio.sleep(0)
+        first.cancel()
+        
+        assert len(await second) == 3
+        assert len(cloudflare_api.ai_batches) == 1
+
+
+
+class TestCloudflareRateGovernor:
+    """Test rate governing of the storage's requests."""
+    
+    @pytest.mark.asyncio
+    async def test_retry_after_is_honoured(self, cloudflare_storage, cloudflare_api):
+        """Test that a 429 pauses the API family for the Retry-After interval."""
+        cloudflare_api.add_memory(cloudflare_storage, "throttled memory")
+        cloudflare_api.rate_limited["d1"] = 1
+        
+        started = time.monotonic()
+        results = await cloudflare_storage.retrieve("query")
+        
+        assert results[0].memory.content == "throttled memory"
+        assert time.monotonic() - started >= 0.09
+        stats = (await cloudflare_storage.get_stats())["rate_limits"]["families"]
+        assert stats["d1"]["throttled"] == 1
+        assert stats["vectorize"]["throttled"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_reads_overtake_queued_writes(self, cloudflare_api):
+        """Test that a retrieval queued behind a bulk write is served first."""
+        storage = cloudflare_api.install(CloudflareStorage(
+            api_token="test-token",
+            account_id="test-account",
+            vectorize_index="test-index",
+            d1_database_id="test-db",
+            requests_per_second=20
+        ))
+        bucket = storage.rate_governor.bucket("d1")
+        bucket.tokens = 0
+        cloudflare_api.add_memory(storage, "existing memory")
+        
+        writes = asyncio.create_task(storage.store_batch(TestCloudflareBatchedWrites.make_memories(3)))
+        await asyncio.sleep(0.01)
+        assert bucket.get_stats()["queue_depth"]["background"] == 1
+        
+        results = await storage.retrieve("query")
+        
+        # The read took the first D1 token although the write was queued before it
+        assert results[0].memory.content == "existing memory"
+        assert not writes.done()
+        
+        write_results = await writes
+        assert all(success for success, _ in write_results)
+    
+    @pytest.mark.asyncio
+    async def test_interactive_writes_are_not_background(self, cloudflare_storage, cloudflare_api):
+        """Test that user-facing metadata updates are not queued behind bulk work."""
+        content_hash = cloudflare_api.add_memory(cloudflare_storage, "tagged memory")
+        priorities = []
+        acquire = cloudflare_storage.rate_governor.acquire
+        
+        async def record(family, priority):
+            priorities.append(priority)
+            return await acquire(family, priority)
+        cloudflare_storage.rate_governor.acquire = record
+        
+        success, _ = await cloudflare_storage.update_memory_metadata(content_hash, {"memory_type": "fact"})
+        await cloudflare_storage.store_batch(TestCloudflareBatchedWrites.make_memories(1))
+        
+        assert success
+        assert priorities[0] != PRIORITY_BACKGROUND
+        assert priorities[-1] == PRIORITY_BACKGROUND
+
+
+class TestCloudflareReplica:
+    """Test the local read-through replica of the D1 tables."""
+    
+    @pytest.fixture
+    def replicated(self, cloudflare_api, tmp_path):
+        storage = cloudflare_api.install(CloudflareStorage(
+            api_token="test-token",
+            account_id="test-account",
+            vectorize_index="test-index",
+            d1_database_id="test-db",
+            replica_path=str(tmp_path / "replica.db")
+        ))
+        yield storage
+        if storage._replica_sync is not None and not storage._replica_sync.done():
+            storage._replica_sync.cancel()
+        asyncio.run(storage.replica.close())
+    
+    @staticmethod
+    def touch(api, content_hash, updated_at):
+        api.db.execute("UPDATE memories SET updated_at = ? WHERE content_hash = ?", (updated_at, content_hash))
+    
+    @staticmethod
+    async def sync(storage):
+        """Wait for the replica sync started by an earlier read."""
+        await storage._replica_sync
+        assert await storage.replica.refreshed_at() is not None
+    
+    @pytest.mark.asyncio
+    async def test_reads_are_served_locally_after_sync(self, replicated, cloudflare_api):
+        """Test that tag, recency, tag-list and stats queries stop hitting D1 once synced."""
+        first = cloudflare_api.add_memory(replicated, "first memory", tags=["alpha", "shared"])
+        cloudflare_api.add_memory(replicated, "second memory", tags=["shared"])
+        self.touch(cloudflare_api, first, 1700000100)
+        
+        # The first read is answered by D1 and starts the sync in the background
+        assert [m.content for m in await replicated.search_by_tag(["alpha"])] == ["first memory"]
+        await self.sync(replicated)
+        cloudflare_api.requests.clear()
+        
+        assert len(await replicated.search_by_tag(["shared"])) == 2
+        assert len(await replicated.get_recent_memories(5)) == 2
+        assert await replicated.get_all_tags() == ["alpha", "shared"]
+        stats = await replicated.get_stats()
+        
+        assert cloudflare_api.count("d1") == 0
+        assert stats["total_memories"] == 2
+        assert stats["replica"]["refreshes"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_stale_replica_pulls_only_changed_rows(self, replicated, cloudflare_api):
+        first = cloudflare_api.add_memory(replicated, "first memory", tags=["alpha"])
+        self.touch(cloudflare_api, first, 1700000100)
+        await replicated.get_recent_memories(5)
+        await self.sync(replicated)
+        
+        replicated.replica_max_staleness = 0
+        second = cloudflare_api.add_memory(replicated, "second memory", tags=["alpha"])
+        self.touch(cloudflare_api, second, 1700000200)
+        cloudflare_api.db.execute("UPDATE memories SET memory_type = 'changed' WHERE content_hash = ?", (first,))
+        
+        # The stale replica is served while it refreshes in the background
+        assert [m.content for m in await replicated.search_by_tag(["alpha"])] == ["first memory"]
+        await self.sync(replicated)
+        memories = await replicated.search_by_tag(["alpha"])
+        
+        # The second memory is past the watermark; the untouched edit to the first is not
+        assert sorted(m.content for m in memories) == ["first memory", "second memory"]
+        assert {m.content_hash: m.memory_type for m in memories}[first] == "note"
+        assert (await replicated.replica.get_watermark())[0] == 1700000200
+    
+    @pytest.mark.asyncio
+    async def test_remote_deletes_are_reconciled(self, replicated, cloudflare_api):
+        doomed = cloudflare_api.add_memory(replicated, "doomed memory", tags=["alpha"])
+        cloudflare_api.add_memory(replicated, "kept memory", tags=["alpha"])
+        await replicated.get_all_tags()
+        await self.sync(replicated)
+        
+        replicated.replica_max_staleness = 0
+        cloudflare_api.db.execute("DELETE FROM memories WHERE content_hash = ?", (doomed,))
+        await replicated.search_by_tag(["alpha"])
+        await self.sync(replicated)
+        
+        assert [m.content for m in await replicated.search_by_tag(["alpha"])] == ["kept memory"]
+        assert await replicated.replica.count() == 1
+    
+    @pytest.mark.asyncio
+    async def test_writes_go_through_to_the_replica(self, replicated, cloudflare_api):
+        await replicated.get_stats()
+        await self.sync(replicated)
+        memory = TestCloudflareBatchedWrites.make_memories(1)[0]
+        
+        success, _ = await replicated.store(memory)
+        assert success
+        assert [m.content for m in await replicated.search_by_tag(["tag-0"])] == [memory.content]
+        
+        success, _ = await replicated.update_memory_metadata(
+            memory.content_hash, {"memory_type": "fact", "tags": ["renamed"]}
+        )
+        assert success
+        updated = await replicated.search_by_tag(["renamed"])
+        assert updated[0].memory_type == "fact"
+        assert await replicated.search_by_tag(["tag-0"]) == []
+        
+        success, _ = await replicated.delete(memory.content_hash)
+        assert success
+        assert await replicated.get_recent_memories(5) == []
+        assert await replicated.replica.count() == 0
+    
+    @pytest.mark.asyncio
+    async def test_bulk_metadata_patches_merge_and_can_skip_touch(self, replicated, cloudflare_api):
+        first = cloudflare_api.add_memory(replicated, "first memory", tags=["alpha"])
+        second = cloudflare_api.add_memory(replicated, "second memory", tags=["alpha"])
+        cloudflare_api.db.execute("UPDATE memories SET metadata_json = '{\"source\": \"import\"}'")
+        self.touch(cloudflare_api, first, 1700000100)
+        self.touch(cloudflare_api, second, 1700000100)
+        await replicated.get_all_tags()
+        await self.sync(replicated)
+
+        updated, _ = await replicated.update_memories_metadata(
+            {first: {"relevance_score": 0.5}, second: {"relevance_score": 0.25}}, touch=False
+        )
+
+        assert updated == 2
+        rows = cloudflare_api.db.execute("SELECT content_hash, metadata_json, updated_at FROM memories").fetchall()
+        for content_hash, metadata_json, updated_at in rows:
+            assert json.loads(metadata_json)["source"] == "import"
+            assert updated_at == 1700000100
+        memories = {m.content_hash: m for m in await replicated.search_by_tag(["alpha"])}
+        assert memories[first].metadata == {"source": "import", "relevance_score": 0.5}
+        assert memories[first].updated_at == 1700000100
+
+        await replicated.update_memories_metadata({first: {"relevance_score": 0.75}})
+        memories = {m.content_hash: m for m in await replicated.search_by_tag(["alpha"])}
+        assert memories[first].metadata["relevance_score"] == 0.75
+        assert memories[first].updated_at > 1700000100
+        assert memories[second].updated_at == 1700000100
+
+    @pytest.mark.asyncio
+    async def test_failed_first_sync_falls_back_to_d1(self, replicated, cloudflare_api):
+        cloudflare_api.add_memory(replicated, "only memory", tags=["alpha"])
+        replicated.max_retries = 0
+        with patch.object(replicated, "_refresh_replica", AsyncMock(side_effect=ValueError("boom"))):
+            memories = await replicated.search_by_tag(["alpha"])
+            await replicated._replica_sync
+        
+        assert [m.content for m in memories] == ["only memory"]
+        assert await replicated.replica.refreshed_at() is None
+        assert replicated._replica_refresh_failures == 1
+        
+        # The next read tries again
+        assert [m.content for m in await replicated.search_by_tag(["alpha"])] == ["only memory"]
+        await self.sync(replicated)
+    
+    @pytest.mark.asyncio
+    async def test_initialize_starts_the_first_sync_in_the_background(self, replicated, cloudflare_api):
+        cloudflare_api.add_memory(replicated, "only memory", tags=["alpha"])
+        
+        with patch.object(replicated, "_verify_vectorize_index", AsyncMock()):
+            await replicated.initialize()
+        assert replicated._replica_sync is not None
+        await self.sync(replicated)
+        cloudflare_api.requests.clear()
+        
+        assert [m.content for m in await replicated.search_by_tag(["alpha"])] == ["only memory"]
+        assert cloudflare_api.count("d1") == 0
+    
+    @pytest.mark.asyncio
+    async def test_reconcile_narrows_to_the_changed_ranges(self, replicated, cloudflare_api):
+        """Test that a remote delete is found without listing every content hash in D1."""
+        hashes = []
+        for i in range(1200):
+            content_hash = cloudflare_api.add_memory(replicated, f"memory {i}")
+            self.touch(cloudflare_api, content_hash, 1700000000 + i)
+            hashes.append(content_hash)
+        await replicated.get_all_tags()
+        await self.sync(replicated)
+        
+        replicated.replica_max_staleness = 0
+        cloudflare_api.db.execute("DELETE FROM memories WHERE content_hash = ?", (hashes[700],))
+        cloudflare_api.d1_statements.clear()
+        await replicated.get_all_tags()
+        await self.sync(replicated)
+        
+        assert await replicated.replica.count() == 1199
+        assert await replicated.replica.memories_by_hash([hashes[700]]) == []
+        listings = [sql for sql in cloudflare_api.d1_statements if "SELECT content_hash FROM memories" in sql]
+        assert listings and all("WHERE" in sql for sql in listings)
+    
+    @pytest.mark.asyncio
+    async def test_delete_by_tag_finds_targets_in_d1(self, replicated, cloudflare_api):
+        """Test that memories tagged after the last sync are deleted although the replica lacks them."""
+        cloudflare_api.add_memory(replicated, "synced memory", tags=["alpha"])
+        await replicated.get_all_tags()
+        await self.sync(replicated)
+        cloudflare_api.add_memory(replicated, "unsynced memory", tags=["alpha"])
+        
+        count, _ = await replicated.delete_by_tag("alpha")
+        
+        assert count == 2
+        assert cloudflare_api.db.execute("SELECT COUNT(*) FROM memories").fetchone()[0] == 0
+        assert await replicated.replica.count() == 0
+    
+    @pytest.mark.asyncio
+    async def test_cleanup_duplicates_writes_through(self, replicated, cloudflare_api):
+        duplicate = cloudflare_api.add_memory(replicated, "duplicated memory", tags=["alpha"])
+        await replicated.get_all_tags()
+        await self.sync(replicated)
+        
+        find = Mock()
+        find.json.return_value = {"success": True, "result": [{"results": [{"content_hash": duplicate, "count": 2, "keep_id": 1}]}]}
+        delete = Mock()
+        delete.json.return_value = {"success": True, "result": [{"meta": {"changes": 1}}]}
+        with patch.object(replicated, "_retry_request", AsyncMock(side_effect=[find, delete])):
+            count, _ = await replicated.cleanup_duplicates()
+        
+        assert count == 1
+        assert await replicated.replica.memories_by_hash([duplicate]) == []
+    
+    @pytest.mark.asyncio
+    async def test_replica_runs_off_the_event_loop(self, replicated):
+        """Test that replica queries run on the replica's own thread."""
+        replica = replicated.replica
+        await replica.count()
+        conn, threads = replica._conn, set()
+        
+        class RecordingConnection:
+            def execute(self, *args):
+                threads.add(threading.current_thread().name)
+                return conn.execute(*args)
+        replica._conn = RecordingConnection()
+        
+        await replica.count()
+        await replica.search_by_tags(["alpha"])
+        replica._conn = conn
+        
+        assert len(threads) == 1 and threads.pop().startswith("d1-replica")
@@ -0,0 +1,71 @@
+"""Tests that the database health utilities keep SQLite work off the event loop."""
+
+import sqlite3
+import threading
+
+import pytest
+import pytest_asyncio
+
+from mcp_memory_service.storage.sqlite_executor import SqliteExecutor
+from mcp_memory_service.storage.sqlite_vec import SqliteVecMemoryStorage
+from mcp_memory_service.utils.db_utils import (
+    check_sqlite_vec_health,
+    get_database_stats,
+    repair_database,
+    validate_database
+)
+
+
+class LoopGuardedConnection:
+    """Stands in for storage.conn and fails the test if it is used on the event loop thread."""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._loop_thread = threading.get_ident()
+
+    def __getattr__(self, name):
+        assert threading.get_ident() != self._loop_thread, f"storage.conn.{name} used on the event loop"
+        return getattr(self._conn, name)
+
+
+def create_plain_vector_table(conn):
+    # The vec0 module is not needed to check where the DDL runs
+    conn.execute('CREATE TABLE IF NOT EXISTS memory_embeddings (rowid INTEGER PRIMARY KEY, content_embedding BLOB)')
+
+
+@pytest_asyncio.fixture
+async def storage(tmp_path, monkeypatch):
+    path = str(tmp_path / "memories.db")
+    storage = SqliteVecMemoryStorage(path)
+    monkeypatch.setattr(storage, '_create_vector_table', create_plain_vector_table)
+
+    executor = SqliteExecutor(path, lambda read_only: sqlite3.connect(path, check_same_thread=False))
+    storage._db = executor
+    storage.conn = LoopGuardedConnection(await executor.start())
+    await storage._execute_with_retry(storage._create_memories_table)
+    await storage._execute_with_retry(storage._create_tags_table)
+    yield storage
+    executor.close()
+
+
+@pytest.mark.asyncio
+async def test_health_check_reads_through_the_executor(storage):
+    is_valid, message, stats = await check_sqlite_vec_health(storage)
+
+    assert is_valid, message
+    assert stats["total_memories"] == 0
+    assert stats["has_embedding_tables"] is False
+
+    assert (await validate_database(storage))[0]
+    assert (await get_database_stats(storage))["status"] == "healthy"
+
+
+@pytest.mark.asyncio
+async def test_repair_runs_ddl_on_the_writer_thread(storage):
+    await storage._execute_with_retry(lambda conn: conn.execute('DROP TABLE memory_tags'))
+
+    repaired, message = await repair_database(storage)
+
+    assert repaired, message
+    tables = {row[0] for row in await storage._fetchall("SELECT name FROM sqlite_master WHERE type='table'")}
+    assert {'memories', 'memory_tags', 'memory_embeddings'} <= tables
@@ -0,0 +1,158 @@
+# Copyright 2024 Heinrich Krupp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the shared embedding cache."""
+
+import os
+import sqlite3
+import tempfile
+
+import pytest
+
+from src.mcp_memory_service.embeddings.cache import EmbeddingCache
+
+
+def test_keys_are_stable_and_model_specific():
+    """Keys do not depend on the process hash seed and differ per model."""
+    key = EmbeddingCache.make_key("model-a", "hello")
+    assert key == EmbeddingCache.make_key("model-a", "hello")
+    assert key != EmbeddingCache.make_key("model-b", "hello")
+    assert len(key) == 64
+
+
+def test_get_put_roundtrip_and_counters():
+    cache = EmbeddingCache("model", max_entries=10)
+    assert cache.get("text") is None
+
+    cache.put("text", [0.1, 0.2, 0.3])
+    assert cache.get("text") == [0.1, 0.2, 0.3]
+    assert "text" in cache
+
+    stats = cache.get_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["entries"] == 1
+    assert stats["hit_ratio"] == 0.5
+
+
+def test_lru_eviction_by_entries():
+    cache = EmbeddingCache("model", max_entries=2)
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+    cache.get("a")  # "b" becomes least recently used
+    cache.put("c", [3.0])
+
+    assert cache.get("b") is None
+    assert cache.get("a") == [1.0]
+    assert cache.get("c") == [3.0]
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_eviction_by_bytes():
+    # Each 384-dim entry takes a bit over 3 KB
+    cache = EmbeddingCache("model", max_entries=1000, max_bytes=10 * 1024)
+    for i in range(10):
+        cache.put(f"text {i}", [float(i)] * 384)
+
+    stats = cache.get_stats()
+    assert stats["bytes"] <= 10 * 1024
+    assert stats["entries"] == 3
+    assert cache.get("text 9") is not None
+    assert cache.get("text 0") is None
+
+
+def test_persistent_tier_survives_restart():
+    temp_dir = tempfile.mkdtemp()
+    path = os.path.join(temp_dir, "embedding_cache.db")
+
+    cache = EmbeddingCache("model", persist_path=path)
+    cache.put_many([("first", [0.5, 0.25]), ("second", [1.0, 2.0])])
+    cache.close()
+
+    restarted = EmbeddingCache("model", persist_path=path)
+    assert restarted.get("first") == [0.5, 0.25]
+    stats = restarted.get_stats()
+    assert stats["persistent_hits"] == 1
+    assert stats["persistent_entries"] == 2
+
+    # Another model never sees these entries
+    other_model = EmbeddingCache("other-model", persist_path=path)
+    assert other_model.get("first") is None
+
+    restarted.clear(persistent=True)
+    assert restarted.get_stats()["persistent_entries"] == 0
+    restarted.close()
+    other_model.close()
+
+
+def test_persistent_hits_batch_their_recency_updates():
+    temp_dir = tempfile.mkdtemp()
+    path = os.path.join(temp_dir, "embedding_cache.db")
+
+    cache = EmbeddingCache("model", persist_path=path)
+    cache.put("first", [0.5, 0.25])
+    cache.close()
+
+    def last_used():
+        conn = sqlite3.connect(path)
+        try:
+            return conn.execute("SELECT last_used FROM embedding_cache").fetchone()[0]
+        finally:
+            conn.close()
+
+    stored = last_used()
+    restarted = EmbeddingCache("model", persist_path=path)
+    assert restarted.get("first") == [0.5, 0.25]
+    # A hit does not write; the recency update is flushed later
+    assert last_used() == stored
+    restarted.close()
+    assert last_used() > stored
+
+
+@pytest.mark.asyncio
+async def test_aget_reads_the_persistent_tier():
+    temp_dir = tempfile.mkdtemp()
+    path = os.path.join(temp_dir, "embedding_cache.db")
+
+    cache = EmbeddingCache("model", persist_path=path)
+    cache.put("first", [0.5, 0.25])
+    cache.close()
+
+    restarted = EmbeddingCache("model", persist_path=path)
+    assert await restarted.aget("first") == [0.5, 0.25]
+    assert await restarted.aget("first") == [0.5, 0.25]
+    assert await restarted.aget("missing") is None
+
+    stats = restarted.get_stats()
+    assert stats["persistent_hits"] == 1
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    restarted.close()
+
+
+@pytest.mark.asyncio
+async def test_aput_many_persists_off_the_event_loop():
+    temp_dir = tempfile.mkdtemp()
+    path = os.path.join(temp_dir, "embedding_cache.db")
+
+    cache = EmbeddingCache("model", persist_path=path)
+    await cache.aput_many([("first", [0.5]), ("second", [0.25])])
+    assert cache.get("first") == [0.5]
+    stats = await cache.aget_stats()
+    assert stats["persistent_entries"] == 2
+    cache.close()
+
+    restarted = EmbeddingCache("model", persist_path=path)
+    assert await restarted.aget("second") == [0.25]
+    restarted.close()
@@ -0,0 +1,188 @@
+# Copyright 2024 Heinrich Krupp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the staged directory ingestion pipeline."""
+
+import os
+import queue
+import shutil
+import struct
+import tempfile
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+
+from src.mcp_memory_service.ingestion import IngestionPipeline
+from src.mcp_memory_service.ingestion.pipeline import _parse_file
+from src.mcp_memory_service.models.memory import Memory
+from src.mcp_memory_service.storage.sqlite_vec import SqliteVecMemoryStorage
+from src.mcp_memory_service.utils.hashing import generate_content_hash
+
+
+def build_memory(file_path, chunk):
+    return Memory(
+        content=chunk.content,
+        content_hash=generate_content_hash(chunk.content, chunk.metadata),
+        tags=[f"file:{file_path.stem}"],
+        memory_type="document",
+        metadata=chunk.metadata
+    )
+
+
+@pytest_asyncio.fixture
+async def storage_and_files():
+    temp_dir = tempfile.mkdtemp()
+    storage = SqliteVecMemoryStorage(os.path.join(temp_dir, "ingest.db"))
+    await storage.initialize()
+
+    files = []
+    for i in range(6):
+        path = Path(temp_dir) / f"doc_{i}.txt"
+        paragraphs = [f"Document {i} paragraph {p}. " + "Some filler text. " * 20 for p in range(5)]
+        path.write_text("\n\n".join(paragraphs))
+        files.append(path)
+
+    yield storage, files, temp_dir
+
+    storage.close()
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("workers", [0, 2])
+async def test_pipeline_stores_all_files(storage_and_files, workers):
+    storage, files, temp_dir = storage_and_files
+    progress_calls = []
+
+    async def on_progress(result):
+        progress_calls.append((result.files_parsed, result.chunks_stored))
+
+    pipeline = IngestionPipeline(
+        storage, build_memory, workers=workers, batch_size=4, progress_callback=on_progress
+    )
+    result = await pipeline.run(files, chunk_size=300)
+
+    assert result.files_processed == len(files)
+    assert result.files_failed == 0
+    assert result.chunks_processed > len(files)
+    assert result.chunks_stored == result.chunks_processed
+    assert await storage.count_all_memories() == result.chunks_stored
+    for file_path in files:
+        memories = await storage.search_by_tag([f"file:{file_path.stem}"])
+        assert len(memories) == result.files[file_path].chunks_stored > 0
+
+    # Progress is reported per stored batch and never goes backwards
+    assert progress_calls
+    assert progress_calls == sorted(progress_calls)
+    assert progress_calls[-1][1] == result.chunks_stored
+
+
+@pytest.mark.asyncio
+async def test_pipeline_reports_failed_files(storage_and_files):
+    storage, files, temp_dir = storage_and_files
+    missing = Path(temp_dir) / "missing.txt"
+
+    pipeline = IngestionPipeline(storage, build_memory, workers=0, batch_size=4)
+    result = await pipeline.run(files[:2] + [missing], chunk_size=300)
+
+    assert result.files_processed == 2
+    assert result.files_failed == 1
+    assert result.files[missing].error
+    assert any("missing.txt" in error for error in result.errors)
+
+
+def test_parse_file_streams_bounded_batches(tmp_path):
+    path = tmp_path / "long.txt"
+    path.write_text("\n\n".join(f"Paragraph {p}. " + "Some filler text. " * 20 for p in range(12)))
+    out = queue.Queue()
+
+    _parse_file(str(path), 300, out, 4)
+
+    items = [out.get_nowait() for _ in range(out.qsize())]
+    batches = [chunks for chunks, _, _ in items[:-1]]
+    assert items[-1] == (None, None, None)
+    assert len(batches) > 1
+    assert all(0 < len(chunks) <= 4 for chunks in batches)
+    assert [c.chunk_index for chunks in batches for c in chunks] == list(range(sum(map(len, batches))))
+
+
+@pytest.mark.asyncio
+async def test_store_batch_reuses_precomputed_embeddings(storage_and_files):
+    storage, files, temp_dir = storage_and_files
+    content = "Precomputed embedding memory"
+    memory = Memory(content=content, content_hash=generate_content_hash(content))
+    memory.embedding = [0.5] * storage.embedding_dimension
+
+    results = await storage.store_batch([memory])
+    assert results == [(True, "Memory stored successfully")]
+
+    row = storage.conn.execute(
+        'SELECT e.content_embedding FROM memories m JOIN memory_embeddings e ON e.rowid = m.id '
+        'WHERE m.content_hash = ?', (memory.content_hash,)
+    ).fetchone()
+    assert list(struct.unpack(f"{storage.embedding_dimension}f", row[0])) == [0.5] * storage.embedding_dimension
+
+
+@pytest.mark.asyncio
+async def test_incremental_reingestion(storage_and_files):
+    storage, files, temp_dir = storage_and_files
+
+    first = await IngestionPipeline(storage, build_memory, workers=0, incremental=True).run(files, chunk_size=300)
+    stored = await storage.count_all_memories()
+    assert first.chunks_stored == stored > 0
+
+    # Unchanged files are skipped without being parsed
+    second = await IngestionPipeline(storage, build_memory, workers=0, incremental=True).run(files, chunk_size=300)
+    assert second.files_unchanged == len(files)
+    assert second.files_processed == len(files)
+    assert second.chunks_processed == 0
+    assert await storage.count_all_memories() == stored
+
+    # A touched but identical file is recognized by its hash
+    os.utime(files[0], ns=(files[0].stat().st_atime_ns, files[0].stat().st_mtime_ns + 10**9))
+    third = await IngestionPipeline(storage, build_memory, workers=0, incremental=True).run(files, chunk_size=300)
+    assert third.files_unchanged == len(files)
+    assert third.chunks_processed == 0
+
+    # Editing one paragraph replaces only that paragraph's chunk
+    text = files[1].read_text()
+    files[1].write_text(text.replace("Document 1 paragraph 2.", "Document 1 rewritten paragraph."))
+    fourth = await IngestionPipeline(storage, build_memory, workers=0, incremental=True).run(files, chunk_size=300)
+    progress = fourth.files[files[1]]
+    assert fourth.files_unchanged == len(files) - 1
+    assert progress.chunks_stored == progress.chunks_removed == 1
+    assert progress.chunks_unchanged == progress.chunks_processed - 1
+    assert await storage.count_all_memories() == stored
+    contents = [m.content for m in await storage.search_by_tag([f"file:{files[1].stem}"])]
+    assert any("rewritten paragraph" in content for content in contents)
+    assert not any("Document 1 paragraph 2." in content for content in contents)
+
+
+@pytest.mark.asyncio
+async def test_purge_deleted_files(storage_and_files):
+    storage, files, temp_dir = storage_and_files
+    await IngestionPipeline(storage, build_memory, workers=0, incremental=True).run(files, chunk_size=300)
+    removed_count = len(await storage.search_by_tag([f"file:{files[0].stem}"]))
+    total = await storage.count_all_memories()
+
+    files[0].unlink()
+    result = await IngestionPipeline(
+        storage, build_memory, workers=0, incremental=True, purge_deleted=True
+    ).run(files[1:], chunk_size=300, root=Path(temp_dir))
+
+    assert result.files_purged == 1
+    assert result.chunks_removed == removed_count
+    assert await storage.count_all_memories() == total - removed_count
+    assert str(files[0].resolve()) not in await storage.get_ingestion_manifest()
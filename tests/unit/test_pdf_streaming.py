@@ -0,0 +1,77 @@
+# Copyright 2024 Heinrich Krupp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for incremental page streaming in the PDF loader."""
+
+import asyncio
+
+import pytest
+
+from src.mcp_memory_service.ingestion.pdf_loader import _stream_from_thread
+
+
+@pytest.mark.asyncio
+async def test_pages_are_yielded_before_extraction_finishes():
+    produced = []
+
+    def pages():
+        for page_num in range(1, 101):
+            produced.append(page_num)
+            yield page_num
+
+    received = []
+    async for page_num in _stream_from_thread(pages, max_buffered=4):
+        received.append(page_num)
+        if page_num == 1:
+            await asyncio.sleep(0.2)
+            # The worker is held back by the bounded queue, not run to completion
+            assert len(produced) <= 1 + 4 + 1
+
+    assert received == list(range(1, 101))
+
+
+@pytest.mark.asyncio
+async def test_early_stop_closes_the_producer():
+    closed = asyncio.Event()
+    loop = asyncio.get_running_loop()
+
+    def pages():
+        try:
+            page_num = 0
+            while True:
+                page_num += 1
+                yield page_num
+        finally:
+            loop.call_soon_threadsafe(closed.set)
+
+    stream = _stream_from_thread(pages, max_buffered=2)
+    async for page_num in stream:
+        if page_num == 3:
+            break
+    await stream.aclose()
+
+    await asyncio.wait_for(closed.wait(), timeout=5)
+
+
+@pytest.mark.asyncio
+async def test_extraction_errors_propagate():
+    def pages():
+        yield 1
+        raise ValueError("corrupt page")
+
+    received = []
+    with pytest.raises(ValueError, match="corrupt page"):
+        async for page_num in _stream_from_thread(pages, max_buffered=2):
+            received.append(page_num)
+    assert received == [1]